@@ -4,157 +4,268 @@ Módulo que implementa una aplicación de escritorio con Tkinter para realizar b
 a un repositorio Git.
 
 Esta aplicación cuenta con una interfaz gráfica para el usuario, realiza las
-operaciones de Git en un hilo secundario para no bloquear la GUI, y gestiona
+operaciones de Git en el bucle de eventos del motor de backup (un hilo
+secundario) para no bloquear la GUI, y gestiona
 reintentos automáticos con timeouts en caso de fallo en la conexión o en los
 comandos de Git.
 """
 
-# Biblioteca para crear interfaces gráficas de usuario (GUI)
-import tkinter as tk
-from tkinter import scrolledtext, messagebox  # Widgets específicos de Tkinter
 import logging  # Para registrar eventos y mensajes de la aplicación
-import subprocess  # Para ejecutar comandos externos del sistema (como Git)
 import os  # Para interactuar con el sistema operativo (ej. verificar rutas)
-# Para trabajar con fechas y horas (ej. para mensajes de commit)
-import datetime
-import time  # Para manejar tiempos de espera y pausas en la ejecución
-import threading  # Para manejar la concurrencia y ejecutar tareas en segundo plano
-# Para manejar timeout por intentos
-from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
-import socket  # Para verificar la conexión de red
+# Para derivar las opciones de cada repositorio en modo multi-repositorio
+import dataclasses
+import threading  # Para el evento de parada compartido con la GUI y las señales
+import sys  # Para devolver el código de salida en modo headless
+
+from backup_tools import headless  # Modo sin interfaz gráfica (servidores)
+# Lógica de backup asíncrona compartida con github_backup.py
+from backup_tools import engine
+from backup_tools.engine import EngineLoop
+from backup_tools.options import BackupOptions
+# Backups commiteados sin conexión y pendientes de subir
+from backup_tools.journal import PushJournal, BackgroundPusher
+from backup_tools.logview import TkLogView  # Vista de logs alimentada por lotes
+from backup_tools.restoreview import RestorePanel  # Panel para restaurar archivos de un backup
+from backup_tools import instance  # Una sola instancia por repositorio y disparo desde fuera
+from backup_tools import logfile  # Log a archivo asíncrono, rotativo y comprimido
+from backup_tools import metrics  # Tiempos por paso en JSONL y textfile de Prometheus
+from backup_tools import profiling  # Perfilado opcional de un intento (--profile-attempt)
+from backup_tools import reachability  # Sondeo del remoto de push con caché
+from backup_tools import statedir  # Log y métricas fuera del árbol de trabajo
+
+# Tkinter se importa bajo demanda (ver cargar_tkinter) para que el modo headless
+# arranque rápido y funcione en máquinas sin entorno gráfico.
+tk = None
+scrolledtext = None
+messagebox = None
 
 # --- Configuración Global ---
-ARCHIVO_LOG = "backup_git.log"  # Nombre del archivo donde se guardarán los logs
+# Nombre del archivo de logs, dentro del directorio de estado (.git/backup-tool/)
+ARCHIVO_LOG = "backup_git.log"
 MAX_REINTENTOS = 3  # Número máximo de reintentos para el proceso de backup completo
-# 5 minutos de timeout para cada intento de backup
+# 5 minutos de timeout para cada intento de backup; un push grande lo amplía
+# según el caudal observado (ver backup_tools/throughput.py)
 TIMEOUT_POR_INTENTO_SEGUNDOS = 5 * 60
-RETRASO_ENTRE_REINTENTOS_SEGUNDOS = 10  # Tiempo de espera entre reintentos
-# Archivo para guardar información del backup
-ARCHIVO_INFO_BACKUP = "backup_info.txt"
+RETRASO_ENTRE_REINTENTOS_SEGUNDOS = 10  # Espera tras el primer fallo; se duplica en cada reintento
+RETRASO_MAXIMO_ENTRE_REINTENTOS_SEGUNDOS = 2 * 60  # Tope de la espera entre reintentos
+# Mensaje de cada commit de backup ({number}: número del catálogo, {date}: fecha)
+MENSAJE_COMMIT = "Backup #{number} - {date}"
 
 # --- Configuración del Logging ---
 
 
-def configurar_logging():
+def configurar_logging(consola=False, repo_dir="."):
     """
-    Configura el sistema de logging para que los mensajes se guarden en un archivo.
-    Opcionalmente, también se pueden mostrar en la consola donde se ejecuta el script.
+    Configura el sistema de logging para que los mensajes se guarden en un archivo
+    del directorio de estado de `repo_dir` (ver backup_tools/statedir.py), fuera del
+    árbol de trabajo para que el log no cuente como un cambio del repositorio.
+    Con consola=True (modo headless) también se muestran por la salida de error,
+    de modo que journald/systemd los recoja.
+
+    Los hilos del backup solo encolan los mensajes; un hilo escritor los guarda
+    en UTF-8 y rota y comprime el archivo (ver backup_tools/logfile.py).
     """
-    logging.basicConfig(
-        # Nivel mínimo de mensajes a registrar (DEBUG, INFO, WARNING, ERROR, CRITICAL)
-        level=logging.INFO,
-        # Formato de cada línea de log
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        handlers=[
-            # Handler para escribir los logs en el archivo especificado
-            logging.FileHandler(ARCHIVO_LOG),
-            # logging.StreamHandler()  # Descomentar esta línea para ver los logs también en la consola
-        ]
-    )
-
-# --- Funciones Auxiliares de Backup ---
+    logfile.setup_logging(statedir.state_path(repo_dir, ARCHIVO_LOG), consola=consola)
 
 
-def get_next_backup_number(log_fn):
+def cargar_tkinter():
     """
-    Obtiene el siguiente número de backup a utilizar.
-    Lee el último número guardado en ARCHIVO_INFO_BACKUP y le suma 1.
-    Si el archivo no existe o está corrupto, empieza desde 1.
-    """
-    if not os.path.exists(ARCHIVO_INFO_BACKUP):
-        if log_fn:
-            log_fn(
-                f"Archivo '{ARCHIVO_INFO_BACKUP}' no encontrado, iniciando contador de backup en 1.", "INFO")
-        return 1
-    try:
-        with open(ARCHIVO_INFO_BACKUP, 'r', encoding='utf-8') as f:  # Abre el archivo en modo lectura
-            last_backup_number = int(f.read().strip())
-            next_number = last_backup_number + 1  # Incrementa el número de backup
-            if log_fn:
-                log_fn(
-                    # Loguea el número de backup
-                    f"Último número de backup leído: {last_backup_number}. Siguiente número: {next_number}", "INFO")
-            return next_number
-    except (ValueError, FileNotFoundError) as e:
-        if log_fn:
-            log_fn(
-                f"Error al leer el número de backup de '{ARCHIVO_INFO_BACKUP}': {e}. Reiniciando a 1.", "WARNING")
-        return 1
-
-
-def save_backup_number(number, log_fn):
+    Importa Tkinter solo cuando se va a mostrar la interfaz gráfica.
     """
-    Guarda el número de backup proporcionado en ARCHIVO_INFO_BACKUP.
-    """
-    try:
-        with open(ARCHIVO_INFO_BACKUP, 'w', encoding='utf-8') as f:
-            f.write(str(number))
-        if log_fn:
-            log_fn(
-                f"Número de backup {number} guardado en '{ARCHIVO_INFO_BACKUP}'.", "INFO")
-    except IOError as e:
-        logging.error(
-            f"Error crítico al guardar el número de backup {number} en '{ARCHIVO_INFO_BACKUP}': {e}")
-        if log_fn:
-            log_fn(
-                f"Error al guardar el número de backup {number}: {e}", "ERROR")
-
-
-def check_github_connection(log_fn=None, timeout=5):
+    global tk, scrolledtext, messagebox
+    if tk is None:
+        import tkinter
+        from tkinter import scrolledtext as modulo_scrolledtext
+        from tkinter import messagebox as modulo_messagebox
+        tk = tkinter
+        scrolledtext = modulo_scrolledtext
+        messagebox = modulo_messagebox
+
+# --- Funciones Auxiliares de Backup ---
+
+
+def check_remote_connection(log_fn=None, repo_dir=".", timeout=5, remote=None):
     """
-    Verifica la conexión a github.com en el puerto 443 (HTTPS).
+    Verifica que el remoto al que se hará el push es alcanzable, con el
+    transporte que corresponda a su URL (ver backup_tools/reachability.py).
+    El resultado se reutiliza unos segundos entre reintentos y repositorios.
 
     Args:
         log_fn (function, optional): Función para loguear mensajes (ej. self.loguear_mensaje).
+        repo_dir (str, optional): Repositorio cuyo remoto de push se comprueba.
         timeout (int, optional): Tiempo de espera en segundos para establecer la conexión.
+        remote (str, optional): Remoto concreto; por defecto el de push de la rama actual.
 
     Returns:
-        bool: True si la conexión es exitosa, False en caso contrario.
+        bool: True si el remoto es alcanzable, False en caso contrario.
     """
-    try:
-        if log_fn:
-            log_fn("Verificando conexión a GitHub (github.com:443)...", "INFO")
-        socket.create_connection(("github.com", 443), timeout=timeout)
-        if log_fn:
-            log_fn("Conexión a GitHub establecida correctamente.", "INFO")
-        return True
-    except socket.timeout:
-        if log_fn:
-            log_fn(
-                "No se pudo conectar a GitHub: Timeout durante el intento de conexión.", "ERROR")
-        return False
-    except (socket.error, OSError) as e:
-        if log_fn:
-            log_fn(f"No se pudo conectar a GitHub: {e}", "ERROR")
-        return False
+    if log_fn:
+        log_fn("Verificando conexión con el remoto de push...", "INFO")
+    return reachability.check_remote(repo_dir, log_fn, timeout, remote)
+
+# --- Motor de Backup (sin interfaz gráfica) ---
+
+
+class MotorBackup:
+    """
+    Lógica de backup con reintentos, independiente de la interfaz gráfica.
+
+    La utiliza AppBackup para la GUI y el modo headless (--headless, --interval,
+    --cron) para ejecutar backups desatendidos en servidores. Los backups se
+    ejecutan en el bucle de eventos del motor asíncrono (backup_tools/engine.py).
+    """
+
+    def __init__(self, evento_parada=None, opciones=None, log_fn=None, metricas=None):
+        """
+        Arranca el bucle de eventos en el que se ejecutan los backups.
+
+        Args:
+            evento_parada (threading.Event, optional): Evento que cancela el
+                intento en curso e interrumpe la espera entre reintentos (p. ej.
+                al recibir SIGTERM).
+            opciones (BackupOptions, optional): Opciones del backup (repositorio,
+                motor de snapshot, etc.).
+            log_fn (function, optional): Función de log alternativa.
+            metricas (MetricsWriter, optional): Destino del registro de tiempos
+                de cada backup; sin él no se escriben métricas.
+        """
+        self.bucle = EngineLoop()
+        self.evento_parada = evento_parada or threading.Event()
+        self.opciones = opciones or BackupOptions()
+        self._log_fn = log_fn
+        self.metricas = metricas
+        # Sube en segundo plano los backups guardados sin conexión. El motor lo
+        # serializa con los backups del mismo repositorio.
+        self.subidor = BackgroundPusher(
+            PushJournal(self.opciones.repo_dir),
+            lambda: self.bucle.run(engine.flush_journal(self.opciones, self.loguear_mensaje)),
+            lambda: check_remote_connection(repo_dir=self.opciones.repo_dir),
+            self.loguear_mensaje)
+
+    def cerrar_motor(self):
+        """
+        Cancela el backup en curso (terminando sus procesos de Git) y detiene
+        el bucle del motor.
+        """
+        self.subidor.stop()  # Lo pendiente queda en el diario para la próxima ejecución
+        self.bucle.close()
+
+    def ejecutar_mantenimiento_pendiente(self):
+        """
+        Ejecuta ya el mantenimiento del repositorio que los backups dejaron
+        programado (ver backup_tools/maintenance.py), en lugar de esperar a que
+        el repositorio lleve un rato sin backups.
+        """
+        self.bucle.run(engine.run_pending_maintenance())
+
+    def _realizar_intento_backup_logica(self, rutas_cambiadas=None, progreso=None):
+        """
+        Realiza un único intento de backup (ver engine.attempt) y devuelve su estado.
+
+        Args:
+            rutas_cambiadas (set, optional): Rutas modificadas según el vigilante
+                de archivos (--watch). Si es un conjunto vacío se devuelve
+                "NO_CHANGES" sin ejecutar Git; None revisa todo el repositorio.
+            progreso (AttemptProgress, optional): Progreso conservado entre
+                intentos. Si el commit ya se creó, el intento solo repite el
+                push; los fallos quedan clasificados en él.
+        """
+        return self.bucle.run(engine.attempt(
+            self.opciones, progreso, self.loguear_mensaje, changed_paths=rutas_cambiadas,
+            message_template=MENSAJE_COMMIT))
+
+    def _corutina_backup(self, rutas_cambiadas=None, al_progresar=None):
+        """
+        Corutina de un backup completo con reintentos, timeout por intento y
+        cancelación por `evento_parada` (ver engine.backup). Al terminar, el
+        resultado se anota en el catálogo y los tiempos de cada paso se
+        escriben en `self.metricas`.
+        """
+        return engine.backup(
+            self.opciones.repo_dir, self.opciones, log_fn=self.loguear_mensaje,
+            on_progress=al_progresar, changed_paths=rutas_cambiadas, cancel_event=self.evento_parada,
+            max_retries=MAX_REINTENTOS, retry_delay=RETRASO_ENTRE_REINTENTOS_SEGUNDOS,
+            max_retry_delay=RETRASO_MAXIMO_ENTRE_REINTENTOS_SEGUNDOS,
+            attempt_timeout=TIMEOUT_POR_INTENTO_SEGUNDOS, metrics_writer=self.metricas,
+            message_template=MENSAJE_COMMIT)
+
+    def _ejecutar_bucle_reintentos(self, rutas_cambiadas=None):
+        """
+        Ejecuta el backup con reintentos y espera su resultado.
+
+        Returns:
+            tuple: (estado final, número del último intento realizado).
+        """
+        return self.bucle.run(self._corutina_backup(rutas_cambiadas))
+
+    def ejecutar_backup(self, rutas_cambiadas=None):
+        """
+        Realiza un backup completo con reintentos y devuelve su estado final.
+        Es el trabajo que ejecuta el programador del modo headless.
+        """
+        estado, _ = self._ejecutar_bucle_reintentos(rutas_cambiadas)
+        # En modo programado o --watch, sube lo pendiente en cuanto vuelva la red
+        self.subidor.ensure_running()
+        return estado
+
+    def loguear_mensaje(self, mensaje_original, nivel="INFO"):
+        """
+        Función centralizada para loguear en archivo.
+        """
+        if self._log_fn is not None:
+            self._log_fn(mensaje_original, nivel)
+        elif nivel.upper() == "ERROR":
+            logging.error(mensaje_original)
+        elif nivel.upper() == "WARNING":
+            logging.warning(mensaje_original)
+        elif nivel.upper() == "CRITICAL":
+            logging.critical(mensaje_original)
+        else:
+            logging.info(mensaje_original)
 
 # --- Clase Principal de la Aplicación ---
 
 
-class AppBackup:
+class AppBackup(MotorBackup):
     """
     Clase que encapsula toda la lógica y la interfaz gráfica de la herramienta de backup.
     """
 
-    def __init__(self, ventana_raiz):
+    def __init__(self, ventana_raiz, opciones=None, metricas=None, perfilar=False):
         """
         Constructor de la aplicación. Se llama cuando se crea una instancia de AppBackup.
-        Inicializa la ventana principal y sus componentes.
+        Inicializa la ventana principal y sus componentes. Con `perfilar`, el
+        primer intento de cada backup se perfila (ver backup_tools/profiling.py).
         """
+        cargar_tkinter()
         self.raiz = ventana_raiz
+        self.perfilar = perfilar
         self.raiz.title("Herramienta de Backup a Git con Reintentos")
         self.raiz.geometry("700x500")
 
-        self.executor = ThreadPoolExecutor(max_workers=1)
+        super().__init__(opciones=opciones, metricas=metricas)
 
-        if not os.path.exists(".git"):
+        if not os.path.exists(os.path.join(self.opciones.repo_dir, ".git")):
             self.raiz.withdraw()
             messagebox.showerror("Error de Repositorio",
                                  "Este script debe ejecutarse desde la raíz de un repositorio Git.")
             logging.error(
                 "La aplicación no se inició desde la raíz de un repositorio Git.")
-            if hasattr(self, 'executor') and self.executor and not self.executor._shutdown:
-                self.executor.shutdown(wait=False, cancel_futures=True)
+            self.cerrar_motor()
+            self.raiz.destroy()
+            return
+
+        # Una sola instancia por repositorio: dos a la vez chocarían en index.lock
+        self.instancia = instance.claim(self.opciones.repo_dir)
+        if self.instancia is None:
+            pid = instance.owner_pid(self.opciones.repo_dir)
+            self.raiz.withdraw()
+            messagebox.showerror("Backup en Curso",
+                                 f"Ya hay otra instancia de la herramienta{f' (pid {pid})' if pid else ''} "
+                                 "en este repositorio. Use --trigger para pedirle un backup.")
+            logging.error(
+                "Ya hay otra instancia de la herramienta en este repositorio.")
+            self.cerrar_motor()
             self.raiz.destroy()
             return
 
@@ -172,6 +283,25 @@ class AppBackup:
         )
         self.boton_backup.pack(pady=10, fill=tk.X, padx=10)
 
+        self.boton_cancelar = tk.Button(
+            self.raiz,
+            text="Cancelar Backup",
+            command=self.cancelar_backup,
+            state=tk.DISABLED
+        )
+        self.boton_cancelar.pack(pady=(0, 5), fill=tk.X, padx=10)
+
+        # Paso en curso del backup y progreso de Git
+        self.etiqueta_progreso = tk.Label(self.raiz, text="", anchor='w')
+        self.etiqueta_progreso.pack(fill=tk.X, padx=10)
+
+        self.boton_restaurar = tk.Button(
+            self.raiz,
+            text="Restaurar archivos de un backup...",
+            command=self.abrir_panel_restauracion
+        )
+        self.boton_restaurar.pack(pady=(0, 5), fill=tk.X, padx=10)
+
         self.etiqueta_logs = tk.Label(self.raiz, text="Logs de Operación:")
         self.etiqueta_logs.pack(pady=(5, 0), anchor='w', padx=10)
 
@@ -182,250 +312,178 @@ class AppBackup:
             state=tk.DISABLED
         )
         self.texto_logs.pack(pady=5, padx=10, fill=tk.BOTH, expand=True)
+        # Los hilos de trabajo solo encolan; el hilo principal dibuja por lotes
+        self.vista_logs = TkLogView(self.raiz, self.texto_logs)
+        self.vista_logs.start()
 
         self.loguear_mensaje(
             "Aplicación de backup iniciada en un repositorio Git.")
 
         self.raiz.protocol("WM_DELETE_WINDOW", self.al_cerrar_ventana)
+        # Backups de sesiones anteriores guardados sin conexión
+        self.subidor.ensure_running()
+        # Otras ejecuciones en este repositorio (--headless, --trigger) piden aquí su backup
+        self.instancia.listen(self._backup_en_hilo, self.loguear_mensaje)
 
     def al_cerrar_ventana(self):
         """
         Se llama cuando el usuario intenta cerrar la ventana.
-        Se asegura de que el ThreadPoolExecutor se cierre limpiamente.
+        Se asegura de que el bucle del motor se detenga limpiamente.
         """
         self.loguear_mensaje("Cerrando aplicación...", "INFO")
-        if hasattr(self, 'executor') and self.executor and not self.executor._shutdown:
-            self.loguear_mensaje(
-                "Intentando cerrar el ThreadPoolExecutor...", "INFO")
-            self.executor.shutdown(wait=False, cancel_futures=True)
-            self.loguear_mensaje("ThreadPoolExecutor cerrado.", "INFO")
+        # Matar cualquier git que siga vivo en lugar de dejarlo huérfano
+        self.evento_parada.set()
+        self.cerrar_motor()
+        # Libera el repositorio sin esperar: el hilo de Tk no debe bloquearse
+        self.instancia.close(wait=False)
+        self.loguear_mensaje("Motor de backup detenido.", "INFO")
+        self.vista_logs.stop()
         self.raiz.destroy()
 
-    def ejecutar_comando_git(self, comando_args, nombre_operacion="Comando Git"):
+    def _mostrar_progreso(self, paso, detalle):
+        """Muestra el paso en curso (y el progreso de Git) bajo los botones."""
+        texto = f"Paso: {paso}" + (f" — {detalle}" if detalle else "")
+        self.raiz.after(0, lambda: self.etiqueta_progreso.config(text=texto))
+
+    def _al_terminar_backup(self, futuro):
         """
-        Ejecuta un comando Git y loguea la salida.
+        Espera el resultado final del backup, lo muestra en la GUI y lo
+        devuelve. Se ejecuta en el hilo de trabajo del backup.
         """
         try:
-            self.loguear_mensaje(
-                f"Ejecutando: {' '.join(comando_args)}", nivel="INFO")
-            proceso = subprocess.Popen(
-                comando_args,
-                stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                text=True, cwd=os.getcwd()
-            )
-            stdout, stderr = proceso.communicate(timeout=120)
-            codigo_retorno = proceso.returncode
-
-            mensaje_log_completo = f"{nombre_operacion} finalizado. Código: {codigo_retorno}\n"
-            if stdout:
-                mensaje_log_completo += f"Salida Estándar:\n{stdout.strip()}\n"
-            if stderr:
-                mensaje_log_completo += f"Salida de Error:\n{stderr.strip()}\n"
-
-            if codigo_retorno == 0:
-                self.loguear_mensaje(mensaje_log_completo, nivel="INFO")
-            else:
-                if "nothing to commit" in stderr.lower():
-                    self.loguear_mensaje(
-                        mensaje_log_completo + "INFO: No había cambios para commitear.", "WARNING")
-                    return stdout, stderr, 0  # Se trata como un caso especial de éxito
-                self.loguear_mensaje(mensaje_log_completo, nivel="ERROR")
-            return stdout, stderr, codigo_retorno
-        except FileNotFoundError:
-            msg_error = "Error: El comando 'git' no se encontró. ¿Está Git instalado y en el PATH?"
-            self.loguear_mensaje(msg_error, "ERROR")
-            return "", "Git no encontrado", -1
-        except subprocess.TimeoutExpired:
-            msg_error = f"La operación '{nombre_operacion}' excedió el tiempo de espera (120s) y fue cancelada."
-            self.loguear_mensaje(msg_error, "ERROR")
-            return "", "Comando Git excedió el tiempo de espera", -2
-        except Exception as e:
-            msg_error = f"Error inesperado ejecutando '{nombre_operacion}': {e}"
-            self.loguear_mensaje(msg_error, "ERROR")
-            return "", str(e), -3
+            status_intento, attempt = futuro.result()
+        except BaseException as e:  # Motor detenido al cerrar la ventana o fallo inesperado
+            logging.warning(f"El backup terminó sin resultado: {e!r}")
+            return "CANCELLED"
+        self.subidor.ensure_running()
+
+        if status_intento == "SUCCESS":
+            self.raiz.after(0, lambda: messagebox.showinfo(
+                "Éxito", f"Backup realizado con éxito en el intento {attempt}."))
+        elif status_intento in ["NO_CHANGES", "NO_CHANGES_AFTER_ADD"]:
+            self.raiz.after(0, lambda: messagebox.showinfo(
+                "Sin Cambios", "No se detectaron cambios para el backup."))
+        elif status_intento == "COMMITTED_OFFLINE":
+            self.raiz.after(0, lambda: messagebox.showinfo(
+                "Sin Conexión", "Backup guardado en local; se subirá automáticamente cuando vuelva la conexión."))
+        elif status_intento == "CANCELLED":
+            self.raiz.after(0, lambda: messagebox.showwarning(
+                "Cancelado", "El backup fue cancelado por el usuario."))
+        else:
+            self.raiz.after(0, lambda: messagebox.showerror(
+                "Fallo Total", f"No se pudo completar el backup después de {attempt} intento(s)."))
 
-    def _realizar_intento_backup_logica(self):
+        self.raiz.after(0, lambda: self.boton_backup.config(state=tk.NORMAL))
+        self.raiz.after(0, lambda: self.boton_cancelar.config(state=tk.DISABLED))
+        self.raiz.after(0, lambda: self.etiqueta_progreso.config(text=""))
+        return status_intento
+
+    def cancelar_backup(self):
         """
-        Contiene la lógica de un solo intento de backup.
-        Diseñada para ser ejecutada en un hilo por ThreadPoolExecutor.
+        Función llamada por el botón Cancelar. El motor detecta la cancelación
+        en menos de un segundo y termina los procesos de Git.
         """
-        self.loguear_mensaje(
-            "Iniciando intento de lógica de backup...", "INFO")
+        self.loguear_mensaje("Cancelación solicitada por el usuario.", "WARNING")
+        self.boton_cancelar.config(state=tk.DISABLED)
+        self.evento_parada.set()
 
-        numero_backup_actual = get_next_backup_number(self.loguear_mensaje)
-
-        if not check_github_connection(self.loguear_mensaje):
-            return "CONNECTION_ERROR"
-
-        stdout_status, _, rc_status = self.ejecutar_comando_git(
-            ["git", "status", "--porcelain"], "Verificar Estado Git"
-        )
-        if rc_status != 0:
-            return "GIT_STATUS_ERROR"
-        if not stdout_status.strip():
-            self.loguear_mensaje(
-                "No hay cambios pendientes en el repositorio.", "INFO")
-            return "NO_CHANGES"
-        self.loguear_mensaje(
-            f"Cambios detectados o archivos no rastreados:\n{stdout_status.strip()}", "INFO")
-
-        _, _, rc_add = self.ejecutar_comando_git(
-            ["git", "add", "."], "Git Add")
-        if rc_add != 0:
-            return "GIT_ADD_ERROR"
-
-        current_date_str = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        commit_message = f"Backup #{numero_backup_actual} - {current_date_str}"
-        self.loguear_mensaje(
-            f"Realizando commit con mensaje: '{commit_message}'...", "INFO")
-        _, stderr_commit, rc_commit = self.ejecutar_comando_git(
-            ["git", "commit", "-m", commit_message], "Git Commit"
-        )
-        if rc_commit != 0:
-            if "nothing to commit" in stderr_commit.lower():
-                self.loguear_mensaje(
-                    "No había cambios para commitear (detectado después de 'git add').", "WARNING")
-                return "NO_CHANGES_AFTER_ADD"
-            return "GIT_COMMIT_ERROR"
-        self.loguear_mensaje("Commit realizado exitosamente.", "INFO")
-
-        self.loguear_mensaje(
-            "Realizando push al repositorio remoto (git push)...", "INFO")
-        _, _, rc_push = self.ejecutar_comando_git(["git", "push"], "Git Push")
-        if rc_push != 0:
-            return "GIT_PUSH_ERROR"
-        self.loguear_mensaje("Push realizado exitosamente.", "INFO")
-
-        save_backup_number(numero_backup_actual, self.loguear_mensaje)
-        return "SUCCESS"
-
-    def _bucle_trabajador_backup(self):
-        """
-        Gestiona los reintentos para el proceso de backup en un hilo separado.
-        """
-        overall_start_time = time.time()
-        success = False
-
-        for attempt in range(1, MAX_REINTENTOS + 1):
-            self.loguear_mensaje(
-                f"--- Iniciando Intento de Backup {attempt}/{MAX_REINTENTOS} ---", "INFO")
-            attempt_start_time = time.time()
-
-            future = self.executor.submit(self._realizar_intento_backup_logica)
-            status_intento = "UNKNOWN_ERROR"
-            try:
-                status_intento = future.result(
-                    timeout=TIMEOUT_POR_INTENTO_SEGUNDOS)
-            except FutureTimeoutError:
-                status_intento = "TIMEOUT_ATTEMPT"
-                self.loguear_mensaje(
-                    f"Intento {attempt} excedió el tiempo límite de {TIMEOUT_POR_INTENTO_SEGUNDOS / 60:.0f} minutos.", "ERROR")
-                if future.running():
-                    future.cancel()
-            except Exception as e:
-                status_intento = "EXCEPTION_IN_LOGIC"
-                self.loguear_mensaje(
-                    f"Excepción no controlada durante el intento {attempt}: {e}", "CRITICAL")
-                logging.exception(
-                    f"Excepción no controlada en _bucle_trabajador_backup, intento {attempt}")
-
-            attempt_duration = time.time() - attempt_start_time
-            self.loguear_mensaje(
-                f"Intento {attempt} finalizado en {attempt_duration:.2f}s con estado: {status_intento}", "INFO")
-
-            if status_intento == "SUCCESS":
-                overall_duration = time.time() - overall_start_time
-                self.loguear_mensaje(
-                    f"Backup completado exitosamente después de {attempt} intento(s).", "INFO")
-                self.loguear_mensaje(
-                    f"Duración total del proceso: {overall_duration:.2f} segundos.", "INFO")
-                self.raiz.after(0, lambda: messagebox.showinfo(
-                    "Éxito", f"Backup realizado con éxito en el intento {attempt}."))
-                success = True
-                break
-
-            elif status_intento in ["NO_CHANGES", "NO_CHANGES_AFTER_ADD"]:
-                self.loguear_mensaje("No hay cambios para el backup.", "INFO")
-                self.raiz.after(0, lambda: messagebox.showinfo(
-                    "Sin Cambios", "No se detectaron cambios para el backup."))
-                success = True
-                break
-
-            else:
-                self.loguear_mensaje(
-                    f"Intento {attempt} falló. Estado: {status_intento}", "ERROR")
-                if attempt < MAX_REINTENTOS:
-                    self.loguear_mensaje(
-                        f"Esperando {RETRASO_ENTRE_REINTENTOS_SEGUNDOS}s antes del próximo intento...", "INFO")
-                    time.sleep(RETRASO_ENTRE_REINTENTOS_SEGUNDOS)
-
-        if not success:
-            overall_duration = time.time() - overall_start_time
-            self.loguear_mensaje(
-                f"Todos los {MAX_REINTENTOS} intentos de backup fallaron.", "ERROR")
-            self.loguear_mensaje(
-                f"Duración total del proceso (fallido): {overall_duration:.2f} segundos.", "ERROR")
-            self.raiz.after(0, lambda: messagebox.showerror(
-                "Fallo Total", f"No se pudo completar el backup después de {MAX_REINTENTOS} intentos."))
-
-        self.raiz.after(0, lambda: self.boton_backup.config(state=tk.NORMAL))
+    def abrir_panel_restauracion(self):
+        """
+        Función llamada por el botón Restaurar. Abre el panel que lista los
+        backups y restaura los archivos elegidos.
+        """
+        RestorePanel(tk, messagebox, self.raiz, self.opciones.repo_dir, self.loguear_mensaje,
+                     self.opciones.chunk_target)
 
     def iniciar_proceso_backup_con_reintentos_en_hilo(self):
         """
-        Función llamada por el botón de backup. Inicia el proceso en un hilo.
+        Función llamada por el botón de backup. Lanza el backup en un hilo de
+        trabajo y vuelve enseguida al bucle de Tkinter. Si ya hay uno en
+        curso (pedido por otra ejecución), se suma al siguiente.
         """
         self.boton_backup.config(state=tk.DISABLED)
-        self.texto_logs.config(state=tk.NORMAL)
-        self.texto_logs.delete('1.0', tk.END)
-        self.texto_logs.config(state=tk.DISABLED)
+        self.vista_logs.clear()
+        threading.Thread(target=self.instancia.run, daemon=True, name="backup-gui").start()
+
+    def _backup_en_hilo(self, rutas_cambiadas=None):
+        """
+        Ejecuta en el bucle del motor un backup pedido con el botón o por
+        otra ejecución (ver backup_tools/instance.py) y devuelve su estado
+        final. Se llama desde un hilo de trabajo: la GUI solo se toca con
+        raiz.after.
+        """
+        self.raiz.after(0, lambda: self.boton_backup.config(state=tk.DISABLED))
+        self.raiz.after(0, lambda: self.boton_cancelar.config(state=tk.NORMAL))
+        self.evento_parada.clear()
 
         self.loguear_mensaje(
             "Iniciando proceso de backup con reintentos...", "INFO")
+        if self.perfilar:
+            # El informe mide también el dibujo del log en el hilo de Tk
+            profiling.arm(self.vista_logs)
 
-        worker_thread = threading.Thread(
-            target=self._bucle_trabajador_backup, daemon=True)
-        worker_thread.start()
-
-    def agregar_log_gui(self, mensaje_gui_formateado):
-        """
-        Añade un mensaje al widget ScrolledText de la GUI de forma segura.
-        """
-        if not self.raiz.winfo_exists():
-            return
-        self.texto_logs.config(state=tk.NORMAL)
-        self.texto_logs.insert(tk.END, mensaje_gui_formateado)
-        self.texto_logs.see(tk.END)
-        self.texto_logs.config(state=tk.DISABLED)
+        futuro = self.bucle.submit(
+            self._corutina_backup(rutas_cambiadas, al_progresar=self._mostrar_progreso))
+        return self._al_terminar_backup(futuro)
 
     def loguear_mensaje(self, mensaje_original, nivel="INFO"):
         """
         Función centralizada para loguear en archivo y en la GUI.
+        Se puede llamar desde cualquier hilo: el mensaje solo se encola y la
+        vista de logs lo dibuja en el siguiente lote.
         """
-        mensaje_para_gui = f"[{nivel.upper()}] {mensaje_original}\n"
+        super().loguear_mensaje(mensaje_original, nivel)
+        self.vista_logs.sink.put(f"[{nivel.upper()}] {mensaje_original}")
 
-        if nivel.upper() == "ERROR":
-            logging.error(mensaje_original)
-        elif nivel.upper() == "WARNING":
-            logging.warning(mensaje_original)
-        elif nivel.upper() == "CRITICAL":
-            logging.critical(mensaje_original)
-        else:
-            logging.info(mensaje_original)
 
-        if threading.current_thread() is threading.main_thread():
-            if self.raiz.winfo_exists():
-                self.agregar_log_gui(mensaje_para_gui)
-        else:
-            if self.raiz.winfo_exists():
-                self.raiz.after(0, self.agregar_log_gui, mensaje_para_gui)
+# --- Código principal para ejecutar la aplicación ---
+
+
+def main_headless(args):
+    """
+    Ejecuta el backup sin interfaz gráfica (una vez o programado) y devuelve
+    el código de salida del proceso.
+    """
+    configurar_logging(consola=True, repo_dir=args.repo)
+    evento_parada = threading.Event()
+    opciones = BackupOptions.from_args(args)
+    metricas = metrics.MetricsWriter.from_args(args)
+    if profiling.enabled(args):
+        profiling.arm()  # Solo el primer intento; el informe queda junto al log
+    motor = MotorBackup(evento_parada, opciones, metricas=metricas)
+
+    def intento_en_repositorio(ruta_repo, log_fn, progreso):
+        # El orquestador ejecuta la corutina en su propio bucle junto a las de los demás repositorios
+        return engine.attempt(dataclasses.replace(opciones, repo_dir=ruta_repo), progreso, log_fn,
+                              message_template=MENSAJE_COMMIT)
+
+    try:
+        return headless.run_headless(
+            args, motor.ejecutar_backup, motor.loguear_mensaje, evento_parada,
+            ignored_files=(ARCHIVO_LOG,) + metricas.paths(),
+            run_attempt=intento_en_repositorio,
+            max_retries=MAX_REINTENTOS, retry_delay=RETRASO_ENTRE_REINTENTOS_SEGUNDOS,
+            attempt_timeout=TIMEOUT_POR_INTENTO_SEGUNDOS, metrics_writer=metricas)
+    finally:
+        if not evento_parada.is_set():
+            motor.ejecutar_mantenimiento_pendiente()  # Un backup único no espera a la inactividad
+        motor.cerrar_motor()
+        logging.info("Script de backup headless finalizado.")
 
 
-# --- Código principal para ejecutar la aplicación ---
 if __name__ == "__main__":
-    configurar_logging()
+    argumentos = headless.build_arg_parser(
+        "Herramienta de backup a Git con reintentos.").parse_args()
+    if headless.wants_headless(argumentos):
+        sys.exit(main_headless(argumentos))
+
+    configurar_logging(repo_dir=argumentos.repo)
+    cargar_tkinter()
 
     ventana_principal_tk = tk.Tk()
-    app_gui = AppBackup(ventana_principal_tk)
+    app_gui = AppBackup(ventana_principal_tk, BackupOptions.from_args(argumentos),
+                        metrics.MetricsWriter.from_args(argumentos),
+                        perfilar=profiling.enabled(argumentos))
 
     if ventana_principal_tk.winfo_exists():
         try:
@@ -445,9 +503,9 @@ if __name__ == "__main__":
         logging.warning(
             "La aplicación no se inició completamente (ventana no existe al llegar al mainloop).")
 
-    if hasattr(app_gui, 'executor') and app_gui.executor and not app_gui.executor._shutdown:
+    if hasattr(app_gui, 'bucle'):
         logging.info(
-            "Asegurando cierre del ThreadPoolExecutor al finalizar el script.")
-        app_gui.executor.shutdown(wait=False, cancel_futures=True)
+            "Asegurando la detención del motor de backup al finalizar el script.")
+        app_gui.cerrar_motor()
 
     logging.info("Script de aplicación de backup finalizado.")
@@ -0,0 +1,7 @@
+"""
+Utilidades compartidas por las herramientas de backup a Git (`backupGit.py` y
+`github_backup.py`).
+
+Los módulos de este paquete no dependen de Tkinter, de modo que pueden usarse
+tanto desde las interfaces gráficas como desde el modo headless en servidores.
+"""
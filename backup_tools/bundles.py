@@ -0,0 +1,232 @@
+"""
+Copia secundaria de cada backup en bundles incrementales de Git.
+
+Además del push, cada backup puede dejarse en un disco local o un volumen USB
+(--bundle-dir) para recuperarlo sin red. Exportar el repositorio entero en
+cada backup costaría lo mismo que el repositorio; aquí cada bundle contiene
+solo los commits nuevos desde el bundle anterior (`git bundle create <ref>
+^<punta anterior>`) y se escribe a la vez que el push (ver engine.py).
+
+Estructura del destino:
+
+    <destino>/<repositorio>/
+        bundles.json                 Índice: número de backup, puntas y SHA-256 de cada bundle
+        backup-000042.bundle         Commits nuevos desde el bundle anterior
+        backup-000042.bundle.sha256  Suma en el formato de `sha256sum -c`
+
+Cada BUNDLES_POR_CADENA bundles incrementales el siguiente vuelve a ser
+completo y empieza una cadena nueva; solo se conservan las últimas
+`cadenas` cadenas, de modo que borrar las antiguas nunca deja un bundle sin
+los commits que necesita. Para recuperar un backup basta el bundle completo
+de su cadena y los incrementales que le siguen, aplicados en orden:
+
+    git init --bare proyecto.git
+    git -C proyecto.git fetch ../backup-000040.bundle 'refs/*:refs/*'
+    git -C proyecto.git fetch ../backup-000041.bundle 'refs/*:refs/*'
+"""
+
+import asyncio  # Hash y lectura del índice fuera del bucle de eventos
+import hashlib  # Suma de verificación de cada bundle
+import json  # Formato del índice
+import os  # Rutas del destino
+import subprocess  # Timeout de inactividad de gitrunner
+import tempfile  # Escritura atómica del índice
+import time  # Para fechar cada bundle
+
+from backup_tools import gitrunner  # Ejecución asíncrona de Git con la salida en el log
+
+ARCHIVO_INDICE = "bundles.json"
+EXTENSION_SUMA = ".sha256"
+# Bundles incrementales tras los que el siguiente vuelve a ser completo
+BUNDLES_POR_CADENA = 20
+# Cadenas (bundle completo + incrementales) que se conservan en el destino
+CADENAS_CONSERVADAS = 2
+# Bytes leídos de disco de cada vez al calcular la suma
+TAMANO_LECTURA = 8 * 1024 * 1024
+
+
+class BundleError(Exception):
+    """Error al escribir o verificar un bundle."""
+
+
+def repo_directory(destino, repo_dir):
+    """Directorio de los bundles de `repo_dir` dentro del destino."""
+    return os.path.join(os.path.abspath(os.path.expanduser(destino)),
+                        os.path.basename(os.path.abspath(repo_dir)))
+
+
+def file_sha256(ruta):
+    """SHA-256 (hexadecimal) del archivo `ruta`."""
+    suma = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(TAMANO_LECTURA), b""):
+            suma.update(bloque)
+    return suma.hexdigest()
+
+
+def load_index(directorio):
+    """Entradas del índice de `directorio`, de la más antigua a la más reciente."""
+    try:
+        with open(os.path.join(directorio, ARCHIVO_INDICE), "r", encoding="utf-8") as f:
+            return json.load(f).get("bundles", [])
+    except FileNotFoundError:
+        return []
+    except (OSError, ValueError) as e:
+        raise BundleError(f"No se pudo leer el índice de bundles de '{directorio}': {e}")
+
+
+def _guardar_indice(directorio, entradas):
+    descriptor, temporal = tempfile.mkstemp(prefix=".tmp-", dir=directorio)
+    try:
+        with os.fdopen(descriptor, "w", encoding="utf-8") as f:
+            json.dump({"bundles": entradas}, f, indent=1)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, os.path.join(directorio, ARCHIVO_INDICE))
+    except BaseException:
+        try:
+            os.remove(temporal)
+        except OSError:
+            pass
+        raise
+
+
+def _cadena_actual(entradas):
+    """Entradas desde el último bundle completo (incluido)."""
+    for i in range(len(entradas) - 1, -1, -1):
+        if entradas[i].get("full"):
+            return entradas[i:]
+    return []
+
+
+def _podar(directorio, entradas, cadenas, log_fn):
+    """Borra las cadenas anteriores a las últimas `cadenas` y devuelve las entradas que quedan."""
+    completos = [i for i, entrada in enumerate(entradas) if entrada.get("full")]
+    if len(completos) <= cadenas:
+        return entradas
+    corte = completos[-cadenas]
+    for entrada in entradas[:corte]:
+        for ruta in (entrada["file"], entrada["file"] + EXTENSION_SUMA):
+            try:
+                os.remove(os.path.join(directorio, ruta))
+            except FileNotFoundError:
+                pass
+    log_fn(f"Bundles podados: {corte} bundle(s) de cadenas anteriores borrados del destino.", "INFO")
+    return entradas[corte:]
+
+
+async def _crear(repo_dir, ruta, refs, excluidos, log_fn):
+    args = ["git", "bundle", "create", ruta] + list(refs) + [f"^{sha}" for sha in excluidos]
+    try:
+        _, stderr, codigo = await gitrunner.run_git(args, log_fn, cwd=repo_dir)
+    except (OSError, subprocess.SubprocessError) as e:
+        return str(e)
+    return None if codigo == 0 else stderr.strip() or f"código {codigo}"
+
+
+async def export_bundle(repo_dir, destino, numero, refs, log_fn, cadenas=CADENAS_CONSERVADAS):
+    """
+    Escribe en `destino` el bundle del backup `numero`.
+
+    Args:
+        repo_dir (str): Raíz del repositorio.
+        destino (str): Directorio de destino (se crea un subdirectorio por repositorio).
+        numero (int): Número de backup del catálogo.
+        refs (dict): Referencias del backup y su SHA, p. ej.
+            {"refs/heads/main": "1a2b..."}.
+        log_fn (function): Función para loguear mensajes (mensaje, nivel).
+        cadenas (int): Cadenas que se conservan al podar.
+
+    Returns:
+        dict: La entrada añadida al índice, o None si el destino ya tenía
+        esos commits.
+
+    Raises:
+        BundleError: Si no se pudo crear, escribir o verificar el bundle.
+    """
+    directorio = repo_directory(destino, repo_dir)
+    try:
+        os.makedirs(directorio, exist_ok=True)
+    except OSError as e:
+        raise BundleError(f"No se pudo crear el directorio de bundles '{directorio}': {e}")
+    entradas = await asyncio.to_thread(load_index, directorio)
+    cadena = _cadena_actual(entradas)
+    puntas = {}
+    for entrada in cadena:
+        puntas.update(entrada["refs"])
+    if cadena and all(puntas.get(ref) == sha for ref, sha in refs.items()):
+        log_fn(f"El destino de bundles ya contiene el backup #{numero}.", "INFO")
+        return None
+    completo = not cadena or len(cadena) > BUNDLES_POR_CADENA
+    excluidos = [] if completo else sorted(set(puntas.values()) - set(refs.values()))
+
+    nombre = f"backup-{numero:06d}.bundle"
+    ruta = os.path.join(directorio, nombre)
+    temporal = ruta + ".tmp"
+    error = await _crear(repo_dir, temporal, refs, excluidos, log_fn)
+    if error is not None and not completo:
+        # Una punta anterior ya no existe en el repositorio: se empieza una cadena nueva
+        log_fn(f"No se pudo crear el bundle incremental ({error}); se escribe uno completo.", "WARNING")
+        completo, excluidos = True, []
+        error = await _crear(repo_dir, temporal, refs, excluidos, log_fn)
+    if error is not None:
+        try:
+            os.remove(temporal)
+        except OSError:
+            pass
+        raise BundleError(f"git bundle create falló: {error}")
+
+    try:
+        suma = await asyncio.to_thread(file_sha256, temporal)
+        os.replace(temporal, ruta)
+        with open(ruta + EXTENSION_SUMA, "w", encoding="utf-8") as f:
+            f.write(f"{suma}  {nombre}\n")
+        # Se relee la copia del destino: un volumen defectuoso no pasa por buena
+        if await asyncio.to_thread(file_sha256, ruta) != suma:
+            raise BundleError(f"La suma SHA-256 de '{ruta}' no coincide tras escribirlo.")
+        _, stderr, codigo = await gitrunner.run_git(["git", "bundle", "verify", "-q", ruta], log_fn, cwd=repo_dir)
+        if codigo != 0:
+            raise BundleError(f"git bundle verify rechazó '{ruta}': {stderr.strip()}")
+        entrada = {
+            "number": numero,
+            "file": nombre,
+            "sha256": suma,
+            "size": os.path.getsize(ruta),
+            "full": completo,
+            "refs": dict(refs),
+            "prerequisites": excluidos,
+            "created": round(time.time(), 3),
+        }
+        entradas = _podar(directorio, entradas + [entrada], cadenas, log_fn)
+        await asyncio.to_thread(_guardar_indice, directorio, entradas)
+    except (OSError, subprocess.SubprocessError) as e:
+        raise BundleError(f"No se pudo escribir el bundle '{ruta}': {e}")
+    log_fn(f"Bundle {'completo' if completo else 'incremental'} del backup #{numero} escrito en "
+           f"{ruta} ({entrada['size'] / 1024:.1f} KiB).", "INFO")
+    return entrada
+
+
+def verify_bundles(destino, repo_dir):
+    """
+    Comprueba la suma SHA-256 de cada bundle del índice de `repo_dir` en
+    `destino`.
+
+    Returns:
+        list: Tuplas (archivo, problema) de los bundles ausentes o alterados;
+        vacía si todos están bien.
+
+    Raises:
+        BundleError: Si el índice no se puede leer.
+    """
+    directorio = repo_directory(destino, repo_dir)
+    problemas = []
+    for entrada in load_index(directorio):
+        ruta = os.path.join(directorio, entrada["file"])
+        try:
+            suma = file_sha256(ruta)
+        except OSError as e:
+            problemas.append((entrada["file"], f"no se puede leer: {e.strerror or e}"))
+            continue
+        if suma != entrada["sha256"]:
+            problemas.append((entrada["file"], "la suma SHA-256 no coincide"))
+    return problemas
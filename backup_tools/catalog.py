@@ -0,0 +1,239 @@
+"""
+Catálogo de backups en SQLite.
+
+El número de backup se guardaba como un único entero en `backup_info.txt`
+(`.backup_info.txt` en github_backup.py), sin bloqueo, de modo que dos
+ejecuciones simultáneas podían reutilizar el mismo número, y no quedaba
+historial. El catálogo es una base SQLite dentro del directorio común de Git
+(no se commitea) que:
+
+* reserva los números de forma atómica (`BEGIN IMMEDIATE`), también entre
+  procesos;
+* registra por backup el commit, la referencia, los archivos cambiados, los
+  bytes y objetos subidos, el tiempo de cada paso, los intentos y el estado
+  final;
+* indexa las rutas cambiadas para responder rápido a "¿cuándo se respaldó
+  por última vez X?" aunque haya miles de backups.
+
+La primera vez que se abre, continúa la numeración del contador antiguo si
+existe.
+"""
+
+import json  # Para guardar los tiempos por paso
+import os  # Para ubicar el catálogo y el contador antiguo
+import sqlite3  # Base de datos embebida
+import threading  # Para no repetir la creación del esquema entre hilos
+import time  # Para fechar los registros
+
+from backup_tools.scheduler import ESTADOS_EXITOSOS  # Estados que cuentan como backup correcto
+from backup_tools.snapshot import resolve_git_dir  # Para ubicar el catálogo en .git
+
+# Nombre del catálogo dentro del directorio común de Git
+ARCHIVO_CATALOGO = "backup-catalog.sqlite3"
+# Contadores antiguos de backupGit.py y github_backup.py (en la raíz del repositorio)
+CONTADORES_ANTIGUOS = ("backup_info.txt", ".backup_info.txt")
+# Segundos que se espera a que otro proceso libere el catálogo
+TIMEOUT_BLOQUEO_SEGUNDOS = 30
+
+# Estados propios del catálogo (el resto son los estados finales de las herramientas)
+STATUS_IN_PROGRESS = "IN_PROGRESS"  # Número reservado, commit aún no creado
+STATUS_COMMITTED = "COMMITTED"  # Commit creado, push pendiente
+STATUS_LEGACY = "LEGACY"  # Último número del contador antiguo
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS backups (
+    number INTEGER PRIMARY KEY,
+    status TEXT NOT NULL,
+    started REAL NOT NULL,
+    finished REAL,
+    pushed REAL,
+    engine TEXT,
+    commit_sha TEXT,
+    ref TEXT,
+    changed_files INTEGER,
+    bytes_pushed INTEGER,
+    objects_pushed INTEGER,
+    attempts INTEGER,
+    duration REAL,
+    phases TEXT
+);
+CREATE INDEX IF NOT EXISTS backups_status ON backups (status, number);
+CREATE INDEX IF NOT EXISTS backups_finished ON backups (finished);
+CREATE TABLE IF NOT EXISTS backup_paths (
+    path TEXT NOT NULL,
+    number INTEGER NOT NULL REFERENCES backups (number) ON DELETE CASCADE,
+    PRIMARY KEY (path, number)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS backup_paths_number ON backup_paths (number);
+"""
+
+_esquemas_creados = set()
+_lock_esquema = threading.Lock()
+
+
+def _leer_contador_antiguo(repo_dir):
+    numeros = []
+    for nombre in CONTADORES_ANTIGUOS:
+        try:
+            with open(os.path.join(repo_dir, nombre), "r", encoding="utf-8") as f:
+                numeros.append(int(f.read().strip()))
+        except (OSError, ValueError):
+            pass
+    return max(numeros, default=0)
+
+
+class BackupCatalog:
+    """
+    Catálogo de los backups de un repositorio. Cada operación abre su propia
+    conexión, así que una instancia puede usarse desde cualquier hilo.
+    """
+
+    def __init__(self, repo_dir="."):
+        self.repo_dir = repo_dir
+        _, common_dir = resolve_git_dir(repo_dir)
+        self.ruta = os.path.join(common_dir, ARCHIVO_CATALOGO)
+
+    def _conectar(self):
+        conexion = sqlite3.connect(self.ruta, timeout=TIMEOUT_BLOQUEO_SEGUNDOS, isolation_level=None)
+        conexion.row_factory = sqlite3.Row
+        conexion.execute("PRAGMA foreign_keys = ON")
+        with _lock_esquema:
+            if self.ruta not in _esquemas_creados:
+                conexion.execute("PRAGMA journal_mode = WAL")
+                conexion.executescript(_ESQUEMA)
+                _esquemas_creados.add(self.ruta)
+        return conexion
+
+    def allocate(self, engine=None):
+        """
+        Reserva el siguiente número de backup (estado IN_PROGRESS) y lo devuelve.
+        Es atómico entre hilos y procesos.
+        """
+        conexion = self._conectar()
+        try:
+            conexion.execute("BEGIN IMMEDIATE")
+            ultimo = conexion.execute("SELECT MAX(number) FROM backups").fetchone()[0]
+            if ultimo is None:
+                ultimo = _leer_contador_antiguo(self.repo_dir)
+                if ultimo:
+                    conexion.execute("INSERT INTO backups (number, status, started) VALUES (?, ?, ?)",
+                                     (ultimo, STATUS_LEGACY, time.time()))
+            numero = ultimo + 1
+            conexion.execute("INSERT INTO backups (number, status, started, engine) VALUES (?, ?, ?, ?)",
+                             (numero, STATUS_IN_PROGRESS, time.time(), engine))
+            conexion.execute("COMMIT")
+            return numero
+        except BaseException:
+            if conexion.in_transaction:
+                conexion.execute("ROLLBACK")
+            raise
+        finally:
+            conexion.close()
+
+    def record_commit(self, numero, commit_sha, ref=None, rutas=()):
+        """Registra el commit del backup `numero` y las rutas que cambió."""
+        rutas = sorted(set(rutas))
+        conexion = self._conectar()
+        try:
+            with conexion:
+                conexion.execute("BEGIN")
+                conexion.execute(
+                    "UPDATE backups SET status = ?, commit_sha = ?, ref = ?, changed_files = ? "
+                    "WHERE number = ?", (STATUS_COMMITTED, commit_sha, ref, len(rutas), numero))
+                conexion.executemany("INSERT OR IGNORE INTO backup_paths (path, number) VALUES (?, ?)",
+                                     ((ruta, numero) for ruta in rutas))
+        finally:
+            conexion.close()
+
+    def finish(self, numero, status, metrics=None, attempts=None):
+        """
+        Registra el estado final del backup `numero` y sus métricas
+        (BackupMetrics). Un número reservado que no llegó a commitearse porque
+        no había cambios se libera para el siguiente backup.
+        """
+        conexion = self._conectar()
+        try:
+            with conexion:
+                conexion.execute("BEGIN")
+                fila = conexion.execute("SELECT commit_sha FROM backups WHERE number = ?", (numero,)).fetchone()
+                if fila is None:
+                    return
+                if fila["commit_sha"] is None and status in ESTADOS_EXITOSOS:
+                    conexion.execute("DELETE FROM backups WHERE number = ?", (numero,))
+                    return
+                valores = {"status": status, "finished": time.time(), "attempts": attempts}
+                if metrics is not None:
+                    valores.update(duration=round(time.time() - metrics.started, 3),
+                                   phases=json.dumps(metrics.phases),
+                                   bytes_pushed=metrics.bytes_pushed,
+                                   objects_pushed=metrics.objects_pushed)
+                if status == "SUCCESS":
+                    valores["pushed"] = time.time()
+                columnas = ", ".join(f"{columna} = ?" for columna in valores)
+                conexion.execute(f"UPDATE backups SET {columnas} WHERE number = ?",
+                                 list(valores.values()) + [numero])
+        finally:
+            conexion.close()
+
+    def mark_pushed(self, numeros):
+        """Marca como subidos (SUCCESS) backups que se commitearon sin conexión."""
+        numeros = [n for n in numeros if n is not None]
+        if not numeros:
+            return
+        conexion = self._conectar()
+        try:
+            with conexion:
+                conexion.execute("BEGIN")
+                conexion.executemany("UPDATE backups SET status = 'SUCCESS', pushed = ? WHERE number = ?",
+                                     ((time.time(), n) for n in numeros))
+        finally:
+            conexion.close()
+
+    def get(self, numero):
+        """Devuelve el registro (dict) del backup `numero`, o None."""
+        conexion = self._conectar()
+        try:
+            fila = conexion.execute("SELECT * FROM backups WHERE number = ?", (numero,)).fetchone()
+            return dict(fila) if fila else None
+        finally:
+            conexion.close()
+
+    def recent(self, limite=20):
+        """Devuelve los últimos `limite` backups, del más reciente al más antiguo."""
+        conexion = self._conectar()
+        try:
+            return [dict(fila) for fila in conexion.execute(
+                "SELECT * FROM backups ORDER BY number DESC LIMIT ?", (limite,))]
+        finally:
+            conexion.close()
+
+    def last_backup_of(self, ruta):
+        """
+        Devuelve el último backup correcto que incluyó cambios en `ruta` (un
+        archivo, o un directorio y todo su contenido), o None.
+        """
+        ruta = ruta.replace(os.sep, "/").strip("/")
+        prefijo = ruta + "/"
+        # Rango [prefijo, prefijo con '/' sustituido por '0'): todo lo que cuelga del directorio
+        fin_prefijo = ruta + "0"
+        marcadores = ", ".join("?" for _ in ESTADOS_EXITOSOS)
+        conexion = self._conectar()
+        try:
+            fila = conexion.execute(
+                f"SELECT b.* FROM backup_paths p JOIN backups b ON b.number = p.number "
+                f"WHERE (p.path = ? OR (p.path >= ? AND p.path < ?)) AND b.status IN ({marcadores}) "
+                f"ORDER BY b.number DESC LIMIT 1",
+                [ruta, prefijo, fin_prefijo] + list(ESTADOS_EXITOSOS)).fetchone()
+            return dict(fila) if fila else None
+        finally:
+            conexion.close()
+
+
+def record_outcome(repo_dir, progress, status, attempts):
+    """
+    Registra en el catálogo el resultado final de un backup con reintentos, si
+    llegó a reservar un número (`progress.metrics.backup_number`).
+    """
+    numero = progress.metrics.backup_number
+    if numero is not None:
+        BackupCatalog(repo_dir).finish(numero, status, progress.metrics, attempts)
@@ -0,0 +1,341 @@
+"""
+Almacén de fragmentos para archivos grandes, fuera del historial de Git.
+
+Un APK, un recurso de diseño o un archivo generado de cientos de MiB se volvía
+a añadir entero al repositorio en cada cambio. Con un umbral configurado
+(--chunk-threshold), los archivos que lo superan no pasan por `git add`:
+
+* se dividen en fragmentos definidos por su contenido (los cortes dependen de
+  los bytes cercanos, no de la posición, así que insertar o borrar datos solo
+  cambia los fragmentos de alrededor);
+* cada fragmento se guarda una sola vez, con su SHA-256 como nombre, en el
+  directorio común de Git (no se commitea);
+* en el backup solo se commitea un manifiesto pequeño en `.backup-chunks/`
+  con la lista de fragmentos del archivo;
+* los fragmentos nuevos se suben a un destino aparte (--chunk-target, un
+  directorio local o montado) antes del push, de modo que un cambio en un
+  archivo de 200 MiB sube solo los fragmentos que cambiaron.
+
+Los cortes se buscan sin recorrer los bytes en Python: `bytes.translate`
+convierte cada byte en uno de cuatro símbolos y `bytes.find` localiza un
+patrón fijo de símbolos, ambos en C. La tabla y el patrón forman parte del
+formato: cambiarlos invalida la deduplicación con los fragmentos existentes.
+"""
+
+import hashlib  # Nombre de cada fragmento y verificación de archivos
+import json  # Formato de los manifiestos
+import os  # Para leer y escribir archivos
+import shutil  # Para copiar fragmentos al destino
+import tempfile  # Escrituras atómicas
+import threading  # Para serializar el archivo de pendientes
+
+from backup_tools.snapshot import resolve_git_dir  # Para ubicar el almacén en .git
+
+# Manifiestos, dentro del árbol de trabajo (se commitean)
+DIRECTORIO_MANIFIESTOS = ".backup-chunks"
+EXTENSION_MANIFIESTO = ".json"
+# Almacén local de fragmentos, dentro del directorio común de Git
+DIRECTORIO_ALMACEN = "backup-chunks"
+# Fragmentos pendientes de subir al destino, uno por línea
+ARCHIVO_PENDIENTES = "pending"
+VERSION_MANIFIESTO = 1
+
+MIB = 1024 * 1024
+# Límites de tamaño de un fragmento (la media ronda TAMANO_MINIMO + 1 MiB)
+TAMANO_MINIMO = 256 * 1024
+TAMANO_MAXIMO = 4 * MIB
+# Bytes leídos de disco de cada vez
+TAMANO_LECTURA = 8 * MIB
+
+# Símbolo ('0' a '3') de cada byte y patrón de 10 símbolos que marca un corte (1 de cada 4^10 posiciones)
+_TABLA = bytes(48 + hashlib.sha256(bytes([b])).digest()[0] % 4 for b in range(256))
+_PATRON = b"0123103223"
+
+_lock_pendientes = threading.Lock()
+
+
+class ChunkStoreError(Exception):
+    """Error al fragmentar, guardar, subir o reconstruir un archivo grande."""
+
+
+def _buscar_corte(datos):
+    """Posición del primer corte de `datos` (al menos TAMANO_MINIMO, como mucho TAMANO_MAXIMO)."""
+    if len(datos) <= TAMANO_MINIMO:
+        return len(datos)
+    ventana = datos[:TAMANO_MAXIMO].translate(_TABLA)
+    posicion = ventana.find(_PATRON, TAMANO_MINIMO - len(_PATRON))
+    return posicion + len(_PATRON) if posicion >= 0 else len(ventana)
+
+
+def iter_chunks(f):
+    """Recorre el archivo binario `f` devolviendo sus fragmentos (bytes)."""
+    buffer = bytearray()
+    fin = False
+    while True:
+        while not fin and len(buffer) < TAMANO_MAXIMO:
+            bloque = f.read(TAMANO_LECTURA)
+            if bloque:
+                buffer += bloque
+            else:
+                fin = True
+        if not buffer:
+            return
+        corte = _buscar_corte(buffer)
+        yield bytes(buffer[:corte])
+        del buffer[:corte]
+
+
+def manifest_path(ruta):
+    """Ruta (relativa al repositorio) del manifiesto de `ruta`."""
+    return f"{DIRECTORIO_MANIFIESTOS}/{ruta}{EXTENSION_MANIFIESTO}"
+
+
+def original_path(ruta_manifiesto):
+    """Ruta del archivo descrito por un manifiesto, o None si no es un manifiesto."""
+    prefijo = DIRECTORIO_MANIFIESTOS + "/"
+    if ruta_manifiesto.startswith(prefijo) and ruta_manifiesto.endswith(EXTENSION_MANIFIESTO):
+        return ruta_manifiesto[len(prefijo):-len(EXTENSION_MANIFIESTO)]
+    return None
+
+
+def manifest_pathspecs(rutas):
+    """Rutas de los manifiestos que corresponden a `rutas` (archivos o directorios)."""
+    resultado = []
+    for ruta in rutas:
+        ruta = ruta.replace(os.sep, "/").strip("/")
+        if ruta in ("", "."):
+            resultado.append(DIRECTORIO_MANIFIESTOS)
+        elif original_path(ruta) is None:
+            resultado += [manifest_path(ruta), f"{DIRECTORIO_MANIFIESTOS}/{ruta}"]
+    return resultado
+
+
+def _escribir_atomico(ruta, escribir):
+    """Escribe `ruta` a través de un temporal en su directorio y lo renombra encima."""
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    descriptor, temporal = tempfile.mkstemp(prefix=".tmp-", dir=os.path.dirname(ruta))
+    try:
+        with os.fdopen(descriptor, "wb") as f:
+            escribir(f)
+        os.replace(temporal, ruta)
+    except BaseException:
+        try:
+            os.remove(temporal)
+        except OSError:
+            pass
+        raise
+
+
+class DirectoryTarget:
+    """Destino de los fragmentos en un directorio (local, NAS, disco montado)."""
+
+    def __init__(self, ruta):
+        self.ruta = os.path.abspath(os.path.expanduser(ruta))
+
+    def _ruta_fragmento(self, clave):
+        return os.path.join(self.ruta, clave[:2], clave[2:])
+
+    def has(self, clave):
+        return os.path.exists(self._ruta_fragmento(clave))
+
+    def put(self, clave, origen):
+        """Copia al destino el fragmento guardado en el archivo `origen`."""
+        with open(origen, "rb") as f:
+            _escribir_atomico(self._ruta_fragmento(clave), lambda destino: shutil.copyfileobj(f, destino))
+
+    def open(self, clave):
+        return open(self._ruta_fragmento(clave), "rb")
+
+
+class ChunkStore:
+    """Almacén local de fragmentos de un repositorio."""
+
+    def __init__(self, repo_dir="."):
+        self.repo_dir = repo_dir
+        _, common_dir = resolve_git_dir(repo_dir)
+        self.ruta = os.path.join(common_dir, DIRECTORIO_ALMACEN)
+
+    def _ruta_fragmento(self, clave):
+        return os.path.join(self.ruta, clave[:2], clave[2:])
+
+    def has(self, clave):
+        return os.path.exists(self._ruta_fragmento(clave))
+
+    def put(self, clave, datos):
+        """Guarda un fragmento; devuelve False si ya estaba en el almacén."""
+        ruta = self._ruta_fragmento(clave)
+        if os.path.exists(ruta):
+            return False
+        _escribir_atomico(ruta, lambda f: f.write(datos))
+        return True
+
+    def open(self, clave):
+        return open(self._ruta_fragmento(clave), "rb")
+
+    def store_file(self, ruta_absoluta):
+        """
+        Fragmenta un archivo y guarda los fragmentos que aún no estaban.
+
+        Returns:
+            tuple: (manifiesto sin la ruta, fragmentos nuevos, bytes nuevos).
+
+        Raises:
+            ChunkStoreError: Si el archivo cambió mientras se leía.
+        """
+        total = hashlib.sha256()
+        fragmentos, nuevos, bytes_nuevos = [], [], 0
+        with open(ruta_absoluta, "rb") as f:
+            antes = os.fstat(f.fileno())
+            for datos in iter_chunks(f):
+                clave = hashlib.sha256(datos).hexdigest()
+                total.update(datos)
+                fragmentos.append(f"{clave} {len(datos)}")  # Una línea por fragmento en el manifiesto
+                if self.put(clave, datos):
+                    nuevos.append(clave)
+                    bytes_nuevos += len(datos)
+            despues = os.fstat(f.fileno())
+        if (antes.st_size, antes.st_mtime_ns) != (despues.st_size, despues.st_mtime_ns):
+            raise ChunkStoreError(f"El archivo '{ruta_absoluta}' cambió mientras se fragmentaba.")
+        self._anotar_pendientes(nuevos)
+        manifiesto = {
+            "version": VERSION_MANIFIESTO,
+            "size": antes.st_size,
+            "mtime_ns": antes.st_mtime_ns,
+            "mode": "100755" if antes.st_mode & 0o100 else "100644",
+            "sha256": total.hexdigest(),
+            "chunks": fragmentos,
+        }
+        return manifiesto, len(nuevos), bytes_nuevos
+
+    # --- Fragmentos pendientes de subir ---
+    def _ruta_pendientes(self):
+        return os.path.join(self.ruta, ARCHIVO_PENDIENTES)
+
+    def _anotar_pendientes(self, claves):
+        if not claves:
+            return
+        with _lock_pendientes:
+            os.makedirs(self.ruta, exist_ok=True)
+            with open(self._ruta_pendientes(), "a", encoding="utf-8") as f:
+                f.write("".join(clave + "\n" for clave in claves))
+
+    def pending(self):
+        """Fragmentos guardados que aún no se han subido al destino."""
+        try:
+            with open(self._ruta_pendientes(), "r", encoding="utf-8") as f:
+                return list(dict.fromkeys(linea.strip() for linea in f if linea.strip()))
+        except FileNotFoundError:
+            return []
+
+    def upload_pending(self, destino, log_fn=None):
+        """
+        Sube al destino (DirectoryTarget) los fragmentos pendientes que no tenga.
+
+        Returns:
+            tuple: (fragmentos subidos, bytes subidos).
+        """
+        with _lock_pendientes:
+            pendientes = self.pending()
+            subidos, total_bytes = 0, 0
+            try:
+                for clave in pendientes:
+                    if not destino.has(clave):
+                        destino.put(clave, self._ruta_fragmento(clave))
+                        subidos += 1
+                        total_bytes += os.path.getsize(self._ruta_fragmento(clave))
+            except OSError as e:
+                raise ChunkStoreError(f"No se pudieron subir los fragmentos a '{destino.ruta}': {e}") from e
+            if pendientes:
+                os.remove(self._ruta_pendientes())
+        if subidos and log_fn:
+            log_fn(f"Subidos {subidos} fragmento(s) ({total_bytes / MIB:.1f} MiB) a '{destino.ruta}'.", "INFO")
+        return subidos, total_bytes
+
+
+def _leer_manifiesto(ruta):
+    try:
+        with open(ruta, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def sync_manifests(repo_dir, rutas, umbral, log_fn=None):
+    """
+    Fragmenta los archivos `rutas` cuyo manifiesto no está al día y borra los
+    manifiestos de archivos que ya no existen o ya no superan `umbral`.
+
+    Returns:
+        list: Manifiestos escritos o borrados (rutas relativas al repositorio).
+    """
+    almacen = ChunkStore(repo_dir)
+    cambiados = []
+    for ruta in rutas:
+        ruta_manifiesto = manifest_path(ruta)
+        absoluta = os.path.join(repo_dir, ruta_manifiesto)
+        info = os.stat(os.path.join(repo_dir, ruta))
+        anterior = _leer_manifiesto(absoluta)
+        if anterior and (anterior.get("size"), anterior.get("mtime_ns")) == (info.st_size, info.st_mtime_ns):
+            continue
+        manifiesto, nuevos, bytes_nuevos = almacen.store_file(os.path.join(repo_dir, ruta))
+        manifiesto["path"] = ruta
+        contenido = json.dumps(manifiesto, indent=1, sort_keys=True).encode("utf-8") + b"\n"
+        _escribir_atomico(absoluta, lambda f: f.write(contenido))
+        cambiados.append(ruta_manifiesto)
+        if log_fn:
+            log_fn(f"'{ruta}' fragmentado: {len(manifiesto['chunks'])} fragmento(s), {nuevos} nuevo(s) "
+                   f"({bytes_nuevos / MIB:.1f} MiB).", "INFO")
+
+    vigentes = set(rutas)
+    for raiz, _, archivos in os.walk(os.path.join(repo_dir, DIRECTORIO_MANIFIESTOS)):
+        for nombre in archivos:
+            ruta_manifiesto = os.path.relpath(os.path.join(raiz, nombre), repo_dir).replace(os.sep, "/")
+            original = original_path(ruta_manifiesto)
+            if original is None or original in vigentes:
+                continue
+            try:
+                vigente = os.path.getsize(os.path.join(repo_dir, original)) >= umbral
+            except OSError:
+                vigente = False
+            if not vigente:
+                os.remove(os.path.join(raiz, nombre))
+                cambiados.append(ruta_manifiesto)
+                if log_fn:
+                    log_fn(f"Se retira el manifiesto de '{original}'.", "INFO")
+    return cambiados
+
+
+def upload_pending(repo_dir, destino, log_fn=None):
+    """Sube los fragmentos pendientes de `repo_dir` al directorio `destino`."""
+    return ChunkStore(repo_dir).upload_pending(DirectoryTarget(destino), log_fn)
+
+
+def reassemble(manifiesto, salida, repo_dir=".", destino=None):
+    """
+    Escribe en el archivo binario `salida` el contenido descrito por
+    `manifiesto`, leyendo cada fragmento del almacén local o, si falta, del
+    directorio `destino`. Verifica el SHA-256 del resultado.
+
+    Returns:
+        int: Bytes escritos.
+    """
+    almacen = ChunkStore(repo_dir)
+    remoto = DirectoryTarget(destino) if destino else None
+    total = hashlib.sha256()
+    escritos = 0
+    for fragmento in manifiesto.get("chunks", ()):
+        clave = fragmento.split(" ", 1)[0]
+        if almacen.has(clave):
+            origen = almacen.open(clave)
+        elif remoto is not None and remoto.has(clave):
+            origen = remoto.open(clave)
+        else:
+            raise ChunkStoreError(f"Falta el fragmento {clave[:12]} de '{manifiesto.get('path')}'.")
+        with origen:
+            datos = origen.read()
+        total.update(datos)
+        salida.write(datos)
+        escritos += len(datos)
+    if total.hexdigest() != manifiesto.get("sha256"):
+        raise ChunkStoreError(f"El contenido reconstruido de '{manifiesto.get('path')}' no coincide con su SHA-256.")
+    return escritos
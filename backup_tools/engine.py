@@ -0,0 +1,911 @@
+"""
+Motor de backup asíncrono compartido por `backupGit.py` y `github_backup.py`.
+
+Las dos herramientas repetían la misma lógica (status, política de staging,
+add, commit, push, diario sin conexión, espejos...) y ejecutaban cada intento
+en un ThreadPoolExecutor(max_workers=1) cuyo hilo solo esperaba a Git. Aquí
+esa lógica está una sola vez y lanza Git con subprocesos de asyncio (ver
+gitrunner.py), de modo que un único bucle de eventos atiende muchos comandos
+a la vez: el orquestador de varios repositorios ya no necesita un hilo por
+intento. Los pasos sin procesos que pueden tardar (escaneo del árbol,
+fragmentos, sondeo del remoto, git fast-import) se ejecutan con
+asyncio.to_thread.
+
+API pública:
+
+* attempt(): un intento de backup; devuelve su estado.
+* backup(): un backup completo con reintentos, timeout por intento y
+  cancelación; devuelve (estado final, intentos).
+* flush_journal(): sube los backups guardados sin conexión.
+* maintain(): reempaqueta el repositorio y actualiza su commit-graph si lo
+  necesita (ver maintenance.py). backup() lo programa para cuando el
+  repositorio lleva un rato sin backups; run_pending_maintenance() lo
+  ejecuta ya.
+* wait_attempt(): espera un intento con timeout y evento de cancelación.
+* EngineLoop: bucle de eventos en un hilo propio para llamar al motor desde
+  código síncrono (las interfaces Tk y el modo headless).
+
+Cancelar la tarea, vencer el timeout o activar `cancel_event` termina los
+procesos de Git en curso. `on_progress(paso, detalle)` recibe cada paso que
+empieza (con detalle None) y las líneas de progreso de Git
+("Writing objects:  42% ...") del paso en curso.
+
+El plazo de cada push se calcula con su tamaño estimado y el caudal de los
+pushes anteriores (ver throughput.py); si supera el timeout del intento, el
+intento se amplía hasta él.
+
+Con `options.bundle_dir`, el bundle incremental de cada backup (ver
+bundles.py) se escribe a la vez que el push, o en lugar de él sin conexión;
+el intento termina cuando acaban ambos.
+"""
+
+import asyncio  # Bucle de eventos, tareas y subprocesos
+import dataclasses  # Para fijar el repositorio de las opciones
+import datetime  # Para el mensaje de cada commit
+import logging  # Log por defecto si no se indica log_fn
+import os  # Para el archivo de pathspecs y las rutas de los repositorios
+import sqlite3  # Errores del catálogo de backups
+import subprocess  # Timeout de inactividad de gitrunner
+import threading  # Hilo de EngineLoop
+import time  # Para medir intentos y duraciones
+import weakref  # Cerrojos por bucle de eventos
+from contextlib import contextmanager  # Para anunciar cada paso
+
+from backup_tools import bundles  # Copia secundaria en bundles incrementales
+from backup_tools import chunkstore  # Archivos grandes como fragmentos fuera del historial
+from backup_tools import gitrunner  # Ejecución asíncrona de Git con la salida en el log
+from backup_tools import maintenance  # Reempaquetado y commit-graph entre backups
+from backup_tools import metrics  # Tiempos por paso
+from backup_tools import mirrors  # Push a los remotos espejo con quórum
+from backup_tools import profiling  # Perfilado opcional de un intento
+from backup_tools import reachability  # Sondeo del remoto de push con caché
+from backup_tools import snapshot  # Motor de snapshots con git fast-import
+from backup_tools import stagepolicy  # Exclusiones y límites de tamaño antes del add
+from backup_tools import throughput  # Plazos del push según su tamaño y el caudal observado
+from backup_tools.catalog import BackupCatalog, record_outcome  # Numeración e historial
+from backup_tools.journal import PushJournal  # Backups commiteados sin conexión
+from backup_tools.options import BackupOptions, ENGINE_FAST_IMPORT  # Opciones del backup
+# Reanudación por fases, backoff exponencial y clasificación de errores
+from backup_tools.retry import AttemptProgress, RetryPolicy, PHASE_PUSH, RETRYABLE, FATAL
+
+# --- Valores por defecto de backup() ---
+MAX_INTENTOS = 3
+TIMEOUT_POR_INTENTO_SEGUNDOS = 5 * 60
+RETRASO_ENTRE_REINTENTOS_SEGUNDOS = 10  # Espera tras el primer fallo; se duplica en cada reintento
+RETRASO_MAXIMO_ENTRE_REINTENTOS_SEGUNDOS = 2 * 60
+# Mensaje de commit; {number} es el número de backup y {date} la fecha
+MENSAJE_COMMIT = "Backup #{number} - {date}"
+# Entradas de `git status` que se muestran en el log antes de resumir el resto
+MAX_CAMBIOS_LOGUEADOS = 50
+# Segundos entre comprobaciones del evento de cancelación
+INTERVALO_CANCELACION_SEGUNDOS = 0.5
+# Segundos máximos del sondeo de conexión con el remoto
+TIMEOUT_CONEXION_SEGUNDOS = 5
+# Segundos que EngineLoop.close() espera a que terminen las tareas canceladas
+ESPERA_CIERRE_SEGUNDOS = 10
+# Con el mantenimiento propio, `git commit` no lanza `gc --auto` en mitad del backup
+OPCIONES_SIN_GC_AUTO = ["-c", "gc.auto=0", "-c", "maintenance.auto=false"]
+
+# Un cerrojo por repositorio y bucle: el vaciado del diario en segundo plano no
+# coincide con un backup del mismo repositorio
+_cerrojos = weakref.WeakKeyDictionary()
+# Un programador de mantenimiento por bucle (ver maintenance.IdleScheduler)
+_programadores = weakref.WeakKeyDictionary()
+# Repositorios en los que ya no queda ningún archivo antiguo de la herramienta rastreado
+_sin_archivos_propios = set()
+
+
+def _log_por_defecto(mensaje, nivel="INFO"):
+    logging.log(getattr(logging, nivel.upper(), logging.INFO), mensaje)
+
+
+def _cerrojo_repositorio(repo_dir):
+    por_bucle = _cerrojos.setdefault(asyncio.get_running_loop(), {})
+    return por_bucle.setdefault(os.path.realpath(repo_dir), asyncio.Lock())
+
+
+def _programador_mantenimiento():
+    bucle = asyncio.get_running_loop()
+    if bucle not in _programadores:
+        _programadores[bucle] = maintenance.IdleScheduler(
+            lambda repo_dir, log_fn, busy_fn: maintain(repo_dir, log_fn, busy_fn=busy_fn))
+    return _programadores[bucle]
+
+
+class _Intento:
+    """Un intento de backup de un repositorio."""
+
+    def __init__(self, opciones, progreso, log_fn, on_progress=None, plantilla=MENSAJE_COMMIT):
+        self.opciones = opciones
+        self.progreso = progreso
+        self.log_fn = log_fn
+        self.on_progress = on_progress
+        self.plantilla = plantilla
+        self.repo_dir = opciones.repo_dir
+        self._paso = None
+        self._exportacion = None  # Tarea del bundle del backup, en paralelo con el push
+        self._historial = None  # Caudal de los pushes anteriores, leído al primer push
+
+    @contextmanager
+    def _fase(self, paso):
+        """Suma el bloque al paso `paso` de las métricas y lo anuncia a on_progress."""
+        self._paso = paso
+        if self.on_progress is not None:
+            self.on_progress(paso, None)
+        with self.progreso.metrics.phase(paso):
+            yield
+
+    def _aviso_git(self, texto):
+        if self.on_progress is not None:
+            self.on_progress(self._paso, texto)
+
+    async def git(self, args, nombre, capturar=False, inactividad=gitrunner.TIMEOUT_INACTIVIDAD_SEGUNDOS):
+        """
+        Ejecuta un comando Git y devuelve (stdout, stderr, código). Los fallos
+        de ejecución se traducen a códigos negativos: -1 Git no encontrado,
+        -2 sin salida durante `inactividad` segundos, -3 error inesperado.
+        """
+        self.log_fn(f"Ejecutando: {' '.join(args)}", "INFO")
+        try:
+            stdout, stderr, codigo = await gitrunner.run_git(
+                args, self.log_fn, cwd=self.repo_dir, capture_stdout=capturar,
+                inactivity_timeout=inactividad, on_progress=self._aviso_git)
+        except FileNotFoundError:
+            self.log_fn("Error: El comando 'git' no se encontró. ¿Está Git instalado y en el PATH?", "ERROR")
+            return "", "Git no encontrado", -1
+        except subprocess.TimeoutExpired:
+            self.log_fn(f"{nombre} no produjo salida durante {inactividad:.0f}s "
+                        "y fue terminado.", "ERROR")
+            return "", "Comando Git excedió el tiempo de espera", -2
+        except OSError as e:
+            self.log_fn(f"Error inesperado ejecutando {nombre}: {e}", "ERROR")
+            return "", str(e), -3
+        self.log_fn(f"{nombre} finalizado. Código de retorno: {codigo}", "INFO" if codigo == 0 else "ERROR")
+        return stdout, stderr, codigo
+
+    async def ejecutar(self):
+        """Realiza el intento y devuelve su estado, después de esperar al bundle si se está escribiendo."""
+        try:
+            estado = await self._ejecutar()
+        except BaseException:
+            if self._exportacion is not None:
+                self._exportacion.cancel()
+                await asyncio.wait({self._exportacion})
+            raise
+        if self._exportacion is not None:
+            await self._exportacion
+        return estado
+
+    async def _ejecutar(self):
+        progreso = self.progreso
+        progreso.begin_attempt()
+        if progreso.phase == PHASE_PUSH:
+            self.log_fn(f"Reanudando el backup #{progreso.backup_number}: el commit ya existe, "
+                        "solo se repite el push.", "INFO")
+            return await self.subir()
+        self.log_fn("Iniciando intento de backup...", "INFO")
+
+        fast_import = self.opciones.snapshot_engine == ENGINE_FAST_IMPORT
+        # Formato sin escapes (lo necesitan la política de tamaño y fast-import)
+        comando_status = ["git", "status", "--porcelain", "-z"]
+        if fast_import:
+            comando_status.append("--untracked-files=all")  # Cada archivo no rastreado por separado
+        with self._fase(metrics.STEP_STATUS):
+            stdout_status, stderr_status, rc_status = await self.git(comando_status, "Git Status", capturar=True)
+        if rc_status != 0:
+            return progreso.fail("GIT_STATUS_ERROR", stderr_status)
+        if not stdout_status.strip("\0"):
+            self.log_fn("No hay cambios para realizar commit. El árbol de trabajo está limpio.", "INFO")
+            return await self.sin_cambios()
+        entradas = [e for e in stdout_status.split("\0") if e.strip()]
+        resumen = "\n".join(entradas[:MAX_CAMBIOS_LOGUEADOS])
+        if len(entradas) > MAX_CAMBIOS_LOGUEADOS:
+            resumen += f"\n... y {len(entradas) - MAX_CAMBIOS_LOGUEADOS} entrada(s) más"
+        self.log_fn(f"Cambios detectados o archivos no rastreados ({len(entradas)}):\n{resumen}", "INFO")
+
+        plan, estado = await self.planificar(stdout_status)
+        if estado is not None:
+            return estado
+        if fast_import:
+            stdout_status = stagepolicy.filter_status(stdout_status, plan)
+            estado = await self.snapshot_sin_cambios(stdout_status)
+            if estado is not None:
+                return estado
+        # La conexión solo se verifica cuando hay algo que subir
+        en_linea, estado = await self.verificar_conexion()
+        if estado is not None:
+            return estado
+        if fast_import:
+            return await self.snapshot_fast_import(stdout_status, plan, en_linea)
+        return await self.add_commit(plan, en_linea)
+
+    async def planificar(self, stdout_status):
+        """
+        Aplica a los cambios detectados la política de tamaño y exclusiones
+        (stagepolicy.py) y guarda en el almacén de fragmentos (chunkstore.py)
+        los archivos que superan `opciones.chunk_threshold`.
+
+        Returns:
+            tuple: (StagePlan, estado). El estado es None si el backup puede
+            seguir, "BACKUP_TOO_LARGE" si supera el presupuesto,
+            "CHUNK_STORE_ERROR" si no se pudo fragmentar un archivo o
+            "NO_CHANGES" si todo quedó excluido.
+        """
+        opciones, progreso = self.opciones, self.progreso
+        politica = stagepolicy.StagePolicy.from_options(opciones)
+        with self._fase(metrics.STEP_SCAN):
+            plan = await asyncio.to_thread(stagepolicy.scan, self.repo_dir, stdout_status, politica)
+        self.log_fn(f"El backup añadirá {plan.summary()}.", "WARNING" if plan.excluded else "INFO")
+        for linea in plan.report_lines():
+            self.log_fn(linea, "INFO")
+        if plan.over_budget:
+            self.log_fn(f"El backup supera el máximo de {politica.max_total_bytes / stagepolicy.MIB:.0f} MiB; "
+                        "excluya los archivos grandes (--exclude o .backupignore) o aumente "
+                        "--max-backup-size.", "ERROR")
+            return plan, progreso.fail("BACKUP_TOO_LARGE", clase=FATAL)
+        if opciones.chunk_threshold:
+            try:
+                with self._fase(metrics.STEP_CHUNKS):
+                    plan.generated = await asyncio.to_thread(
+                        chunkstore.sync_manifests, self.repo_dir, [ruta for ruta, _ in plan.chunked],
+                        opciones.chunk_threshold, self.log_fn)
+            except (chunkstore.ChunkStoreError, OSError) as e:
+                self.log_fn(f"Error al guardar los archivos grandes en el almacén de fragmentos: {e}", "ERROR")
+                return plan, progreso.fail("CHUNK_STORE_ERROR", str(e))
+            plan.included += plan.generated
+        if not plan.included:
+            self.log_fn("Todos los cambios están excluidos del backup; no hay nada que commitear.", "INFO")
+            return plan, await self.sin_cambios()
+        return plan, None
+
+    async def _sondear_remoto(self):
+        # Ambos motores suben al remoto de push de la rama, el mismo que se sondea
+        return await asyncio.to_thread(
+            reachability.check_remote, self.repo_dir, self.log_fn, TIMEOUT_CONEXION_SEGUNDOS)
+
+    async def verificar_conexion(self):
+        """
+        Verifica la conexión con el remoto de push.
+
+        Returns:
+            tuple: (en línea, estado). El estado es "CONNECTION_ERROR" si no
+            hay conexión y `opciones.offline_journal` está desactivado, y None
+            en otro caso.
+        """
+        self.log_fn("Verificando conexión con el remoto de push...", "INFO")
+        with self._fase(metrics.STEP_CONNECTION):
+            en_linea = await self._sondear_remoto()
+        if not en_linea:
+            if not self.opciones.offline_journal:
+                return False, self.progreso.fail("CONNECTION_ERROR", clase=RETRYABLE)
+            self.log_fn("Sin conexión: el backup se guardará en local y se subirá cuando vuelva la conexión.",
+                        "WARNING")
+        return en_linea, None
+
+    async def sin_cambios(self):
+        """
+        Termina un intento sin cambios. Solo si el diario tiene backups
+        pendientes se verifica la conexión para subirlos: un backup sin
+        cambios no hace ninguna operación de red.
+        """
+        if PushJournal(self.repo_dir).pending():
+            with self._fase(metrics.STEP_CONNECTION):
+                en_linea = await self._sondear_remoto()
+            if en_linea:
+                await self.vaciar_diario()
+        return "NO_CHANGES"
+
+    def reservar_numero(self):
+        """
+        Reserva en el catálogo el número del backup. Los reintentos reutilizan
+        el número ya reservado en el progreso.
+        """
+        if self.progreso.backup_number is None:
+            with self._fase(metrics.STEP_CATALOG):
+                self.progreso.reserve(BackupCatalog(self.repo_dir).allocate(self.opciones.snapshot_engine))
+            self.log_fn(f"Número de backup reservado en el catálogo: #{self.progreso.backup_number}.", "INFO")
+        return self.progreso.backup_number
+
+    def mensaje_commit(self, numero):
+        fecha = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        return self.plantilla.format(number=numero, date=fecha)
+
+    def registrar_commit(self, sha, ref, rutas):
+        """Anota en el catálogo el commit del backup y las rutas que cambió."""
+        try:
+            with self._fase(metrics.STEP_CATALOG):
+                BackupCatalog(self.repo_dir).record_commit(self.progreso.backup_number, sha, ref, rutas)
+        except sqlite3.Error as e:
+            self.log_fn(f"No se pudo registrar el commit en el catálogo de backups: {e}", "WARNING")
+
+    def exportar_bundle(self, numero, ref, sha):
+        """
+        Empieza a escribir en `opciones.bundle_dir` el bundle del backup
+        `numero`, sin esperar a que termine (ver ejecutar()).
+        """
+        if self.opciones.bundle_dir:
+            self._exportacion = asyncio.ensure_future(self._exportar_bundle(numero, ref, sha))
+
+    async def _exportar_bundle(self, numero, ref, sha):
+        # Un bundle fallido no hace fallar el backup: el siguiente incluye también estos commits
+        try:
+            with self.progreso.metrics.phase(metrics.STEP_BUNDLE):
+                await bundles.export_bundle(self.repo_dir, self.opciones.bundle_dir, numero, {ref: sha},
+                                            self.log_fn, self.opciones.bundle_chains)
+        except bundles.BundleError as e:
+            self.log_fn(f"No se pudo escribir el bundle del backup #{numero}: {e}", "WARNING")
+
+    def marcar_subidos(self, entradas):
+        """Marca como subidos en el catálogo los backups del diario incluidos en un push."""
+        try:
+            BackupCatalog(self.repo_dir).mark_pushed([e.get("backup_number") for e in entradas])
+        except sqlite3.Error as e:
+            self.log_fn(f"No se pudo actualizar el catálogo de backups: {e}", "WARNING")
+
+    async def dejar_de_rastrear_propios(self, plan):
+        """
+        Saca del índice las copias rastreadas del log y el contador que
+        escribían versiones anteriores en la raíz (stagepolicy.OWN_FILES) y
+        las deja fuera del `git add` de `plan`: el backup commitea su borrado
+        una vez y, ya sin rastrear, la política las excluye. Los archivos se
+        quedan en disco. Se comprueba una vez por proceso y repositorio.
+        """
+        clave = os.path.realpath(self.repo_dir)
+        if clave in _sin_archivos_propios:
+            return
+        stdout, stderr, codigo = await self.git(
+            ["git", "ls-files", "-z", "--"] + stagepolicy.own_files_pathspecs(),
+            "Git Ls-files (archivos antiguos de la herramienta)", capturar=True)
+        rastreados = [ruta for ruta in stdout.split("\0") if ruta] if codigo == 0 else []
+        if rastreados:
+            self.log_fn(f"Se dejan de rastrear archivos de versiones anteriores de la herramienta: "
+                        f"{', '.join(rastreados)}.", "INFO")
+            _, stderr, codigo = await self.git(
+                ["git", "rm", "--cached", "-q", "--"] + [f":(literal){ruta}" for ruta in rastreados],
+                "Git Rm")
+        if codigo != 0:
+            # No impide el backup: se reintenta en el siguiente
+            self.log_fn(f"No se pudieron dejar de rastrear los archivos antiguos de la herramienta: "
+                        f"{stderr.strip()}", "WARNING")
+            return
+        plan.excluded += [(ruta, "archivo antiguo de la herramienta") for ruta in rastreados]
+        _sin_archivos_propios.add(clave)
+
+    async def add_commit(self, plan, en_linea):
+        """`git add` (con pathspecs de exclusión si la política dejó algo fuera) y `git commit`."""
+        progreso = self.progreso
+        with self._fase(metrics.STEP_ADD):
+            await self.dejar_de_rastrear_propios(plan)
+        archivo_pathspecs = stagepolicy.write_pathspec_file(self.repo_dir, plan)
+        comando_add = stagepolicy.add_command(archivo_pathspecs)
+        try:
+            with self._fase(metrics.STEP_ADD):
+                _, stderr_add, rc_add = await self.git(comando_add, "Git Add")
+        finally:
+            if archivo_pathspecs is not None:
+                os.remove(archivo_pathspecs)
+        if rc_add != 0:
+            return progreso.fail("GIT_ADD_ERROR", stderr_add)
+
+        try:
+            numero = self.reservar_numero()
+        except sqlite3.Error as e:
+            self.log_fn(f"No se pudo reservar el número de backup en el catálogo: {e}", "ERROR")
+            return progreso.fail("CATALOG_ERROR", str(e))
+        mensaje = self.mensaje_commit(numero)
+        self.log_fn(f"Realizando commit con mensaje: '{mensaje}'...", "INFO")
+        comando_commit = ["git", "commit", "-m", mensaje]
+        if self.opciones.maintenance:
+            comando_commit[1:1] = OPCIONES_SIN_GC_AUTO
+        with self._fase(metrics.STEP_COMMIT):
+            stdout_commit, stderr_commit, rc_commit = await self.git(comando_commit, "Git Commit")
+        if rc_commit != 0:
+            if "nothing to commit" in (stdout_commit + stderr_commit).lower():
+                self.log_fn("No había cambios para commitear (detectado después de 'git add').", "WARNING")
+                return "NO_CHANGES_AFTER_ADD"
+            return progreso.fail("GIT_COMMIT_ERROR", stderr_commit)
+        ref, sha = snapshot.read_head(self.repo_dir)
+        self.registrar_commit(sha, ref, plan.included)
+        if ref is None:
+            ref_bundle = "HEAD"  # HEAD separado
+        else:
+            ref_bundle = ref if ref.startswith("refs/") else f"refs/heads/{ref}"
+        self.exportar_bundle(numero, ref_bundle, sha)
+
+        push_args = ["git", "push", "--progress"]
+        if not en_linea:
+            return self.registrar_sin_conexion(numero, push_args)
+        self.commit_hecho(numero, push_args)
+        self.log_fn("Realizando push al repositorio remoto (git push)...", "INFO")
+        return await self.subir()
+
+    async def snapshot_sin_cambios(self, stdout_status):
+        """
+        Comprueba, antes de reservar número y de sondear el remoto, si el
+        snapshot sería idéntico al último backup de la rama (también el de una
+        ejecución anterior). Devuelve "NO_CHANGES" en ese caso y None si hay
+        algo que respaldar o no se pudo comprobar.
+        """
+        snapshotter = snapshot.get_snapshotter(self.repo_dir)
+        try:
+            with self._fase(metrics.STEP_COMMIT):
+                sin_cambios = await asyncio.to_thread(snapshotter.unchanged, stdout_status)
+        except (snapshot.SnapshotError, OSError) as e:
+            self.log_fn(f"No se pudo comparar con el último snapshot: {e}", "WARNING")
+            return None
+        if not sin_cambios:
+            return None
+        self.log_fn("El árbol de trabajo no cambió desde el último snapshot.", "INFO")
+        return await self.sin_cambios()
+
+    async def snapshot_fast_import(self, stdout_status, plan, en_linea):
+        """
+        Variante del commit que usa el proceso persistente de `git fast-import`:
+        no modifica el índice ni la rama del usuario y sube el commit a
+        refs/backups/<rama> en el remoto de push de la rama (el mismo que usa
+        add-commit y que sondea verificar_conexion()).
+        """
+        progreso = self.progreso
+        try:
+            numero = self.reservar_numero()
+        except sqlite3.Error as e:
+            self.log_fn(f"No se pudo reservar el número de backup en el catálogo: {e}", "ERROR")
+            return progreso.fail("CATALOG_ERROR", str(e))
+        mensaje = self.mensaje_commit(numero)
+        snapshotter = snapshot.get_snapshotter(self.repo_dir)
+        self.log_fn(f"Creando snapshot con git fast-import: '{mensaje}'...", "INFO")
+        try:
+            with self._fase(metrics.STEP_COMMIT):
+                sha = await asyncio.to_thread(snapshotter.snapshot, stdout_status, mensaje)
+        except snapshot.SnapshotError as e:
+            self.log_fn(f"Error al crear el snapshot: {e}", "ERROR")
+            return progreso.fail("GIT_COMMIT_ERROR", str(e))
+        if sha is None:
+            self.log_fn("El árbol de trabajo no cambió desde el último snapshot.", "INFO")
+            if en_linea:
+                await self.vaciar_diario()
+            return "NO_CHANGES"
+        ref = snapshotter.backup_ref()
+        self.log_fn(f"Snapshot {sha[:12]} escrito en {ref}.", "INFO")
+        self.registrar_commit(sha, ref, plan.included)
+        self.exportar_bundle(numero, ref, sha)
+
+        # El remoto al que iría `git push` en la rama (branch.<rama>.pushRemote, remote.pushDefault...)
+        remoto, _ = await asyncio.to_thread(reachability.resolve_push_remote, self.repo_dir)
+        push_args = ["git", "push", "--progress", remoto, f"{ref}:{ref}"]
+        if not en_linea:
+            return self.registrar_sin_conexion(numero, push_args)
+        self.commit_hecho(numero, push_args)
+        self.log_fn(f"Realizando push de {ref}...", "INFO")
+        return await self.subir()
+
+    def _anotar_en_diario(self, numero, push_args):
+        """Anota en el diario el push (al principal y a cada espejo) del backup `numero`."""
+        diario = PushJournal(self.repo_dir)
+        for _, push_args_destino in mirrors.destinations(push_args, self.opciones.mirrors):
+            diario.add(numero, push_args_destino)
+        return diario
+
+    def commit_hecho(self, numero, push_args):
+        """
+        Pasa el backup a la fase de push y anota su push en el diario antes de
+        intentarlo: si se agotan los reintentos, el error es fatal o el proceso
+        muere, el commit no queda olvidado en local (el siguiente backup o
+        BackgroundPusher lo suben). subir() borra la entrada al subirlo.
+        """
+        self.progreso.commit_done(numero, push_args)
+        self._anotar_en_diario(numero, push_args)
+
+    def registrar_sin_conexion(self, numero, push_args):
+        """Anota en el diario el push (al principal y a cada espejo) de un backup commiteado sin conexión."""
+        diario = self._anotar_en_diario(numero, push_args)
+        pendientes = len({e.get("backup_number") for e in diario.pending()})
+        self.progreso.metrics.backup_number = numero
+        self.log_fn(f"Backup #{numero} guardado en local sin conexión; "
+                    f"{pendientes} backup(s) pendiente(s) de subir.", "WARNING")
+        return "COMMITTED_OFFLINE"
+
+    @property
+    def historial(self):
+        if self._historial is None:
+            self._historial = throughput.ThroughputHistory(self.repo_dir)
+        return self._historial
+
+    async def _push(self, push_args, inactividad=gitrunner.TIMEOUT_INACTIVIDAD_SEGUNDOS):
+        """Ejecuta un push y, si termina bien, añade su caudal al historial."""
+        inicio = time.monotonic()
+        _, stderr, codigo = await self.git(push_args, "Git Push", inactividad=inactividad)
+        if codigo == 0:
+            self.historial.record(metrics.parse_push_output(stderr)[1], time.monotonic() - inicio)
+        return stderr, codigo
+
+    async def _push_con_plazo(self, push_args, plan):
+        """_push() terminado al vencer el plazo de `plan` (sin plan, solo el del intento)."""
+        if plan is None:
+            return await self._push(push_args)
+        try:
+            return await asyncio.wait_for(self._push(push_args, plan.inactivity_timeout), plan.timeout)
+        except asyncio.TimeoutError:
+            self.log_fn(f"Git Push superó su plazo de {plan.timeout:.0f}s y fue terminado.", "ERROR")
+            return f"tiempo límite de {plan.timeout:.0f}s del push", -2
+
+    async def planificar_push(self):
+        """
+        Estima el tamaño del push pendiente y calcula sus plazos con el caudal
+        de los pushes anteriores (ver throughput.py). El plazo del push amplía
+        el del intento si lo supera (ver wait_attempt).
+
+        Returns:
+            tuple: (PushPlan, o None si no se pudo estimar; SHA que se sube).
+        """
+        tamano, sha = await throughput.estimate_push(
+            self.repo_dir, self.progreso.push_args, self.historial, self.log_fn)
+        if tamano is None:
+            self.log_fn("No se pudo estimar el tamaño del push; se usan los plazos fijos.", "WARNING")
+            return None, sha
+        plan = self.historial.plan(tamano)
+        self.log_fn(f"Push estimado: {plan.summary()}.", "INFO")
+        self.progreso.push_deadline = time.monotonic() + plan.timeout
+        return plan, sha
+
+    async def subir(self):
+        """
+        Sube el commit pendiente en el progreso y, si lo consigue, lo marca
+        como subido en el catálogo junto con los backups sin conexión que
+        incluía. Con `opciones.mirrors` sube además a los espejos a la vez y
+        basta con alcanzar `opciones.push_quorum` (ver mirrors.py). Si el push
+        falla, el progreso conserva el commit para que el siguiente intento
+        solo repita este paso.
+        """
+        opciones, progreso = self.opciones, self.progreso
+        diario = PushJournal(self.repo_dir)
+        if opciones.chunk_target:
+            # Los fragmentos llegan al destino antes que los manifiestos que los citan
+            try:
+                with self._fase(metrics.STEP_CHUNKS):
+                    await asyncio.to_thread(
+                        chunkstore.upload_pending, self.repo_dir, opciones.chunk_target, self.log_fn)
+            except chunkstore.ChunkStoreError as e:
+                self.log_fn(str(e), "ERROR")
+                return progreso.fail("CHUNK_UPLOAD_ERROR", str(e), clase=RETRYABLE)
+        with self._fase(metrics.STEP_PUSH):
+            plan, sha = await self.planificar_push()
+            try:
+                if opciones.mirrors:
+                    inactividad = gitrunner.TIMEOUT_INACTIVIDAD_SEGUNDOS if plan is None else plan.inactivity_timeout
+                    quorum_ok, stderr_push = await mirrors.push_with_quorum(
+                        progreso, opciones.mirrors, opciones.push_quorum,
+                        lambda push_args: self._push(push_args, inactividad), self.log_fn,
+                        diario if opciones.offline_journal else None,
+                        mirrors.TIMEOUT_PUSH_SEGUNDOS if plan is None else plan.timeout)
+                    rc_push = 0 if quorum_ok else 1
+                else:
+                    stderr_push, rc_push = await self._push_con_plazo(progreso.push_args, plan)
+                    progreso.metrics.record_push(stderr_push)
+            finally:
+                progreso.push_deadline = None
+        if rc_push != 0:
+            return progreso.fail("GIT_PUSH_ERROR", stderr_push)
+        # Lo subido no cuenta en la estimación del próximo push
+        self.historial.record(0, 0, throughput.push_source(progreso.push_args), sha)
+
+        numero = progreso.backup_number
+        sin_conexion = []
+        for remoto, push_args in mirrors.destinations(progreso.push_args, opciones.mirrors):
+            if not opciones.mirrors or remoto in progreso.pushed_remotes:
+                # La entrada del propio backup se anotó en commit_hecho()
+                sin_conexion += [e for e in diario.complete(push_args) if e.get("backup_number") != numero]
+        if sin_conexion:
+            self.log_fn(f"El push incluyó {len(sin_conexion)} backup(s) pendientes de subir.", "INFO")
+        with self._fase(metrics.STEP_CATALOG):
+            self.marcar_subidos([{"backup_number": numero}] + sin_conexion)
+        progreso.reset()
+        self.log_fn(f"Backup #{numero} commiteado y subido exitosamente.", "INFO")
+        return "SUCCESS"
+
+    async def vaciar_diario(self):
+        """
+        Sube con un único push por destino los backups guardados sin conexión,
+        después de subir los fragmentos pendientes si hay destino configurado.
+        Devuelve True si no queda nada pendiente.
+        """
+        if self.opciones.chunk_target:
+            try:
+                await asyncio.to_thread(
+                    chunkstore.upload_pending, self.repo_dir, self.opciones.chunk_target, self.log_fn)
+            except chunkstore.ChunkStoreError as e:
+                self.log_fn(f"{e}; los backups pendientes se subirán más tarde.", "WARNING")
+                return False
+
+        async def push_ok(push_args):
+            return (await self._push(push_args))[1] == 0
+
+        return await PushJournal(self.repo_dir).flush(push_ok, self.log_fn, on_pushed=self.marcar_subidos)
+
+
+async def attempt(options=None, progress=None, log_fn=None, on_progress=None, changed_paths=None,
+                  message_template=MENSAJE_COMMIT):
+    """
+    Realiza un intento de backup.
+
+    Args:
+        options (BackupOptions, optional): Opciones del backup (repositorio,
+            motor de snapshot, espejos, política de staging...).
+        progress (AttemptProgress, optional): Progreso conservado entre
+            intentos. Si el commit ya se creó, el intento solo repite el push;
+            los fallos quedan clasificados en él.
+        log_fn (function, optional): Función para loguear mensajes (mensaje, nivel).
+        on_progress (function, optional): Callable(paso, detalle), ver el
+            docstring del módulo.
+        changed_paths (set, optional): Rutas modificadas según el vigilante de
+            archivos (--watch). Si es un conjunto vacío se devuelve
+            "NO_CHANGES" sin ejecutar Git; None revisa todo el repositorio.
+        message_template (str): Mensaje del commit ({number}, {date}).
+
+    Sin conexión (y con `options.offline_journal`) el commit se crea
+    igualmente, su push queda anotado en el diario de pendientes y se devuelve
+    "COMMITTED_OFFLINE".
+
+    Returns:
+        str: "SUCCESS", "NO_CHANGES", "NO_CHANGES_AFTER_ADD",
+        "COMMITTED_OFFLINE" o un código de error como "CONNECTION_ERROR",
+        "GIT_ADD_ERROR", etc.
+    """
+    log_fn = log_fn or _log_por_defecto
+    if changed_paths is not None and not changed_paths:
+        log_fn("El vigilante de archivos no registró cambios; se omite Git.", "INFO")
+        return "NO_CHANGES"
+    options = options or BackupOptions()
+    intento = _Intento(options, progress or AttemptProgress(), log_fn, on_progress, message_template)
+    perfilador = profiling.take_armed()  # None salvo con --profile-attempt o BACKUP_PROFILE
+    if perfilador is not None:
+        intento.log_fn = perfilador.wrap_log(log_fn)
+        return await perfilador.run(_ejecutar_con_cerrojo(intento), options.repo_dir, log_fn)
+    return await _ejecutar_con_cerrojo(intento)
+
+
+async def _ejecutar_con_cerrojo(intento):
+    async with _cerrojo_repositorio(intento.repo_dir):
+        return await intento.ejecutar()
+
+
+async def flush_journal(options=None, log_fn=None):
+    """
+    Sube los backups guardados sin conexión de `options.repo_dir` (con un
+    único push por destino). Devuelve True si no queda nada pendiente.
+    """
+    options = options or BackupOptions()
+    intento = _Intento(options, AttemptProgress(), log_fn or _log_por_defecto)
+    async with _cerrojo_repositorio(options.repo_dir):
+        return await intento.vaciar_diario()
+
+
+async def maintain(repo=".", log_fn=None, force=False, busy_fn=None):
+    """
+    Ejecuta las tareas de mantenimiento que necesite `repo` sin coincidir con
+    ningún backup suyo en este bucle (ver maintenance.run_maintenance).
+    Devuelve el registro de la ejecución, o None si no hacía falta nada.
+    """
+    return await maintenance.run_maintenance(
+        repo, log_fn or _log_por_defecto, _cerrojo_repositorio(repo), force, busy_fn)
+
+
+async def run_pending_maintenance():
+    """Ejecuta ya el mantenimiento que backup() dejó programado en este bucle."""
+    await _programador_mantenimiento().run_pending()
+
+
+async def wait_cancelled(segundos, cancel_event=None):
+    """Espera `segundos`; devuelve True en cuanto se activa `cancel_event`."""
+    limite = time.monotonic() + segundos
+    while True:
+        if cancel_event is not None and cancel_event.is_set():
+            return True
+        restante = limite - time.monotonic()
+        if restante <= 0:
+            return False
+        await asyncio.sleep(min(INTERVALO_CANCELACION_SEGUNDOS, restante))
+
+
+async def wait_attempt(coro, timeout=None, cancel_event=None, log_fn=None, progress=None):
+    """
+    Ejecuta el intento `coro` como tarea y espera su estado.
+
+    Si vence `timeout` o se activa `cancel_event` (botón Cancelar, SIGTERM),
+    la tarea se cancela, lo que termina sus procesos de Git. Un push cuyo
+    plazo (`progress.push_deadline`, ver throughput.py) va más allá de
+    `timeout` amplía el del intento hasta él.
+
+    Returns:
+        str: El estado devuelto por el intento, "TIMEOUT_ATTEMPT" o "CANCELLED".
+
+    Raises:
+        Exception: La excepción no controlada que haya lanzado el intento.
+    """
+    tarea = asyncio.ensure_future(coro)
+    inicio = time.monotonic()
+    limite = None if timeout is None else inicio + timeout
+    try:
+        while True:
+            plazo_push = None if progress is None else progress.push_deadline
+            if limite is not None and plazo_push is not None and plazo_push > limite:
+                if log_fn:
+                    log_fn(f"El tiempo límite del intento se amplía a {plazo_push - inicio:.0f}s "
+                           "para el push.", "INFO")
+                limite = plazo_push
+            espera = INTERVALO_CANCELACION_SEGUNDOS
+            if limite is not None:
+                espera = max(0.0, min(espera, limite - time.monotonic()))
+            terminadas, _ = await asyncio.wait({tarea}, timeout=espera)
+            if terminadas:
+                return tarea.result()
+            if cancel_event is not None and cancel_event.is_set():
+                estado, motivo = "CANCELLED", "cancelación solicitada"
+                break
+            if limite is not None and time.monotonic() >= limite:
+                estado, motivo = "TIMEOUT_ATTEMPT", f"tiempo límite de {limite - inicio:.0f}s"
+                break
+    except asyncio.CancelledError:
+        tarea.cancel()
+        await asyncio.wait({tarea})
+        raise
+    if log_fn:
+        log_fn(f"Terminando los procesos de Git del intento ({motivo})...", "WARNING")
+    tarea.cancel()
+    await asyncio.wait({tarea})
+    return estado
+
+
+async def backup(repo=".", options=None, log_fn=None, on_progress=None, changed_paths=None,
+                 cancel_event=None, max_retries=MAX_INTENTOS, retry_delay=RETRASO_ENTRE_REINTENTOS_SEGUNDOS,
+                 max_retry_delay=RETRASO_MAXIMO_ENTRE_REINTENTOS_SEGUNDOS,
+                 attempt_timeout=TIMEOUT_POR_INTENTO_SEGUNDOS, metrics_writer=None,
+                 message_template=MENSAJE_COMMIT):
+    """
+    Realiza un backup completo de `repo` con reintentos.
+
+    Cada reintento continúa desde la fase que falló, espera con backoff
+    exponencial y no se realiza si el error se clasificó como definitivo. Si
+    un intento supera `attempt_timeout` o se activa `cancel_event`
+    (threading.Event), sus procesos de Git se terminan. Al terminar, el
+    resultado se anota en el catálogo de backups y los tiempos de cada paso
+    se escriben en `metrics_writer` (MetricsWriter) y, con
+    `options.maintenance`, se programa el mantenimiento del repositorio para
+    cuando lleve un rato sin backups.
+
+    Returns:
+        tuple: (estado final, número del último intento realizado).
+    """
+    options = dataclasses.replace(options or BackupOptions(), repo_dir=repo)
+    log_fn = log_fn or _log_por_defecto
+    progreso = AttemptProgress()
+    resultado = ["UNKNOWN_ERROR", 0]  # Estado e intento, también si la tarea se cancela
+    programador = _programador_mantenimiento() if options.maintenance else None
+    if programador is not None:
+        programador.backup_started(options.repo_dir)
+    try:
+        await _reintentar(options, progreso, log_fn, on_progress, changed_paths, cancel_event,
+                          max_retries, RetryPolicy(base_delay=retry_delay, max_delay=max_retry_delay),
+                          attempt_timeout, message_template, resultado)
+    except asyncio.CancelledError:
+        resultado[0] = "CANCELLED"
+        raise
+    finally:
+        estado, intentos = resultado
+        try:
+            record_outcome(options.repo_dir, progreso, estado, intentos)
+        except sqlite3.Error as e:
+            log_fn(f"No se pudo actualizar el catálogo de backups: {e}", "WARNING")
+        if metrics_writer is not None:
+            metrics_writer.write(progreso.metrics, metrics.repo_label(options.repo_dir), estado,
+                                 intentos, options.snapshot_engine, log_fn)
+        if programador is not None:
+            programador.backup_finished(options.repo_dir, log_fn, schedule=estado != "CANCELLED")
+    return tuple(resultado)
+
+
+async def _reintentar(opciones, progreso, log_fn, on_progress, rutas_cambiadas, evento_cancelacion,
+                      max_intentos, politica, timeout, plantilla, resultado):
+    """Bucle de reintentos de backup(); deja en `resultado` el estado y el intento."""
+    inicio_total = time.time()
+    for intento in range(1, max_intentos + 1):
+        resultado[1] = intento
+        log_fn(f"--- Intento de Backup {intento}/{max_intentos} ---", "INFO")
+        inicio_intento = time.time()
+        try:
+            estado = await wait_attempt(
+                attempt(opciones, progreso, log_fn, on_progress, rutas_cambiadas, plantilla),
+                timeout, evento_cancelacion, log_fn, progreso)
+            if estado == "TIMEOUT_ATTEMPT":
+                log_fn(f"Intento {intento} excedió el tiempo límite de {timeout / 60:.0f} minutos.", "ERROR")
+        except Exception as e:
+            estado = "EXCEPTION_IN_LOGIC"
+            log_fn(f"Excepción no controlada durante el intento {intento}: {e}", "CRITICAL")
+            logging.exception(f"Excepción no controlada en el intento de backup {intento}")
+        resultado[0] = estado
+        log_fn(f"Intento {intento} finalizado en {time.time() - inicio_intento:.2f}s con estado: {estado}", "INFO")
+
+        if estado == "CANCELLED" or (evento_cancelacion is not None and evento_cancelacion.is_set()):
+            log_fn("Backup cancelado; no se harán más intentos.", "WARNING")
+            resultado[0] = "CANCELLED"
+            return
+        if estado == "SUCCESS":
+            log_fn(f"Backup completado exitosamente después de {intento} intento(s).", "INFO")
+            log_fn(f"Duración total del proceso: {time.time() - inicio_total:.2f} segundos.", "INFO")
+            return
+        if estado in ("NO_CHANGES", "NO_CHANGES_AFTER_ADD"):
+            log_fn("No hay cambios para el backup.", "INFO")
+            log_fn(f"Duración total del proceso (sin cambios): {time.time() - inicio_total:.2f} segundos.", "INFO")
+            return
+        if estado == "COMMITTED_OFFLINE":
+            log_fn("Backup guardado en local; se subirá cuando vuelva la conexión.", "INFO")
+            return
+
+        log_fn(f"Intento {intento} falló. Estado: {estado}", "ERROR")
+        if progreso.fatal:
+            log_fn("El error no se resolverá reintentando (autenticación, rechazo del remoto...); "
+                   "no se harán más intentos.", "ERROR")
+            log_push_pending(progreso, log_fn)
+            return
+        if intento < max_intentos:
+            espera = politica.delay(intento)
+            if progreso.phase == PHASE_PUSH:
+                log_fn(f"El próximo intento solo repetirá el push del backup #{progreso.backup_number}.", "INFO")
+            log_fn(f"Esperando {espera:.1f}s antes del próximo intento...", "INFO")
+            if await wait_cancelled(espera, evento_cancelacion):
+                log_fn("Reintentos interrumpidos por una cancelación.", "WARNING")
+                resultado[0] = "CANCELLED"
+                return
+
+    log_fn(f"Todos los {max_intentos} intentos de backup fallaron.", "ERROR")
+    log_fn(f"Duración total del proceso (fallido): {time.time() - inicio_total:.2f} segundos.", "ERROR")
+    log_push_pending(progreso, log_fn)
+
+
+def log_push_pending(progress, log_fn):
+    """Avisa de que el commit de un backup fallido queda en el diario de pushes pendientes."""
+    if progress.phase == PHASE_PUSH:
+        log_fn(f"El backup #{progress.backup_number} quedó commiteado en local; su push queda en el "
+               "diario de pendientes y se reintentará en el próximo backup.", "WARNING")
+
+
+class EngineLoop:
+    """
+    Bucle de eventos del motor en un hilo propio, para llamarlo desde código
+    síncrono: la GUI no se bloquea mientras espera y el modo headless comparte
+    un único bucle entre el backup y la subida en segundo plano del diario.
+    """
+
+    def __init__(self, nombre="backup-engine"):
+        self._bucle = asyncio.new_event_loop()
+        self._hilo = threading.Thread(target=self._bucle.run_forever, name=nombre, daemon=True)
+        self._hilo.start()
+
+    def submit(self, coro):
+        """Programa `coro` en el bucle y devuelve su concurrent.futures.Future."""
+        return asyncio.run_coroutine_threadsafe(coro, self._bucle)
+
+    def run(self, coro):
+        """Ejecuta `coro` en el bucle y espera su resultado."""
+        return self.submit(coro).result()
+
+    async def _cancelar_tareas(self):
+        tareas = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for tarea in tareas:
+            tarea.cancel()
+        if tareas:
+            await asyncio.wait(tareas, timeout=ESPERA_CIERRE_SEGUNDOS)
+
+    def close(self):
+        """
+        Cancela las tareas en curso (terminando sus procesos de Git) y detiene
+        el bucle. Se puede llamar varias veces.
+        """
+        if not self._hilo.is_alive():
+            return
+        try:
+            self.submit(self._cancelar_tareas()).result(ESPERA_CIERRE_SEGUNDOS + 1)
+        except Exception:
+            pass  # El bucle se detiene igualmente
+        self._bucle.call_soon_threadsafe(self._bucle.stop)
+        self._hilo.join(ESPERA_CIERRE_SEGUNDOS)
@@ -0,0 +1,299 @@
+"""
+Ejecución asíncrona de comandos Git con la salida transmitida en vivo al log.
+
+`communicate()` retenía toda la salida en memoria hasta que el comando
+terminaba y solo entonces la copiaba al log, de modo que un `git push` grande
+no daba señales de vida durante minutos y el timeout fijo de 120 s podía
+matarlo aunque estuviera transfiriendo datos. Aquí stdout y stderr se leen
+línea a línea, se envían al log en bloques acotados (las líneas de progreso
+terminadas en '\\r' se limitan a una por segundo) y solo se retiene el final de
+cada flujo. El timeout pasa a medir inactividad: se reinicia cada vez que el
+proceso escribe algo.
+
+Los procesos se lanzan con subprocesos de asyncio, así que un único bucle de
+eventos atiende muchos comandos a la vez sin un hilo por flujo. Cada proceso
+vive en su propio grupo: si la tarea que lo espera se cancela (timeout del
+intento, botón Cancelar, SIGTERM) se termina el grupo completo, incluidos
+`ssh`, `git-remote-https`, etc., antes de propagar la cancelación.
+"""
+
+import asyncio  # Subprocesos y lectura concurrente de stdout y stderr
+import os  # Para decodificar la salida capturada y señalar el grupo de procesos
+import re  # Para separar líneas terminadas en '\n', '\r\n' o '\r'
+import signal  # Para SIGTERM/SIGKILL
+import subprocess  # Para señalar el timeout y las opciones de Windows
+import sys  # Para distinguir Windows de POSIX
+import time  # Para medir la inactividad y limitar el progreso
+
+# Segundos sin ninguna salida tras los que se considera colgado el comando
+# (el push usa el suyo, según su tamaño: ver throughput.py)
+TIMEOUT_INACTIVIDAD_SEGUNDOS = 120
+# Caracteres que se retienen (los últimos) de cada flujo para el llamador
+MAX_SALIDA_RETENIDA = 64 * 1024
+# Caracteres máximos de una línea enviada al log
+MAX_LARGO_LINEA = 500
+# Límites de cada bloque enviado al log
+MAX_LINEAS_POR_BLOQUE = 50
+INTERVALO_BLOQUE_SEGUNDOS = 0.5
+# Frecuencia máxima de las líneas de progreso ("Writing objects:  42% ...")
+INTERVALO_PROGRESO_SEGUNDOS = 1.0
+# Frecuencia máxima de los avisos de progreso al llamador (p. ej. una etiqueta de la GUI)
+INTERVALO_AVISO_PROGRESO_SEGUNDOS = 0.25
+# Segundos que se espera tras SIGTERM antes de recurrir a SIGKILL
+GRACIA_TERMINACION_SEGUNDOS = 3
+
+# Callable(args, inicio, fin, código) que recibe cada proceso terminado, con
+# los instantes de time.perf_counter(); None salvo al perfilar (ver profiling.py)
+observer = None
+
+_TAMANO_LECTURA = 64 * 1024
+_FIN_LINEA = re.compile(rb"\r\n|\r|\n")
+
+# Tipos de mensaje de los lectores
+_LINEA, _PROGRESO, _ACTIVIDAD, _FIN = range(4)
+
+
+class _SalidaAcotada:
+    """Retiene solo los últimos `limite` caracteres de un flujo."""
+
+    def __init__(self, limite=MAX_SALIDA_RETENIDA):
+        self.limite = limite
+        self._partes = []
+        self._largo = 0
+        self.omitidos = 0
+
+    def append(self, texto):
+        self._partes.append(texto)
+        self._largo += len(texto)
+        while self._largo > self.limite and len(self._partes) > 1:
+            descartado = self._partes.pop(0)
+            self._largo -= len(descartado)
+            self.omitidos += len(descartado)
+
+    def text(self):
+        texto = "".join(self._partes)
+        if self.omitidos:
+            texto = f"[... {self.omitidos} caracteres omitidos ...]\n" + texto
+        return texto
+
+
+class _SumideroLog:
+    """Agrupa las líneas de salida en bloques acotados antes de enviarlas al log."""
+
+    def __init__(self, log_fn):
+        self.log_fn = log_fn
+        self._lineas = []
+        self._inicio_bloque = None
+        self._ultimo_progreso = {}  # flujo -> instante del último progreso logueado
+        self._progreso_pendiente = {}  # flujo -> último progreso no logueado
+
+    def linea(self, flujo, texto):
+        self._progreso_pendiente.pop(flujo, None)
+        self._agregar(texto)
+
+    def progreso(self, flujo, texto):
+        ahora = time.monotonic()
+        if ahora - self._ultimo_progreso.get(flujo, 0.0) >= INTERVALO_PROGRESO_SEGUNDOS:
+            self._ultimo_progreso[flujo] = ahora
+            self._progreso_pendiente.pop(flujo, None)
+            self._agregar(texto)
+        else:
+            self._progreso_pendiente[flujo] = texto
+
+    def _agregar(self, texto):
+        if len(texto) > MAX_LARGO_LINEA:
+            texto = texto[:MAX_LARGO_LINEA] + " [...]"
+        self._lineas.append(f"    {texto}")
+        if self._inicio_bloque is None:
+            self._inicio_bloque = time.monotonic()
+        if len(self._lineas) >= MAX_LINEAS_POR_BLOQUE:
+            self.vaciar()
+
+    def vaciar_si_vencido(self):
+        if self._inicio_bloque is not None and \
+                time.monotonic() - self._inicio_bloque >= INTERVALO_BLOQUE_SEGUNDOS:
+            self.vaciar()
+
+    def vaciar(self, final=False):
+        if final:
+            # El último progreso indica hasta dónde llegó el comando
+            for texto in self._progreso_pendiente.values():
+                self._agregar(texto)
+            self._progreso_pendiente.clear()
+        if self._lineas:
+            self.log_fn("\n".join(self._lineas), "INFO")
+            self._lineas = []
+        self._inicio_bloque = None
+
+
+def _decodificar(datos):
+    return datos.decode("utf-8", "replace")
+
+
+async def _leer_lineas(flujo, nombre, cola):
+    """Lector: envía a `cola` cada línea (o actualización de progreso) de `flujo`."""
+    pendiente = b""
+    try:
+        while True:
+            bloque = await flujo.read(_TAMANO_LECTURA)
+            if not bloque:
+                break
+            pendiente += bloque
+            inicio = 0
+            for fin in _FIN_LINEA.finditer(pendiente):
+                if fin.group() == b"\r" and fin.end() == len(pendiente):
+                    break  # Puede ser la mitad de un '\r\n'
+                tipo = _PROGRESO if fin.group() == b"\r" else _LINEA
+                texto = _decodificar(pendiente[inicio:fin.start()]).rstrip()
+                if texto:
+                    cola.put_nowait((tipo, nombre, texto))
+                inicio = fin.end()
+            pendiente = pendiente[inicio:]
+            if len(pendiente) > MAX_SALIDA_RETENIDA:
+                # Una "línea" sin fin (p. ej. salida binaria): enviarla ya
+                cola.put_nowait((_LINEA, nombre, _decodificar(pendiente)))
+                pendiente = b""
+            elif inicio == 0:
+                cola.put_nowait((_ACTIVIDAD, nombre, None))
+        texto = _decodificar(pendiente).rstrip()
+        if texto:
+            cola.put_nowait((_LINEA, nombre, texto))
+    except (OSError, ValueError):
+        pass  # El proceso fue terminado y el pipe se cerró
+    finally:
+        cola.put_nowait((_FIN, nombre, None))
+
+
+async def _leer_completo(flujo, nombre, bloques, cola):
+    """Lector: acumula `flujo` completo (salida que el llamador necesita entera)."""
+    try:
+        while True:
+            bloque = await flujo.read(_TAMANO_LECTURA)
+            if not bloque:
+                break
+            bloques.append(bloque)
+            cola.put_nowait((_ACTIVIDAD, nombre, None))
+    except (OSError, ValueError):
+        pass
+    finally:
+        cola.put_nowait((_FIN, nombre, None))
+
+
+def _opciones_grupo():
+    """Argumentos que lanzan el proceso en un grupo propio."""
+    if sys.platform == "win32":
+        return {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+    return {"start_new_session": True}
+
+
+async def terminate(proceso):
+    """Termina el grupo de procesos de `proceso` (SIGTERM y luego SIGKILL)."""
+    if proceso.returncode is not None:
+        return
+    try:
+        if sys.platform == "win32":
+            matador = await asyncio.create_subprocess_exec(
+                "taskkill", "/T", "/F", "/PID", str(proceso.pid),
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            await matador.wait()
+        else:
+            os.killpg(proceso.pid, signal.SIGTERM)
+        await asyncio.wait_for(proceso.wait(), GRACIA_TERMINACION_SEGUNDOS)
+    except asyncio.TimeoutError:
+        try:
+            if sys.platform == "win32":
+                proceso.kill()
+            else:
+                os.killpg(proceso.pid, signal.SIGKILL)
+        except OSError:
+            pass
+        await proceso.wait()
+    except OSError:
+        try:
+            proceso.kill()
+        except OSError:
+            pass  # Ya había terminado
+
+
+async def run_git(args, log_fn, cwd=None, capture_stdout=False,
+                  inactivity_timeout=TIMEOUT_INACTIVIDAD_SEGUNDOS, on_progress=None):
+    """
+    Ejecuta `args` transmitiendo su salida al log.
+
+    Args:
+        args (list): Comando a ejecutar.
+        log_fn (function): Función para loguear mensajes (mensaje, nivel).
+        cwd (str, optional): Directorio de trabajo.
+        capture_stdout (bool): Si es True, stdout se devuelve completo y sin
+            loguear (para salidas que se interpretan, como `git status`).
+        inactivity_timeout (float): Segundos sin salida tras los que se mata
+            el proceso.
+        on_progress (function, optional): Callable(texto) que recibe, como
+            mucho cada INTERVALO_AVISO_PROGRESO_SEGUNDOS, la última línea de
+            progreso ("Writing objects:  42% ...").
+
+    Returns:
+        tuple: (stdout, stderr, código de retorno). Salvo con `capture_stdout`,
+        cada flujo contiene solo sus últimos MAX_SALIDA_RETENIDA caracteres.
+
+    Raises:
+        subprocess.TimeoutExpired: Si el proceso estuvo inactivo demasiado tiempo.
+        asyncio.CancelledError: Si se canceló la tarea (el proceso ya está terminado).
+        FileNotFoundError: Si no se encuentra el ejecutable de Git.
+    """
+    inicio = time.perf_counter()
+    proceso = await asyncio.create_subprocess_exec(
+        *args, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        cwd=cwd, **_opciones_grupo())
+    cola = asyncio.Queue()
+    bloques_stdout = []
+    lectores = [asyncio.ensure_future(_leer_lineas(proceso.stderr, "stderr", cola))]
+    if capture_stdout:
+        lectores.append(asyncio.ensure_future(_leer_completo(proceso.stdout, "stdout", bloques_stdout, cola)))
+    else:
+        lectores.append(asyncio.ensure_future(_leer_lineas(proceso.stdout, "stdout", cola)))
+    try:
+        salidas = {"stdout": _SalidaAcotada(), "stderr": _SalidaAcotada()}
+        sumidero = _SumideroLog(log_fn)
+        activos = len(lectores)
+        ultima_actividad = time.monotonic()
+        ultimo_aviso = 0.0
+        try:
+            while activos:
+                try:
+                    tipo, flujo, texto = await asyncio.wait_for(
+                        cola.get(), min(1.0, INTERVALO_BLOQUE_SEGUNDOS))
+                except asyncio.TimeoutError:
+                    sumidero.vaciar_si_vencido()
+                    if time.monotonic() - ultima_actividad >= inactivity_timeout:
+                        raise subprocess.TimeoutExpired(args, inactivity_timeout)
+                    continue
+                ultima_actividad = time.monotonic()
+                if tipo == _FIN:
+                    activos -= 1
+                elif tipo == _LINEA:
+                    salidas[flujo].append(texto + "\n")
+                    sumidero.linea(flujo, texto)
+                elif tipo == _PROGRESO:
+                    sumidero.progreso(flujo, texto)
+                    if on_progress is not None and \
+                            ultima_actividad - ultimo_aviso >= INTERVALO_AVISO_PROGRESO_SEGUNDOS:
+                        ultimo_aviso = ultima_actividad
+                        on_progress(texto)
+                sumidero.vaciar_si_vencido()
+        finally:
+            sumidero.vaciar(final=True)
+        codigo_retorno = await proceso.wait()
+    except BaseException:
+        # Timeout de inactividad o tarea cancelada: no dejar el proceso huérfano
+        await terminate(proceso)
+        raise
+    finally:
+        for lector in lectores:
+            lector.cancel()
+        await asyncio.gather(*lectores, return_exceptions=True)
+        if observer is not None:
+            observer(args, inicio, time.perf_counter(), proceso.returncode)
+
+    stdout = os.fsdecode(b"".join(bloques_stdout)) if capture_stdout else salidas["stdout"].text()
+    return stdout, salidas["stderr"].text(), codigo_retorno
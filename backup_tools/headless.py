@@ -0,0 +1,405 @@
+"""
+Punto de entrada headless común a `backupGit.py` y `github_backup.py`.
+
+Define los argumentos de línea de comandos compartidos y ejecuta el backup sin
+interfaz gráfica, una vez o de forma programada, devolviendo códigos de salida
+aptos para systemd. Nada de este módulo importa Tkinter.
+"""
+
+import argparse  # Para interpretar los argumentos de línea de comandos
+import asyncio  # Para --maintain
+import datetime  # Para mostrar la fecha de cada backup en --list-backups
+import os  # Para verificar que se ejecuta en la raíz de un repositorio Git
+import threading  # Para el evento de parada del programador
+
+import subprocess  # Para los errores de git status en --dry-run
+
+from backup_tools import bundles, chunkstore, instance, maintenance, metrics, orchestrator, profiling, restore
+from backup_tools import scheduler, stagepolicy, statedir, watcher
+from backup_tools.options import ENGINE_ADD_COMMIT, SNAPSHOT_ENGINES, BackupOptions
+
+
+def build_arg_parser(descripcion):
+    """
+    Crea el parser de argumentos compartido por ambas herramientas de backup.
+    """
+    parser = argparse.ArgumentParser(description=descripcion)
+    parser.add_argument(
+        "--repo", default=".", metavar="RUTA",
+        help="Raíz del repositorio a respaldar (por defecto el directorio actual).")
+    parser.add_argument(
+        "--config", metavar="ARCHIVO",
+        help="Archivo JSON con varios repositorios a respaldar en paralelo "
+             "(implica --headless; ver backup_tools/orchestrator.py).")
+    parser.add_argument(
+        "--headless", action="store_true",
+        help="Ejecuta el backup sin interfaz gráfica (no importa Tkinter).")
+    programacion = parser.add_mutually_exclusive_group()
+    programacion.add_argument(
+        "--interval", type=float, metavar="SEGUNDOS",
+        help="Repite el backup cada SEGUNDOS (implica --headless).")
+    programacion.add_argument(
+        "--cron", metavar="EXPRESION",
+        help="Programa el backup con una expresión cron de 5 campos, "
+             "p. ej. '*/30 * * * *' (implica --headless).")
+    parser.add_argument(
+        "--watch", action="store_true",
+        help="Lanza un backup cuando cambian archivos del repositorio (implica "
+             "--headless). Combinado con --interval, tras SEGUNDOS sin cambios hace "
+             "además una revisión completa con git status, por si se perdió algún evento.")
+    parser.add_argument(
+        "--debounce", type=float, default=5.0, metavar="SEGUNDOS",
+        help="Con --watch, segundos sin cambios que cierran un lote (por defecto 5).")
+    parser.add_argument(
+        "--trigger", action="store_true",
+        help="Pide un backup a la instancia que ya se está ejecutando en el "
+             "repositorio (GUI, programada o --watch) y espera su resultado; "
+             "falla si no hay ninguna.")
+    parser.add_argument(
+        "--engine", choices=SNAPSHOT_ENGINES, default=ENGINE_ADD_COMMIT,
+        help="Motor de snapshot: 'add-commit' (git add + git commit en la rama "
+             "actual) o 'fast-import' (proceso persistente que escribe en "
+             "refs/backups/<rama> sin tocar el índice).")
+    parser.add_argument(
+        "--no-offline", action="store_true",
+        help="Sin conexión, fallar con CONNECTION_ERROR en lugar de commitear en "
+             "local y subir el backup cuando vuelva la conexión.")
+    parser.add_argument(
+        "--mirror", action="append", metavar="REMOTO",
+        help="Remoto espejo al que subir también cada backup, en paralelo con el "
+             "principal (repetible).")
+    parser.add_argument(
+        "--push-quorum", type=int, metavar="N",
+        help="Pushes correctos (principal y espejos) necesarios para dar el backup "
+             "por subido (por defecto, todos). Los espejos que fallen se "
+             "reintentan en segundo plano.")
+    politica = parser.add_argument_group("tamaño y exclusiones")
+    politica.add_argument(
+        "--exclude", action="append", metavar="PATRON",
+        help="Patrón (sintaxis de .gitignore) de archivos no rastreados que no "
+             "se respaldan, además de los de .backupignore (repetible).")
+    politica.add_argument(
+        "--max-file-size", type=float, default=stagepolicy.MAX_TAMANO_ARCHIVO / stagepolicy.MIB,
+        metavar="MIB",
+        help="Los archivos mayores de MIB se dejan fuera del backup (por defecto "
+             f"{stagepolicy.MAX_TAMANO_ARCHIVO // stagepolicy.MIB}; 0 sin límite).")
+    politica.add_argument(
+        "--max-backup-size", type=float, default=stagepolicy.MAX_TAMANO_BACKUP / stagepolicy.MIB,
+        metavar="MIB",
+        help="Rechaza el backup si añadiría más de MIB (por defecto "
+             f"{stagepolicy.MAX_TAMANO_BACKUP // stagepolicy.MIB}; 0 sin límite).")
+    politica.add_argument(
+        "--dry-run", action="store_true",
+        help="Informa de lo que añadiría el próximo backup y de lo que quedaría "
+             "fuera, sin crear ningún commit.")
+    grandes = parser.add_argument_group("archivos grandes")
+    grandes.add_argument(
+        "--chunk-threshold", type=float, default=0, metavar="MIB",
+        help="Los archivos de MIB o más se guardan como fragmentos deduplicados "
+             "fuera del historial y solo se commitea su manifiesto en "
+             f"{chunkstore.DIRECTORIO_MANIFIESTOS}/ (por defecto 0, desactivado).")
+    grandes.add_argument(
+        "--chunk-target", metavar="DIR",
+        help="Directorio al que se suben los fragmentos nuevos antes de cada push "
+             "(y del que se leen al restaurar si faltan en local).")
+    copia = parser.add_argument_group("copia en bundles")
+    copia.add_argument(
+        "--bundle-dir", metavar="DIR",
+        help="Directorio (disco local, USB) en el que dejar un bundle incremental "
+             "de cada backup, escrito a la vez que el push.")
+    copia.add_argument(
+        "--bundle-chains", type=int, default=bundles.CADENAS_CONSERVADAS, metavar="N",
+        help="Cadenas de bundles (uno completo cada "
+             f"{bundles.BUNDLES_POR_CADENA + 1} y sus incrementales) que se conservan "
+             f"en --bundle-dir (por defecto {bundles.CADENAS_CONSERVADAS}).")
+    copia.add_argument(
+        "--verify-bundles", action="store_true",
+        help="Comprueba la suma SHA-256 de los bundles de --bundle-dir.")
+    mantenimiento = parser.add_argument_group("mantenimiento")
+    mantenimiento.add_argument(
+        "--no-maintenance", action="store_true",
+        help="No reempaquetar el repositorio entre backups (Git vuelve a lanzar "
+             "su propio `gc --auto` al hacer commit).")
+    mantenimiento.add_argument(
+        "--maintain", action="store_true",
+        help="Reempaqueta el repositorio y actualiza su multi-pack-index y su "
+             "commit-graph ahora, sin hacer ningún backup.")
+    parser.add_argument(
+        "--profile-attempt", action="store_true",
+        help="Perfila el primer intento de backup (cProfile y tracemalloc) y "
+             f"escribe el informe junto al log; equivale a {profiling.VARIABLE_ENTORNO}=1.")
+    parser.add_argument(
+        "--metrics-file", metavar="ARCHIVO",
+        help="Archivo JSONL con una línea de tiempos por paso de cada backup (por "
+             f"defecto .git/{statedir.DIRECTORIO_ESTADO}/{metrics.ARCHIVO_JSONL}; '' lo desactiva).")
+    parser.add_argument(
+        "--metrics-textfile", metavar="ARCHIVO",
+        help="Archivo .prom para el textfile collector de node_exporter (por "
+             f"defecto .git/{statedir.DIRECTORIO_ESTADO}/{metrics.ARCHIVO_TEXTFILE}; '' lo desactiva).")
+    restauracion = parser.add_argument_group("restauración")
+    restauracion.add_argument(
+        "--list-backups", action="store_true",
+        help="Escribe en la salida estándar (no en el log) la lista de backups "
+             "(commits 'Backup #N') de las ramas y de refs/backups/, una línea por backup.")
+    restauracion.add_argument(
+        "--restore", metavar="BACKUP",
+        help="Restaura --paths desde el backup BACKUP (número o commit).")
+    restauracion.add_argument(
+        "--paths", nargs="+", metavar="RUTA",
+        help="Archivos o directorios a restaurar, relativos a la raíz del repositorio.")
+    restauracion.add_argument(
+        "--restore-to", metavar="DIR",
+        help="Directorio donde escribir los archivos restaurados (por defecto, "
+             "el propio árbol de trabajo).")
+    return parser
+
+
+def wants_headless(args):
+    """
+    Indica si los argumentos piden el modo sin interfaz gráfica.
+    """
+    return bool(args.headless or args.interval is not None or args.cron or args.watch
+                or args.config or args.list_backups or args.restore or args.dry_run or args.maintain
+                or args.verify_bundles or args.trigger)
+
+
+def run_restore(args, log_fn):
+    """
+    Atiende --list-backups y --restore y devuelve el código de salida.
+    """
+    if not os.path.exists(os.path.join(args.repo, ".git")):
+        log_fn("Indique con --repo la raíz de un repositorio Git.", "ERROR")
+        return scheduler.EXIT_CONFIG_ERROR
+    try:
+        if args.list_backups:
+            # La lista es la salida del comando (para redirigirla o filtrarla), no un mensaje de log
+            for backup in restore.list_backups(args.repo):
+                fecha = datetime.datetime.fromtimestamp(backup.timestamp).strftime("%Y-%m-%d %H:%M:%S")
+                print(f"#{backup.number:<6} {backup.sha[:12]}  {fecha}  {backup.ref}")
+            return scheduler.EXIT_OK
+        if not args.paths:
+            log_fn("--restore necesita --paths con los archivos o directorios a restaurar.", "ERROR")
+            return scheduler.EXIT_CONFIG_ERROR
+        _, _, errores = restore.restore(args.repo, args.restore, args.paths, args.restore_to, log_fn,
+                                        args.chunk_target)
+    except restore.RestoreError as e:
+        log_fn(str(e), "ERROR")
+        return scheduler.EXIT_BACKUP_FAILED
+    return scheduler.EXIT_BACKUP_FAILED if errores else scheduler.EXIT_OK
+
+
+def run_dry_run(args, log_fn):
+    """
+    Atiende --dry-run y devuelve el código de salida.
+    """
+    if not os.path.exists(os.path.join(args.repo, ".git")):
+        log_fn("Indique con --repo la raíz de un repositorio Git.", "ERROR")
+        return scheduler.EXIT_CONFIG_ERROR
+    politica = stagepolicy.StagePolicy.from_options(BackupOptions.from_args(args))
+    try:
+        plan = stagepolicy.dry_run(args.repo, politica, log_fn)
+    except subprocess.CalledProcessError as e:
+        log_fn(f"git status falló: {os.fsdecode(e.stderr or b'').strip()}", "ERROR")
+        return scheduler.EXIT_BACKUP_FAILED
+    return scheduler.EXIT_BACKUP_FAILED if plan.over_budget else scheduler.EXIT_OK
+
+
+def run_maintain(args, log_fn):
+    """
+    Atiende --maintain y devuelve el código de salida.
+    """
+    if not os.path.exists(os.path.join(args.repo, ".git")):
+        log_fn("Indique con --repo la raíz de un repositorio Git.", "ERROR")
+        return scheduler.EXIT_CONFIG_ERROR
+    registro = asyncio.run(maintenance.run_maintenance(args.repo, log_fn, force=True))
+    if registro is None or any(tarea["returncode"] != 0 for tarea in registro["tasks"]):
+        return scheduler.EXIT_BACKUP_FAILED
+    return scheduler.EXIT_OK
+
+
+def run_verify_bundles(args, log_fn):
+    """
+    Atiende --verify-bundles y devuelve el código de salida.
+    """
+    if not args.bundle_dir:
+        log_fn("--verify-bundles necesita --bundle-dir.", "ERROR")
+        return scheduler.EXIT_CONFIG_ERROR
+    try:
+        problemas = bundles.verify_bundles(args.bundle_dir, args.repo)
+    except bundles.BundleError as e:
+        log_fn(str(e), "ERROR")
+        return scheduler.EXIT_BACKUP_FAILED
+    for archivo, problema in problemas:
+        log_fn(f"Bundle {archivo}: {problema}.", "ERROR")
+    if not problemas:
+        log_fn("Todos los bundles del destino están íntegros.", "INFO")
+    return scheduler.EXIT_BACKUP_FAILED if problemas else scheduler.EXIT_OK
+
+
+def run_trigger(args, log_fn, stop_event=None):
+    """
+    Atiende --trigger y devuelve el código de salida.
+    """
+    if not os.path.exists(os.path.join(args.repo, ".git")):
+        log_fn("Indique con --repo la raíz de un repositorio Git.", "ERROR")
+        return scheduler.EXIT_CONFIG_ERROR
+    stop_event = stop_event or threading.Event()
+    scheduler.install_stop_signals(stop_event)  # Ctrl+C deja de esperar; el backup sigue en la otra instancia
+    estado = instance.request_backup(args.repo, log_fn, stop_event)
+    if estado is None:
+        log_fn("No hay ninguna instancia de la herramienta en este repositorio.", "ERROR")
+        return scheduler.EXIT_CONFIG_ERROR
+    return scheduler.status_to_exit_code(estado)
+
+
+def _tomar_repositorio(args, run_backup, log_fn, stop_event, programado):
+    """
+    Toma el repositorio para este proceso (ver backup_tools/instance.py).
+
+    Returns:
+        tuple: (instancia, código). Si otra instancia ya lo tiene, la instancia
+        es None y el código es el de salida: el del backup que hizo la otra
+        instancia a petición de esta, o un error si este proceso iba a quedarse
+        programado.
+    """
+    # Si la otra instancia termina justo entonces, el segundo intento toma el repositorio
+    for _ in range(2):
+        instancia = instance.claim(args.repo)
+        if instancia is not None:
+            instancia.listen(run_backup, log_fn)
+            return instancia, None
+        pid = instance.owner_pid(args.repo)
+        if programado:
+            log_fn(f"Ya hay otra instancia{f' (pid {pid})' if pid else ''} respaldando este "
+                   "repositorio; use --trigger para pedirle un backup.", "ERROR")
+            return None, scheduler.EXIT_CONFIG_ERROR
+        estado = instance.request_backup(args.repo, log_fn, stop_event)
+        if estado is not None:
+            return None, scheduler.status_to_exit_code(estado)
+        if stop_event.is_set():
+            return None, scheduler.EXIT_OK
+    log_fn(f"Otra instancia{f' (pid {pid})' if pid else ''} tiene el repositorio pero no atiende "
+           "peticiones de backup.", "ERROR")
+    return None, scheduler.EXIT_BACKUP_FAILED
+
+
+def run_headless(args, run_backup, log_fn, stop_event=None, ignored_files=(),
+                 run_attempt=None, max_retries=3, retry_delay=10, attempt_timeout=None,
+                 metrics_writer=None):
+    """
+    Ejecuta el backup sin interfaz gráfica según los argumentos recibidos.
+    Si otra instancia ya respalda el repositorio, un backup único se le pide
+    a ella (ver backup_tools/instance.py) en lugar de ejecutarse aquí.
+
+    Args:
+        args (argparse.Namespace): Argumentos devueltos por build_arg_parser().
+        run_backup (function): Callable que realiza un backup completo (con
+            reintentos) y devuelve su estado final. Recibe opcionalmente el
+            conjunto de rutas cambiadas detectado por el modo --watch.
+        log_fn (function): Función para loguear mensajes (mensaje, nivel).
+        stop_event (threading.Event, optional): Evento que detiene el modo
+            programado y los reintentos en curso; se activa con SIGTERM/SIGINT.
+        ignored_files (iterable, optional): Archivos propios de la herramienta
+            (log, métricas) cuyos cambios no deben disparar un backup en --watch.
+        run_attempt (function, optional): Callable(repo_dir, log_fn, progress)
+            que devuelve la corutina de un único intento de backup en un
+            repositorio (ver engine.attempt); lo usa --config.
+        max_retries (int): Intentos por repositorio en modo --config.
+        retry_delay (float): Espera tras el primer fallo en modo --config.
+        attempt_timeout (float, optional): Tiempo máximo por intento en modo --config.
+        metrics_writer (MetricsWriter, optional): Destino de los tiempos de
+            cada backup en modo --config.
+
+    Returns:
+        int: Código de salida del proceso (ver backup_tools.scheduler).
+    """
+    if args.list_backups or args.restore:
+        return run_restore(args, log_fn)
+    if args.dry_run:
+        return run_dry_run(args, log_fn)
+    if args.maintain:
+        return run_maintain(args, log_fn)
+    if args.verify_bundles:
+        return run_verify_bundles(args, log_fn)
+    if args.trigger:
+        return run_trigger(args, log_fn, stop_event)
+    if args.config:
+        if args.watch:
+            log_fn("--watch no puede combinarse con --config.", "ERROR")
+            return scheduler.EXIT_CONFIG_ERROR
+        try:
+            orchestrator.load_config(args.config)
+        except orchestrator.ConfigError as e:
+            log_fn(str(e), "ERROR")
+            return scheduler.EXIT_CONFIG_ERROR
+
+        def run_backup(changed_paths=None):
+            try:
+                return orchestrator.run_from_config(
+                    args.config, run_attempt, log_fn, max_retries, retry_delay, stop_event,
+                    attempt_timeout, metrics_writer, maintenance=not args.no_maintenance)
+            except orchestrator.ConfigError as e:
+                log_fn(str(e), "ERROR")
+                return "CONFIG_ERROR"
+    elif not os.path.exists(os.path.join(args.repo, ".git")):
+        log_fn("Este script debe ejecutarse desde la raíz de un repositorio Git "
+               "(o indicarla con --repo).", "ERROR")
+        return scheduler.EXIT_CONFIG_ERROR
+
+    cron = None
+    if args.cron:
+        try:
+            cron = scheduler.CronExpression(args.cron)
+        except ValueError as e:
+            log_fn(str(e), "ERROR")
+            return scheduler.EXIT_CONFIG_ERROR
+    if args.interval is not None and args.interval <= 0:
+        log_fn("El intervalo debe ser mayor que cero segundos.", "ERROR")
+        return scheduler.EXIT_CONFIG_ERROR
+    if args.watch and cron is not None:
+        log_fn("--watch no puede combinarse con --cron.", "ERROR")
+        return scheduler.EXIT_CONFIG_ERROR
+
+    stop_event = stop_event or threading.Event()
+    scheduler.install_stop_signals(stop_event)
+
+    instancia = None
+    if not args.config:
+        # Una segunda ejecución en el mismo repositorio pide el backup a la primera
+        # en lugar de chocar con su index.lock (con --config, cada repositorio lo toma
+        # el orquestador)
+        programado = args.watch or args.interval is not None or cron is not None
+        instancia, codigo = _tomar_repositorio(args, run_backup, log_fn, stop_event, programado)
+        if instancia is None:
+            return codigo
+        run_backup = instancia.run
+    try:
+        return _ejecutar_programacion(args, run_backup, log_fn, stop_event, ignored_files, cron)
+    finally:
+        if instancia is not None:
+            instancia.close()
+
+
+def _ejecutar_programacion(args, run_backup, log_fn, stop_event, ignored_files, cron):
+    """Ejecuta el backup una vez, de forma programada o con --watch."""
+    if args.watch:
+        log_fn(f"Modo headless: backup por cambios en archivos (debounce {args.debounce:.1f}s).", "INFO")
+        politica = stagepolicy.StagePolicy.from_options(BackupOptions.from_args(args))
+        vigilante = watcher.create_watcher(args.repo, ignored_files, log_fn, politica)
+        try:
+            watcher.run_watch(run_backup, vigilante, args.debounce, stop_event,
+                              heartbeat=args.interval, log_fn=log_fn)
+        finally:
+            vigilante.close()
+        return scheduler.EXIT_OK
+
+    if args.interval is not None:
+        log_fn(f"Modo headless: backup cada {args.interval:.0f} segundos.", "INFO")
+    elif cron is not None:
+        log_fn(f"Modo headless: backup programado con cron '{cron.expresion}'.", "INFO")
+    else:
+        log_fn("Modo headless: ejecutando un único backup.", "INFO")
+
+    return scheduler.run_schedule(
+        run_backup, interval=args.interval, cron=cron,
+        stop_event=stop_event, log_fn=log_fn)
@@ -0,0 +1,370 @@
+"""
+Una sola instancia de la herramienta por repositorio.
+
+Nada impedía que dos copias de `backupGit.py` (o una de cada herramienta)
+ejecutaran `git add` y `git commit` a la vez en el mismo repositorio: la
+segunda fallaba con `index.lock` y gastaba todos sus reintentos. Ahora la
+primera instancia toma un cerrojo exclusivo (flock) sobre `instance.lock` en el
+directorio de estado (ver statedir.py) y escucha en un socket Unix,
+`instance.sock`, junto a él. Una segunda ejecución, o un script con
+--trigger, no toca el repositorio: pide el backup a la instancia en curso y
+recibe su resultado.
+
+Protocolo: una línea JSON por petición y otra por respuesta.
+
+    -> {"command": "backup"}
+    <- {"status": "SUCCESS"}
+    -> {"command": "ping"}
+    <- {"pid": 1234, "busy": false}
+
+Las peticiones que llegan durante un backup se agrupan en como mucho un
+backup más al terminar el actual (ver BackupTrigger): diez disparos seguidos
+hacen dos backups, no diez.
+
+Sin flock ni sockets Unix (Windows) no hay cerrojo ni canal y cada proceso se
+comporta como antes.
+"""
+
+import hashlib  # Para el nombre del socket cuando la ruta es demasiado larga
+import json  # Formato de las peticiones y respuestas
+import os  # Para el pid, los permisos y las rutas
+import socket  # Canal con la instancia en curso
+import socketserver  # Un hilo por petición en la instancia en curso
+import tempfile  # Ubicación alternativa del socket
+import threading  # El disparador se usa desde varios hilos
+import time  # Para reintentar la conexión mientras la instancia arranca
+
+try:
+    import fcntl  # Cerrojo entre procesos (solo Unix)
+except ImportError:
+    fcntl = None
+
+from backup_tools import statedir  # El cerrojo y el socket van junto al log
+
+ARCHIVO_CERROJO = "instance.lock"
+ARCHIVO_SOCKET = "instance.sock"
+# Longitud máxima de la ruta de un socket Unix (108 en Linux, 104 en macOS)
+MAX_RUTA_SOCKET = 100
+# Segundos que un cliente reintenta conectar mientras la otra instancia arranca
+ESPERA_CONEXION_SEGUNDOS = 5
+# Segundos para recibir la petición completa de un cliente
+TIMEOUT_PETICION_SEGUNDOS = 10
+# Estado de los backups pedidos (o pendientes) cuando la instancia se cierra
+ESTADO_ABANDONADO = "CANCELLED"
+
+
+def supported():
+    """True si la plataforma tiene flock y sockets Unix."""
+    return fcntl is not None and hasattr(socket, "AF_UNIX")
+
+
+def socket_path(repo_dir):
+    """
+    Ruta del socket de la instancia de `repo_dir`. Si la del directorio de
+    estado no cabe en un socket Unix, se usa una en el directorio temporal
+    derivada de ella.
+    """
+    ruta = statedir.state_path(repo_dir, ARCHIVO_SOCKET)
+    if len(os.fsencode(ruta)) <= MAX_RUTA_SOCKET:
+        return ruta
+    resumen = hashlib.sha1(os.fsencode(os.path.abspath(ruta))).hexdigest()[:16]
+    return os.path.join(tempfile.gettempdir(), f"backup-tool-{resumen}.sock")
+
+
+def owner_pid(repo_dir):
+    """Pid de la instancia que tiene (o tuvo) el cerrojo de `repo_dir`, o None."""
+    try:
+        with open(statedir.state_path(repo_dir, ARCHIVO_CERROJO), "r", encoding="ascii") as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+class _Turno:
+    """Backup pendiente compartido por todas las peticiones agrupadas en él."""
+
+    def __init__(self):
+        self.rutas = set()  # None: revisar todo el repositorio
+        self.estado = None
+        self.hecho = threading.Event()
+
+    def sumar(self, rutas):
+        if self.rutas is None or rutas is None:
+            self.rutas = None
+        else:
+            self.rutas |= set(rutas)
+
+
+class BackupTrigger:
+    """
+    Serializa los backups de una instancia y agrupa las peticiones que llegan
+    mientras uno está en curso en un único backup posterior.
+
+    Quien encuentra libre el disparador ejecuta el backup en su propio hilo.
+    Las peticiones que llegan entretanto esperan al backup siguiente, que un
+    hilo auxiliar lanza al terminar el actual con la unión de sus rutas
+    cambiadas; así quien lanzó el primero recibe su resultado sin esperar a
+    los demás.
+    """
+
+    def __init__(self, run_backup):
+        """
+        Args:
+            run_backup (function): Callable(changed_paths) que realiza un backup
+                completo (con reintentos) y devuelve su estado final.
+        """
+        self._run_backup = run_backup
+        self._condicion = threading.Condition()
+        self._en_curso = False
+        self._siguiente = None
+        self._cerrado = False
+
+    @property
+    def busy(self):
+        """True mientras hay un backup en curso o pendiente."""
+        return self._en_curso
+
+    def run(self, changed_paths=None):
+        """
+        Realiza un backup, o se suma al siguiente si ya hay uno en curso, y
+        devuelve su estado final.
+
+        Args:
+            changed_paths (set, optional): Rutas cambiadas; None revisa todo el
+                repositorio.
+        """
+        with self._condicion:
+            if self._cerrado:
+                return ESTADO_ABANDONADO
+            if self._en_curso:
+                if self._siguiente is None:
+                    self._siguiente = _Turno()
+                turno = self._siguiente
+                turno.sumar(changed_paths)
+            else:
+                self._en_curso = True
+                turno = None
+        if turno is not None:
+            turno.hecho.wait()
+            return turno.estado
+        try:
+            return self._run_backup(changed_paths)
+        finally:
+            self._relevar()
+
+    def _relevar(self):
+        """Lanza el backup agrupado pendiente, o deja libre el disparador."""
+        with self._condicion:
+            turno, self._siguiente = self._siguiente, None
+            if turno is None or self._cerrado:
+                self._en_curso = False
+                self._condicion.notify_all()
+                if turno is not None:
+                    turno.estado = ESTADO_ABANDONADO
+                    turno.hecho.set()
+                return
+        threading.Thread(target=self._ejecutar_turno, args=(turno,), daemon=True,
+                         name="backup-agrupado").start()
+
+    def _ejecutar_turno(self, turno):
+        try:
+            turno.estado = self._run_backup(turno.rutas)
+        except Exception:
+            turno.estado = "UNKNOWN_ERROR"
+        finally:
+            turno.hecho.set()
+            self._relevar()
+
+    def close(self, wait=True):
+        """
+        Deja de aceptar backups. Con `wait`, espera antes al backup en curso y
+        al agrupado que ya estaba pendiente; sin él, el pendiente se abandona.
+        """
+        with self._condicion:
+            while wait and self._en_curso:
+                self._condicion.wait()
+            self._cerrado = True
+
+
+class _Servidor(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, ruta, disparador, log_fn):
+        self.disparador = disparador
+        self.log_fn = log_fn
+        super().__init__(ruta, _Peticion)
+
+
+class _Peticion(socketserver.StreamRequestHandler):
+    def handle(self):
+        servidor = self.server
+        self.connection.settimeout(TIMEOUT_PETICION_SEGUNDOS)
+        try:
+            peticion = json.loads(self.rfile.readline())
+            comando = peticion.get("command")
+        except (OSError, ValueError, AttributeError):
+            return
+        self.connection.settimeout(None)  # Un backup puede durar varios minutos
+        if comando == "backup":
+            servidor.log_fn("Backup solicitado por otra ejecución de la herramienta.", "INFO")
+            respuesta = {"status": servidor.disparador.run()}
+        elif comando == "ping":
+            respuesta = {"pid": os.getpid(), "busy": servidor.disparador.busy}
+        else:
+            respuesta = {"error": f"comando desconocido: {comando!r}"}
+        try:
+            self.wfile.write(json.dumps(respuesta).encode("utf-8") + b"\n")
+        except OSError:
+            pass  # El cliente ya no espera la respuesta
+
+
+class Instance:
+    """
+    Instancia que posee un repositorio: mantiene el cerrojo y, tras listen(),
+    atiende las peticiones de backup de otras ejecuciones.
+    """
+
+    def __init__(self, repo_dir="."):
+        self.repo_dir = repo_dir
+        self.trigger = None
+        self._archivo = None
+        self._servidor = None
+        self._ruta_socket = None
+
+    def acquire(self):
+        """Toma el cerrojo del repositorio; False si otra instancia lo tiene."""
+        if fcntl is None:
+            return True
+        archivo = open(statedir.state_path(self.repo_dir, ARCHIVO_CERROJO), "a+", encoding="ascii")
+        try:
+            fcntl.flock(archivo.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            archivo.close()
+            return False
+        archivo.seek(0)
+        archivo.truncate()
+        archivo.write(f"{os.getpid()}\n")
+        archivo.flush()
+        self._archivo = archivo
+        return True
+
+    def listen(self, run_backup, log_fn):
+        """
+        Empieza a atender peticiones de backup en el socket de la instancia.
+        Sin sockets Unix, o sin haber tomado el cerrojo con acquire(), solo se
+        serializan los backups de este proceso.
+
+        Args:
+            run_backup (function): Callable(changed_paths) que realiza un
+                backup completo y devuelve su estado final.
+            log_fn (function): Función para loguear mensajes (mensaje, nivel).
+        """
+        self.trigger = BackupTrigger(run_backup)
+        if not supported() or self._archivo is None:
+            return
+        ruta = socket_path(self.repo_dir)
+        try:
+            # Con el cerrojo tomado, un socket existente es de una instancia que ya terminó
+            if os.path.exists(ruta):
+                os.remove(ruta)
+            self._servidor = _Servidor(ruta, self.trigger, log_fn)
+            os.chmod(ruta, 0o600)
+        except OSError as e:
+            log_fn(f"No se pudo abrir el canal de la instancia en {ruta}: {e}", "WARNING")
+            return
+        self._ruta_socket = ruta
+        threading.Thread(target=self._servidor.serve_forever, daemon=True, name="backup-instancia").start()
+
+    def run(self, changed_paths=None):
+        """Realiza (o agrupa) un backup con el disparador de la instancia."""
+        return self.trigger.run(changed_paths)
+
+    def close(self, wait=True):
+        """
+        Deja de atender peticiones y libera el cerrojo. Con `wait`, espera
+        antes al backup en curso y al agrupado pendiente (ver
+        BackupTrigger.close); la GUI no espera para no bloquear el hilo de Tk.
+        """
+        if self._servidor is not None:
+            self._servidor.shutdown()
+            self._servidor.server_close()
+            self._servidor = None
+            try:
+                os.remove(self._ruta_socket)
+            except OSError:
+                pass
+        if self.trigger is not None:
+            self.trigger.close(wait)
+        if self._archivo is not None:
+            self._archivo.close()  # Cerrar el descriptor libera el flock
+            self._archivo = None
+
+
+def claim(repo_dir="."):
+    """
+    Toma el repositorio para este proceso.
+
+    Returns:
+        Instance: La instancia (sin atender peticiones todavía; ver listen()),
+        o None si otra instancia ya tiene el repositorio.
+    """
+    instancia = Instance(repo_dir)
+    return instancia if instancia.acquire() else None
+
+
+def request_backup(repo_dir, log_fn, stop_event=None, espera=ESPERA_CONEXION_SEGUNDOS):
+    """
+    Pide un backup a la instancia en curso de `repo_dir` y espera su resultado.
+
+    Args:
+        repo_dir (str): Raíz del repositorio.
+        log_fn (function): Función para loguear mensajes (mensaje, nivel).
+        stop_event (threading.Event, optional): Deja de esperar la respuesta
+            (el backup sigue en la otra instancia).
+        espera (float): Segundos que se reintenta la conexión.
+
+    Returns:
+        str: El estado final del backup, "CANCELLED" si se activó
+        `stop_event`, o None si ninguna instancia atiende peticiones.
+    """
+    if not supported():
+        return None
+    ruta = socket_path(repo_dir)
+    limite = time.monotonic() + espera
+    while True:
+        cliente = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            cliente.connect(ruta)
+            break
+        except OSError:
+            cliente.close()
+            if time.monotonic() >= limite or (stop_event is not None and stop_event.is_set()):
+                return None
+            time.sleep(0.2)
+
+    pid = owner_pid(repo_dir)
+    log_fn(f"Otra instancia{f' (pid {pid})' if pid else ''} ya respalda este repositorio; "
+           "se le pide el backup y se espera su resultado.", "INFO")
+    datos = b""
+    with cliente:
+        cliente.sendall(json.dumps({"command": "backup"}).encode("utf-8") + b"\n")
+        cliente.settimeout(1.0)  # Para atender stop_event mientras se espera
+        while not datos.endswith(b"\n"):
+            if stop_event is not None and stop_event.is_set():
+                return "CANCELLED"
+            try:
+                trozo = cliente.recv(4096)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            if not trozo:
+                break
+            datos += trozo
+    try:
+        estado = json.loads(datos)["status"]
+    except (ValueError, KeyError, TypeError):
+        log_fn("La otra instancia terminó sin devolver el resultado del backup.", "ERROR")
+        return "UNKNOWN_ERROR"
+    log_fn(f"La otra instancia terminó el backup con estado: {estado}", "INFO")
+    return estado
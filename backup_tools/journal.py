@@ -0,0 +1,210 @@
+"""
+Diario de pushes pendientes para trabajar sin conexión.
+
+Cuando no hay conexión, el backup se commitea igualmente en local y su push se
+anota en un pequeño diario JSON dentro del directorio de Git. Un hilo en
+segundo plano sondea la conectividad y, cuando vuelve, sube todos los commits
+acumulados con un único `git push` por destino (un push de la rama incluye
+todos los commits anteriores), en lugar de un viaje de red por backup.
+
+Con conexión, el push de cada backup también se anota antes de intentarlo y
+se borra al subirse: un commit cuyo push falla en todos los reintentos queda
+aquí y lo sube el siguiente backup (o el hilo de subida) en lugar de perderse.
+"""
+
+import datetime  # Para fechar las entradas del diario
+import json  # Formato del diario
+import os  # Para escribir el diario de forma atómica
+import threading  # Para el hilo de subida y la exclusión entre hilos
+from contextlib import contextmanager  # Para el cerrojo del diario
+
+try:
+    import fcntl  # Exclusión entre procesos (solo Unix)
+except ImportError:
+    fcntl = None
+
+from backup_tools.snapshot import resolve_git_dir  # Para ubicar el diario en .git
+
+# Nombre del diario dentro del directorio común de Git
+ARCHIVO_DIARIO = "backup-push-journal.json"
+# Segundos entre comprobaciones de conectividad del hilo de subida
+INTERVALO_SONDEO_SEGUNDOS = 30
+
+# Un cerrojo por diario (ruta absoluta), compartido por todas las instancias de
+# PushJournal: el motor y BackgroundPusher crean la suya en cada llamada
+_cerrojos = {}
+_cerrojos_lock = threading.Lock()
+
+
+def _cerrojo_diario(ruta):
+    with _cerrojos_lock:
+        return _cerrojos.setdefault(ruta, threading.Lock())
+
+
+class PushJournal:
+    """
+    Lista persistente de backups commiteados en local que aún no se subieron.
+    """
+
+    def __init__(self, repo_dir="."):
+        _, common_dir = resolve_git_dir(repo_dir)
+        self.ruta = os.path.abspath(os.path.join(common_dir, ARCHIVO_DIARIO))
+        self._lock = _cerrojo_diario(self.ruta)
+
+    @contextmanager
+    def _bloqueo(self):
+        """
+        Exclusión de la lectura-modificación-escritura del diario entre hilos
+        y, con flock sobre `<diario>.lock`, entre procesos.
+        """
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.ruta + ".lock", "a") as cerrojo:
+                fcntl.flock(cerrojo.fileno(), fcntl.LOCK_EX)
+                yield  # Cerrar el archivo libera el flock
+
+    def _leer(self):
+        try:
+            with open(self.ruta, "r", encoding="utf-8") as f:
+                entradas = json.load(f)
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError):
+            return []  # Diario corrupto: el siguiente push de la rama lo cubre igualmente
+        return entradas if isinstance(entradas, list) else []
+
+    def _escribir(self, entradas):
+        if not entradas:
+            try:
+                os.remove(self.ruta)
+            except FileNotFoundError:
+                pass
+            return
+        temporal = self.ruta + ".tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(entradas, f, indent=1)
+        os.replace(temporal, self.ruta)
+
+    def pending(self):
+        """Devuelve las entradas pendientes, de la más antigua a la más reciente."""
+        with self._bloqueo():
+            return self._leer()
+
+    def add(self, numero_backup, push_args):
+        """
+        Anota que el backup `numero_backup` debe subirse con `push_args` (una
+        sola vez aunque se anote de nuevo) y devuelve el número de entradas.
+        """
+        with self._bloqueo():
+            entradas = self._leer()
+            if any(e.get("backup_number") == numero_backup and e.get("push_args") == list(push_args)
+                   for e in entradas):
+                return len(entradas)
+            entradas.append({
+                "backup_number": numero_backup,
+                "push_args": list(push_args),
+                "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            })
+            self._escribir(entradas)
+            return len(entradas)
+
+    def complete(self, push_args):
+        """
+        Elimina las entradas que `push_args` ya subió (un push del mismo destino
+        incluye todos los commits anteriores). Devuelve las entradas eliminadas.
+        """
+        push_args = list(push_args)
+        with self._bloqueo():
+            entradas = self._leer()
+            subidas = [e for e in entradas if e.get("push_args") == push_args]
+            if subidas:
+                self._escribir([e for e in entradas if e.get("push_args") != push_args])
+            return subidas
+
+    async def flush(self, push_fn, log_fn, on_pushed=None):
+        """
+        Sube los backups pendientes con un único push por destino.
+
+        Args:
+            push_fn (function): Corutina(push_args) que ejecuta el push y
+                devuelve True si tuvo éxito.
+            log_fn (function): Función para loguear mensajes (mensaje, nivel).
+            on_pushed (function): Callable(entradas) opcional que recibe las
+                entradas subidas por cada push.
+
+        Returns:
+            bool: True si no queda nada pendiente.
+        """
+        destinos = []
+        for entrada in self.pending():
+            if entrada.get("push_args") and entrada["push_args"] not in destinos:
+                destinos.append(entrada["push_args"])
+        todo_subido = True
+        for push_args in destinos:
+            numeros = [e["backup_number"] for e in self.pending() if e.get("push_args") == push_args]
+            log_fn(f"Subiendo {len(numeros)} backup(s) pendiente(s) "
+                   f"(#{numeros[0]} a #{numeros[-1]}) con un único push...", "INFO")
+            if await push_fn(push_args):
+                subidas = self.complete(push_args)
+                if on_pushed is not None:
+                    on_pushed(subidas)
+            else:
+                todo_subido = False
+        return todo_subido
+
+
+class BackgroundPusher:
+    """
+    Hilo que, mientras el diario tenga entradas, espera a que vuelva la
+    conexión y entonces las sube.
+    """
+
+    def __init__(self, journal, flush_fn, probe_fn, log_fn, intervalo=INTERVALO_SONDEO_SEGUNDOS):
+        """
+        Args:
+            journal (PushJournal): Diario a vaciar.
+            flush_fn (function): Callable() que sube lo pendiente (normalmente
+                engine.flush_journal en el bucle del motor, que lo serializa
+                con los backups del mismo repositorio).
+            probe_fn (function): Callable() que devuelve True si el remoto es alcanzable.
+            log_fn (function): Función para loguear mensajes (mensaje, nivel).
+            intervalo (float): Segundos entre comprobaciones de conectividad.
+        """
+        self.journal = journal
+        self.flush_fn = flush_fn
+        self.probe_fn = probe_fn
+        self.log_fn = log_fn
+        self.intervalo = intervalo
+        self._parada = threading.Event()
+        self._lock = threading.Lock()
+        self._hilo = None
+
+    def ensure_running(self):
+        """Arranca el hilo si hay entradas pendientes y no está ya en marcha."""
+        with self._lock:
+            if self._hilo is not None or self._parada.is_set() or not self.journal.pending():
+                return
+            self._hilo = threading.Thread(target=self._bucle, name="backup-pusher", daemon=True)
+            self._hilo.start()
+
+    def _bucle(self):
+        while not self._parada.wait(self.intervalo):
+            with self._lock:
+                if not self.journal.pending():
+                    self._hilo = None
+                    return
+            try:
+                if not self.probe_fn():
+                    continue
+                self.log_fn("Conexión recuperada: subiendo los backups guardados sin conexión.", "INFO")
+                self.flush_fn()
+            except Exception as e:
+                self.log_fn(f"Error al subir los backups pendientes: {e}", "ERROR")
+        with self._lock:
+            self._hilo = None
+
+    def stop(self):
+        """Detiene el hilo (las entradas pendientes se conservan en el diario)."""
+        self._parada.set()
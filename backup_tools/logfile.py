@@ -0,0 +1,107 @@
+"""
+Logging a archivo asíncrono, rotativo y comprimido.
+
+`logging.FileHandler` escribía de forma síncrona desde el hilo del backup, con
+la codificación de la configuración regional (de ahí el texto corrupto en el
+log) y sin límite de tamaño. Aquí los hilos solo encolan los registros
+(QueueHandler) y un único hilo escritor (QueueListener) los vuelca en el
+archivo en UTF-8. El archivo se rota al superar un tamaño o al cambiar de día,
+y los segmentos rotados se comprimen con gzip en ese mismo hilo escritor.
+"""
+
+import atexit  # Para vaciar la cola al salir
+import datetime  # Para la rotación diaria
+import gzip  # Para comprimir los segmentos rotados
+import logging  # Sistema de logging estándar
+import logging.handlers  # QueueHandler, QueueListener y RotatingFileHandler
+import os  # Para renombrar y borrar segmentos
+import queue  # Cola entre los hilos productores y el escritor
+import shutil  # Para copiar el segmento al archivo comprimido
+
+FORMATO_LOG = '%(asctime)s - %(levelname)s - %(message)s'
+# Tamaño a partir del cual se rota el log
+MAX_BYTES_LOG = 1024 * 1024
+# Segmentos comprimidos que se conservan (backup_git.log.1.gz ... .N.gz)
+SEGMENTOS_CONSERVADOS = 5
+
+_listener = None
+_manejador_cola = None
+
+
+class CompressedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    RotatingFileHandler que además rota al cambiar de día y comprime con gzip
+    los segmentos rotados.
+    """
+
+    def __init__(self, ruta, max_bytes=MAX_BYTES_LOG, segmentos=SEGMENTOS_CONSERVADOS):
+        super().__init__(ruta, maxBytes=max_bytes, backupCount=segmentos,
+                         encoding="utf-8", delay=True)
+        self.namer = lambda nombre: nombre + ".gz"
+        self.rotator = self._comprimir
+        try:
+            self._dia_segmento = datetime.date.fromtimestamp(os.path.getmtime(self.baseFilename))
+        except OSError:
+            self._dia_segmento = datetime.date.today()
+
+    @staticmethod
+    def _comprimir(origen, destino):
+        with open(origen, "rb") as entrada, gzip.open(destino, "wb") as salida:
+            shutil.copyfileobj(entrada, salida)
+        os.remove(origen)
+
+    def shouldRollover(self, record):
+        hoy = datetime.date.fromtimestamp(record.created)
+        if hoy != self._dia_segmento and os.path.exists(self.baseFilename) \
+                and os.path.getsize(self.baseFilename) > 0:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self._dia_segmento = datetime.date.today()
+
+
+def setup_logging(ruta_log, consola=False, max_bytes=MAX_BYTES_LOG, segmentos=SEGMENTOS_CONSERVADOS):
+    """
+    Configura el logging raíz: los registros se encolan y un hilo escritor los
+    guarda en `ruta_log` (UTF-8, rotado y comprimido) y, con `consola=True`,
+    también en la salida de error. Llamadas posteriores no hacen nada.
+
+    Returns:
+        logging.handlers.QueueListener: El hilo escritor (se detiene al salir).
+    """
+    global _listener, _manejador_cola
+    if _listener is not None:
+        return _listener
+
+    formato = logging.Formatter(FORMATO_LOG)
+    destinos = [CompressedRotatingFileHandler(ruta_log, max_bytes, segmentos)]
+    if consola:
+        destinos.append(logging.StreamHandler())
+    for destino in destinos:
+        destino.setFormatter(formato)
+
+    cola = queue.SimpleQueue()
+    raiz = logging.getLogger()
+    raiz.setLevel(logging.INFO)
+    _manejador_cola = logging.handlers.QueueHandler(cola)
+    raiz.addHandler(_manejador_cola)
+
+    _listener = logging.handlers.QueueListener(cola, *destinos, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return _listener
+
+
+def shutdown_logging():
+    """Vacía la cola, detiene el hilo escritor y cierra el archivo."""
+    global _listener, _manejador_cola
+    if _listener is None:
+        return
+    logging.getLogger().removeHandler(_manejador_cola)
+    _manejador_cola = None
+    _listener.stop()
+    for destino in _listener.handlers:
+        destino.close()
+    _listener = None
@@ -0,0 +1,132 @@
+"""
+Vista de logs de la GUI alimentada por lotes.
+
+Cada mensaje programaba su propio `root.after(0, ...)` y se insertaba en un
+ScrolledText que crecía sin límite, así que un `git status` de decenas de
+miles de líneas bloqueaba el bucle de eventos de Tk. Aquí los hilos de trabajo
+solo encolan líneas (sin tocar Tk); el hilo principal vacía la cola en lotes
+acotados a un ritmo fijo, agrupa las líneas repetidas consecutivas y recorta
+el widget para conservar solo las últimas líneas.
+
+El módulo no importa Tkinter: TkLogView recibe la ventana y el widget ya
+creados y usa los nombres de índice y estado de Tk como cadenas.
+"""
+
+import threading  # Para proteger la cola entre hilos
+from collections import deque  # Cola acotada de líneas pendientes
+
+# Líneas pendientes como máximo; si los hilos producen más rápido de lo que
+# la GUI dibuja, se descartan las más antiguas
+MAX_LINEAS_PENDIENTES = 5000
+# Líneas que se insertan en el widget como máximo en cada tick
+MAX_LINEAS_POR_LOTE = 500
+# Líneas que conserva el widget
+MAX_LINEAS_VISTA = 2000
+# Milisegundos entre vaciados de la cola
+INTERVALO_TICK_MS = 100
+
+
+class LogSink:
+    """
+    Cola de líneas de log segura entre hilos, acotada y con agrupación de
+    líneas repetidas consecutivas.
+    """
+
+    def __init__(self, max_pendientes=MAX_LINEAS_PENDIENTES):
+        self._lock = threading.Lock()
+        self._pendientes = deque()  # [texto, repeticiones]
+        self.max_pendientes = max_pendientes
+        self._omitidas = 0
+
+    def put(self, mensaje):
+        """Encola `mensaje` (puede tener varias líneas). No toca la GUI."""
+        with self._lock:
+            for linea in mensaje.splitlines() or [""]:
+                if self._pendientes and self._pendientes[-1][0] == linea:
+                    self._pendientes[-1][1] += 1
+                    continue
+                if len(self._pendientes) >= self.max_pendientes:
+                    _, veces = self._pendientes.popleft()
+                    self._omitidas += veces
+                self._pendientes.append([linea, 1])
+
+    def drain(self, max_lineas=MAX_LINEAS_POR_LOTE):
+        """
+        Extrae hasta `max_lineas` líneas listas para mostrar. Las repeticiones
+        se resumen en una sola línea y las descartadas por desbordamiento se
+        indican con un aviso.
+        """
+        lineas = []
+        with self._lock:
+            if self._omitidas:
+                lineas.append(f"[... {self._omitidas} línea(s) de log omitidas en la vista ...]")
+                self._omitidas = 0
+            while self._pendientes and len(lineas) < max_lineas:
+                texto, veces = self._pendientes.popleft()
+                lineas.append(texto if veces == 1 else f"{texto}  (repetido {veces} veces)")
+        return lineas
+
+    def clear(self):
+        """Descarta todo lo pendiente."""
+        with self._lock:
+            self._pendientes.clear()
+            self._omitidas = 0
+
+
+class TkLogView:
+    """
+    Vuelca periódicamente un LogSink en un widget Text/ScrolledText de Tk,
+    conservando solo las últimas `max_lineas` líneas.
+    """
+
+    def __init__(self, raiz, widget, sink=None, max_lineas=MAX_LINEAS_VISTA,
+                 intervalo_ms=INTERVALO_TICK_MS):
+        self.raiz = raiz
+        self.widget = widget
+        self.sink = sink or LogSink()
+        self.max_lineas = max_lineas
+        self.intervalo_ms = intervalo_ms
+        self._tarea = None
+
+    def start(self):
+        """Empieza a vaciar la cola. Debe llamarse desde el hilo principal."""
+        if self._tarea is None:
+            self._tarea = self.raiz.after(self.intervalo_ms, self._tick)
+
+    def stop(self):
+        """Deja de vaciar la cola (p. ej. antes de destruir la ventana)."""
+        if self._tarea is not None:
+            try:
+                self.raiz.after_cancel(self._tarea)
+            except Exception:
+                pass  # La ventana ya fue destruida
+            self._tarea = None
+
+    def _tick(self):
+        self._tarea = None
+        try:
+            self.flush()
+        finally:
+            if self.widget.winfo_exists():
+                self._tarea = self.raiz.after(self.intervalo_ms, self._tick)
+
+    def flush(self):
+        """Inserta en el widget un lote de líneas pendientes."""
+        lineas = self.sink.drain()
+        if not lineas or not self.widget.winfo_exists():
+            return
+        self.widget.config(state="normal")
+        self.widget.insert("end", "\n".join(lineas) + "\n")
+        # El texto termina en '\n': "end-1c" está al inicio de la línea vacía final
+        total = int(self.widget.index("end-1c").split(".")[0]) - 1
+        if total > self.max_lineas:
+            self.widget.delete("1.0", f"{total - self.max_lineas + 1}.0")
+        self.widget.see("end")
+        self.widget.config(state="disabled")
+
+    def clear(self):
+        """Vacía el widget y la cola."""
+        self.sink.clear()
+        self.widget.config(state="normal")
+        self.widget.delete("1.0", "end")
+        self.widget.config(state="disabled")
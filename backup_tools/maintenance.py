@@ -0,0 +1,298 @@
+"""
+Mantenimiento del repositorio entre backups.
+
+Cada backup añade un commit y varios objetos sueltos, y ninguna de las dos
+herramientas reempaquetaba nunca: con los meses de commits "Backup #N",
+`git status`, `git add` y `git push` recorren miles de objetos sueltos y
+decenas de paquetes (fast-import crea uno por snapshot), y el `gc --auto`
+que lanza `git commit` al superar su umbral aparece de golpe en medio de un
+backup. Aquí se miden los objetos sueltos y los paquetes (`git
+count-objects -v`) y, cuando superan sus umbrales, se ejecutan tareas
+incrementales:
+
+* incremental-repack: `git repack -d --geometric=2`, que empaqueta los
+  objetos sueltos y fusiona solo los paquetes pequeños.
+* multi-pack-index: un índice único para todos los paquetes.
+* commit-graph: el grafo de commits por capas (`--split`), que acelera
+  recorrer el historial.
+
+El mantenimiento nunca coincide con un backup: cada tarea toma el mismo
+cerrojo por repositorio que los intentos (ver engine.py) y, antes de cada
+una, se abandona si ha empezado un backup. IdleScheduler lo lanza cuando el
+repositorio lleva ESPERA_INACTIVIDAD_SEGUNDOS sin backups. El coste de cada
+ejecución (estadísticas antes y después y duración de cada tarea) se añade a
+`maintenance.jsonl` en el directorio de estado (ver statedir.py).
+"""
+
+import asyncio  # Cerrojo, esperas de inactividad y tareas en segundo plano
+import json  # Formato del registro de cada ejecución
+import os  # Para ubicar el multi-pack-index y el commit-graph
+import subprocess  # Timeout de inactividad de gitrunner
+import time  # Para medir cada tarea
+from dataclasses import asdict, dataclass  # Para las estadísticas de objetos
+
+from backup_tools import gitrunner  # Ejecución asíncrona de Git con la salida en el log
+from backup_tools import snapshot  # Para ubicar .git y cerrar fast-import antes de reempaquetar
+from backup_tools import statedir  # Ubicación del registro de mantenimiento
+
+# --- Tareas de mantenimiento ---
+TASK_REPACK = "incremental-repack"
+TASK_MIDX = "multi-pack-index"
+TASK_COMMIT_GRAPH = "commit-graph"
+
+_COMANDOS = {
+    TASK_REPACK: ["git", "repack", "-d", "--geometric=2"],
+    TASK_MIDX: ["git", "multi-pack-index", "write"],
+    TASK_COMMIT_GRAPH: ["git", "commit-graph", "write", "--reachable", "--split", "--changed-paths"],
+}
+
+# Objetos sueltos a partir de los que se reempaqueta (gc --auto espera a 6700)
+UMBRAL_OBJETOS_SUELTOS = 256
+# Paquetes a partir de los que se reempaqueta aunque haya pocos objetos sueltos
+# (fast-import crea uno por snapshot). La progresión geométrica deja del orden
+# de log2(objetos) paquetes, así que el umbral queda por encima.
+UMBRAL_PAQUETES = 32
+# Segundos sin backups tras los que IdleScheduler lanza el mantenimiento
+ESPERA_INACTIVIDAD_SEGUNDOS = 30
+# Un repack con -d no escribe nada mientras comprime: se le da más margen
+TIMEOUT_INACTIVIDAD_SEGUNDOS = 30 * 60
+# Registro de cada ejecución, dentro del directorio de estado
+ARCHIVO_REGISTRO = "maintenance.jsonl"
+
+
+@dataclass
+class ObjectStats:
+    """
+    Estado del almacén de objetos de un repositorio.
+
+    Attributes:
+        loose_objects (int): Objetos sueltos.
+        loose_kib (int): KiB ocupados por los objetos sueltos.
+        packs (int): Paquetes.
+        pack_kib (int): KiB ocupados por los paquetes.
+        packed_objects (int): Objetos dentro de paquetes.
+        garbage (int): Archivos del directorio de objetos que Git no reconoce.
+        multi_pack_index (bool): Si existe un multi-pack-index.
+        commit_graph (bool): Si existe un commit-graph (simple o por capas).
+    """
+    loose_objects: int = 0
+    loose_kib: int = 0
+    packs: int = 0
+    pack_kib: int = 0
+    packed_objects: int = 0
+    garbage: int = 0
+    multi_pack_index: bool = False
+    commit_graph: bool = False
+
+    def summary(self):
+        return (f"{self.loose_objects} objeto(s) suelto(s) ({self.loose_kib} KiB), "
+                f"{self.packs} paquete(s) ({self.pack_kib} KiB)")
+
+
+# Campos de `git count-objects -v` -> atributos de ObjectStats
+_CAMPOS_COUNT_OBJECTS = {
+    "count": "loose_objects",
+    "size": "loose_kib",
+    "packs": "packs",
+    "size-pack": "pack_kib",
+    "in-pack": "packed_objects",
+    "garbage": "garbage",
+}
+
+
+def parse_count_objects(salida):
+    """Interpreta la salida de `git count-objects -v`."""
+    stats = ObjectStats()
+    for linea in salida.splitlines():
+        clave, _, valor = linea.partition(":")
+        atributo = _CAMPOS_COUNT_OBJECTS.get(clave.strip())
+        if atributo is not None:
+            setattr(stats, atributo, int(valor.strip() or 0))
+    return stats
+
+
+async def object_stats(repo_dir, log_fn):
+    """
+    Devuelve las ObjectStats de `repo_dir`.
+
+    Raises:
+        subprocess.CalledProcessError: Si `git count-objects` falla.
+    """
+    stdout, stderr, codigo = await gitrunner.run_git(
+        ["git", "count-objects", "-v"], log_fn, cwd=repo_dir, capture_stdout=True)
+    if codigo != 0:
+        raise subprocess.CalledProcessError(codigo, "git count-objects -v", stdout, stderr)
+    stats = parse_count_objects(stdout)
+    _, common_dir = snapshot.resolve_git_dir(repo_dir)
+    objetos = os.path.join(common_dir, "objects")
+    stats.multi_pack_index = os.path.exists(os.path.join(objetos, "pack", "multi-pack-index"))
+    stats.commit_graph = (os.path.exists(os.path.join(objetos, "info", "commit-graph"))
+                          or os.path.exists(os.path.join(objetos, "info", "commit-graphs", "commit-graph-chain")))
+    return stats
+
+
+def plan_tasks(stats, force=False):
+    """
+    Decide qué tareas necesita un repositorio con las estadísticas `stats`.
+    Con `force` se reempaqueta aunque no se hayan superado los umbrales.
+    """
+    tareas = []
+    if force or stats.loose_objects >= UMBRAL_OBJETOS_SUELTOS or stats.packs >= UMBRAL_PAQUETES:
+        tareas.append(TASK_REPACK)
+    reempaqueta = bool(tareas)
+    if reempaqueta or (stats.packs >= 2 and not stats.multi_pack_index):
+        tareas.append(TASK_MIDX)
+    if reempaqueta or not stats.commit_graph:
+        tareas.append(TASK_COMMIT_GRAPH)
+    return tareas
+
+
+def _escribir_registro(repo_dir, registro):
+    with open(statedir.state_path(repo_dir, ARCHIVO_REGISTRO), "a", encoding="utf-8") as f:
+        f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+
+
+async def run_maintenance(repo_dir, log_fn, lock=None, force=False, busy_fn=None):
+    """
+    Ejecuta las tareas de mantenimiento que necesite `repo_dir`.
+
+    Args:
+        repo_dir (str): Raíz del repositorio.
+        log_fn (function): Función para loguear mensajes (mensaje, nivel).
+        lock (asyncio.Lock, optional): Cerrojo de los backups del
+            repositorio; se toma durante cada tarea por separado, de modo que
+            un backup que llega espera como mucho a que termine la tarea en curso.
+        force (bool): Reempaqueta aunque no se hayan superado los umbrales.
+        busy_fn (function, optional): Callable() que devuelve True si hay un
+            backup en curso o esperando; en ese caso no se empiezan más tareas.
+
+    Returns:
+        dict: El registro de la ejecución, o None si no hacía falta nada.
+    """
+    lock = lock or asyncio.Lock()
+    try:
+        async with lock:
+            antes = await object_stats(repo_dir, log_fn)
+    except (OSError, subprocess.SubprocessError) as e:
+        log_fn(f"No se pudo medir el almacén de objetos: {e}", "WARNING")
+        return None
+    tareas = plan_tasks(antes, force)
+    if not tareas:
+        return None
+    log_fn(f"Mantenimiento del repositorio ({antes.summary()}): {', '.join(tareas)}.", "INFO")
+
+    inicio = time.time()
+    resultados = []
+    for tarea in tareas:
+        if busy_fn is not None and busy_fn():
+            log_fn("Mantenimiento aplazado: hay un backup en curso.", "INFO")
+            break
+        async with lock:
+            inicio_tarea = time.monotonic()
+            try:
+                if tarea == TASK_REPACK:
+                    # fast-import lee de los paquetes que escribió: se reinicia en el próximo backup
+                    await asyncio.to_thread(snapshot.get_snapshotter(repo_dir).close)
+                _, stderr, codigo = await gitrunner.run_git(
+                    _COMANDOS[tarea], log_fn, cwd=repo_dir, inactivity_timeout=TIMEOUT_INACTIVIDAD_SEGUNDOS)
+            except (OSError, subprocess.SubprocessError) as e:
+                stderr, codigo = str(e), -1
+            duracion = time.monotonic() - inicio_tarea
+        resultados.append({"task": tarea, "duration": round(duracion, 3), "returncode": codigo})
+        if codigo != 0:
+            log_fn(f"La tarea de mantenimiento {tarea} falló (código {codigo}): {stderr.strip()}", "WARNING")
+            break
+
+    try:
+        async with lock:
+            despues = await object_stats(repo_dir, log_fn)
+    except (OSError, subprocess.SubprocessError):
+        despues = None
+    registro = {
+        "timestamp": round(inicio, 3),
+        "repo": os.path.abspath(repo_dir),
+        "duration": round(time.time() - inicio, 3),
+        "tasks": resultados,
+        "before": asdict(antes),
+        "after": asdict(despues) if despues is not None else None,
+    }
+    try:
+        _escribir_registro(repo_dir, registro)
+    except OSError as e:
+        log_fn(f"No se pudo escribir el registro de mantenimiento: {e}", "WARNING")
+    if despues is not None:
+        log_fn(f"Mantenimiento terminado en {registro['duration']:.2f}s: {despues.summary()}.", "INFO")
+    return registro
+
+
+class IdleScheduler:
+    """
+    Lanza el mantenimiento de cada repositorio cuando lleva `delay` segundos
+    sin backups. Vive en un bucle de eventos: sus métodos se llaman desde
+    corutinas de ese bucle.
+    """
+
+    def __init__(self, run_fn, delay=ESPERA_INACTIVIDAD_SEGUNDOS):
+        """
+        Args:
+            run_fn (function): Callable(repo_dir, log_fn, busy_fn) que devuelve
+                la corutina del mantenimiento (normalmente engine.maintain).
+            delay (float): Segundos de inactividad antes del mantenimiento.
+        """
+        self.run_fn = run_fn
+        self.delay = delay
+        self._ocupados = {}  # Repositorio -> backups en curso
+        self._esperas = {}  # Repositorio -> (tarea que espera la inactividad, log_fn)
+        self._en_curso = {}  # Repositorio -> tarea de mantenimiento en marcha
+
+    def busy(self, repo_dir):
+        """True si `repo_dir` tiene un backup en curso."""
+        return self._ocupados.get(os.path.realpath(repo_dir), 0) > 0
+
+    def backup_started(self, repo_dir):
+        """Anota un backup que empieza y cancela el mantenimiento que aún esperaba."""
+        clave = os.path.realpath(repo_dir)
+        self._ocupados[clave] = self._ocupados.get(clave, 0) + 1
+        espera = self._esperas.pop(clave, None)
+        if espera is not None:
+            espera[0].cancel()
+
+    def backup_finished(self, repo_dir, log_fn, schedule=True):
+        """Anota un backup terminado y, con `schedule`, programa el mantenimiento."""
+        clave = os.path.realpath(repo_dir)
+        self._ocupados[clave] = max(0, self._ocupados.get(clave, 0) - 1)
+        if not schedule or self._ocupados[clave]:
+            return
+        espera = self._esperas.pop(clave, None)
+        if espera is not None:
+            espera[0].cancel()
+        self._esperas[clave] = (asyncio.ensure_future(self._esperar(clave, log_fn)), log_fn)
+
+    async def _esperar(self, clave, log_fn):
+        await asyncio.sleep(self.delay)
+        self._esperas.pop(clave, None)
+        await self._ejecutar(clave, log_fn)
+
+    async def _ejecutar(self, clave, log_fn):
+        if clave in self._en_curso or self.busy(clave):
+            return
+        self._en_curso[clave] = asyncio.current_task()
+        try:
+            await self.run_fn(clave, log_fn, lambda: self.busy(clave))
+        except Exception as e:
+            log_fn(f"Error en el mantenimiento del repositorio: {e}", "WARNING")
+        finally:
+            self._en_curso.pop(clave, None)
+
+    async def run_pending(self):
+        """
+        Ejecuta ya el mantenimiento programado (p. ej. antes de terminar un
+        backup único) y espera al que esté en marcha.
+        """
+        esperas, self._esperas = self._esperas, {}
+        for clave, (tarea, log_fn) in esperas.items():
+            tarea.cancel()
+            await self._ejecutar(clave, log_fn)
+        en_curso = list(self._en_curso.values())
+        if en_curso:
+            await asyncio.wait(en_curso)
@@ -0,0 +1,297 @@
+"""
+Métricas por fase de cada backup.
+
+Hasta ahora la única medición era la duración del intento y del proceso
+completo, escrita como texto libre en el log. Aquí cada backup acumula el
+tiempo de cada fase (verificación de conexión, status, add, commit, push y
+registro en el catálogo) a lo largo de todos sus intentos, junto con los bytes y
+objetos subidos por el push. Al terminar el backup se escribe:
+
+* una línea JSON con el registro completo en un archivo JSONL, y
+* un archivo de texto para el textfile collector de node_exporter con
+  histogramas de la duración de cada fase y contadores de backups, bytes y
+  objetos subidos. Los acumulados se conservan en un archivo JSON junto al
+  textfile para que sobrevivan a las ejecuciones puntuales (--cron, systemd).
+"""
+
+import datetime  # Para fechar cada registro
+import json  # Formato del registro y del estado acumulado
+import os  # Para escribir los archivos de forma atómica
+import re  # Para interpretar el progreso de `git push`
+import threading  # Varios repositorios pueden terminar a la vez (--config)
+import time  # Para medir la duración de cada fase
+from contextlib import contextmanager  # Para medir una fase con `with`
+from dataclasses import dataclass, field  # Para el registro de un backup
+
+from backup_tools import statedir  # Ubicación por defecto de los archivos de métricas
+from backup_tools.scheduler import ESTADOS_EXITOSOS  # Estados que cuentan como backup correcto
+
+# --- Pasos medidos (no confundir con las fases reanudables de retry.py) ---
+STEP_CONNECTION = "connection"
+STEP_STATUS = "status"
+STEP_SCAN = "scan"
+STEP_ADD = "add"
+STEP_COMMIT = "commit"
+STEP_PUSH = "push"
+STEP_CATALOG = "catalog"
+STEP_CHUNKS = "chunks"
+STEP_BUNDLE = "bundle"
+
+# Archivos por defecto, dentro del directorio de estado (ver statedir.py)
+ARCHIVO_JSONL = "backup_metrics.jsonl"
+ARCHIVO_TEXTFILE = "backup_metrics.prom"
+
+# Límites superiores (segundos) de los buckets de los histogramas
+BUCKETS_SEGUNDOS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+# "Writing objects: 100% (12/12), 1.20 MiB | 2.00 MiB/s, done."
+_RE_ESCRITURA = re.compile(
+    r"Writing objects:\s+\d+% \((\d+)/(\d+)\),\s+([\d.]+)\s*(bytes|KiB|MiB|GiB)")
+# "Total 12 (delta 3), reused 0 (delta 0)"
+_RE_TOTAL = re.compile(r"Total (\d+) \(delta")
+_UNIDADES = {"bytes": 1, "KiB": 1024, "MiB": 1024 ** 2, "GiB": 1024 ** 3}
+
+
+def parse_push_output(stderr):
+    """
+    Extrae de la salida de error de `git push --progress` los objetos y bytes
+    escritos en el remoto.
+
+    Returns:
+        tuple: (objetos, bytes). (0, 0) si el push no tuvo nada que enviar.
+    """
+    objetos, tamano = 0, 0
+    for objetos_escritos, _, cantidad, unidad in _RE_ESCRITURA.findall(stderr or ""):
+        objetos = int(objetos_escritos)
+        tamano = int(float(cantidad) * _UNIDADES[unidad])
+    if not objetos:
+        totales = _RE_TOTAL.findall(stderr or "")
+        if totales:
+            objetos = int(totales[-1])
+    return objetos, tamano
+
+
+@dataclass
+class BackupMetrics:
+    """
+    Mediciones de un backup, acumuladas a lo largo de todos sus intentos.
+
+    Attributes:
+        started (float): Instante (epoch) en que empezó el backup.
+        phases (dict): Segundos acumulados por fase.
+        backup_number (int): Número del backup commiteado, o None.
+        bytes_pushed (int): Bytes escritos en el remoto por los pushes.
+        objects_pushed (int): Objetos escritos en el remoto por los pushes.
+    """
+    started: float = field(default_factory=time.time)
+    phases: dict = field(default_factory=dict)
+    backup_number: int = None
+    bytes_pushed: int = 0
+    objects_pushed: int = 0
+
+    @contextmanager
+    def phase(self, nombre):
+        """Suma a la fase `nombre` el tiempo que tarda el bloque `with`."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[nombre] = self.phases.get(nombre, 0.0) + time.perf_counter() - inicio
+
+    def record_push(self, stderr):
+        """Suma los objetos y bytes que indica la salida de un push."""
+        objetos, tamano = parse_push_output(stderr)
+        self.objects_pushed += objetos
+        self.bytes_pushed += tamano
+
+    def to_record(self, repo, status, attempts, engine=None):
+        """Devuelve el registro JSON del backup terminado con `status`."""
+        return {
+            "timestamp": datetime.datetime.fromtimestamp(self.started).isoformat(timespec="seconds"),
+            "repo": repo,
+            "engine": engine,
+            "status": status,
+            "attempts": attempts,
+            "backup_number": self.backup_number,
+            "duration": round(time.time() - self.started, 3),
+            "phases": {fase: round(segundos, 3) for fase, segundos in self.phases.items()},
+            "bytes_pushed": self.bytes_pushed,
+            "objects_pushed": self.objects_pushed,
+        }
+
+
+def _escapar_etiqueta(valor):
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _etiquetas(**etiquetas):
+    return ",".join(f'{nombre}="{_escapar_etiqueta(valor)}"' for nombre, valor in etiquetas.items())
+
+
+def _escribir_atomico(ruta, texto):
+    temporal = ruta + ".tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        f.write(texto)
+    os.replace(temporal, ruta)
+
+
+class MetricsWriter:
+    """
+    Escribe el registro de cada backup terminado en el JSONL y regenera el
+    textfile de Prometheus con los acumulados.
+    """
+
+    def __init__(self, jsonl_path=ARCHIVO_JSONL, textfile_path=ARCHIVO_TEXTFILE):
+        """
+        Args:
+            jsonl_path (str, optional): Archivo JSONL; None o "" lo desactiva.
+            textfile_path (str, optional): Archivo .prom para node_exporter;
+                None o "" lo desactiva. Los acumulados se guardan en
+                `<textfile_path>.json`.
+        """
+        self.jsonl_path = jsonl_path or None
+        self.textfile_path = textfile_path or None
+        self._lock = threading.Lock()
+        self._estado = None
+
+    @classmethod
+    def from_args(cls, args):
+        """
+        Construye el escritor a partir de los argumentos de línea de comandos.
+        Sin ruta explícita, los archivos van al directorio de estado de --repo.
+        """
+        jsonl_path, textfile_path = args.metrics_file, args.metrics_textfile
+        if jsonl_path is None:
+            jsonl_path = statedir.state_path(args.repo, ARCHIVO_JSONL)
+        if textfile_path is None:
+            textfile_path = statedir.state_path(args.repo, ARCHIVO_TEXTFILE)
+        return cls(jsonl_path, textfile_path)
+
+    @property
+    def _ruta_estado(self):
+        return self.textfile_path + ".json"
+
+    def paths(self):
+        """
+        Archivos que escribe el escritor (incluidos los temporales), para que
+        --watch no los tome por cambios del repositorio.
+        """
+        rutas = []
+        if self.jsonl_path:
+            rutas.append(self.jsonl_path)
+        if self.textfile_path:
+            for ruta in (self.textfile_path, self._ruta_estado):
+                rutas += [ruta, ruta + ".tmp"]
+        return tuple(rutas)
+
+    def _cargar_estado(self):
+        if self._estado is None:
+            try:
+                with open(self._ruta_estado, "r", encoding="utf-8") as f:
+                    self._estado = json.load(f)
+            except (OSError, ValueError):
+                self._estado = {}  # Sin acumulados previos (o corruptos): se empieza de cero
+        return self._estado
+
+    def write(self, metrics, repo, status, attempts, engine=None, log_fn=None):
+        """
+        Registra el backup terminado. Los errores de escritura solo se loguean:
+        las métricas nunca deben hacer fallar un backup.
+        """
+        registro = metrics.to_record(repo, status, attempts, engine)
+        with self._lock:
+            try:
+                if self.jsonl_path:
+                    with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                        f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+                if self.textfile_path:
+                    self._acumular(registro)
+                    _escribir_atomico(self._ruta_estado, json.dumps(self._estado))
+                    _escribir_atomico(self.textfile_path, self._exposicion())
+            except OSError as e:
+                if log_fn:
+                    log_fn(f"No se pudieron escribir las métricas del backup: {e}", "WARNING")
+        return registro
+
+    def _acumular(self, registro):
+        estado = self._cargar_estado()
+        repo = estado.setdefault(registro["repo"], {
+            "runs": {}, "phases": {},
+            "bytes_pushed": 0, "objects_pushed": 0, "last": {}})
+        repo["runs"][registro["status"]] = repo["runs"].get(registro["status"], 0) + 1
+        observaciones = dict(registro["phases"], total=registro["duration"])
+        for fase, segundos in observaciones.items():
+            histograma = repo["phases"].setdefault(
+                fase, {"buckets": [0] * len(BUCKETS_SEGUNDOS), "sum": 0.0, "count": 0})
+            for i, limite in enumerate(BUCKETS_SEGUNDOS):
+                if segundos <= limite:
+                    histograma["buckets"][i] += 1
+            histograma["sum"] += segundos
+            histograma["count"] += 1
+        repo["bytes_pushed"] += registro["bytes_pushed"]
+        repo["objects_pushed"] += registro["objects_pushed"]
+        repo["last"] = {
+            "timestamp": time.time(),
+            "status": registro["status"],
+            "bytes_pushed": registro["bytes_pushed"],
+            "objects_pushed": registro["objects_pushed"],
+        }
+        if registro["status"] in ESTADOS_EXITOSOS:
+            repo["last_success"] = time.time()
+
+    def _exposicion(self):
+        """Genera el textfile en el formato de exposición de Prometheus."""
+        lineas = []
+
+        def metrica(nombre, tipo, ayuda):
+            lineas.append(f"# HELP {nombre} {ayuda}")
+            lineas.append(f"# TYPE {nombre} {tipo}")
+
+        repos = sorted(self._estado.items())
+        metrica("git_backup_phase_duration_seconds", "histogram",
+                "Duracion de cada fase del backup, sumada entre sus intentos (phase=total: backup completo).")
+        for nombre, repo in repos:
+            for fase, histograma in sorted(repo["phases"].items()):
+                for limite, cuenta in zip(BUCKETS_SEGUNDOS, histograma["buckets"]):
+                    lineas.append(f"git_backup_phase_duration_seconds_bucket"
+                                  f"{{{_etiquetas(repo=nombre, phase=fase, le=limite)}}} {cuenta}")
+                lineas.append(f"git_backup_phase_duration_seconds_bucket"
+                              f"{{{_etiquetas(repo=nombre, phase=fase, le='+Inf')}}} {histograma['count']}")
+                lineas.append(f"git_backup_phase_duration_seconds_sum"
+                              f"{{{_etiquetas(repo=nombre, phase=fase)}}} {histograma['sum']:.6f}")
+                lineas.append(f"git_backup_phase_duration_seconds_count"
+                              f"{{{_etiquetas(repo=nombre, phase=fase)}}} {histograma['count']}")
+        metrica("git_backup_runs_total", "counter", "Backups terminados por estado final.")
+        for nombre, repo in repos:
+            for estado, cuenta in sorted(repo["runs"].items()):
+                lineas.append(f"git_backup_runs_total{{{_etiquetas(repo=nombre, status=estado)}}} {cuenta}")
+        metrica("git_backup_pushed_bytes_total", "counter", "Bytes escritos en el remoto por los pushes.")
+        for nombre, repo in repos:
+            lineas.append(f"git_backup_pushed_bytes_total{{{_etiquetas(repo=nombre)}}} {repo['bytes_pushed']}")
+        metrica("git_backup_pushed_objects_total", "counter", "Objetos escritos en el remoto por los pushes.")
+        for nombre, repo in repos:
+            lineas.append(f"git_backup_pushed_objects_total{{{_etiquetas(repo=nombre)}}} {repo['objects_pushed']}")
+        metrica("git_backup_last_pushed_bytes", "gauge", "Bytes subidos por el ultimo backup.")
+        for nombre, repo in repos:
+            lineas.append(f"git_backup_last_pushed_bytes{{{_etiquetas(repo=nombre)}}} "
+                          f"{repo['last'].get('bytes_pushed', 0)}")
+        metrica("git_backup_last_pushed_objects", "gauge", "Objetos subidos por el ultimo backup.")
+        for nombre, repo in repos:
+            lineas.append(f"git_backup_last_pushed_objects{{{_etiquetas(repo=nombre)}}} "
+                          f"{repo['last'].get('objects_pushed', 0)}")
+        metrica("git_backup_last_run_timestamp_seconds", "gauge", "Instante en que termino el ultimo backup.")
+        for nombre, repo in repos:
+            lineas.append(f"git_backup_last_run_timestamp_seconds{{{_etiquetas(repo=nombre)}}} "
+                          f"{repo['last'].get('timestamp', 0):.0f}")
+        metrica("git_backup_last_success_timestamp_seconds", "gauge",
+                "Instante del ultimo backup terminado correctamente.")
+        for nombre, repo in repos:
+            if "last_success" in repo:
+                lineas.append(f"git_backup_last_success_timestamp_seconds{{{_etiquetas(repo=nombre)}}} "
+                              f"{repo['last_success']:.0f}")
+        return "\n".join(lineas) + "\n"
+
+
+def repo_label(repo_dir):
+    """Nombre con el que se etiqueta un repositorio en las métricas."""
+    return os.path.basename(os.path.abspath(repo_dir))
@@ -0,0 +1,157 @@
+"""
+Push del backup a varios remotos espejo en paralelo con quórum.
+
+Cada backup puede subirse, además de al remoto principal, a remotos espejo
+(otra forja, un espejo interno, un repositorio bare en un NAS). Los pushes se
+lanzan a la vez, cada uno con su propio plazo y sus propios reintentos, de modo
+que la latencia del paso es la del remoto más lento y no la suma de todos. El
+backup se da por subido cuando el número de pushes correctos alcanza el quórum
+configurado; los espejos que quedaron atrás se anotan en el diario de pushes
+pendientes y se ponen al día en segundo plano (ver journal.py).
+"""
+
+import asyncio  # Pushes concurrentes en el bucle del motor y plazo de cada uno
+import time  # Para medir cada push
+from dataclasses import dataclass, field  # Para el resultado de cada destino
+
+from backup_tools.retry import FATAL, classify_error  # Fallos que no merece la pena reintentar
+
+# Segundos máximos de cada push a un destino antes de terminarlo
+TIMEOUT_PUSH_SEGUNDOS = 3 * 60
+# Reintentos de cada destino dentro de un mismo intento de backup
+REINTENTOS_PUSH = 1
+# Espera antes de reintentar el push a un destino
+ESPERA_REINTENTO_SEGUNDOS = 2
+# Nombre del destino principal cuando el push no indica remoto (rama con upstream)
+DESTINO_PREDETERMINADO = "(principal)"
+
+
+@dataclass
+class PushOutcome:
+    """
+    Resultado del push a un destino.
+
+    Attributes:
+        remote (str): Remoto de destino.
+        push_args (list): Comando de push usado.
+        ok (bool): True si el push terminó bien.
+        attempts (int): Pushes lanzados a este destino.
+        duration (float): Segundos del último push.
+        stderr (str): Salida de error del último push.
+    """
+    remote: str
+    push_args: list = field(default_factory=list)
+    ok: bool = False
+    attempts: int = 0
+    duration: float = 0.0
+    stderr: str = ""
+
+
+def destinations(push_args, mirrors):
+    """
+    Devuelve los destinos [(remoto, push_args)] de un backup: el push principal
+    y uno por cada espejo. Un push sin remoto explícito (`git push` sobre la
+    rama actual) sube `HEAD` a la rama del mismo nombre en cada espejo.
+    """
+    push_args = list(push_args)
+    principal = push_args[3] if len(push_args) > 3 else DESTINO_PREDETERMINADO
+    destinos = [(principal, push_args)]
+    for espejo in mirrors:
+        if espejo == principal or any(espejo == remoto for remoto, _ in destinos):
+            continue
+        if len(push_args) > 3:
+            destinos.append((espejo, push_args[:3] + [espejo] + push_args[4:]))
+        else:
+            destinos.append((espejo, push_args + [espejo, "HEAD"]))
+    return destinos
+
+
+def required_successes(quorum, total):
+    """Pushes correctos necesarios de `total` destinos (quórum None = todos)."""
+    if quorum is None:
+        return total
+    return max(1, min(quorum, total))
+
+
+async def _push_destino(remoto, push_args, run_push, log_fn, timeout, reintentos, espera):
+    resultado = PushOutcome(remoto, list(push_args))
+    for intento in range(reintentos + 1):
+        resultado.attempts += 1
+        inicio = time.monotonic()
+        try:
+            # Al vencer el plazo se cancela el push, lo que termina su proceso
+            resultado.stderr, codigo = await asyncio.wait_for(run_push(push_args), timeout)
+        except asyncio.TimeoutError:
+            resultado.stderr, codigo = f"tiempo límite de {timeout:.0f}s del push a {remoto}", -2
+        resultado.duration = time.monotonic() - inicio
+        if codigo == 0:
+            resultado.ok = True
+            log_fn(f"Push a {remoto} completado en {resultado.duration:.2f}s.", "INFO")
+            break
+        log_fn(f"Push a {remoto} fallido (intento {resultado.attempts}).", "WARNING")
+        if classify_error(resultado.stderr) == FATAL or intento == reintentos:
+            break
+        await asyncio.sleep(espera)
+    return resultado
+
+
+async def push_all(destinos, run_push, log_fn, timeout=TIMEOUT_PUSH_SEGUNDOS,
+                   reintentos=REINTENTOS_PUSH, espera=ESPERA_REINTENTO_SEGUNDOS):
+    """
+    Sube a todos los `destinos` a la vez.
+
+    Args:
+        destinos (list): Tuplas (remoto, push_args), ver destinations().
+        run_push (function): Corutina(push_args) que ejecuta el push y
+            devuelve (stderr, código de retorno).
+        log_fn (function): Función para loguear mensajes (mensaje, nivel).
+
+    Returns:
+        list: PushOutcome por destino, en el orden de `destinos`.
+    """
+    return list(await asyncio.gather(*(
+        _push_destino(remoto, args, run_push, log_fn, timeout, reintentos, espera)
+        for remoto, args in destinos)))
+
+
+async def push_with_quorum(progress, mirrors, quorum, run_push, log_fn, journal=None,
+                           timeout=TIMEOUT_PUSH_SEGUNDOS):
+    """
+    Sube el commit pendiente en `progress` al remoto principal y a `mirrors`,
+    cada uno con un plazo de `timeout` segundos. Los destinos que ya lo
+    recibieron en un intento anterior se omiten. Si se alcanza el quórum, los
+    destinos fallidos se anotan en `journal` (PushJournal) para subirlos más
+    tarde.
+
+    Returns:
+        tuple: (True si se alcanzó el quórum, stderr representativo del fallo).
+    """
+    todos = destinations(progress.push_args, mirrors)
+    necesarios = required_successes(quorum, len(todos))
+    pendientes = [(remoto, args) for remoto, args in todos if remoto not in progress.pushed_remotes]
+    log_fn(f"Subiendo a {len(pendientes)} destino(s) en paralelo "
+           f"({', '.join(remoto for remoto, _ in pendientes)}); quórum {necesarios}/{len(todos)}.", "INFO")
+    resultados = await push_all(pendientes, run_push, log_fn, timeout)
+    for resultado in resultados:
+        progress.metrics.record_push(resultado.stderr)
+        if resultado.ok:
+            progress.pushed_remotes.add(resultado.remote)
+    fallidos = [r for r in resultados if not r.ok]
+
+    if len(progress.pushed_remotes) >= necesarios:
+        if fallidos:
+            nombres = ", ".join(r.remote for r in fallidos)
+            log_fn(f"Quórum alcanzado ({len(progress.pushed_remotes)}/{len(todos)}); "
+                   f"sin actualizar: {nombres}.", "WARNING")
+            if journal is not None:
+                for resultado in fallidos:
+                    journal.add(progress.backup_number, resultado.push_args)
+                log_fn("Los espejos atrasados se subirán en segundo plano.", "INFO")
+        return True, ""
+
+    log_fn(f"Quórum no alcanzado: {len(progress.pushed_remotes)}/{len(todos)} push(es) "
+           f"correctos, se necesitan {necesarios}.", "ERROR")
+    # Un fallo reintentable pesa más que uno definitivo: otro intento puede alcanzar el quórum
+    reintentables = [r for r in fallidos if classify_error(r.stderr) != FATAL]
+    representativo = (reintentables or fallidos)[0].stderr if fallidos else ""
+    return False, representativo
@@ -0,0 +1,80 @@
+"""
+Opciones de backup compartidas por `backupGit.py` y `github_backup.py`.
+"""
+
+from dataclasses import dataclass  # Para declarar las opciones de forma compacta
+
+from backup_tools.bundles import CADENAS_CONSERVADAS  # Cadenas de bundles por defecto
+from backup_tools.stagepolicy import MAX_TAMANO_ARCHIVO, MAX_TAMANO_BACKUP, MIB  # Límites por defecto
+
+# --- Motores de snapshot disponibles ---
+# "git add ." + "git commit" sobre la rama actual (comportamiento original)
+ENGINE_ADD_COMMIT = "add-commit"
+# Proceso `git fast-import` persistente que escribe en refs/backups/<rama>
+ENGINE_FAST_IMPORT = "fast-import"
+SNAPSHOT_ENGINES = (ENGINE_ADD_COMMIT, ENGINE_FAST_IMPORT)
+
+
+@dataclass
+class BackupOptions:
+    """
+    Opciones que modifican cómo se realiza cada backup.
+
+    Attributes:
+        repo_dir (str): Raíz del repositorio a respaldar.
+        snapshot_engine (str): Motor usado para crear el commit de backup
+            (ENGINE_ADD_COMMIT o ENGINE_FAST_IMPORT).
+        offline_journal (bool): Sin conexión, commitear en local y anotar el
+            push en el diario de pendientes en lugar de fallar.
+        mirrors (tuple): Remotos espejo a los que se sube cada backup en
+            paralelo con el remoto principal (ver backup_tools/mirrors.py).
+        push_quorum (int): Pushes correctos (principal incluido) necesarios
+            para dar el backup por subido; None exige todos.
+        exclude (tuple): Patrones de exclusión adicionales a los de
+            backup_tools/stagepolicy.py y .backupignore.
+        max_file_size (int): Bytes máximos de un archivo; los mayores se dejan
+            fuera del backup (0 sin límite).
+        max_backup_size (int): Bytes máximos que puede añadir un backup; si se
+            superan, el backup se rechaza (0 sin límite).
+        chunk_threshold (int): Bytes a partir de los cuales un archivo se
+            guarda en el almacén de fragmentos y solo se commitea su
+            manifiesto (0 lo desactiva; ver backup_tools/chunkstore.py).
+        chunk_target (str): Directorio al que se suben los fragmentos nuevos
+            antes de cada push; None los deja solo en el almacén local.
+        maintenance (bool): Reempaquetar el repositorio y actualizar su
+            commit-graph cuando lleva un rato sin backups, en lugar del
+            `gc --auto` de Git (ver backup_tools/maintenance.py).
+        bundle_dir (str): Directorio (disco local, USB) en el que se deja un
+            bundle incremental de cada backup a la vez que el push; None no
+            escribe bundles (ver backup_tools/bundles.py).
+        bundle_chains (int): Cadenas de bundles (uno completo y sus
+            incrementales) que se conservan en `bundle_dir`.
+    """
+    repo_dir: str = "."
+    snapshot_engine: str = ENGINE_ADD_COMMIT
+    offline_journal: bool = True
+    mirrors: tuple = ()
+    push_quorum: int = None
+    exclude: tuple = ()
+    max_file_size: int = MAX_TAMANO_ARCHIVO
+    max_backup_size: int = MAX_TAMANO_BACKUP
+    chunk_threshold: int = 0
+    chunk_target: str = None
+    maintenance: bool = True
+    bundle_dir: str = None
+    bundle_chains: int = CADENAS_CONSERVADAS
+
+    @classmethod
+    def from_args(cls, args):
+        """Construye las opciones a partir de los argumentos de línea de comandos."""
+        return cls(repo_dir=args.repo, snapshot_engine=args.engine,
+                   offline_journal=not args.no_offline,
+                   mirrors=tuple(args.mirror or ()), push_quorum=args.push_quorum,
+                   exclude=tuple(args.exclude or ()),
+                   max_file_size=int(args.max_file_size * MIB),
+                   max_backup_size=int(args.max_backup_size * MIB),
+                   chunk_threshold=int(args.chunk_threshold * MIB),
+                   chunk_target=args.chunk_target,
+                   maintenance=not args.no_maintenance,
+                   bundle_dir=args.bundle_dir,
+                   bundle_chains=args.bundle_chains)
@@ -0,0 +1,309 @@
+"""
+Orquestador de backups de varios repositorios en paralelo.
+
+Lee un archivo de configuración JSON con la lista de repositorios y los
+respalda en un único bucle de eventos (ver engine.py), con un máximo de
+intentos simultáneos. Cada repositorio mantiene su propio estado de
+reintentos; los reintentos esperan sin ocupar un cupo y vuelven a la cola
+detrás de los repositorios que aún no han tenido su turno, de modo que un
+repositorio que falla no acapara los cupos. Cuando todos han terminado, los
+que se respaldaron bien reciben su mantenimiento (ver maintenance.py) con los
+mismos cupos.
+
+Cada repositorio se toma con su cerrojo de instancia (ver instance.py) hasta
+terminar su mantenimiento. Si otra instancia (la GUI, --watch, un modo
+headless) ya lo tiene, el backup se le pide a ella en lugar de ejecutar Git
+en paralelo con sus procesos.
+
+Formato del archivo de configuración:
+
+    {
+        "max_workers": 4,
+        "max_retries": 3,
+        "retry_delay": 10,
+        "attempt_timeout": 300,
+        "repos": [
+            "/srv/git/proyecto-a",
+            {"path": "/srv/git/proyecto-b", "name": "b"}
+        ]
+    }
+"""
+
+import asyncio  # Un bucle de eventos para todos los repositorios
+import json  # Para leer el archivo de configuración
+import os  # Para validar las rutas de los repositorios
+import sqlite3  # Errores del catálogo de backups
+import threading  # Para el evento de parada
+import time  # Para medir duraciones
+from dataclasses import dataclass, field  # Para el estado de cada repositorio
+
+from backup_tools import catalog  # Para cerrar el registro de cada backup en su catálogo
+from backup_tools import engine  # Timeout y cancelación de cada intento
+from backup_tools import instance  # Un solo proceso respalda cada repositorio
+from backup_tools.retry import AttemptProgress, RetryPolicy  # Reanudación y backoff por repositorio
+from backup_tools.scheduler import ESTADOS_EXITOSOS  # Estados que cuentan como backup correcto
+
+
+class ConfigError(Exception):
+    """Error en el archivo de configuración del orquestador."""
+
+
+@dataclass
+class RepoState:
+    """Estado de backup de un repositorio dentro del orquestador."""
+    name: str
+    path: str
+    attempts: int = 0
+    status: str = "PENDING"
+    duration: float = 0.0
+    history: list = field(default_factory=list)  # Estado de cada intento
+    progress: AttemptProgress = field(default_factory=AttemptProgress, repr=False)
+    instance: object = field(default=None, repr=False)  # Cerrojo del repositorio mientras se respalda
+
+    @property
+    def succeeded(self):
+        return self.status in ESTADOS_EXITOSOS
+
+
+def load_config(ruta_config):
+    """
+    Lee el archivo de configuración y devuelve (lista de RepoState, ajustes).
+
+    Raises:
+        ConfigError: Si el archivo no existe, no es JSON válido o algún
+            repositorio no contiene un directorio `.git`.
+    """
+    try:
+        with open(ruta_config, "r", encoding="utf-8") as f:
+            config = json.load(f)
+    except (OSError, ValueError) as e:
+        raise ConfigError(f"No se pudo leer la configuración '{ruta_config}': {e}")
+
+    base = os.path.dirname(os.path.abspath(ruta_config))
+    repos = []
+    nombres = set()
+    for entrada in config.get("repos", []):
+        if isinstance(entrada, str):
+            entrada = {"path": entrada}
+        ruta = os.path.normpath(os.path.join(base, os.path.expanduser(entrada["path"])))
+        nombre = entrada.get("name") or os.path.basename(ruta)
+        if nombre in nombres:
+            raise ConfigError(f"Nombre de repositorio duplicado en la configuración: '{nombre}'.")
+        if not os.path.exists(os.path.join(ruta, ".git")):
+            raise ConfigError(f"'{ruta}' no es la raíz de un repositorio Git.")
+        nombres.add(nombre)
+        repos.append(RepoState(name=nombre, path=ruta))
+    if not repos:
+        raise ConfigError(f"La configuración '{ruta_config}' no define ningún repositorio.")
+
+    ajustes = {clave: config[clave] for clave in ("max_workers", "max_retries", "retry_delay", "attempt_timeout")
+               if clave in config}
+    return repos, ajustes
+
+
+class Orchestrator:
+    """
+    Ejecuta un intento de backup por repositorio con un máximo de intentos
+    simultáneos y gestiona los reintentos de cada uno de forma independiente.
+    """
+
+    def __init__(self, repos, run_attempt, log_fn, max_workers=4, max_retries=3,
+                 retry_delay=10, stop_event=None, attempt_timeout=None, metrics_writer=None,
+                 maintenance=True):
+        """
+        Args:
+            repos (list): Lista de RepoState a respaldar.
+            run_attempt (function): Callable(repo_path, log_fn, progress) que
+                devuelve la corutina de un único intento de backup (p. ej.
+                engine.attempt) y registra en `progress` (AttemptProgress) la
+                fase alcanzada y sus fallos. Cancelarla debe terminar sus
+                procesos de Git.
+            log_fn (function): Función para loguear mensajes (mensaje, nivel).
+            max_workers (int): Número máximo de backups simultáneos.
+            max_retries (int): Intentos máximos por repositorio.
+            retry_delay (float): Espera tras el primer fallo de un repositorio;
+                se duplica (con jitter) en cada reintento.
+            stop_event (threading.Event, optional): Detiene el lanzamiento de
+                nuevos intentos y termina los procesos de los que están en curso.
+            attempt_timeout (float, optional): Segundos máximos por intento; al
+                vencer se cancela el intento y se terminan sus procesos de Git.
+            metrics_writer (MetricsWriter, optional): Recibe los tiempos por
+                paso de cada repositorio cuando su backup termina.
+            maintenance (bool): Reempaquetar al final los repositorios
+                respaldados que lo necesiten.
+        """
+        self.repos = repos
+        self.run_attempt = run_attempt
+        self.log_fn = log_fn
+        self.max_workers = max(1, int(max_workers))
+        self.max_retries = max(1, int(max_retries))
+        self.retry_policy = RetryPolicy(base_delay=retry_delay)
+        self.stop_event = stop_event or threading.Event()
+        self.attempt_timeout = attempt_timeout
+        self.metrics_writer = metrics_writer
+        self.maintenance = maintenance
+
+    def _log_repo(self, repo):
+        """Devuelve una función de log que antepone el nombre del repositorio."""
+        def log(mensaje, nivel="INFO"):
+            self.log_fn(f"[{repo.name}] {mensaje}", nivel)
+        return log
+
+    def run(self):
+        """
+        Respalda todos los repositorios y devuelve la lista de RepoState.
+        """
+        return asyncio.run(self._respaldar_todos())
+
+    async def _respaldar_todos(self):
+        inicio_total = time.time()
+        # Los cupos se conceden por orden de llegada: un reintento espera detrás
+        # de los repositorios que ya estaban esperando
+        cupos = asyncio.Semaphore(self.max_workers)
+        try:
+            await asyncio.gather(*(self._respaldar(repo, cupos) for repo in self.repos))
+            self._loguear_resumen(time.time() - inicio_total)
+            if self.maintenance and not self.stop_event.is_set():
+                # Los repositorios de otra instancia los mantiene ella
+                await asyncio.gather(*(self._mantener(repo, cupos) for repo in self.repos
+                                       if repo.succeeded and repo.instance is not None))
+        finally:
+            for repo in self.repos:
+                if repo.instance is not None:
+                    repo.instance.close()
+                    repo.instance = None
+        return self.repos
+
+    async def _tomar(self, repo):
+        """
+        Toma el cerrojo de instancia de `repo` (queda en `repo.instance`). Si
+        otra instancia lo tiene, le pide el backup y guarda su resultado en
+        `repo.status`.
+
+        Returns:
+            bool: True si este proceso debe respaldar el repositorio.
+        """
+        log = self._log_repo(repo)
+        # Si la otra instancia termina justo entonces, el segundo intento toma el repositorio
+        for _ in range(2):
+            repo.instance = instance.claim(repo.path)
+            if repo.instance is not None:
+                return True
+            inicio = time.time()
+            estado = await asyncio.to_thread(instance.request_backup, repo.path, log, self.stop_event)
+            if estado is not None:
+                repo.duration += time.time() - inicio
+                repo.history.append(estado)
+                repo.status = estado
+                return False
+            if self.stop_event.is_set():
+                repo.status = "CANCELLED"
+                return False
+        pid = instance.owner_pid(repo.path)
+        log(f"Otra instancia{f' (pid {pid})' if pid else ''} tiene el repositorio pero no atiende "
+            "peticiones de backup.", "ERROR")
+        repo.status = "INSTANCE_BUSY"
+        return False
+
+    async def _mantener(self, repo, cupos):
+        """Mantenimiento de un repositorio ya respaldado."""
+        async with cupos:
+            if self.stop_event.is_set():
+                return
+            try:
+                # stop_event cancela el mantenimiento igual que un intento
+                await engine.wait_attempt(engine.maintain(repo.path, self._log_repo(repo)),
+                                          cancel_event=self.stop_event)
+            except Exception as e:
+                self._log_repo(repo)(f"Error en el mantenimiento del repositorio: {e}", "WARNING")
+
+    async def _respaldar(self, repo, cupos):
+        """Intentos y reintentos de un repositorio."""
+        log = self._log_repo(repo)
+        if not await self._tomar(repo):
+            return
+        while True:
+            async with cupos:
+                if self.stop_event.is_set():
+                    break
+                repo.attempts += 1
+                log(f"--- Intento de Backup {repo.attempts}/{self.max_retries} ---", "INFO")
+                inicio = time.time()
+                try:
+                    estado = await engine.wait_attempt(
+                        self.run_attempt(repo.path, log, repo.progress),
+                        self.attempt_timeout, self.stop_event, log, repo.progress)
+                except Exception as e:
+                    log(f"Excepción no controlada durante el intento: {e}", "CRITICAL")
+                    estado = "EXCEPTION_IN_LOGIC"
+                duracion = time.time() - inicio
+            repo.history.append(estado)
+            repo.duration += duracion
+            repo.status = estado
+            log(f"Intento {repo.attempts} finalizado en {duracion:.2f}s con estado: {estado}", "INFO")
+            if repo.succeeded or estado == "CANCELLED":
+                break
+            if repo.progress.fatal:
+                log("El error no se resolverá reintentando; no se harán más intentos.", "ERROR")
+                engine.log_push_pending(repo.progress, log)
+                break
+            if repo.attempts >= self.max_retries:
+                log(f"Backup fallido tras {repo.attempts} intento(s).", "ERROR")
+                engine.log_push_pending(repo.progress, log)
+                break
+            espera = self.retry_policy.delay(repo.attempts)
+            log(f"Reintentando en {espera:.1f} segundos.", "INFO")
+            if await engine.wait_cancelled(espera, self.stop_event):
+                break
+        if self.stop_event.is_set() and not repo.succeeded:
+            repo.status = "CANCELLED"
+        if repo.attempts:
+            self._registrar_resultado(repo)
+
+    def _registrar_resultado(self, repo):
+        """Registra en el catálogo y en las métricas el backup terminado de `repo`."""
+        try:
+            catalog.record_outcome(repo.path, repo.progress, repo.status, repo.attempts)
+        except sqlite3.Error as e:
+            self._log_repo(repo)(f"No se pudo actualizar el catálogo de backups: {e}", "WARNING")
+        if self.metrics_writer is not None:
+            self.metrics_writer.write(repo.progress.metrics, repo.name, repo.status,
+                                      repo.attempts, log_fn=self._log_repo(repo))
+
+    def _loguear_resumen(self, duracion_total):
+        """Loguea una tabla con el resultado de cada repositorio."""
+        ancho = max(len(repo.name) for repo in self.repos)
+        self.log_fn("=== Resumen de backups ===", "INFO")
+        for repo in self.repos:
+            nivel = "INFO" if repo.succeeded else "ERROR"
+            self.log_fn(f"{repo.name:<{ancho}}  {repo.status:<22} intentos: {repo.attempts}  "
+                        f"tiempo: {repo.duration:.2f}s", nivel)
+        correctos = sum(1 for repo in self.repos if repo.succeeded)
+        self.log_fn(f"{correctos}/{len(self.repos)} repositorios respaldados correctamente "
+                    f"en {duracion_total:.2f} segundos.", "INFO" if correctos == len(self.repos) else "ERROR")
+
+
+def run_from_config(ruta_config, run_attempt, log_fn, max_retries, retry_delay,
+                    stop_event=None, attempt_timeout=None, metrics_writer=None, maintenance=True):
+    """
+    Carga la configuración y respalda todos sus repositorios.
+
+    Returns:
+        str: "SUCCESS" si todos los repositorios terminaron bien, o
+        "PARTIAL_FAILURE" si alguno falló.
+
+    Raises:
+        ConfigError: Si la configuración no es válida.
+    """
+    repos, ajustes = load_config(ruta_config)
+    orquestador = Orchestrator(
+        repos, run_attempt, log_fn,
+        max_workers=ajustes.get("max_workers", min(4, len(repos))),
+        max_retries=ajustes.get("max_retries", max_retries),
+        retry_delay=ajustes.get("retry_delay", retry_delay),
+        stop_event=stop_event,
+        attempt_timeout=ajustes.get("attempt_timeout", attempt_timeout),
+        metrics_writer=metrics_writer,
+        maintenance=maintenance)
+    orquestador.run()
+    return "SUCCESS" if all(repo.succeeded for repo in repos) else "PARTIAL_FAILURE"
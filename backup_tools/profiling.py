@@ -0,0 +1,210 @@
+"""
+Perfilado opcional de un intento de backup.
+
+Cuando un backup va lento no había forma de saber si el tiempo se iba en los
+procesos de Git, en el log o en la GUI. Con --profile-attempt (o la variable
+de entorno BACKUP_PROFILE=1) el siguiente intento de backup se ejecuta bajo
+cProfile y tracemalloc y al terminar se escribe, en el directorio de estado
+junto al log (ver statedir.py):
+
+* `backup_profile-<fecha>.txt`: tiempo total del intento repartido entre la
+  espera a los procesos hijos (los lanzados con gitrunner; varios a la vez
+  cuentan una sola vez), las llamadas al log y el dibujo del log en Tk, la
+  lista de procesos, las líneas que más memoria asignaron y las funciones
+  con más tiempo acumulado;
+* `backup_profile-<fecha>.prof`: las estadísticas de cProfile, para pstats
+  o snakeviz.
+
+cProfile mide el hilo del bucle del motor, donde corre el intento (incluidas
+las demás tareas del bucle durante ese tiempo); el trabajo enviado a hilos
+con asyncio.to_thread (escaneo del árbol, fast-import) aparece solo como
+parte del "resto".
+
+Desactivado no cuesta nada: engine.attempt() solo comprueba si hay un
+perfilador armado y gitrunner si hay observador; cProfile y tracemalloc ni
+siquiera se importan.
+"""
+
+import datetime  # Para nombrar el informe
+import io  # Para capturar la salida de pstats
+import os  # Para la variable de entorno y las rutas del informe
+import threading  # El log y Tk se miden desde varios hilos
+import time  # Para medir el intento y cada llamada
+
+from backup_tools import gitrunner  # Observador de los procesos hijos
+from backup_tools import statedir  # El informe va junto al log
+
+VARIABLE_ENTORNO = "BACKUP_PROFILE"
+# Líneas de cada sección del informe
+MAX_FUNCIONES = 40
+MAX_ASIGNACIONES = 20
+MAX_PROCESOS = 100
+
+_armado = None
+_lock = threading.Lock()
+
+
+def enabled(args=None):
+    """True si se pidió perfilar con --profile-attempt o con BACKUP_PROFILE."""
+    if args is not None and getattr(args, "profile_attempt", False):
+        return True
+    return os.environ.get(VARIABLE_ENTORNO, "").strip() not in ("", "0")
+
+
+def arm(tk_view=None):
+    """
+    Hace que el siguiente intento de backup de este proceso se perfile.
+
+    Args:
+        tk_view (TkLogView, optional): Vista de logs de la GUI cuyo dibujo en
+            el hilo de Tk se mide durante el intento.
+    """
+    global _armado
+    with _lock:
+        _armado = AttemptProfiler(tk_view)
+
+
+def take_armed():
+    """Devuelve (y desarma) el perfilador armado, o None."""
+    global _armado
+    if _armado is None:
+        return None
+    with _lock:
+        perfilador, _armado = _armado, None
+    return perfilador
+
+
+class _Contador:
+    """Tiempo y llamadas acumulados de una categoría, desde cualquier hilo."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.segundos = 0.0
+        self.llamadas = 0
+
+    def medir(self, funcion):
+        def medida(*args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                return funcion(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.segundos += time.perf_counter() - inicio
+                    self.llamadas += 1
+        return medida
+
+
+def _union(intervalos):
+    """Segundos cubiertos por al menos uno de los intervalos (inicio, fin)."""
+    total, fin_actual = 0.0, None
+    for inicio, fin in sorted(intervalos):
+        if fin_actual is None or inicio > fin_actual:
+            total += fin - inicio
+            fin_actual = fin
+        elif fin > fin_actual:
+            total += fin - fin_actual
+            fin_actual = fin
+    return total
+
+
+class AttemptProfiler:
+    """Perfila un único intento de backup y escribe su informe."""
+
+    def __init__(self, tk_view=None):
+        self.tk_view = tk_view
+        self.log = _Contador()
+        self.tk = _Contador()
+        self.procesos = []  # (comando, inicio, fin, código)
+
+    def wrap_log(self, log_fn):
+        """Devuelve `log_fn` midiendo el tiempo de cada llamada."""
+        return self.log.medir(log_fn)
+
+    def _observar(self, args, inicio, fin, codigo):
+        self.procesos.append((" ".join(args), inicio, fin, codigo))
+
+    async def run(self, coro, repo_dir, log_fn):
+        """Ejecuta la corutina del intento perfilada y devuelve su resultado."""
+        import cProfile
+        import tracemalloc
+
+        perfil = cProfile.Profile()
+        trazaba = tracemalloc.is_tracing()
+        if not trazaba:
+            tracemalloc.start()
+        gitrunner.observer = self._observar
+        if self.tk_view is not None:
+            self.tk_view.flush = self.tk.medir(self.tk_view.flush)
+        estado = "EXCEPTION"
+        inicio = time.perf_counter()
+        try:
+            perfil.enable()
+        except ValueError:
+            perfil = None  # Otro perfilador (p. ej. python -m cProfile) ya está activo
+        try:
+            estado = await coro
+            return estado
+        finally:
+            if perfil is not None:
+                perfil.disable()
+            fin = time.perf_counter()
+            gitrunner.observer = None
+            if self.tk_view is not None:
+                del self.tk_view.flush
+            instantanea = tracemalloc.take_snapshot()
+            actual, pico = tracemalloc.get_traced_memory()
+            if not trazaba:
+                tracemalloc.stop()
+            try:
+                ruta = self._escribir_informe(repo_dir, estado, inicio, fin, perfil, instantanea, actual, pico)
+                log_fn(f"Perfil del intento escrito en {ruta}.", "INFO")
+            except OSError as e:
+                log_fn(f"No se pudo escribir el perfil del intento: {e}", "WARNING")
+
+    def _escribir_informe(self, repo_dir, estado, inicio, fin, perfil, instantanea, actual, pico):
+        import pstats
+
+        base = os.path.join(statedir.state_dir(repo_dir),
+                            datetime.datetime.now().strftime("backup_profile-%Y%m%d-%H%M%S"))
+        total = fin - inicio
+        procesos = _union((max(p_inicio, inicio), min(p_fin, fin)) for _, p_inicio, p_fin, _ in self.procesos)
+
+        def linea(nombre, segundos, detalle=""):
+            porcentaje = 100 * segundos / total if total else 0.0
+            return f"  {nombre:<46} {segundos:9.3f} s {porcentaje:6.1f} %{detalle}"
+
+        lineas = [
+            f"Perfil del intento de backup de {os.path.abspath(repo_dir)}",
+            f"Fecha: {datetime.datetime.now().isoformat(timespec='seconds')}  Estado: {estado}",
+            "",
+            f"Tiempo total del intento: {total:.3f} s",
+            linea("Esperando a procesos hijos", procesos, f"  ({len(self.procesos)} proceso(s))"),
+            linea("Llamadas al log", self.log.segundos, f"  ({self.log.llamadas} llamada(s))"),
+        ]
+        if self.tk_view is not None:
+            lineas.append(linea("Dibujo del log en Tk (hilo principal)", self.tk.segundos,
+                                f"  ({self.tk.llamadas} lote(s))"))
+        resto = max(0.0, total - procesos - self.log.segundos)
+        lineas += [
+            linea("Resto (Python, hilos auxiliares, espera)", resto),
+            "",
+            f"Memoria (tracemalloc): pico {pico / 1024 / 1024:.2f} MiB, al terminar {actual / 1024 / 1024:.2f} MiB",
+            "",
+            "Procesos hijos (segundos desde el inicio del intento):",
+            "     inicio   duración  código  comando",
+        ]
+        for comando, p_inicio, p_fin, codigo in self.procesos[:MAX_PROCESOS]:
+            lineas.append(f"  {p_inicio - inicio:9.3f}  {p_fin - p_inicio:9.3f}  {codigo!s:>6}  {comando}")
+        if len(self.procesos) > MAX_PROCESOS:
+            lineas.append(f"  ... y {len(self.procesos) - MAX_PROCESOS} proceso(s) más")
+        lineas += ["", "Líneas que más memoria asignaron (tracemalloc):"]
+        for estadistica in instantanea.statistics("lineno")[:MAX_ASIGNACIONES]:
+            lineas.append(f"  {estadistica}")
+        if perfil is not None:
+            perfil.dump_stats(base + ".prof")
+            salida = io.StringIO()
+            pstats.Stats(perfil, stream=salida).sort_stats("cumulative").print_stats(MAX_FUNCIONES)
+            lineas += ["", "Funciones con más tiempo acumulado (cProfile, hilo del motor):", salida.getvalue()]
+        with open(base + ".txt", "w", encoding="utf-8") as f:
+            f.write("\n".join(lineas) + "\n")
+        return base + ".txt"
@@ -0,0 +1,281 @@
+"""
+Comprobación de que el remoto de push es alcanzable.
+
+La verificación anterior abría en cada intento un socket a github.com:443 (sin
+cerrarlo) aunque el remoto real fuera otro servidor o una ruta local, y
+bloqueaba hasta 5 s en cada reintento. Aquí se resuelve la URL de push real de
+la rama actual (`branch.<rama>.pushRemote`, `remote.pushDefault`,
+`branch.<rama>.remote` u "origin", con `pushurl` e `insteadOf` aplicados por
+`git remote get-url --push`) y se comprueba con el transporte que corresponde:
+
+* rutas locales y file://: que el directorio exista (p. ej. un disco montado);
+* ssh (también la forma `usuario@host:ruta`): conexión TCP al host y puerto
+  efectivos según `ssh -G`, que resuelve los alias de ~/.ssh/config;
+* http(s) y git://: conexión TCP al host y puerto de la URL;
+* ayudantes de transporte (`ext::`, `<helper>::`) o esquemas desconocidos: no
+  se pueden sondear y se consideran alcanzables; el push informará del error.
+
+Los resultados se guardan en caché por destino durante unos segundos (más
+tiempo los positivos que los negativos), compartida entre reintentos y entre
+repositorios, y las resoluciones DNS también se reutilizan.
+"""
+
+import os  # Para comprobar remotos locales
+import re  # Para reconocer la forma scp `usuario@host:ruta`
+import socket  # Para resolver nombres y sondear puertos TCP
+import subprocess  # Para consultar a Git y a ssh
+import threading  # La caché se comparte entre los hilos del orquestador
+import time  # Para la caducidad de las cachés
+from dataclasses import dataclass  # Para describir un destino
+from urllib.parse import urlsplit, unquote  # Para interpretar las URLs de los remotos
+
+# Segundos que se reutiliza un resultado positivo / negativo
+TTL_ALCANZABLE_SEGUNDOS = 30
+TTL_INALCANZABLE_SEGUNDOS = 5
+# Segundos que se reutiliza una resolución DNS o de ssh -G
+TTL_DNS_SEGUNDOS = 300
+# Timeout de las consultas locales a git y ssh
+_TIMEOUT_CONSULTA_SEGUNDOS = 5
+
+TRANSPORT_LOCAL = "local"
+TRANSPORT_SSH = "ssh"
+TRANSPORT_HTTP = "http"
+TRANSPORT_GIT = "git"
+TRANSPORT_UNKNOWN = "unknown"  # Ayudantes de transporte y esquemas no sondeables
+
+_PUERTOS = {"https": 443, "http": 80, "ssh": 22, "git+ssh": 22, "ssh+git": 22, "git": 9418}
+_TRANSPORTES = {"https": TRANSPORT_HTTP, "http": TRANSPORT_HTTP, "ssh": TRANSPORT_SSH,
+                "git+ssh": TRANSPORT_SSH, "ssh+git": TRANSPORT_SSH, "git": TRANSPORT_GIT}
+_RE_ESQUEMA = re.compile(r"^([A-Za-z][A-Za-z0-9+.-]*)://")
+_RE_AYUDANTE = re.compile(r"^([A-Za-z][A-Za-z0-9+.-]*)::")
+# usuario@host:ruta o host:ruta (sin '/' antes de ':' y sin '//' tras él)
+_RE_SCP = re.compile(r"^(?:[^@/]+@)?(\[[^\]]+\]|[^:/\[\]]+):(?!//)")
+
+
+@dataclass(frozen=True)
+class Endpoint:
+    """
+    Destino de un remoto.
+
+    Attributes:
+        transport (str): TRANSPORT_LOCAL, TRANSPORT_SSH, TRANSPORT_HTTP,
+            TRANSPORT_GIT o TRANSPORT_UNKNOWN.
+        host (str): Host (transportes de red).
+        port (int): Puerto TCP (transportes de red).
+        path (str): Ruta del repositorio (remotos locales).
+    """
+    transport: str
+    host: str = None
+    port: int = None
+    path: str = None
+
+    def __str__(self):
+        if self.transport == TRANSPORT_LOCAL:
+            return self.path
+        if self.host:
+            return f"{self.host}:{self.port}"
+        return self.transport
+
+
+def parse_remote_url(url, repo_dir="."):
+    """Interpreta la URL de un remoto de Git y devuelve su Endpoint."""
+    url = url.strip()
+    ayudante = _RE_AYUDANTE.match(url)
+    esquema = _RE_ESQUEMA.match(url)
+    if ayudante and not esquema:
+        return Endpoint(TRANSPORT_UNKNOWN)
+    if esquema:
+        nombre = esquema.group(1).lower()
+        partes = urlsplit(url)
+        if nombre == "file":
+            return Endpoint(TRANSPORT_LOCAL, path=unquote(partes.path))
+        if nombre not in _TRANSPORTES or not partes.hostname:
+            return Endpoint(TRANSPORT_UNKNOWN)
+        try:
+            puerto = partes.port
+        except ValueError:
+            puerto = None
+        return Endpoint(_TRANSPORTES[nombre], partes.hostname, puerto or _PUERTOS[nombre])
+    scp = _RE_SCP.match(url)
+    # Una sola letra antes de ':' es una unidad de Windows (C:\repos\x), no un host
+    if scp and len(scp.group(1)) > 1:
+        return Endpoint(TRANSPORT_SSH, scp.group(1).strip("[]"), 22)
+    return Endpoint(TRANSPORT_LOCAL, path=os.path.normpath(os.path.join(repo_dir, url)))
+
+
+def _git(args, repo_dir):
+    """Ejecuta una consulta de Git y devuelve su stdout, o None si falla."""
+    try:
+        resultado = subprocess.run(["git"] + args, cwd=repo_dir, stdin=subprocess.DEVNULL,
+                                   stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                   text=True, timeout=_TIMEOUT_CONSULTA_SEGUNDOS)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    return resultado.stdout.strip() if resultado.returncode == 0 else None
+
+
+def resolve_push_remote(repo_dir=".", remote=None):
+    """
+    Devuelve (nombre del remoto, URL de push) al que iría `git push` desde la
+    rama actual, o (nombre, None) si el remoto no existe.
+    """
+    if remote is None:
+        rama = _git(["symbolic-ref", "--short", "-q", "HEAD"], repo_dir)
+        claves = ["remote.pushDefault"]
+        if rama:
+            claves = [f"branch.{rama}.pushRemote", "remote.pushDefault", f"branch.{rama}.remote"]
+        for clave in claves:
+            remote = _git(["config", "--get", clave], repo_dir)
+            if remote:
+                break
+        remote = remote or "origin"
+    return remote, _git(["remote", "get-url", "--push", remote], repo_dir)
+
+
+class ReachabilityProbe:
+    """
+    Sondea la alcanzabilidad de los remotos con cachés de resultados y DNS.
+    Una instancia puede compartirse entre hilos y repositorios.
+    """
+
+    def __init__(self, ttl_ok=TTL_ALCANZABLE_SEGUNDOS, ttl_fail=TTL_INALCANZABLE_SEGUNDOS,
+                 ttl_dns=TTL_DNS_SEGUNDOS):
+        self.ttl_ok = ttl_ok
+        self.ttl_fail = ttl_fail
+        self.ttl_dns = ttl_dns
+        self._lock = threading.Lock()
+        self._resultados = {}  # Endpoint -> (caducidad, alcanzable, detalle)
+        self._dns = {}  # (host, puerto) -> (caducidad, direcciones)
+        self._ssh = {}  # (host, puerto) de la URL -> (caducidad, (host, puerto) efectivos)
+        self._remotos = {}  # (repositorio, remoto pedido) -> (caducidad, nombre, URL)
+
+    def _cache(self, cache, clave):
+        with self._lock:
+            entrada = cache.get(clave)
+            if entrada and entrada[0] > time.monotonic():
+                return entrada[1:]
+            cache.pop(clave, None)
+            return None
+
+    def _guardar(self, cache, clave, ttl, *valor):
+        with self._lock:
+            cache[clave] = (time.monotonic() + ttl,) + valor
+
+    def _destino_ssh(self, host, puerto):
+        """
+        Host y puerto efectivos según ~/.ssh/config (alias, Port, HostName).
+        Un puerto explícito en la URL (distinto de 22) tiene prioridad.
+        """
+        en_cache = self._cache(self._ssh, (host, puerto))
+        if en_cache:
+            return en_cache[0]
+        destino = (host, puerto)
+        try:
+            salida = subprocess.run(["ssh", "-G", host], stdin=subprocess.DEVNULL,
+                                    stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+                                    timeout=_TIMEOUT_CONSULTA_SEGUNDOS)
+            opciones = dict(linea.split(" ", 1) for linea in salida.stdout.splitlines() if " " in linea)
+            if salida.returncode == 0 and opciones.get("hostname"):
+                puerto_efectivo = puerto
+                if puerto == _PUERTOS["ssh"]:
+                    puerto_efectivo = int(opciones.get("port", puerto))
+                destino = (opciones["hostname"], puerto_efectivo)
+        except (OSError, ValueError, subprocess.TimeoutExpired):
+            pass  # Sin cliente ssh: se usa el host tal cual
+        self._guardar(self._ssh, (host, puerto), self.ttl_dns, destino)
+        return destino
+
+    def _direcciones(self, host, puerto):
+        en_cache = self._cache(self._dns, (host, puerto))
+        if en_cache:
+            return en_cache[0]
+        direcciones = socket.getaddrinfo(host, puerto, type=socket.SOCK_STREAM)
+        self._guardar(self._dns, (host, puerto), self.ttl_dns, direcciones)
+        return direcciones
+
+    def _sondear_tcp(self, host, puerto, timeout):
+        try:
+            direcciones = self._direcciones(host, puerto)
+        except socket.gaierror as e:
+            return False, f"no se pudo resolver {host}: {e}"
+        ultimo_error = None
+        for familia, tipo, protocolo, _, direccion in direcciones:
+            try:
+                with socket.socket(familia, tipo, protocolo) as conexion:
+                    conexion.settimeout(timeout)
+                    conexion.connect(direccion)
+                return True, f"{host}:{puerto}"
+            except OSError as e:
+                ultimo_error = e
+        with self._lock:
+            self._dns.pop((host, puerto), None)  # Quizá cambió la IP del servidor
+        if isinstance(ultimo_error, socket.timeout):
+            return False, f"{host}:{puerto}: timeout"
+        return False, f"{host}:{puerto}: {ultimo_error}"
+
+    def probe(self, endpoint, timeout=5):
+        """
+        Comprueba `endpoint` (usando la caché si el resultado no caducó).
+
+        Returns:
+            tuple: (alcanzable, detalle, en_cache).
+        """
+        en_cache = self._cache(self._resultados, endpoint)
+        if en_cache:
+            return en_cache[0], en_cache[1], True
+        if endpoint.transport == TRANSPORT_LOCAL:
+            alcanzable = os.path.isdir(endpoint.path)
+            detalle = endpoint.path if alcanzable else f"{endpoint.path} no existe"
+        elif endpoint.transport == TRANSPORT_UNKNOWN:
+            alcanzable, detalle = True, "transporte no sondeable"
+        else:
+            host, puerto = endpoint.host, endpoint.port
+            if endpoint.transport == TRANSPORT_SSH:
+                host, puerto = self._destino_ssh(host, puerto)
+            alcanzable, detalle = self._sondear_tcp(host, puerto, timeout)
+        self._guardar(self._resultados, endpoint, self.ttl_ok if alcanzable else self.ttl_fail,
+                      alcanzable, detalle)
+        return alcanzable, detalle, False
+
+    def check(self, repo_dir=".", log_fn=None, timeout=5, remote=None):
+        """
+        Comprueba si el remoto de push de `repo_dir` es alcanzable.
+
+        Args:
+            repo_dir (str): Repositorio cuyo remoto se comprueba.
+            log_fn (function, optional): Función para loguear mensajes (mensaje, nivel).
+            timeout (float): Segundos máximos de la conexión de prueba.
+            remote (str, optional): Remoto concreto; por defecto el de push de la rama actual.
+
+        Returns:
+            bool: True si el remoto es alcanzable (o no se puede sondear).
+        """
+        clave = (os.path.abspath(repo_dir), remote)
+        en_cache = self._cache(self._remotos, clave)
+        if en_cache:
+            nombre, url = en_cache
+        else:
+            nombre, url = resolve_push_remote(repo_dir, remote)
+            self._guardar(self._remotos, clave, self.ttl_ok, nombre, url)
+        if url is None:
+            if log_fn:
+                log_fn(f"No hay un remoto '{nombre}' configurado; el push indicará el error.", "WARNING")
+            return True
+        endpoint = parse_remote_url(url, repo_dir)
+        alcanzable, detalle, en_cache = self.probe(endpoint, timeout)
+        if log_fn:
+            origen = " (resultado en caché)" if en_cache else ""
+            if alcanzable:
+                log_fn(f"Remoto '{nombre}' alcanzable ({detalle}){origen}.", "INFO")
+            else:
+                log_fn(f"No se pudo conectar con el remoto '{nombre}': {detalle}{origen}", "ERROR")
+        return alcanzable
+
+
+# Instancia compartida: la caché sirve a todos los reintentos y repositorios del proceso
+default_probe = ReachabilityProbe()
+
+
+def check_remote(repo_dir=".", log_fn=None, timeout=5, remote=None):
+    """Comprueba el remoto de push de `repo_dir` con la caché compartida del proceso."""
+    return default_probe.check(repo_dir, log_fn, timeout, remote)
@@ -0,0 +1,334 @@
+"""
+Restauración de archivos desde cualquier backup.
+
+Los backups se localizan por el mensaje de su commit ("Backup #N - fecha" en
+backupGit.py, "backup N - fecha" en github_backup.py), tanto en las ramas como
+en refs/backups/* (motor fast-import). Para restaurar, `git ls-tree` lista
+las entradas de las rutas pedidas y un único proceso `git cat-file --batch`
+persistente entrega el contenido de todos los blobs, que se copia al disco por
+bloques sin cargar cada archivo entero en memoria. Restaurar miles de archivos
+lanza así dos procesos de Git en lugar de uno por archivo.
+
+Cada archivo se escribe en un temporal junto al destino y se renombra encima,
+de modo que una restauración interrumpida no deja archivos a medias. Los
+archivos guardados en el almacén de fragmentos (chunkstore.py) se reconstruyen
+a partir de su manifiesto en lugar de restaurar el manifiesto.
+"""
+
+import atexit  # Para cerrar los procesos cat-file al salir
+import json  # Para leer los manifiestos de archivos fragmentados
+import os  # Para escribir los archivos restaurados
+import re  # Para reconocer los mensajes de los commits de backup
+import subprocess  # Para lanzar git log, git ls-tree y git cat-file
+import tempfile  # Temporales junto al destino de cada archivo
+import threading  # Para serializar el acceso al proceso compartido
+from dataclasses import dataclass  # Para describir cada backup
+
+from backup_tools import chunkstore  # Archivos grandes guardados como fragmentos
+from backup_tools.snapshot import REF_PREFIX, TAMANO_BLOQUE  # Refs y tamaño de copia de los snapshots
+
+# "Backup #12 - 2024-05-01 10:00:00" (backupGit.py) o "backup 12 - ..." (github_backup.py)
+_RE_ASUNTO_BACKUP = re.compile(r"^[Bb]ackup #?(\d+) - ")
+# Patrón equivalente para `git log --grep` (ERE)
+_GREP_ASUNTO_BACKUP = "^[Bb]ackup #?[0-9]+ - "
+
+MODO_ENLACE = "120000"
+MODO_SUBMODULO = "160000"
+MODO_EJECUTABLE = "100755"
+
+
+class RestoreError(Exception):
+    """Error al listar o restaurar un backup."""
+
+
+@dataclass
+class BackupCommit:
+    """
+    Commit de backup encontrado en el historial.
+
+    Attributes:
+        number (int): Número del backup según el mensaje.
+        sha (str): SHA del commit.
+        timestamp (int): Fecha del commit (segundos desde la época).
+        subject (str): Mensaje del commit.
+        ref (str): Referencia desde la que se encontró (rama o refs/backups/...).
+    """
+    number: int
+    sha: str
+    timestamp: int
+    subject: str
+    ref: str
+
+
+def _git(repo_dir, args):
+    # Las rutas pedidas son literales: "*" o ":" no son comodines ni magia de pathspec
+    entorno = dict(os.environ, GIT_LITERAL_PATHSPECS="1")
+    resultado = subprocess.run(["git"] + args, cwd=repo_dir, stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE, env=entorno, check=False)
+    if resultado.returncode != 0:
+        raise RestoreError(f"git {args[0]} falló: {resultado.stderr.decode('utf-8', 'replace').strip()}")
+    return resultado.stdout
+
+
+def list_backups(repo_dir=".", limite=None):
+    """
+    Lista los commits de backup de las ramas y de refs/backups/*, del más
+    reciente al más antiguo.
+
+    Returns:
+        list: BackupCommit por cada commit de backup.
+    """
+    args = ["log", "--branches", f"--glob={REF_PREFIX}*", "--source", "-E",
+            f"--grep={_GREP_ASUNTO_BACKUP}", "--format=%H%x1f%ct%x1f%S%x1f%s"]
+    if limite:
+        args.append(f"--max-count={limite}")
+    backups = []
+    for linea in _git(repo_dir, args).decode("utf-8", "replace").splitlines():
+        partes = linea.split("\x1f", 3)
+        if len(partes) != 4:
+            continue
+        sha, fecha, ref, asunto = partes
+        coincidencia = _RE_ASUNTO_BACKUP.match(asunto)
+        if coincidencia:
+            backups.append(BackupCommit(int(coincidencia.group(1)), sha, int(fecha), asunto, ref))
+    return backups
+
+
+def resolve_backup(repo_dir, identificador):
+    """
+    Devuelve el SHA del backup `identificador`: un número de backup (el commit
+    más reciente con ese número) o cualquier expresión de commit de Git.
+    """
+    identificador = str(identificador).lstrip("#")
+    if identificador.isdigit():
+        for backup in list_backups(repo_dir):
+            if backup.number == int(identificador):
+                return backup.sha
+    try:
+        return _git(repo_dir, ["rev-parse", "--verify", "--quiet", f"{identificador}^{{commit}}"]).decode().strip()
+    except RestoreError:
+        raise RestoreError(f"No se encontró el backup '{identificador}'.") from None
+
+
+def list_files(repo_dir, commit, rutas=None):
+    """
+    Lista los archivos del backup `commit`, opcionalmente limitados a `rutas`
+    (archivos o directorios relativos a la raíz del repositorio).
+
+    Returns:
+        list: Tuplas (modo, sha, ruta).
+    """
+    args = ["ls-tree", "-r", "-z", "--full-tree", commit]
+    if rutas:
+        args += ["--"] + [ruta.replace(os.sep, "/").strip("/") or "." for ruta in rutas]
+    entradas = []
+    for entrada in _git(repo_dir, args).decode("utf-8", "surrogateescape").split("\0"):
+        if not entrada:
+            continue
+        cabecera, ruta = entrada.split("\t", 1)
+        modo, _, sha = cabecera.split(" ")
+        entradas.append((modo, sha, ruta))
+    return entradas
+
+
+class CatFileReader:
+    """
+    Mantiene un proceso `git cat-file --batch` abierto para un repositorio y
+    entrega el contenido de los objetos que se le piden.
+    """
+
+    def __init__(self, repo_dir):
+        self.repo_dir = os.path.abspath(repo_dir)
+        self._lock = threading.Lock()
+        self._proceso = None
+
+    def _iniciar_proceso(self):
+        if self._proceso is not None and self._proceso.poll() is None:
+            return
+        self._proceso = subprocess.Popen(
+            ["git", "cat-file", "--batch"], cwd=self.repo_dir,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+    def _pedir(self, objeto):
+        """Pide `objeto` y devuelve su tamaño; el contenido queda en stdout."""
+        self._iniciar_proceso()
+        try:
+            self._proceso.stdin.write(f"{objeto}\n".encode("utf-8"))
+            self._proceso.stdin.flush()
+            cabecera = self._proceso.stdout.readline().decode("utf-8", "replace").split()
+        except (BrokenPipeError, OSError) as e:
+            self._detener()
+            raise RestoreError(f"git cat-file terminó inesperadamente ({e})") from e
+        if len(cabecera) != 3:
+            if not cabecera:
+                self._detener()
+                raise RestoreError("git cat-file terminó inesperadamente")
+            raise RestoreError(f"El objeto {objeto} no existe en el repositorio.")
+        return int(cabecera[2])
+
+    def copy_to(self, objeto, destino):
+        """
+        Escribe el contenido de `objeto` en el archivo binario `destino` por
+        bloques y devuelve su tamaño.
+        """
+        with self._lock:
+            tamano = restante = self._pedir(objeto)
+            salida = self._proceso.stdout
+            try:
+                while restante:
+                    bloque = salida.read(min(TAMANO_BLOQUE, restante))
+                    if not bloque:
+                        raise RestoreError("git cat-file terminó a mitad de un objeto")
+                    destino.write(bloque)
+                    restante -= len(bloque)
+                salida.read(1)  # Salto de línea que cierra cada objeto
+            except BaseException:
+                # El flujo quedó a medias: el siguiente objeto necesita un proceso nuevo
+                self._detener()
+                raise
+            return tamano
+
+    def read(self, objeto):
+        """Devuelve el contenido completo de `objeto` (para objetos pequeños)."""
+        with self._lock:
+            tamano = self._pedir(objeto)
+            contenido = self._proceso.stdout.read(tamano)
+            self._proceso.stdout.read(1)
+            return contenido
+
+    def _detener(self):
+        if self._proceso is None:
+            return
+        try:
+            self._proceso.stdin.close()
+            self._proceso.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            self._proceso.kill()
+            self._proceso.wait()
+        self._proceso = None
+
+    def close(self):
+        """Termina el proceso cat-file."""
+        with self._lock:
+            self._detener()
+
+
+# --- Registro de lectores por repositorio (uno por proceso de Python) ---
+_lectores = {}
+_registro_lock = threading.Lock()
+
+
+def get_reader(repo_dir):
+    """Devuelve el CatFileReader compartido de `repo_dir`."""
+    clave = os.path.abspath(repo_dir)
+    with _registro_lock:
+        if clave not in _lectores:
+            _lectores[clave] = CatFileReader(clave)
+        return _lectores[clave]
+
+
+@atexit.register
+def close_all():
+    """Cierra todos los procesos cat-file abiertos."""
+    with _registro_lock:
+        for lector in _lectores.values():
+            lector.close()
+        _lectores.clear()
+
+
+def _ruta_destino(destino, ruta):
+    """Ruta absoluta de `ruta` dentro de `destino`; rechaza rutas que escapen de él."""
+    raiz = os.path.realpath(destino)
+    completa = os.path.realpath(os.path.join(raiz, os.path.dirname(ruta)))
+    if completa != raiz and not completa.startswith(raiz + os.sep):
+        raise RestoreError(f"La ruta '{ruta}' sale del directorio de destino.")
+    return os.path.join(completa, os.path.basename(ruta))
+
+
+def _escribir_temporal(ruta_final, modo, escribir):
+    """Escribe `ruta_final` mediante un temporal junto a ella; devuelve lo que devuelva `escribir`."""
+    descriptor, temporal = tempfile.mkstemp(prefix=".restore-", dir=os.path.dirname(ruta_final))
+    try:
+        with os.fdopen(descriptor, "wb") as f:
+            tamano = escribir(f)
+        os.chmod(temporal, 0o755 if modo == MODO_EJECUTABLE else 0o644)
+        os.replace(temporal, ruta_final)
+    except BaseException:
+        try:
+            os.remove(temporal)
+        except OSError:
+            pass
+        raise
+    return tamano
+
+
+def _restaurar_fragmentado(lector, repo_dir, sha, ruta_final, chunk_target):
+    """Reconstruye un archivo fragmentado a partir del manifiesto `sha`."""
+    try:
+        manifiesto = json.loads(lector.read(sha))
+    except ValueError as e:
+        raise RestoreError(f"Manifiesto de fragmentos ilegible: {e}") from e
+    os.makedirs(os.path.dirname(ruta_final), exist_ok=True)
+    try:
+        return _escribir_temporal(
+            ruta_final, manifiesto.get("mode"),
+            lambda f: chunkstore.reassemble(manifiesto, f, repo_dir, chunk_target))
+    except chunkstore.ChunkStoreError as e:
+        raise RestoreError(str(e)) from e
+
+
+def _restaurar_entrada(lector, modo, sha, ruta_final):
+    os.makedirs(os.path.dirname(ruta_final), exist_ok=True)
+    if modo == MODO_ENLACE:
+        enlace = os.fsdecode(lector.read(sha))
+        if os.path.lexists(ruta_final) and not os.path.isdir(ruta_final):
+            os.remove(ruta_final)
+        os.symlink(enlace, ruta_final)
+        return 0
+    return _escribir_temporal(ruta_final, modo, lambda f: lector.copy_to(sha, f))
+
+
+def restore(repo_dir, backup, rutas, destino=None, log_fn=None, chunk_target=None):
+    """
+    Restaura `rutas` (archivos o directorios) del backup `backup` (número o
+    commit) en `destino` (por defecto, el propio árbol de trabajo). Los
+    fragmentos que falten en el almacén local se leen de `chunk_target`.
+
+    Returns:
+        tuple: (archivos restaurados, bytes escritos, lista de (ruta, error)).
+
+    Raises:
+        RestoreError: Si el backup no existe o ninguna ruta coincide.
+    """
+    commit = resolve_backup(repo_dir, backup)
+    destino = destino or repo_dir
+    entradas = list_files(repo_dir, commit, list(rutas) + chunkstore.manifest_pathspecs(rutas))
+    # Los manifiestos al final: su archivo reconstruido prevalece sobre una versión antigua en Git
+    entradas.sort(key=lambda entrada: chunkstore.original_path(entrada[2]) is not None)
+    if not entradas:
+        raise RestoreError(f"Ninguna de las rutas {', '.join(rutas)} existe en el backup {backup}.")
+    if log_fn:
+        log_fn(f"Restaurando {len(entradas)} archivo(s) del commit {commit[:12]} en '{destino}'...", "INFO")
+    lector = get_reader(repo_dir)
+    restaurados, total_bytes, errores = 0, 0, []
+    for modo, sha, ruta in entradas:
+        if modo == MODO_SUBMODULO:
+            if log_fn:
+                log_fn(f"Se omite el submódulo '{ruta}'.", "WARNING")
+            continue
+        original = chunkstore.original_path(ruta)
+        try:
+            if original is not None:
+                total_bytes += _restaurar_fragmentado(
+                    lector, repo_dir, sha, _ruta_destino(destino, original), chunk_target)
+            else:
+                total_bytes += _restaurar_entrada(lector, modo, sha, _ruta_destino(destino, ruta))
+            restaurados += 1
+        except (OSError, RestoreError) as e:
+            errores.append((ruta, str(e)))
+            if log_fn:
+                log_fn(f"No se pudo restaurar '{ruta}': {e}", "ERROR")
+    if log_fn:
+        log_fn(f"Restaurados {restaurados} archivo(s) ({total_bytes} bytes); {len(errores)} error(es).",
+               "INFO" if not errores else "WARNING")
+    return restaurados, total_bytes, errores
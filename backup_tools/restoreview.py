@@ -0,0 +1,162 @@
+"""
+Panel de la GUI para explorar los backups y restaurar archivos.
+
+Muestra los backups encontrados por backup_tools.restore, los archivos del
+backup seleccionado (con un filtro por texto) y restaura la selección, o la
+ruta escrita en el filtro si no hay selección, en el directorio elegido. Git
+se ejecuta siempre en un hilo aparte; los widgets solo se tocan desde el hilo
+principal mediante `after`.
+
+Como logview.py, el módulo no importa Tkinter: recibe los módulos `tk` y
+`messagebox` que la aplicación ya cargó.
+"""
+
+import datetime  # Para mostrar la fecha de cada backup
+import threading  # Para no bloquear la GUI mientras trabaja Git
+
+from backup_tools import restore  # Listado y restauración de backups
+
+# Archivos que se muestran como máximo en la lista (el filtro acota el resto)
+MAX_ARCHIVOS_MOSTRADOS = 5000
+
+
+class RestorePanel:
+    """Ventana de restauración asociada a la ventana principal `raiz`."""
+
+    def __init__(self, tk, messagebox, raiz, repo_dir, log_fn, chunk_target=None):
+        self.tk = tk
+        self.messagebox = messagebox
+        self.raiz = raiz
+        self.repo_dir = repo_dir
+        self.log_fn = log_fn
+        self.chunk_target = chunk_target  # Origen de los fragmentos que falten en local
+        self.backups = []
+        self.archivos = []
+        self.commit = None
+
+        self.ventana = tk.Toplevel(raiz)
+        self.ventana.title("Restaurar desde un backup")
+        self.ventana.geometry("800x500")
+
+        paneles = tk.PanedWindow(self.ventana, orient=tk.HORIZONTAL)
+        paneles.pack(fill=tk.BOTH, expand=True, padx=10, pady=(10, 5))
+
+        marco_backups = tk.Frame(paneles)
+        tk.Label(marco_backups, text="Backups:", anchor="w").pack(fill=tk.X)
+        self.lista_backups = tk.Listbox(marco_backups, exportselection=False, width=40)
+        self.lista_backups.pack(fill=tk.BOTH, expand=True)
+        self.lista_backups.bind("<<ListboxSelect>>", self._al_elegir_backup)
+        paneles.add(marco_backups)
+
+        marco_archivos = tk.Frame(paneles)
+        tk.Label(marco_archivos, text="Archivos (filtro o ruta a restaurar):", anchor="w").pack(fill=tk.X)
+        self.filtro = tk.StringVar()
+        entrada_filtro = tk.Entry(marco_archivos, textvariable=self.filtro)
+        entrada_filtro.pack(fill=tk.X)
+        entrada_filtro.bind("<KeyRelease>", lambda _evento: self._mostrar_archivos())
+        self.lista_archivos = tk.Listbox(marco_archivos, selectmode=tk.EXTENDED, exportselection=False)
+        self.lista_archivos.pack(fill=tk.BOTH, expand=True)
+        self.etiqueta_archivos = tk.Label(marco_archivos, anchor="w")
+        self.etiqueta_archivos.pack(fill=tk.X)
+        paneles.add(marco_archivos)
+
+        marco_destino = tk.Frame(self.ventana)
+        marco_destino.pack(fill=tk.X, padx=10, pady=(0, 10))
+        tk.Label(marco_destino, text="Destino:").pack(side=tk.LEFT)
+        self.destino = tk.StringVar(value=repo_dir)
+        tk.Entry(marco_destino, textvariable=self.destino).pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        self.boton_restaurar = tk.Button(marco_destino, text="Restaurar", command=self._restaurar,
+                                         state=tk.DISABLED)
+        self.boton_restaurar.pack(side=tk.RIGHT)
+
+        self._en_segundo_plano(lambda: restore.list_backups(self.repo_dir), self._mostrar_backups)
+
+    def _en_segundo_plano(self, tarea, al_terminar):
+        """Ejecuta `tarea` en un hilo y entrega su resultado a `al_terminar` en el hilo de Tk."""
+        def trabajador():
+            try:
+                resultado = tarea()
+            except restore.RestoreError as e:
+                mensaje = str(e)
+                self.log_fn(mensaje, "ERROR")
+                self.raiz.after(0, lambda: self._si_abierta(self._mostrar_error, mensaje))
+                return
+            self.raiz.after(0, lambda: self._si_abierta(al_terminar, resultado))
+        threading.Thread(target=trabajador, daemon=True).start()
+
+    def _si_abierta(self, funcion, resultado):
+        if self.ventana.winfo_exists():
+            funcion(resultado)
+
+    def _mostrar_error(self, mensaje):
+        if self.commit is not None:
+            self.boton_restaurar.config(state=self.tk.NORMAL)
+        self.messagebox.showerror("Restaurar", mensaje, parent=self.ventana)
+
+    def _mostrar_backups(self, backups):
+        self.backups = backups
+        self.lista_backups.delete(0, self.tk.END)
+        for backup in backups:
+            fecha = datetime.datetime.fromtimestamp(backup.timestamp).strftime("%Y-%m-%d %H:%M")
+            self.lista_backups.insert(self.tk.END, f"#{backup.number}  {fecha}  {backup.ref}")
+        if not backups:
+            self.lista_backups.insert(self.tk.END, "(no hay backups)")
+
+    def _al_elegir_backup(self, _evento):
+        seleccion = self.lista_backups.curselection()
+        if not seleccion or seleccion[0] >= len(self.backups):
+            return
+        commit = self.backups[seleccion[0]].sha
+        self.etiqueta_archivos.config(text="Cargando archivos...")
+        self._en_segundo_plano(
+            lambda: (commit, [ruta for _, _, ruta in restore.list_files(self.repo_dir, commit)]),
+            self._cargar_archivos)
+
+    def _cargar_archivos(self, resultado):
+        self.commit, self.archivos = resultado
+        self.boton_restaurar.config(state=self.tk.NORMAL)
+        self._mostrar_archivos()
+
+    def _mostrar_archivos(self):
+        texto = self.filtro.get().strip()
+        coincidencias = [ruta for ruta in self.archivos if texto in ruta]
+        self.lista_archivos.delete(0, self.tk.END)
+        for ruta in coincidencias[:MAX_ARCHIVOS_MOSTRADOS]:
+            self.lista_archivos.insert(self.tk.END, ruta)
+        resumen = f"{len(coincidencias)} de {len(self.archivos)} archivo(s)"
+        if len(coincidencias) > MAX_ARCHIVOS_MOSTRADOS:
+            resumen += f"; se muestran {MAX_ARCHIVOS_MOSTRADOS}, acote con el filtro"
+        self.etiqueta_archivos.config(text=resumen)
+
+    def _restaurar(self):
+        if self.commit is None:
+            return
+        rutas = [self.lista_archivos.get(i) for i in self.lista_archivos.curselection()]
+        if not rutas and self.filtro.get().strip():
+            rutas = [self.filtro.get().strip()]  # Archivo o directorio escrito a mano
+        if not rutas:
+            self.messagebox.showwarning("Restaurar", "Seleccione archivos o escriba una ruta.",
+                                        parent=self.ventana)
+            return
+        destino = self.destino.get().strip() or self.repo_dir
+        if not self.messagebox.askyesno(
+                "Restaurar", f"¿Restaurar {len(rutas)} ruta(s) en '{destino}'? "
+                             "Los archivos existentes se sobrescribirán.", parent=self.ventana):
+            return
+        self.boton_restaurar.config(state=self.tk.DISABLED)
+        commit = self.commit
+        self._en_segundo_plano(
+            lambda: restore.restore(self.repo_dir, commit, rutas, destino, self.log_fn, self.chunk_target),
+            self._restauracion_terminada)
+
+    def _restauracion_terminada(self, resultado):
+        restaurados, total_bytes, errores = resultado
+        self.boton_restaurar.config(state=self.tk.NORMAL)
+        if errores:
+            self.messagebox.showwarning(
+                "Restaurar", f"Restaurados {restaurados} archivo(s); {len(errores)} no se pudieron "
+                             "restaurar (ver el log).", parent=self.ventana)
+        else:
+            self.messagebox.showinfo(
+                "Restaurar", f"Restaurados {restaurados} archivo(s) ({total_bytes} bytes).",
+                parent=self.ventana)
@@ -0,0 +1,185 @@
+"""
+Política de reintentos de los backups.
+
+Antes, cualquier fallo (aunque solo fallara el push) repetía el intento
+completo tras una espera fija: verificación de conexión, status, add y
+commit. Aquí se conserva el progreso entre intentos para reanudar desde la
+fase que falló (p. ej. reintentar solo el push de un commit ya creado), las
+esperas crecen exponencialmente con un componente aleatorio (jitter) para no
+sincronizar reintentos, y la salida de error de Git se clasifica en
+recuperable (red, bloqueos) o definitiva (autenticación, non-fast-forward),
+de modo que un error definitivo no se reintenta.
+"""
+
+import random  # Para el jitter de las esperas
+from dataclasses import dataclass, field  # Para la política y el progreso
+
+from backup_tools.metrics import BackupMetrics  # Tiempos por paso del backup
+
+# --- Clasificación de errores ---
+RETRYABLE = "retryable"
+FATAL = "fatal"
+UNKNOWN = "unknown"  # Sin patrón conocido: se reintenta por prudencia
+
+# Fragmentos (en minúsculas) de la salida de error que indican un fallo que
+# no se resolverá reintentando. Se revisan antes que los recuperables.
+_PATRONES_DEFINITIVOS = (
+    "authentication failed",
+    "invalid username or password",
+    "could not read username",
+    "could not read password",
+    "permission denied",
+    "the requested url returned error: 401",
+    "the requested url returned error: 403",
+    "repository not found",
+    "does not appear to be a git repository",
+    "non-fast-forward",
+    "fetch first",
+    "[rejected]",
+    "[remote rejected]",
+    "protected branch",
+    "hook declined",
+    "please tell me who you are",
+    "no configured push destination",
+    "has no upstream branch",
+    "no such remote",
+)
+
+# Fragmentos que indican un fallo transitorio (red, servidor, bloqueos locales)
+_PATRONES_RECUPERABLES = (
+    "could not resolve host",
+    "temporary failure in name resolution",
+    "connection timed out",
+    "operation timed out",
+    "connection refused",
+    "connection reset",
+    "network is unreachable",
+    "the remote end hung up",
+    "early eof",
+    "rpc failed",
+    "unexpected disconnect",
+    "ssl",
+    "gnutls",
+    "returned error: 429",
+    "returned error: 500",
+    "returned error: 502",
+    "returned error: 503",
+    "returned error: 504",
+    "index.lock",
+    "cannot lock ref",
+    "unable to create",
+    "another git process",
+)
+
+
+def classify_error(stderr):
+    """
+    Clasifica la salida de error de un comando Git.
+
+    Returns:
+        str: FATAL si reintentar no servirá de nada, RETRYABLE si es un fallo
+        transitorio conocido y UNKNOWN en otro caso.
+    """
+    texto = (stderr or "").lower()
+    if any(patron in texto for patron in _PATRONES_DEFINITIVOS):
+        return FATAL
+    if any(patron in texto for patron in _PATRONES_RECUPERABLES):
+        return RETRYABLE
+    return UNKNOWN
+
+
+@dataclass
+class RetryPolicy:
+    """
+    Esperas exponenciales con jitter entre intentos.
+
+    Attributes:
+        base_delay (float): Espera tras el primer fallo.
+        max_delay (float): Tope de la espera.
+        factor (float): Multiplicador de la espera en cada fallo.
+        jitter (float): Fracción de la espera que se elige al azar (0 a 1).
+    """
+    base_delay: float = 10
+    max_delay: float = 300
+    factor: float = 2.0
+    jitter: float = 0.5
+
+    def delay(self, intento):
+        """Segundos que se espera después del fallo número `intento` (desde 1)."""
+        espera = min(self.max_delay, self.base_delay * self.factor ** max(0, intento - 1))
+        return espera * (1 - self.jitter) + random.uniform(0, espera * self.jitter)
+
+
+# --- Fases de un backup que se pueden reanudar ---
+PHASE_START = "start"  # Nada hecho: verificar conexión, status, add, commit y push
+PHASE_PUSH = "push"  # El commit ya existe: solo falta subirlo
+
+
+@dataclass
+class AttemptProgress:
+    """
+    Progreso de un backup que se conserva entre sus intentos.
+
+    Attributes:
+        phase (str): Fase desde la que debe empezar el siguiente intento.
+        backup_number (int): Número reservado en el catálogo para el backup en
+            curso; los reintentos lo reutilizan.
+        push_args (list): Comando de push pendiente (fase PHASE_PUSH).
+        pushed_remotes (set): Destinos (principal o espejos) que ya recibieron
+            el commit; los reintentos no vuelven a subirlo a ellos.
+        error_class (str): Clasificación del último fallo, o None.
+        last_error (str): Salida de error del último fallo.
+        metrics (BackupMetrics): Tiempos por paso y datos subidos, sumados
+            entre todos los intentos del backup.
+        push_deadline (float): Instante (time.monotonic) en que vence el
+            plazo del push en curso, calculado con su tamaño (ver
+            throughput.py); amplía el timeout del intento. None fuera del push.
+    """
+    phase: str = PHASE_START
+    backup_number: int = None
+    push_args: list = field(default_factory=list)
+    pushed_remotes: set = field(default_factory=set)
+    error_class: str = None
+    last_error: str = ""
+    metrics: BackupMetrics = field(default_factory=BackupMetrics, repr=False)
+    push_deadline: float = None
+
+    @property
+    def fatal(self):
+        """True si el último fallo no se resolverá reintentando."""
+        return self.error_class == FATAL
+
+    def begin_attempt(self):
+        """Olvida la clasificación y el plazo del push del intento anterior."""
+        self.error_class = None
+        self.last_error = ""
+        self.push_deadline = None
+
+    def fail(self, estado, stderr="", clase=None):
+        """
+        Registra un fallo y devuelve `estado` para poder retornarlo directamente.
+        La clase se deduce de `stderr` salvo que se indique en `clase`.
+        """
+        self.last_error = stderr or ""
+        self.error_class = clase or classify_error(stderr)
+        return estado
+
+    def reserve(self, numero_backup):
+        """Guarda el número reservado en el catálogo para este backup."""
+        self.backup_number = numero_backup
+        self.metrics.backup_number = numero_backup
+
+    def commit_done(self, numero_backup, push_args):
+        """El commit se creó: los siguientes intentos solo repiten el push."""
+        self.phase = PHASE_PUSH
+        self.backup_number = numero_backup
+        self.metrics.backup_number = numero_backup
+        self.push_args = list(push_args)
+
+    def reset(self):
+        """Vuelve al inicio (backup subido o descartado)."""
+        self.phase = PHASE_START
+        self.backup_number = None
+        self.push_args = []
+        self.pushed_remotes = set()
+        self.begin_attempt()
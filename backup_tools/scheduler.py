@@ -0,0 +1,191 @@
+"""
+Programación de backups desatendidos.
+
+Ejecuta un trabajo de backup una sola vez, cada N segundos o siguiendo una
+expresión estilo cron de cinco campos (minuto, hora, día del mes, mes y día de
+la semana). No importa Tkinter, por lo que puede usarse en servidores sin
+entorno gráfico.
+"""
+
+import datetime  # Para calcular la próxima ejecución de una expresión cron
+import signal  # Para detener el programador limpiamente ante SIGTERM/SIGINT
+import threading  # Para esperar entre ejecuciones de forma interrumpible
+import time  # Para medir los intervalos entre ejecuciones
+
+# --- Códigos de salida (compatibles con systemd) ---
+EXIT_OK = 0  # Backup correcto, sin cambios, o demonio detenido por señal
+EXIT_BACKUP_FAILED = 1  # Se agotaron los reintentos sin completar el backup
+# EX_CONFIG de sysexits.h: configuración inválida (repositorio inexistente,
+# expresión cron mal formada...). Útil para RestartPreventExitStatus=78.
+EXIT_CONFIG_ERROR = 78
+
+# Estados finales que se consideran un backup correcto
+ESTADOS_EXITOSOS = ("SUCCESS", "NO_CHANGES", "NO_CHANGES_AFTER_ADD", "COMMITTED_OFFLINE")
+
+# Rangos válidos de cada campo cron: (mínimo, máximo)
+_RANGOS_CRON = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+
+def status_to_exit_code(status):
+    """
+    Traduce el estado final de un backup a un código de salida del proceso.
+    """
+    return EXIT_OK if status in ESTADOS_EXITOSOS else EXIT_BACKUP_FAILED
+
+
+def _parse_cron_field(campo, minimo, maximo):
+    """
+    Convierte un campo cron ("*", "5", "1-5", "*/15", "1,2,10-20/2") en el
+    conjunto de valores que representa.
+    """
+    valores = set()
+    for parte in campo.split(","):
+        paso = 1
+        if "/" in parte:
+            parte, paso_txt = parte.split("/", 1)
+            paso = int(paso_txt)
+            if paso <= 0:
+                raise ValueError(f"Paso inválido en el campo cron '{campo}'.")
+        if parte == "*":
+            inicio, fin = minimo, maximo
+        elif "-" in parte:
+            inicio_txt, fin_txt = parte.split("-", 1)
+            inicio, fin = int(inicio_txt), int(fin_txt)
+        else:
+            inicio = int(parte)
+            fin = maximo if paso > 1 else inicio
+        if inicio < minimo or fin > maximo or inicio > fin:
+            raise ValueError(
+                f"Valor fuera de rango en el campo cron '{campo}' ({minimo}-{maximo}).")
+        valores.update(range(inicio, fin + 1, paso))
+    return valores
+
+
+class CronExpression:
+    """
+    Expresión cron de cinco campos: minuto hora día-del-mes mes día-de-la-semana.
+
+    Sigue la semántica de Vixie cron: si tanto el día del mes como el día de la
+    semana están restringidos, basta con que coincida cualquiera de los dos. Un
+    campo que empieza por '*' (también '*/2') cuenta como no restringido, así
+    que "0 3 */2 * 1" exige un día impar que además sea lunes.
+    El domingo puede escribirse como 0 o como 7.
+    """
+
+    def __init__(self, expresion):
+        campos = expresion.split()
+        if len(campos) != 5:
+            raise ValueError(
+                f"La expresión cron '{expresion}' debe tener 5 campos.")
+        try:
+            conjuntos = [_parse_cron_field(campo, *rango)
+                         for campo, rango in zip(campos, _RANGOS_CRON)]
+        except ValueError as e:
+            raise ValueError(f"Expresión cron inválida '{expresion}': {e}")
+        self.expresion = expresion
+        self.minutos, self.horas, self.dias_mes, self.meses, dias_semana = conjuntos
+        # cron usa 0 = domingo; datetime.weekday() usa 0 = lunes
+        self.dias_semana = {(d - 1) % 7 for d in dias_semana}
+        self._dia_mes_libre = campos[2].startswith("*")
+        self._dia_semana_libre = campos[4].startswith("*")
+
+    def _coincide_dia(self, fecha):
+        coincide_mes = fecha.day in self.dias_mes
+        coincide_semana = fecha.weekday() in self.dias_semana
+        if self._dia_mes_libre or self._dia_semana_libre:
+            return coincide_mes and coincide_semana
+        return coincide_mes or coincide_semana
+
+    def next_after(self, momento):
+        """
+        Devuelve el primer minuto estrictamente posterior a `momento` que
+        satisface la expresión.
+        """
+        candidato = momento.replace(second=0, microsecond=0) + \
+            datetime.timedelta(minutes=1)
+        limite = candidato + datetime.timedelta(days=366 * 5)
+        while candidato < limite:
+            if candidato.month not in self.meses or not self._coincide_dia(candidato):
+                candidato = (candidato + datetime.timedelta(days=1)).replace(
+                    hour=0, minute=0)
+                continue
+            if candidato.hour not in self.horas:
+                candidato = (candidato + datetime.timedelta(hours=1)
+                             ).replace(minute=0)
+                continue
+            if candidato.minute not in self.minutos:
+                candidato += datetime.timedelta(minutes=1)
+                continue
+            return candidato
+        raise ValueError(
+            f"La expresión cron '{self.expresion}' nunca se cumple.")
+
+
+def install_stop_signals(evento_parada):
+    """
+    Hace que SIGTERM (systemd stop) y SIGINT (Ctrl+C) activen `evento_parada`
+    en lugar de abortar el proceso a mitad de un backup.
+    Solo tiene efecto si se llama desde el hilo principal.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return
+
+    def _manejador(signum, _frame):
+        evento_parada.set()
+
+    for nombre in ("SIGTERM", "SIGINT"):
+        if hasattr(signal, nombre):
+            signal.signal(getattr(signal, nombre), _manejador)
+
+
+def run_schedule(job, interval=None, cron=None, stop_event=None, log_fn=None):
+    """
+    Ejecuta `job` (que devuelve el estado final de un backup) según la
+    programación indicada.
+
+    Args:
+        job (function): Callable sin argumentos que devuelve un estado como "SUCCESS".
+        interval (float, optional): Segundos entre el inicio de dos ejecuciones.
+        cron (CronExpression, optional): Expresión cron que determina cuándo ejecutar.
+        stop_event (threading.Event, optional): Evento que detiene el programador.
+        log_fn (function, optional): Función para loguear mensajes.
+
+    Returns:
+        int: Código de salida. Sin programación se ejecuta una sola vez y se
+        devuelve el código correspondiente a su estado; con programación se
+        ejecuta hasta recibir la señal de parada y devuelve EXIT_OK.
+    """
+    stop_event = stop_event or threading.Event()
+
+    if interval is None and cron is None:
+        return status_to_exit_code(job())
+
+    while not stop_event.is_set():
+        inicio = time.monotonic()
+        if cron is None or _es_momento_cron(cron):
+            estado = job()
+            if log_fn:
+                log_fn(f"Ejecución programada finalizada con estado: {estado}", "INFO")
+
+        if interval is not None:
+            espera = max(0.0, interval - (time.monotonic() - inicio))
+        else:
+            ahora = datetime.datetime.now()
+            espera = (cron.next_after(ahora) - ahora).total_seconds()
+        if log_fn and not stop_event.is_set():
+            log_fn(f"Próximo backup programado en {espera:.0f} segundos.", "INFO")
+        stop_event.wait(espera)
+
+    if log_fn:
+        log_fn("Programador detenido por señal de parada.", "INFO")
+    return EXIT_OK
+
+
+def _es_momento_cron(cron):
+    """
+    Indica si el minuto actual satisface la expresión cron (al arrancar el
+    demonio no se ejecuta un backup fuera de horario).
+    """
+    ahora = datetime.datetime.now()
+    return cron.next_after(ahora - datetime.timedelta(minutes=1)) == \
+        ahora.replace(second=0, microsecond=0)
@@ -0,0 +1,427 @@
+"""
+Motor de snapshots basado en un proceso `git fast-import` persistente.
+
+En lugar de lanzar `git add .` y `git commit` en cada backup (que reescriben el
+índice del usuario y mueven su rama), se mantiene abierto un único proceso
+`git fast-import` al que se envían solo los archivos que `git status` reporta
+como distintos de HEAD. Cada backup es un commit en `refs/backups/<rama>` cuyo
+árbol es el de HEAD más los cambios del árbol de trabajo, con HEAD como primer
+padre y el backup anterior como segundo padre. El área de staging y la rama
+del usuario no se tocan, por lo que el backup puede hacerse en mitad de una
+edición.
+
+Antes de escribir un commit se calcula, en un índice temporal y sin guardar
+ningún blob, el árbol que tendría; si es el del backup anterior no se escribe
+nada. Así una ejecución nueva (cron, --headless) sobre un árbol de trabajo que
+no cambió tampoco crea un backup idéntico al último.
+"""
+
+import atexit  # Para cerrar los procesos fast-import al salir
+import hashlib  # SHA de los blobs sin escribirlos en el repositorio
+import os  # Para leer archivos del árbol de trabajo y referencias de Git
+import stat  # Para distinguir enlaces simbólicos y ejecutables
+import subprocess  # Para lanzar git fast-import y git var
+import tempfile  # Para capturar la salida de error de fast-import
+import threading  # Para serializar el acceso al proceso compartido
+import time  # Para la fecha del commit
+
+REF_PREFIX = "refs/backups/"
+TAMANO_BLOQUE = 1024 * 1024  # Bytes copiados por iteración al enviar un archivo
+
+
+class SnapshotError(Exception):
+    """Error al crear un snapshot con git fast-import."""
+
+
+def resolve_git_dir(repo_dir):
+    """
+    Devuelve (git_dir, common_dir) del repositorio, soportando worktrees en los
+    que `.git` es un archivo con la línea `gitdir: <ruta>`.
+    """
+    git_dir = os.path.join(repo_dir, ".git")
+    if os.path.isfile(git_dir):
+        with open(git_dir, "r", encoding="utf-8") as f:
+            contenido = f.read().strip()
+        if contenido.startswith("gitdir:"):
+            git_dir = os.path.normpath(os.path.join(repo_dir, contenido[len("gitdir:"):].strip()))
+    common_dir = git_dir
+    archivo_common = os.path.join(git_dir, "commondir")
+    if os.path.isfile(archivo_common):
+        with open(archivo_common, "r", encoding="utf-8") as f:
+            common_dir = os.path.normpath(os.path.join(git_dir, f.read().strip()))
+    return git_dir, common_dir
+
+
+def read_ref(common_dir, refname):
+    """
+    Lee el SHA de una referencia (archivo suelto o packed-refs) sin lanzar Git.
+    Devuelve None si la referencia no existe.
+    """
+    ruta = os.path.join(common_dir, *refname.split("/"))
+    try:
+        with open(ruta, "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+        pass
+    try:
+        with open(os.path.join(common_dir, "packed-refs"), "r", encoding="utf-8") as f:
+            for linea in f:
+                if linea.startswith(("#", "^")):
+                    continue
+                partes = linea.split()
+                if len(partes) == 2 and partes[1] == refname:
+                    return partes[0]
+    except FileNotFoundError:
+        pass
+    return None
+
+
+def read_head(repo_dir):
+    """
+    Devuelve (nombre de rama o None si HEAD está separado, SHA de HEAD o None
+    si la rama todavía no tiene commits).
+    """
+    git_dir, common_dir = resolve_git_dir(repo_dir)
+    with open(os.path.join(git_dir, "HEAD"), "r", encoding="utf-8") as f:
+        head = f.read().strip()
+    if head.startswith("ref:"):
+        ref = head[len("ref:"):].strip()
+        rama = ref[len("refs/heads/"):] if ref.startswith("refs/heads/") else ref
+        return rama, read_ref(common_dir, ref)
+    return None, head
+
+
+def parse_porcelain_z(salida):
+    """
+    Interpreta la salida de `git status --porcelain -z` y devuelve el conjunto
+    de rutas que difieren de HEAD (en renombrados, el origen y el destino).
+    """
+    rutas = set()
+    entradas = salida.split("\0")
+    i = 0
+    while i < len(entradas):
+        entrada = entradas[i]
+        i += 1
+        if len(entrada) < 4:
+            continue
+        estado, ruta = entrada[:2], entrada[3:]
+        rutas.add(ruta)
+        if "R" in estado or "C" in estado:
+            if i < len(entradas) and entradas[i]:
+                rutas.add(entradas[i])  # Ruta de origen del renombrado
+            i += 1
+    return rutas
+
+
+def _quote_path(ruta):
+    """Aplica el entrecomillado estilo C que exige fast-import a rutas especiales."""
+    if not (ruta.startswith('"') or "\n" in ruta):
+        return ruta
+    escapada = ruta.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return f'"{escapada}"'
+
+
+class FastImportSnapshotter:
+    """
+    Mantiene un proceso `git fast-import` abierto para un repositorio y crea
+    commits de backup en `refs/backups/<rama>` enviando solo los archivos cambiados.
+    """
+
+    def __init__(self, repo_dir):
+        self.repo_dir = os.path.abspath(repo_dir)
+        self._lock = threading.Lock()
+        self._proceso = None
+        self._stderr = None
+        self._marca = 0
+        self._identidad = None
+        self._ultima_huella = None  # Huella del último árbol respaldado
+        self._huella_comprobada = None  # Huella cuyo árbol ya se comparó (y era distinto)
+        self._formato = None  # Algoritmo de los objetos del repositorio (sha1, sha256)
+        self._tips = {}  # ref de backup -> SHA del último commit escrito
+
+    def _iniciar_proceso(self):
+        if self._proceso is not None and self._proceso.poll() is None:
+            return
+        if self._identidad is None:
+            identidad = subprocess.run(
+                ["git", "var", "GIT_COMMITTER_IDENT"], cwd=self.repo_dir,
+                capture_output=True, text=True, check=False)
+            if identidad.returncode != 0:
+                raise SnapshotError(f"No se pudo obtener la identidad del committer: {identidad.stderr.strip()}")
+            # "Nombre <correo> 1700000000 +0100" -> "Nombre <correo>"
+            self._identidad = identidad.stdout.strip().rsplit(" ", 2)[0]
+        self._stderr = tempfile.TemporaryFile()
+        self._proceso = subprocess.Popen(
+            ["git", "fast-import", "--quiet", "--done"],
+            cwd=self.repo_dir, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            stderr=self._stderr)
+        self._tips = {}
+
+    def _error_proceso(self, mensaje):
+        detalle = ""
+        if self._stderr is not None:
+            self._stderr.seek(0)
+            detalle = self._stderr.read().decode("utf-8", "replace").strip()
+        self._detener(forzar=True)
+        return SnapshotError(f"{mensaje}: {detalle}" if detalle else mensaje)
+
+    def _huella_ruta(self, ruta):
+        """Estado (fecha, tamaño, modo) de una ruta, o None si no existe."""
+        try:
+            info = os.lstat(os.path.join(self.repo_dir, ruta))
+        except FileNotFoundError:
+            return (ruta, None)
+        return (ruta, info.st_mtime_ns, info.st_size, info.st_mode)
+
+    def _escribir_archivo(self, entrada, ruta):
+        ruta_absoluta = os.path.join(self.repo_dir, ruta)
+        try:
+            info = os.lstat(ruta_absoluta)
+        except FileNotFoundError:
+            entrada.write(f"D {_quote_path(ruta)}\n".encode("utf-8"))
+            return
+        if stat.S_ISLNK(info.st_mode):
+            destino = os.fsencode(os.readlink(ruta_absoluta))
+            entrada.write(f"M 120000 inline {_quote_path(ruta)}\ndata {len(destino)}\n".encode("utf-8"))
+            entrada.write(destino + b"\n")
+        elif stat.S_ISREG(info.st_mode):
+            modo = "100755" if info.st_mode & stat.S_IXUSR else "100644"
+            with open(ruta_absoluta, "rb") as f:
+                tamano = os.fstat(f.fileno()).st_size
+                entrada.write(f"M {modo} inline {_quote_path(ruta)}\ndata {tamano}\n".encode("utf-8"))
+                restante = tamano
+                while restante:
+                    bloque = f.read(min(TAMANO_BLOQUE, restante))
+                    if not bloque:
+                        # El archivo se truncó mientras se leía: el flujo ya no es válido
+                        raise self._error_proceso(f"El archivo '{ruta}' cambió durante el backup")
+                    entrada.write(bloque)
+                    restante -= len(bloque)
+            entrada.write(b"\n")
+        # Directorios (submódulos, repos anidados) y archivos especiales se omiten
+
+    def _git(self, args, entorno=None, entrada=None):
+        resultado = subprocess.run(
+            ["git"] + args, cwd=self.repo_dir, env=entorno, input=entrada,
+            capture_output=True, check=False)
+        if resultado.returncode != 0:
+            detalle = resultado.stderr.decode("utf-8", "replace").strip()
+            raise SnapshotError(f"'git {args[0]}' falló: {detalle}")
+        return resultado.stdout.decode("utf-8").strip()
+
+    def _sha_blob(self, ruta_absoluta, info):
+        """SHA que tendría el blob de la ruta (sin escribirlo), o None si cambió al leerla."""
+        if stat.S_ISLNK(info.st_mode):
+            contenido = os.fsencode(os.readlink(ruta_absoluta))
+            return hashlib.new(self._formato, b"blob %d\0" % len(contenido) + contenido).hexdigest()
+        resumen = hashlib.new(self._formato, b"blob %d\0" % info.st_size)
+        leidos = 0
+        with open(ruta_absoluta, "rb") as f:
+            for bloque in iter(lambda: f.read(TAMANO_BLOQUE), b""):
+                resumen.update(bloque)
+                leidos += len(bloque)
+        return resumen.hexdigest() if leidos == info.st_size else None
+
+    def _arbol(self, head, rutas):
+        """
+        SHA del árbol que tendría el snapshot de `rutas` sobre `head`, calculado
+        en un índice temporal: solo se escriben objetos tree (write-tree
+        --missing-ok), nunca los blobs. None si un archivo cambió o no se pudo
+        leer (el snapshot lo dirá al escribirlo).
+        """
+        if self._formato is None:
+            self._formato = self._git(["rev-parse", "--show-object-format"])
+        nulo = "0" * hashlib.new(self._formato).digest_size * 2
+        entrada = []
+        for ruta in rutas:
+            ruta_absoluta = os.path.join(self.repo_dir, ruta)
+            try:
+                info = os.lstat(ruta_absoluta)
+            except FileNotFoundError:
+                entrada.append(f"0 {nulo}\t{ruta}\0")
+                continue
+            except OSError:
+                return None
+            if stat.S_ISLNK(info.st_mode):
+                modo = "120000"
+            elif stat.S_ISREG(info.st_mode):
+                modo = "100755" if info.st_mode & stat.S_IXUSR else "100644"
+            else:
+                continue  # Como en _escribir_archivo: se conserva la entrada de HEAD
+            try:
+                sha = self._sha_blob(ruta_absoluta, info)
+            except OSError:
+                return None
+            if sha is None:
+                return None
+            entrada.append(f"{modo} {sha}\t{ruta}\0")
+        with tempfile.TemporaryDirectory(prefix="backup-index-", dir=resolve_git_dir(self.repo_dir)[0]) as temporal:
+            entorno = dict(os.environ, GIT_INDEX_FILE=os.path.join(temporal, "index"))
+            self._git(["read-tree", head] if head else ["read-tree", "--empty"], entorno)
+            self._git(["update-index", "-z", "--index-info"], entorno, "".join(entrada).encode("utf-8"))
+            return self._git(["write-tree", "--missing-ok"], entorno)
+
+    def _punta(self, ref):
+        """SHA del último backup de `ref` (None si todavía no hay ninguno)."""
+        if ref not in self._tips:
+            self._tips[ref] = read_ref(resolve_git_dir(self.repo_dir)[1], ref)
+        return self._tips[ref]
+
+    def _sin_cambios(self, ref, head, rutas, huella):
+        """
+        Indica si el snapshot sería idéntico al último backup de `ref`: misma
+        huella que el último snapshot de este proceso o, si no, mismo árbol
+        que `<backup anterior>^{tree}` (p. ej. tras reiniciar el proceso).
+        """
+        if huella == self._ultima_huella:
+            return True
+        if huella == self._huella_comprobada:
+            return False
+        anterior = self._punta(ref)
+        if anterior is None:
+            return False
+        arbol = self._arbol(head, rutas)
+        if arbol is not None and arbol == self._git(["rev-parse", f"{anterior}^{{tree}}"]):
+            self._ultima_huella = huella
+            return True
+        self._huella_comprobada = huella if arbol is not None else None
+        return False
+
+    def _estado(self, salida_status):
+        rama, head = read_head(self.repo_dir)
+        ref = REF_PREFIX + (rama or "detached")
+        rutas = sorted(parse_porcelain_z(salida_status))
+        huella = (ref, head) + tuple(self._huella_ruta(r) for r in rutas)
+        return ref, head, rutas, huella
+
+    def unchanged(self, salida_status):
+        """
+        Indica, sin escribir ningún commit, si el snapshot de `salida_status`
+        sería idéntico al último backup de la rama actual (ver snapshot()).
+
+        Raises:
+            SnapshotError: Si Git falla al calcular el árbol.
+        """
+        with self._lock:
+            return self._sin_cambios(*self._estado(salida_status))
+
+    def snapshot(self, salida_status, mensaje):
+        """
+        Crea un commit de backup con los cambios indicados por `git status`.
+
+        Args:
+            salida_status (str): Salida de `git status --porcelain -z -uall`.
+            mensaje (str): Mensaje del commit.
+
+        Returns:
+            str | None: SHA del commit creado, o None si su árbol sería el del
+            último backup de la rama (no hay nada nuevo que guardar).
+
+        Raises:
+            SnapshotError: Si fast-import falla; el proceso se reinicia en el
+            siguiente snapshot.
+        """
+        with self._lock:
+            ref, head, rutas, huella = self._estado(salida_status)
+            if self._sin_cambios(ref, head, rutas, huella):
+                return None
+            self._iniciar_proceso()
+            entrada = self._proceso.stdin
+            anterior = self._punta(ref)
+
+            self._marca += 1
+            marca = self._marca
+            cuerpo = mensaje.encode("utf-8")
+            zona = time.strftime("%z") or "+0000"
+            try:
+                entrada.write(f"commit {ref}\nmark :{marca}\n".encode("utf-8"))
+                entrada.write(f"committer {self._identidad} {int(time.time())} {zona}\n".encode("utf-8"))
+                entrada.write(f"data {len(cuerpo)}\n".encode("utf-8") + cuerpo + b"\n")
+                if head:
+                    # Árbol inicial = HEAD; el backup anterior queda como segundo padre
+                    entrada.write(f"from {head}\n".encode("utf-8"))
+                    if anterior:
+                        entrada.write(f"merge {anterior}\n".encode("utf-8"))
+                elif anterior:
+                    # Rama sin commits: git status lista todos los archivos
+                    entrada.write(f"from {anterior}\ndeleteall\n".encode("utf-8"))
+                for ruta in rutas:
+                    self._escribir_archivo(entrada, ruta)
+                entrada.write(b"\n")
+                sha = self._sincronizar(marca)
+            except (BrokenPipeError, OSError) as e:
+                raise self._error_proceso(f"git fast-import terminó inesperadamente ({e})")
+            self._tips[ref] = sha
+            self._ultima_huella = huella
+            return sha
+
+    def _sincronizar(self, marca):
+        """
+        Pide a fast-import el SHA de la marca, fuerza un checkpoint (para que
+        `git push` vea el commit) y espera a que termine.
+        """
+        entrada = self._proceso.stdin
+        entrada.write(f"get-mark :{marca}\n".encode("utf-8"))
+        entrada.write(f"checkpoint\n\nprogress backup-{marca}\n".encode("utf-8"))
+        entrada.flush()
+        sha = None
+        while True:
+            linea = self._proceso.stdout.readline()
+            if not linea:
+                raise self._error_proceso("git fast-import terminó sin completar el checkpoint")
+            linea = linea.decode("utf-8").strip()
+            if linea == f"progress backup-{marca}":
+                return sha
+            sha = linea
+
+    def backup_ref(self):
+        """Referencia donde se escriben los backups de la rama actual."""
+        rama, _ = read_head(self.repo_dir)
+        return REF_PREFIX + (rama or "detached")
+
+    def _detener(self, forzar=False):
+        if self._proceso is None:
+            return
+        try:
+            if not forzar and self._proceso.poll() is None:
+                self._proceso.stdin.write(b"done\n")
+                self._proceso.stdin.close()
+                self._proceso.wait(timeout=30)
+        except (OSError, subprocess.TimeoutExpired):
+            forzar = True
+        if forzar and self._proceso.poll() is None:
+            self._proceso.kill()
+            self._proceso.wait()
+        if self._stderr is not None:
+            self._stderr.close()
+        self._proceso = None
+        self._stderr = None
+        self._tips = {}
+
+    def close(self):
+        """Termina el proceso fast-import de forma ordenada."""
+        with self._lock:
+            self._detener()
+
+
+# --- Registro de snapshotters por repositorio (uno por proceso de Python) ---
+_snapshotters = {}
+_registro_lock = threading.Lock()
+
+
+def get_snapshotter(repo_dir):
+    """Devuelve el FastImportSnapshotter compartido de `repo_dir`."""
+    clave = os.path.abspath(repo_dir)
+    with _registro_lock:
+        if clave not in _snapshotters:
+            _snapshotters[clave] = FastImportSnapshotter(clave)
+        return _snapshotters[clave]
+
+
+@atexit.register
+def close_all():
+    """Cierra todos los procesos fast-import abiertos."""
+    with _registro_lock:
+        for snapshotter in _snapshotters.values():
+            snapshotter.close()
+        _snapshotters.clear()
@@ -0,0 +1,368 @@
+"""
+Política de tamaño y exclusiones aplicada antes de añadir los cambios.
+
+`git add .` añade todo lo que no ignora .gitignore, así que una carpeta
+`android/app/build` o un `node_modules` sin ignorar convertía el backup en
+minutos de hash, commit y push, y engordaba el repositorio para siempre. Antes
+de añadir nada, el escáner recorre las rutas que reporta `git status` (los
+directorios no rastreados se recorren con `os.scandir`, solo con `lstat`, sin
+leer ni hashear contenido) y aplica:
+
+* patrones de exclusión (sintaxis reducida de .gitignore, sin negaciones):
+  los de DEFAULT_EXCLUDES, los de `.backupignore` en la raíz del repositorio
+  y los de --exclude. Solo se aplican a archivos no rastreados: un archivo que
+  ya está en el repositorio se sigue respaldando;
+* un tamaño máximo por archivo: los archivos mayores se dejan fuera del backup
+  y se informa de ellos;
+* un presupuesto total por backup: si lo que se añadiría lo supera, el backup
+  se rechaza sin añadir nada;
+* opcionalmente, un umbral a partir del cual los archivos no se añaden a Git
+  sino al almacén de fragmentos (ver chunkstore.py).
+
+El resultado (StagePlan) indica qué se añadirá, su tamaño total y qué quedó
+fuera; las exclusiones se pasan a `git add` como pathspecs `:(exclude)` y al
+motor fast-import filtrando la salida de `git status`.
+"""
+
+import os  # Para recorrer directorios y leer tamaños
+import re  # Para compilar los patrones de exclusión
+import stat  # Solo los archivos regulares se fragmentan
+import subprocess  # Para el informe de --dry-run
+import tempfile  # Archivo de pathspecs para git add
+from dataclasses import dataclass, field  # Para el plan de cada backup
+
+from backup_tools.snapshot import resolve_git_dir  # Para dejar el archivo de pathspecs en .git
+
+# Patrones excluidos siempre (artefactos de compilación y dependencias)
+DEFAULT_EXCLUDES = (
+    "node_modules/",
+    "android/app/build/",
+    "android/build/",
+    ".gradle/",
+    "ios/App/Pods/",
+)
+# Archivos que escribían versiones anteriores de las herramientas en la raíz (hoy en statedir.py)
+OWN_FILES = (
+    "/backup_git.log*",
+    "/backup_metrics.*",
+    "/backup_info.txt",
+    "/.backup_info.txt",
+)
+# Archivo opcional con patrones propios del repositorio
+ARCHIVO_EXCLUSIONES = ".backupignore"
+MIB = 1024 * 1024
+# Tamaño máximo de un archivo (GitHub avisa a partir de 50 MiB)
+MAX_TAMANO_ARCHIVO = 50 * MIB
+# Tamaño máximo de lo que añade un backup
+MAX_TAMANO_BACKUP = 500 * MIB
+# Archivos más grandes que se listan en el informe
+ARCHIVOS_EN_INFORME = 10
+
+
+def _traducir_glob(patron):
+    """Traduce un glob de .gitignore (*, ?, **) a una expresión regular."""
+    partes = []
+    i = 0
+    while i < len(patron):
+        if patron.startswith("**/", i):
+            partes.append("(?:.*/)?")
+            i += 3
+        elif patron.startswith("**", i):
+            partes.append(".*")
+            i += 2
+        elif patron[i] == "*":
+            partes.append("[^/]*")
+            i += 1
+        elif patron[i] == "?":
+            partes.append("[^/]")
+            i += 1
+        else:
+            partes.append(re.escape(patron[i]))
+            i += 1
+    return "".join(partes)
+
+
+def compile_patterns(patrones):
+    """
+    Compila `patrones` en una única expresión regular que encuentra una ruta
+    (relativa, con '/') excluida por sí misma o por alguno de sus directorios.
+    Devuelve None si no hay patrones.
+    """
+    alternativas = []
+    for patron in patrones:
+        patron = patron.strip()
+        if not patron or patron.startswith("#") or patron.startswith("!"):
+            continue
+        solo_directorio = patron.endswith("/")
+        # Como en .gitignore, una '/' al principio o en medio ancla el patrón a la raíz
+        anclado = "/" in patron.rstrip("/")
+        cuerpo = _traducir_glob(patron.strip("/"))
+        inicio = "^" if anclado else "(?:^|/)"
+        fin = "/" if solo_directorio else "(?:/|$)"
+        alternativas.append(inicio + cuerpo + fin)
+    if not alternativas:
+        return None
+    return re.compile("|".join(alternativas))
+
+
+@dataclass
+class StagePolicy:
+    """
+    Exclusiones y límites de tamaño de los backups de un repositorio.
+
+    Attributes:
+        patterns (tuple): Patrones de exclusión.
+        max_file_bytes (int): Tamaño máximo de un archivo; 0 sin límite.
+        max_total_bytes (int): Tamaño máximo de un backup; 0 sin límite.
+        chunk_threshold (int): Tamaño a partir del cual un archivo va al
+            almacén de fragmentos en lugar de a Git; 0 lo desactiva.
+    """
+    patterns: tuple = DEFAULT_EXCLUDES
+    max_file_bytes: int = MAX_TAMANO_ARCHIVO
+    max_total_bytes: int = MAX_TAMANO_BACKUP
+    chunk_threshold: int = 0
+
+    def __post_init__(self):
+        self._regex = compile_patterns(self.patterns)
+
+    @classmethod
+    def for_repo(cls, repo_dir, extra_patterns=(), max_file_bytes=MAX_TAMANO_ARCHIVO,
+                 max_total_bytes=MAX_TAMANO_BACKUP, chunk_threshold=0):
+        """Política de `repo_dir`: patrones por defecto, `.backupignore` y `extra_patterns`."""
+        patrones = list(DEFAULT_EXCLUDES + OWN_FILES)
+        try:
+            with open(os.path.join(repo_dir, ARCHIVO_EXCLUSIONES), "r", encoding="utf-8") as f:
+                patrones += f.read().splitlines()
+        except OSError:
+            pass
+        patrones += list(extra_patterns)
+        return cls(tuple(patrones), max_file_bytes, max_total_bytes, chunk_threshold)
+
+    @classmethod
+    def from_options(cls, options):
+        """Política correspondiente a unas BackupOptions."""
+        return cls.for_repo(options.repo_dir, options.exclude, options.max_file_size,
+                            options.max_backup_size, options.chunk_threshold)
+
+    def excluded(self, ruta):
+        """True si `ruta` (o uno de sus directorios) coincide con un patrón de exclusión."""
+        return self._regex is not None and self._regex.search(ruta) is not None
+
+
+@dataclass
+class StagePlan:
+    """
+    Lo que añadiría un backup según la política.
+
+    Attributes:
+        included (list): Archivos que se añadirán (rutas relativas).
+        excluded (list): Tuplas (ruta, motivo) de lo que queda fuera; un
+            directorio excluido entero aparece una sola vez, acabado en '/'.
+        chunked (list): Tuplas (ruta, tamaño) de los archivos que van al
+            almacén de fragmentos en lugar de a Git.
+        generated (list): Archivos escritos por el propio backup (manifiestos
+            de los archivos fragmentados) que deben añadirse.
+        sizes (dict): Tamaño de cada archivo incluido.
+        total_bytes (int): Suma de `sizes`.
+        over_budget (bool): True si `total_bytes` supera el presupuesto.
+    """
+    included: list = field(default_factory=list)
+    excluded: list = field(default_factory=list)
+    chunked: list = field(default_factory=list)
+    generated: list = field(default_factory=list)
+    sizes: dict = field(default_factory=dict)
+    total_bytes: int = 0
+    over_budget: bool = False
+
+    def summary(self):
+        """Resumen de una línea para el log."""
+        texto = f"{len(self.included)} archivo(s), {self.total_bytes / MIB:.1f} MiB"
+        if self.chunked:
+            texto += f"; {len(self.chunked)} archivo(s) grande(s) al almacén de fragmentos"
+        if self.excluded:
+            texto += f"; {len(self.excluded)} ruta(s) excluida(s)"
+        return texto
+
+    def left_out(self):
+        """Rutas que no deben pasar por `git add` (excluidas o fragmentadas)."""
+        return [ruta for ruta, _ in self.excluded] + [ruta for ruta, _ in self.chunked]
+
+    def report_lines(self):
+        """Líneas con las exclusiones y los archivos más grandes, para el log."""
+        lineas = [f"  excluido: {ruta} ({motivo})" for ruta, motivo in self.excluded[:ARCHIVOS_EN_INFORME]]
+        if len(self.excluded) > ARCHIVOS_EN_INFORME:
+            lineas.append(f"  ... y {len(self.excluded) - ARCHIVOS_EN_INFORME} exclusión(es) más")
+        lineas += [f"  fragmentado: {ruta} ({tamano / MIB:.1f} MiB)" for ruta, tamano in self.chunked]
+        mayores = sorted(self.sizes.items(), key=lambda par: par[1], reverse=True)[:ARCHIVOS_EN_INFORME]
+        lineas += [f"  {tamano / MIB:9.2f} MiB  {ruta}" for ruta, tamano in mayores if tamano]
+        return lineas
+
+
+def _iterar_entradas(salida_status):
+    """Recorre `git status --porcelain -z`: (estado, ruta, ruta de origen o None)."""
+    entradas = salida_status.split("\0")
+    i = 0
+    while i < len(entradas):
+        entrada = entradas[i]
+        i += 1
+        if len(entrada) < 4:
+            continue
+        estado, ruta, origen = entrada[:2], entrada[3:], None
+        if "R" in estado or "C" in estado:
+            origen = entradas[i] if i < len(entradas) else None
+            i += 1
+        yield estado, ruta, origen
+
+
+class _Escaner:
+    def __init__(self, repo_dir, politica):
+        self.repo_dir = repo_dir
+        self.politica = politica
+        self.plan = StagePlan()
+
+    def _incluir(self, ruta, tamano, regular=False):
+        if regular and self.politica.chunk_threshold and tamano >= self.politica.chunk_threshold:
+            self.plan.chunked.append((ruta, tamano))
+            return
+        if self.politica.max_file_bytes and tamano > self.politica.max_file_bytes:
+            self.plan.excluded.append(
+                (ruta, f"{tamano / MIB:.1f} MiB > {self.politica.max_file_bytes / MIB:.0f} MiB"))
+            return
+        self.plan.included.append(ruta)
+        self.plan.sizes[ruta] = tamano
+        self.plan.total_bytes += tamano
+
+    def _archivo(self, ruta):
+        try:
+            info = os.lstat(os.path.join(self.repo_dir, ruta))
+        except OSError:
+            self._incluir(ruta, 0)  # Borrado: git add registra la eliminación
+            return
+        self._incluir(ruta, info.st_size, stat.S_ISREG(info.st_mode))
+
+    def _directorio_no_rastreado(self, ruta):
+        """Recorre un directorio no rastreado sin seguir enlaces ni entrar en repos anidados."""
+        pendientes = [ruta.rstrip("/")]
+        while pendientes:
+            actual = pendientes.pop()
+            try:
+                entradas = list(os.scandir(os.path.join(self.repo_dir, actual)))
+            except OSError:
+                continue
+            if any(e.name == ".git" for e in entradas):
+                self._incluir(actual + "/", 0)  # Repositorio anidado: git lo añade como enlace
+                continue
+            for entrada in sorted(entradas, key=lambda e: e.name):
+                relativa = f"{actual}/{entrada.name}"
+                if entrada.is_dir(follow_symlinks=False):
+                    if self.politica.excluded(relativa + "/"):
+                        self.plan.excluded.append((relativa + "/", "patrón de exclusión"))
+                    else:
+                        pendientes.append(relativa)
+                elif self.politica.excluded(relativa):
+                    self.plan.excluded.append((relativa, "patrón de exclusión"))
+                else:
+                    try:
+                        self._incluir(relativa, entrada.stat(follow_symlinks=False).st_size,
+                                      entrada.is_file(follow_symlinks=False))
+                    except OSError:
+                        continue
+
+    def escanear(self, salida_status):
+        for estado, ruta, origen in _iterar_entradas(salida_status):
+            if estado == "??":
+                if self.politica.excluded(ruta):
+                    self.plan.excluded.append((ruta, "patrón de exclusión"))
+                elif ruta.endswith("/"):
+                    self._directorio_no_rastreado(ruta)
+                else:
+                    self._archivo(ruta)
+            elif estado != "!!":
+                self._archivo(ruta)
+                if origen is not None:
+                    self._archivo(origen)  # Origen de un renombrado: su borrado también se añade
+        if self.politica.max_total_bytes and self.plan.total_bytes > self.politica.max_total_bytes:
+            self.plan.over_budget = True
+        return self.plan
+
+
+def scan(repo_dir, salida_status, politica):
+    """
+    Aplica `politica` a la salida de `git status --porcelain -z` sin leer el
+    contenido de ningún archivo.
+
+    Returns:
+        StagePlan: Lo que se añadiría y lo que queda fuera.
+    """
+    return _Escaner(repo_dir, politica).escanear(salida_status)
+
+
+def filter_status(salida_status, plan):
+    """
+    Devuelve la salida de `git status --porcelain -z` sin las entradas que el
+    plan deja fuera y con los archivos que generó (para el motor fast-import,
+    que recibe rutas ya expandidas).
+    """
+    excluidas = set(plan.left_out())
+    prefijos = tuple(ruta for ruta in excluidas if ruta.endswith("/"))
+    partes = []
+    for estado, ruta, origen in _iterar_entradas(salida_status):
+        if ruta in excluidas or (prefijos and ruta.startswith(prefijos)):
+            continue
+        partes.append(f"{estado} {ruta}")
+        if origen is not None:
+            partes.append(origen)
+    partes += [f"?? {ruta}" for ruta in plan.generated]
+    return "".join(parte + "\0" for parte in partes)
+
+
+def own_files_pathspecs():
+    """
+    Pathspecs de los archivos de OWN_FILES relativos a la raíz del repositorio,
+    para sacar del índice las copias que rastrearon versiones anteriores.
+    """
+    return [f":(top,glob){patron.lstrip('/')}" for patron in OWN_FILES]
+
+
+def write_pathspec_file(repo_dir, plan):
+    """
+    Escribe en el directorio de Git un archivo de pathspecs (separados por NUL)
+    para `git add --pathspec-from-file`: todo el árbol salvo lo que el plan
+    deja fuera. Devuelve su ruta, o None si no hay nada que dejar fuera (basta
+    con `git add .`).
+    """
+    if not plan.left_out():
+        return None
+    git_dir, _ = resolve_git_dir(repo_dir)
+    descriptor, ruta = tempfile.mkstemp(prefix="backup-pathspec-", dir=git_dir)
+    with os.fdopen(descriptor, "w", encoding="utf-8", newline="") as f:
+        f.write(".\0")
+        for excluida in plan.left_out():
+            f.write(f":(exclude,literal){excluida.rstrip('/')}\0")
+    return ruta
+
+
+def add_command(pathspec_file):
+    """Comando `git add` que respeta el archivo de pathspecs (o `git add .` sin él)."""
+    if pathspec_file is None:
+        return ["git", "add", "."]
+    return ["git", "add", f"--pathspec-from-file={pathspec_file}", "--pathspec-file-nul"]
+
+
+def dry_run(repo_dir, politica, log_fn):
+    """
+    Informa de lo que añadiría el próximo backup sin crear ningún commit.
+
+    Returns:
+        StagePlan: El plan calculado.
+    """
+    salida = subprocess.run(["git", "status", "--porcelain", "-z"], cwd=repo_dir,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True).stdout
+    plan = scan(repo_dir, os.fsdecode(salida), politica)
+    log_fn(f"El próximo backup añadiría {plan.summary()}.", "INFO")
+    for linea in plan.report_lines():
+        log_fn(linea, "INFO")
+    if plan.over_budget:
+        log_fn(f"Supera el presupuesto de {politica.max_total_bytes / MIB:.0f} MiB: "
+               "el backup se rechazaría.", "WARNING")
+    return plan
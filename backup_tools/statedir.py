@@ -0,0 +1,37 @@
+"""
+Directorio de estado de las herramientas, fuera del árbol de trabajo.
+
+El log (`backup_git.log`) y las métricas se escriben en cada ejecución; en la
+raíz del repositorio, `git status` nunca quedaría limpio y el siguiente
+`git add .` los subiría con el backup. Por eso se guardan en
+`<directorio común de Git>/backup-tool/`, donde Git no los ve.
+
+Los nombres antiguos se excluyen además del backup (ver OWN_FILES en
+stagepolicy.py) por si quedan copias sin rastrear de versiones anteriores.
+"""
+
+import os  # Para ubicar y crear el directorio de estado
+
+from backup_tools.snapshot import resolve_git_dir  # Para ubicar .git (también en worktrees)
+
+# Subdirectorio del directorio común de Git
+DIRECTORIO_ESTADO = "backup-tool"
+
+
+def state_dir(repo_dir="."):
+    """
+    Devuelve (y crea si hace falta) el directorio de estado de `repo_dir`. Si
+    `repo_dir` no es un repositorio Git (p. ej. el directorio desde el que se
+    lanza --config), devuelve el propio `repo_dir`.
+    """
+    _, common_dir = resolve_git_dir(repo_dir)
+    if not os.path.isdir(common_dir):
+        return repo_dir
+    ruta = os.path.join(common_dir, DIRECTORIO_ESTADO)
+    os.makedirs(ruta, exist_ok=True)
+    return ruta
+
+
+def state_path(repo_dir, nombre):
+    """Ruta del archivo `nombre` dentro del directorio de estado de `repo_dir`."""
+    return os.path.join(state_dir(repo_dir), nombre)
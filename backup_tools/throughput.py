@@ -0,0 +1,221 @@
+"""
+Plazos del push calculados a partir de su tamaño y del caudal observado.
+
+El timeout del intento (4 o 5 minutos según la herramienta) y el de
+inactividad de gitrunner (120 s) eran fijos: un push de varios cientos de MiB
+por una conexión lenta se mataba siempre a mitad y se reintentaba sin fin,
+mientras que un push de pocos KiB sobre una conexión muerta esperaba minutos
+antes de darse por fallido. Aquí, antes de cada push:
+
+1. se estima el tamaño del pack que saldrá con `git rev-list --objects
+   --disk-usage <origen> --not --remotes <puntas ya subidas>`, es decir, lo
+   que ocupan en disco los objetos que el remoto aún no tiene;
+2. se calcula la duración esperada con el historial de pushes anteriores del
+   repositorio (`push_throughput.json` en el directorio de estado): la
+   latencia de los pushes pequeños más el tamaño entre un caudal prudente
+   (un percentil bajo) de los grandes;
+3. el plazo total y el de inactividad del push son un múltiplo de esa
+   duración, acotados por PLAZO_MINIMO/PLAZO_MAXIMO y
+   INACTIVIDAD_MINIMA/INACTIVIDAD_MAXIMA. Si el plazo del push supera el
+   timeout del intento, el intento se amplía (ver engine.wait_attempt).
+
+Cada push correcto añade una muestra (bytes escritos según `git push
+--progress` y segundos) al historial. Sin historial se usan CAUDAL_INICIAL y
+LATENCIA_INICIAL; si no se puede estimar el tamaño, el push conserva los
+plazos fijos de antes.
+"""
+
+import json  # Formato del historial
+import os  # Para escribir el historial de forma atómica
+import statistics  # Mediana y percentiles de las muestras
+import subprocess  # Timeout de inactividad de gitrunner
+import tempfile  # Escritura atómica del historial
+import time  # Para fechar cada muestra
+from dataclasses import dataclass  # Para el plan de cada push
+
+from backup_tools import gitrunner  # Ejecución asíncrona de Git
+from backup_tools import statedir  # El historial va junto al log
+
+ARCHIVO_HISTORIAL = "push_throughput.json"
+# Muestras que se conservan (las más recientes)
+MAX_MUESTRAS = 50
+# Los pushes menores miden sobre todo la latencia (negociación, hooks del remoto)
+MIN_BYTES_CAUDAL = 256 * 1024
+# Percentil del caudal de los pushes grandes que se da por esperable
+PERCENTIL_CAUDAL = 25
+# Sin historial: ~1 Mbit/s y 5 s de latencia, prudentes para una conexión doméstica
+CAUDAL_INICIAL = 128 * 1024
+LATENCIA_INICIAL = 5.0
+# Plazo = MARGEN × duración esperada, acotado
+MARGEN = 3.0
+PLAZO_MINIMO_SEGUNDOS = 60
+PLAZO_MAXIMO_SEGUNDOS = 6 * 60 * 60
+INACTIVIDAD_MINIMA_SEGUNDOS = 30
+INACTIVIDAD_MAXIMA_SEGUNDOS = 10 * 60
+
+
+def _acotar(valor, minimo, maximo):
+    return max(minimo, min(maximo, valor))
+
+
+def push_source(push_args):
+    """Referencia local que sube `push_args` (el origen del refspec, o HEAD)."""
+    if len(push_args) > 4:
+        return push_args[4].lstrip("+").split(":", 1)[0] or "HEAD"
+    return "HEAD"
+
+
+def _formato_bytes(cantidad):
+    for unidad, factor in (("GiB", 1024 ** 3), ("MiB", 1024 ** 2), ("KiB", 1024)):
+        if cantidad >= factor:
+            return f"{cantidad / factor:.1f} {unidad}"
+    return f"{cantidad} bytes"
+
+
+@dataclass
+class PushPlan:
+    """
+    Plazos de un push.
+
+    Attributes:
+        bytes (int): Tamaño estimado del pack.
+        expected (float): Segundos que debería tardar.
+        timeout (float): Segundos tras los que se termina el push.
+        inactivity_timeout (float): Segundos sin salida tras los que se
+            termina el push.
+        throughput (float): Caudal (bytes/s) con el que se calculó.
+        samples (int): Muestras del historial en que se basa el caudal
+            (0: valores iniciales).
+    """
+    bytes: int
+    expected: float
+    timeout: float
+    inactivity_timeout: float
+    throughput: float
+    samples: int
+
+    def summary(self):
+        """Descripción para el log."""
+        origen = f"{self.samples} push(es) anteriores" if self.samples else "valores iniciales"
+        return (f"~{_formato_bytes(self.bytes)} a {_formato_bytes(self.throughput)}/s ({origen}): "
+                f"se esperan {self.expected:.0f}s; plazo {self.timeout:.0f}s, "
+                f"inactividad máxima {self.inactivity_timeout:.0f}s")
+
+
+class ThroughputHistory:
+    """Muestras (bytes, segundos) de los pushes correctos de un repositorio."""
+
+    def __init__(self, repo_dir="."):
+        self.ruta = statedir.state_path(repo_dir, ARCHIVO_HISTORIAL)
+        self.muestras = []  # [bytes, segundos, instante]
+        self.puntas = {}  # Origen del push -> último SHA subido
+        try:
+            with open(self.ruta, "r", encoding="utf-8") as f:
+                datos = json.load(f)
+            self.muestras = [m for m in datos.get("samples", []) if m[0] > 0 and m[1] > 0]
+            self.puntas = dict(datos.get("tips", {}))
+        except (OSError, ValueError, TypeError, IndexError):
+            pass  # Sin historial (o corrupto): se empieza de cero
+
+    def latency(self):
+        """Segundos típicos de un push pequeño."""
+        pequenos = [segundos for tamano, segundos, _ in self.muestras if tamano < MIN_BYTES_CAUDAL]
+        return statistics.median(pequenos) if pequenos else LATENCIA_INICIAL
+
+    def throughput(self):
+        """
+        Caudal prudente (bytes/s) de los pushes grandes y número de muestras
+        en que se basa.
+        """
+        latencia = self.latency()
+        caudales = [tamano / max(segundos - latencia, 0.1 * segundos)
+                    for tamano, segundos, _ in self.muestras if tamano >= MIN_BYTES_CAUDAL]
+        if not caudales:
+            return CAUDAL_INICIAL, 0
+        if len(caudales) == 1:
+            return caudales[0], 1
+        return statistics.quantiles(caudales, n=100)[PERCENTIL_CAUDAL - 1], len(caudales)
+
+    def plan(self, tamano):
+        """Plazos del push de `tamano` bytes."""
+        caudal, muestras = self.throughput()
+        esperado = self.latency() + tamano / caudal
+        return PushPlan(
+            bytes=tamano,
+            expected=esperado,
+            timeout=_acotar(MARGEN * esperado, PLAZO_MINIMO_SEGUNDOS, PLAZO_MAXIMO_SEGUNDOS),
+            inactivity_timeout=_acotar(MARGEN * esperado, INACTIVIDAD_MINIMA_SEGUNDOS,
+                                       INACTIVIDAD_MAXIMA_SEGUNDOS),
+            throughput=caudal,
+            samples=muestras)
+
+    def record(self, tamano, segundos, origen=None, sha=None):
+        """
+        Añade la muestra de un push correcto y, si se indica, la punta que
+        subió (para no contarla en la próxima estimación). Los errores de
+        escritura se ignoran: el historial nunca debe hacer fallar un backup.
+        """
+        if tamano > 0 and segundos > 0:
+            self.muestras = (self.muestras + [[tamano, round(segundos, 3), round(time.time())]])[-MAX_MUESTRAS:]
+        if origen and sha:
+            self.puntas[origen] = sha
+        try:
+            self._guardar()
+        except OSError:
+            pass
+
+    def _guardar(self):
+        descriptor, temporal = tempfile.mkstemp(prefix=".tmp-", dir=os.path.dirname(self.ruta))
+        try:
+            with os.fdopen(descriptor, "w", encoding="utf-8") as f:
+                json.dump({"samples": self.muestras, "tips": self.puntas}, f)
+            os.replace(temporal, self.ruta)
+        except BaseException:
+            try:
+                os.remove(temporal)
+            except OSError:
+                pass
+            raise
+
+
+async def _disk_usage(repo_dir, origen, excluidos, log_fn):
+    args = ["git", "rev-list", "--objects", "--disk-usage", origen, "--not", "--remotes"] + excluidos
+    stdout, _, codigo = await gitrunner.run_git(args, log_fn, cwd=repo_dir, capture_stdout=True,
+                                                inactivity_timeout=PLAZO_MINIMO_SEGUNDOS)
+    if codigo != 0:
+        return None
+    try:
+        return int(stdout.strip())
+    except ValueError:
+        return None
+
+
+async def estimate_push(repo_dir, push_args, history, log_fn):
+    """
+    Estima el tamaño del pack que enviará `push_args`.
+
+    Args:
+        repo_dir (str): Raíz del repositorio.
+        push_args (list): Comando de push.
+        history (ThroughputHistory): Historial con las puntas ya subidas.
+        log_fn (function): Función para loguear mensajes (mensaje, nivel).
+
+    Returns:
+        tuple: (bytes o None si no se pudo estimar, SHA del origen o None).
+    """
+    origen = push_source(push_args)
+    try:
+        stdout, _, codigo = await gitrunner.run_git(
+            ["git", "rev-parse", "--verify", "-q", f"{origen}^{{commit}}"], log_fn, cwd=repo_dir,
+            capture_stdout=True, inactivity_timeout=PLAZO_MINIMO_SEGUNDOS)
+        sha = stdout.strip() if codigo == 0 else None
+        if sha is None:
+            return None, None
+        excluidos = [punta for punta in history.puntas.values() if punta != sha]
+        tamano = await _disk_usage(repo_dir, sha, excluidos, log_fn)
+        if tamano is None and excluidos:
+            # Una punta anterior ya no existe (historial reescrito): se estima sin ellas
+            tamano = await _disk_usage(repo_dir, sha, [], log_fn)
+    except (OSError, subprocess.SubprocessError):
+        return None, None
+    return tamano, sha
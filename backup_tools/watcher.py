@@ -0,0 +1,422 @@
+"""
+Vigilancia de cambios en el árbol de trabajo para lanzar backups por eventos.
+
+En Linux se usa inotify (vía ctypes, sin dependencias externas); en otros
+sistemas, o si no quedan watches disponibles, se recurre a un sondeo periódico
+de fechas de modificación. En ambos casos las ráfagas de cambios (un
+`npm install`, una compilación de Gradle...) se agrupan en un solo lote
+mediante un tiempo de espera (debounce).
+
+No se vigila lo que el backup nunca incluiría: los directorios que excluye la
+política de staging (DEFAULT_EXCLUDES, `.backupignore` y --exclude, ver
+stagepolicy.py) o que ignora `.gitignore` se podan del recorrido, salvo que Git
+ya rastree algo dentro, y los cambios en archivos excluidos o ignorados no
+forman lote. Así `node_modules/` o `android/app/build/` no agotan los watches
+de inotify ni lanzan un backup en cada `npm install` o compilación de Gradle.
+"""
+
+import ctypes  # Para llamar a inotify_init1/inotify_add_watch de la libc
+import ctypes.util  # Para localizar la libc
+import errno  # Para interpretar los errores de inotify
+import os  # Para recorrer el árbol de directorios
+import select  # Para esperar eventos con timeout
+import struct  # Para decodificar los eventos de inotify
+import subprocess  # Para consultar a Git qué rutas rastrea o ignora
+import sys  # Para detectar la plataforma
+import time  # Para el debounce y el sondeo
+
+# Directorios que nunca se vigilan (Git escribe en ellos durante cada backup)
+DIRECTORIOS_EXCLUIDOS = (".git",)
+
+# --- Constantes de inotify (linux/inotify.h) ---
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_MASCARA_VIGILANCIA = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM |
+                       IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF |
+                       IN_MOVE_SELF | IN_ONLYDIR)
+_CABECERA_EVENTO = struct.Struct("iIII")  # wd, mask, cookie, len
+
+# Ruta que representa "todo el repositorio" cuando se pierden eventos
+RUTA_RAIZ = "."
+
+
+def _ruta_git(ruta):
+    """Ruta relativa con '/' como separador, como la escribe Git."""
+    return ruta.replace(os.sep, "/")
+
+
+class _FiltroRutas:
+    """
+    Decide qué directorios no se recorren y qué cambios no cuentan: lo que la
+    política de staging deja fuera (solo si Git no lo rastrea, como en el
+    backup) y lo que ignora `.gitignore` (según `git check-ignore`).
+    """
+
+    def __init__(self, raiz, politica=None):
+        self.raiz = raiz
+        self.politica = politica
+        self._rastreados = set()
+        self._directorios_rastreados = set()
+        self._ignorados = {}  # Respuestas ya obtenidas de git check-ignore
+        try:
+            salida = subprocess.run(["git", "ls-files", "-z"], cwd=raiz, stdout=subprocess.PIPE,
+                                    stderr=subprocess.DEVNULL, check=True).stdout
+        except (OSError, subprocess.CalledProcessError):
+            self._con_git = False  # Sin Git no hay .gitignore que aplicar
+            return
+        self._con_git = True
+        for ruta in os.fsdecode(salida).split("\0"):
+            if not ruta:
+                continue
+            self._rastreados.add(ruta)
+            directorio = os.path.dirname(ruta)
+            while directorio and directorio not in self._directorios_rastreados:
+                self._directorios_rastreados.add(directorio)
+                directorio = os.path.dirname(directorio)
+
+    def _excluido(self, ruta, directorio=False):
+        """True si la política de staging deja fuera `ruta` y Git no rastrea nada en ella."""
+        if self.politica is None or ruta == RUTA_RAIZ:
+            return False
+        ruta = _ruta_git(ruta)
+        if directorio:
+            return ruta not in self._directorios_rastreados and self.politica.excluded(ruta + "/")
+        return ruta not in self._rastreados and self.politica.excluded(ruta)
+
+    def _ignorados_por_git(self, rutas):
+        """Subconjunto de `rutas` que ignora .gitignore (Git no informa de las rastreadas)."""
+        if not self._con_git:
+            return set()
+        nuevas = [r for r in rutas if r != RUTA_RAIZ and r not in self._ignorados]
+        if nuevas:
+            entrada = "".join(_ruta_git(r) + "\0" for r in nuevas)
+            try:
+                resultado = subprocess.run(["git", "check-ignore", "--stdin", "-z"], cwd=self.raiz,
+                                           input=os.fsencode(entrada), stdout=subprocess.PIPE,
+                                           stderr=subprocess.DEVNULL)
+            except OSError:
+                return set()
+            # Código 1: ninguna ignorada; otro distinto de 0: error, no se poda nada
+            ignoradas = set()
+            if resultado.returncode == 0:
+                ignoradas = set(os.fsdecode(resultado.stdout).split("\0"))
+            elif resultado.returncode != 1:
+                return set()
+            for ruta in nuevas:
+                self._ignorados[ruta] = _ruta_git(ruta) in ignoradas
+        return {r for r in rutas if self._ignorados.get(r)}
+
+    def descartar_cambio(self, ruta, directorio=False):
+        """True si un cambio en `ruta` no puede afectar al backup según la política."""
+        return self._excluido(ruta, directorio)
+
+    def directorios_vigilados(self, directorios):
+        """Los `directorios` que no se podan, con una sola consulta a Git para todos."""
+        candidatos = [d for d in directorios if not self._excluido(d, directorio=True)]
+        ignorados = self._ignorados_por_git(candidatos)
+        return [d for d in candidatos if d not in ignorados]
+
+    def filtrar_lote(self, cambios):
+        """Quita de un lote de cambios lo excluido por la política o ignorado por Git."""
+        cambios = {r for r in cambios if not self.descartar_cambio(r)}
+        return cambios - self._ignorados_por_git(sorted(cambios))
+
+
+class InotifyWatcher:
+    """
+    Vigila recursivamente un directorio con inotify y devuelve lotes de rutas
+    modificadas (relativas a la raíz).
+    """
+
+    def __init__(self, raiz, archivos_ignorados=(), politica=None):
+        """
+        Args:
+            raiz (str): Directorio raíz del repositorio.
+            archivos_ignorados (iterable): Rutas relativas que no cuentan como
+                cambios (p. ej. el log y las métricas de la propia herramienta).
+            politica (StagePolicy, optional): Política de staging del backup;
+                lo que excluye no se vigila.
+
+        Raises:
+            OSError: Si inotify no está disponible o no quedan watches libres.
+        """
+        self.raiz = os.path.abspath(raiz)
+        self.archivos_ignorados = {os.path.normpath(r) for r in archivos_ignorados}
+        self._filtro = _FiltroRutas(self.raiz, politica)
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6",
+                                 use_errno=True)
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, f"inotify_init1 falló: {os.strerror(error)}")
+        self._directorios = {}  # wd -> ruta relativa del directorio
+        try:
+            self._vigilar_arbol(RUTA_RAIZ, set())
+        except OSError:
+            self.close()
+            raise
+
+    def _vigilar_arbol(self, relativa, cambios):
+        """
+        Añade watches a `relativa` y a sus subdirectorios no podados, nivel a
+        nivel (una consulta a Git por nivel). Los archivos que ya existían
+        (creados antes de tener el watch) se anotan en `cambios`.
+        """
+        nivel = [relativa]
+        while nivel:
+            subdirectorios = []
+            for rel_dir in nivel:
+                directorio = os.path.join(self.raiz, rel_dir)
+                # El watch va antes del listado: lo creado entre medias aparece en uno de los dos
+                wd = self._libc.inotify_add_watch(
+                    self._fd, os.fsencode(directorio), _MASCARA_VIGILANCIA)
+                if wd < 0:
+                    error = ctypes.get_errno()
+                    if error in (errno.ENOENT, errno.ENOTDIR):
+                        continue  # El directorio desapareció mientras se recorría
+                    raise OSError(error, f"inotify_add_watch('{rel_dir}') falló: {os.strerror(error)}")
+                self._directorios[wd] = rel_dir
+                try:
+                    entradas = list(os.scandir(directorio))
+                except OSError:
+                    continue
+                for entrada in entradas:
+                    ruta = os.path.normpath(os.path.join(rel_dir, entrada.name))
+                    if entrada.is_dir(follow_symlinks=False):
+                        if entrada.name not in DIRECTORIOS_EXCLUIDOS:
+                            subdirectorios.append(ruta)
+                    elif relativa != RUTA_RAIZ:
+                        cambios.add(ruta)
+            nivel = self._filtro.directorios_vigilados(subdirectorios)
+
+    def _procesar_eventos(self, cambios):
+        """
+        Lee los eventos pendientes y anota las rutas afectadas en `cambios`.
+        """
+        try:
+            datos = os.read(self._fd, 256 * 1024)
+        except BlockingIOError:
+            return
+        desplazamiento = 0
+        while desplazamiento < len(datos):
+            wd, mascara, _cookie, longitud = _CABECERA_EVENTO.unpack_from(datos, desplazamiento)
+            desplazamiento += _CABECERA_EVENTO.size
+            nombre = datos[desplazamiento:desplazamiento + longitud].rstrip(b"\0")
+            desplazamiento += longitud
+
+            if mascara & IN_Q_OVERFLOW:
+                # Se perdieron eventos: el siguiente backup debe revisar todo
+                cambios.add(RUTA_RAIZ)
+                continue
+            if mascara & IN_IGNORED:
+                self._directorios.pop(wd, None)
+                continue
+            directorio = self._directorios.get(wd)
+            if directorio is None or not nombre:
+                continue
+            nombre = os.fsdecode(nombre)
+            if nombre in DIRECTORIOS_EXCLUIDOS:
+                continue
+            ruta = os.path.normpath(os.path.join(directorio, nombre))
+            if ruta in self.archivos_ignorados or self._filtro.descartar_cambio(ruta, mascara & IN_ISDIR):
+                continue
+            if mascara & IN_ISDIR and mascara & (IN_CREATE | IN_MOVED_TO):
+                if not self._filtro.directorios_vigilados([ruta]):
+                    continue  # Directorio podado (build/, node_modules/...): ni se vigila ni cuenta
+                cambios.add(ruta)
+                try:
+                    self._vigilar_arbol(ruta, cambios)
+                except OSError:
+                    # Sin watches libres: forzar una revisión completa con git status
+                    cambios.add(RUTA_RAIZ)
+            else:
+                cambios.add(ruta)
+
+    def wait_for_changes(self, debounce, stop_event, timeout=None):
+        """
+        Espera hasta que haya cambios y los agrupa hasta que pasen `debounce`
+        segundos sin eventos nuevos (o 10 veces `debounce` desde el primero).
+        Un lote en el que todo resulta excluido o ignorado por .gitignore se
+        descarta y se sigue esperando.
+
+        Args:
+            debounce (float): Segundos de calma que cierran un lote.
+            stop_event (threading.Event): Evento que interrumpe la espera.
+            timeout (float, optional): Tiempo máximo de espera sin cambios.
+
+        Returns:
+            set | None: Rutas modificadas (vacío si venció `timeout` sin cambios),
+            o None si se activó `stop_event`.
+        """
+        cambios = set()
+        limite_espera = None if timeout is None else time.monotonic() + timeout
+        primer_evento = ultimo_evento = None
+        while not stop_event.is_set():
+            ahora = time.monotonic()
+            if primer_evento is not None:
+                if ahora - ultimo_evento >= debounce or ahora - primer_evento >= debounce * 10:
+                    cambios = self._filtro.filtrar_lote(cambios)
+                    if cambios:
+                        return cambios
+                    primer_evento = ultimo_evento = None
+                    continue
+                espera = min(debounce - (ahora - ultimo_evento), 1.0)
+            elif limite_espera is not None:
+                if ahora >= limite_espera:
+                    return cambios
+                espera = min(limite_espera - ahora, 1.0)
+            else:
+                espera = 1.0  # Revisar stop_event al menos una vez por segundo
+
+            listos, _, _ = select.select([self._fd], [], [], max(espera, 0.0))
+            if listos:
+                antes = len(cambios)
+                self._procesar_eventos(cambios)
+                if len(cambios) > antes:
+                    ultimo_evento = time.monotonic()
+                    primer_evento = primer_evento or ultimo_evento
+        return None
+
+    def close(self):
+        """Libera el descriptor de inotify."""
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class PollingWatcher:
+    """
+    Alternativa portable a InotifyWatcher: compara periódicamente la fecha de
+    modificación y el tamaño de cada archivo del árbol.
+    """
+
+    def __init__(self, raiz, archivos_ignorados=(), intervalo_sondeo=2.0, politica=None):
+        self.raiz = os.path.abspath(raiz)
+        self.archivos_ignorados = {os.path.normpath(r) for r in archivos_ignorados}
+        self.intervalo_sondeo = intervalo_sondeo
+        self._filtro = _FiltroRutas(self.raiz, politica)
+        self._instantanea = self._tomar_instantanea()
+
+    def _tomar_instantanea(self):
+        """Fecha y tamaño de cada archivo de los directorios no podados."""
+        instantanea = {}
+        nivel = [RUTA_RAIZ]
+        while nivel:
+            subdirectorios = []
+            for rel_dir in nivel:
+                try:
+                    entradas = list(os.scandir(os.path.join(self.raiz, rel_dir)))
+                except OSError:
+                    continue
+                for entrada in entradas:
+                    if entrada.name in DIRECTORIOS_EXCLUIDOS:
+                        continue
+                    ruta = os.path.normpath(os.path.join(rel_dir, entrada.name))
+                    try:
+                        if entrada.is_dir(follow_symlinks=False):
+                            subdirectorios.append(ruta)
+                            continue
+                        info = entrada.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    if ruta not in self.archivos_ignorados and not self._filtro.descartar_cambio(ruta):
+                        instantanea[ruta] = (info.st_mtime_ns, info.st_size)
+            nivel = self._filtro.directorios_vigilados(subdirectorios)
+        return instantanea
+
+    def _detectar_cambios(self):
+        nueva = self._tomar_instantanea()
+        anterior, self._instantanea = self._instantanea, nueva
+        return {ruta for ruta in anterior.keys() | nueva.keys()
+                if anterior.get(ruta) != nueva.get(ruta)}
+
+    def wait_for_changes(self, debounce, stop_event, timeout=None):
+        """Mismo contrato que InotifyWatcher.wait_for_changes()."""
+        cambios = set()
+        inicio = time.monotonic()
+        primer_evento = ultimo_evento = None
+        while not stop_event.wait(self.intervalo_sondeo):
+            nuevos = self._detectar_cambios()
+            ahora = time.monotonic()
+            if nuevos:
+                cambios |= nuevos
+                ultimo_evento = ahora
+                primer_evento = primer_evento or ahora
+            if primer_evento is not None:
+                if ahora - ultimo_evento >= debounce or ahora - primer_evento >= debounce * 10:
+                    cambios = self._filtro.filtrar_lote(cambios)
+                    if cambios:
+                        return cambios
+                    primer_evento = ultimo_evento = None
+            elif timeout is not None and ahora - inicio >= timeout:
+                return cambios
+        return None
+
+    def close(self):
+        """No hay recursos que liberar."""
+
+
+def create_watcher(raiz, archivos_ignorados=(), log_fn=None, policy=None):
+    """
+    Crea el vigilante más eficiente disponible para `raiz`: inotify en Linux y
+    sondeo periódico en el resto de casos. Lo que excluye `policy`
+    (StagePolicy del backup) o ignora .gitignore no se vigila.
+    """
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(raiz, archivos_ignorados, policy)
+        except OSError as e:
+            if log_fn:
+                log_fn(f"No se pudo usar inotify ({e}); se usará sondeo periódico.", "WARNING")
+    return PollingWatcher(raiz, archivos_ignorados, politica=policy)
+
+
+def run_watch(job, watcher, debounce, stop_event, heartbeat=None, log_fn=None):
+    """
+    Ejecuta `job(rutas_cambiadas)` cada vez que el vigilante entrega un lote de
+    cambios. Al arrancar se hace una revisión completa (rutas_cambiadas=None)
+    para no perder lo modificado mientras la herramienta estaba detenida.
+
+    Args:
+        job (function): Callable que recibe el conjunto de rutas cambiadas (o
+            None para revisar todo) y devuelve el estado del backup.
+        watcher: InotifyWatcher o PollingWatcher.
+        debounce (float): Segundos de calma que cierran un lote de cambios.
+        stop_event (threading.Event): Evento que detiene la vigilancia.
+        heartbeat (float, optional): Si se indica, tras ese tiempo sin cambios
+            se invoca `job(None)`: una revisión completa con `git status` que
+            recoge lo que el vigilante no vio (un watch que no se pudo
+            registrar, cambios mientras se recorría un directorio nuevo...).
+        log_fn (function, optional): Función para loguear mensajes.
+    """
+    rutas = None
+    while not stop_event.is_set():
+        estado = job(rutas)
+        if log_fn:
+            log_fn(f"Backup por eventos finalizado con estado: {estado}", "INFO")
+            log_fn("Esperando cambios en el árbol de trabajo...", "INFO")
+        rutas = watcher.wait_for_changes(debounce, stop_event, timeout=heartbeat)
+        if rutas is None:
+            break
+        if not rutas:
+            if log_fn:
+                log_fn("Sin cambios detectados; revisión completa del repositorio.", "INFO")
+            rutas = None
+        elif log_fn:
+            log_fn(f"Detectados cambios en {len(rutas)} ruta(s).", "INFO")
+    if log_fn:
+        log_fn("Vigilancia de archivos detenida por señal de parada.", "INFO")
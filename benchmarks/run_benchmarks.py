@@ -0,0 +1,276 @@
+"""
+Benchmarks de extremo a extremo de las dos herramientas de backup.
+
+Para cada herramienta (`github_backup.perform_backup_logic` y
+`backupGit.MotorBackup._realizar_intento_backup_logica`; ambas ejecutan
+`engine.attempt`, la primera con asyncio.run y la segunda en el bucle del
+motor de AppBackup) y cada motor de snapshot, crea un repositorio sintético con un
+remoto bare local (ver synthetic.py) y mide un intento de backup completo en
+tres escenarios:
+
+* clean: árbol sin cambios (status y, como mucho, vaciar el diario).
+* small-change: unos pocos archivos de texto modificados.
+* large-change: cientos de archivos nuevos en árboles profundos y un binario.
+
+El remoto es un repositorio bare local que hace las veces de GitHub, así que
+los tiempos no dependen de la red. Además del tiempo total se recoge el
+tiempo de cada paso (BackupMetrics).
+
+Los resultados se guardan en JSON junto con el commit de la herramienta y las
+versiones de Python y Git, y pueden compararse con los de otro commit:
+
+    python benchmarks/run_benchmarks.py --output antes.json
+    git checkout otra-rama
+    python benchmarks/run_benchmarks.py --baseline antes.json
+
+Con --baseline el proceso termina con código 1 si alguna mediana empeora más
+que --threshold.
+"""
+
+import argparse  # Para interpretar los argumentos de línea de comandos
+import dataclasses  # Para guardar el perfil en los resultados
+import json  # Formato de los resultados
+import os  # Para las rutas de la herramienta y los repositorios
+import platform  # Para describir la máquina en los resultados
+import shutil  # Para borrar los repositorios temporales
+import statistics  # Medianas y dispersión de las mediciones
+import subprocess  # Para consultar el commit de la herramienta y la versión de Git
+import sys  # Para importar las herramientas desde la raíz del repositorio
+import tempfile  # Directorio de trabajo de los benchmarks
+import time  # Para medir cada ejecución
+
+RAIZ_HERRAMIENTA = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ_HERRAMIENTA)
+
+import backupGit  # noqa: E402  (necesita RAIZ_HERRAMIENTA en sys.path)
+import github_backup  # noqa: E402
+from backup_tools.options import BackupOptions, SNAPSHOT_ENGINES  # noqa: E402
+from backup_tools.retry import AttemptProgress  # noqa: E402
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import synthetic  # noqa: E402
+
+TOOLS = ("github_backup", "backupGit")
+SCENARIOS = ("clean", "small-change", "large-change")
+# Estado esperado de cada escenario: otro estado invalida la medición
+_ESTADOS_ESPERADOS = {
+    "clean": ("NO_CHANGES",),
+    "small-change": ("SUCCESS",),
+    "large-change": ("SUCCESS",),
+}
+# Diferencia absoluta mínima (segundos) para considerar una regresión
+RUIDO_MINIMO_SEGUNDOS = 0.05
+
+
+def _sin_log(mensaje, nivel="INFO"):
+    pass
+
+
+class _GithubBackupRunner:
+    """Ejecuta un intento con github_backup.perform_backup_logic."""
+
+    def __init__(self, repo_dir, engine):
+        self.opciones = BackupOptions(repo_dir=repo_dir, snapshot_engine=engine)
+
+    def run(self, progreso):
+        return github_backup.perform_backup_logic(_sin_log, options=self.opciones, progress=progreso)
+
+    def close(self):
+        pass
+
+
+class _BackupGitRunner:
+    """Ejecuta un intento con MotorBackup._realizar_intento_backup_logica (la lógica de AppBackup)."""
+
+    def __init__(self, repo_dir, engine):
+        self.motor = backupGit.MotorBackup(
+            opciones=BackupOptions(repo_dir=repo_dir, snapshot_engine=engine), log_fn=_sin_log)
+
+    def run(self, progreso):
+        return self.motor._realizar_intento_backup_logica(progreso=progreso)
+
+    def close(self):
+        self.motor.cerrar_motor()
+
+
+_RUNNERS = {"github_backup": _GithubBackupRunner, "backupGit": _BackupGitRunner}
+
+
+def _preparar_escenario(escenario, repo_dir, perfil, iteracion):
+    synthetic.settle(repo_dir)
+    if escenario == "small-change":
+        synthetic.apply_small_change(repo_dir, perfil, iteracion)
+    elif escenario == "large-change":
+        synthetic.apply_large_change(repo_dir, perfil, iteracion)
+
+
+def run_case(tool, engine, escenarios, perfil, repeticiones, directorio, semilla=0):
+    """
+    Crea un repositorio sintético para (`tool`, `engine`) y mide cada escenario
+    `repeticiones` veces.
+
+    Returns:
+        list: Un resultado (dict) por escenario.
+    """
+    repo_dir = synthetic.create_repos(directorio, perfil, semilla)
+    runner = _RUNNERS[tool](repo_dir, engine)
+    resultados = []
+    try:
+        # Calentamiento: primer backup (catálogo, snapshotter, cachés del SO)
+        runner.run(AttemptProgress())
+        for escenario in escenarios:
+            tiempos, pasos = [], {}
+            for iteracion in range(repeticiones):
+                _preparar_escenario(escenario, repo_dir, perfil, iteracion)
+                progreso = AttemptProgress()
+                inicio = time.perf_counter()
+                estado = runner.run(progreso)
+                duracion = time.perf_counter() - inicio
+                if estado not in _ESTADOS_ESPERADOS[escenario]:
+                    raise RuntimeError(
+                        f"{tool}/{engine}/{escenario}: estado inesperado {estado} "
+                        f"({progreso.last_error.strip()[:200]})")
+                tiempos.append(duracion)
+                for paso, segundos in progreso.metrics.phases.items():
+                    pasos.setdefault(paso, []).append(segundos)
+            resultados.append({
+                "tool": tool,
+                "engine": engine,
+                "scenario": escenario,
+                "runs": [round(t, 4) for t in tiempos],
+                "median": round(statistics.median(tiempos), 4),
+                "min": round(min(tiempos), 4),
+                "max": round(max(tiempos), 4),
+                "stdev": round(statistics.stdev(tiempos), 4) if len(tiempos) > 1 else 0.0,
+                "steps": {paso: round(statistics.median(valores), 4) for paso, valores in pasos.items()},
+            })
+    finally:
+        runner.close()
+    return resultados
+
+
+def _salida(comando, cwd=None):
+    try:
+        return subprocess.run(comando, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment_info(perfil_nombre, perfil, repeticiones, semilla):
+    """Describe la ejecución para poder comparar resultados entre commits."""
+    commit = _salida(["git", "rev-parse", "HEAD"], RAIZ_HERRAMIENTA)
+    sucio = bool(_salida(["git", "status", "--porcelain", "--untracked-files=no"], RAIZ_HERRAMIENTA))
+    return {
+        "commit": commit,
+        "dirty": sucio,
+        "python": platform.python_version(),
+        "git": _salida(["git", "--version"]),
+        "platform": platform.platform(),
+        "profile": perfil_nombre,
+        "profile_settings": dataclasses.asdict(perfil),
+        "repeat": repeticiones,
+        "seed": semilla,
+    }
+
+
+def compare(resultados, referencia, umbral):
+    """
+    Compara las medianas con las de `referencia` (resultados de otro commit).
+
+    Returns:
+        list: Descripción de cada regresión encontrada.
+    """
+    previos = {(r["tool"], r["engine"], r["scenario"]): r for r in referencia["results"]}
+    regresiones = []
+    for r in resultados:
+        previo = previos.get((r["tool"], r["engine"], r["scenario"]))
+        if previo is None:
+            continue
+        diferencia = r["median"] - previo["median"]
+        if diferencia > RUIDO_MINIMO_SEGUNDOS and r["median"] > previo["median"] * (1 + umbral):
+            regresiones.append(
+                f"{r['tool']}/{r['engine']}/{r['scenario']}: mediana {previo['median']:.3f}s -> "
+                f"{r['median']:.3f}s (+{diferencia / previo['median']:.0%})")
+    return regresiones
+
+
+def _tabla(resultados, referencia=None):
+    previos = {}
+    if referencia:
+        previos = {(r["tool"], r["engine"], r["scenario"]): r for r in referencia["results"]}
+    lineas = [f"{'herramienta':<14} {'motor':<12} {'escenario':<13} {'mediana':>9} {'mín':>9} "
+              f"{'máx':>9} {'ref.':>9}  pasos (mediana)"]
+    for r in resultados:
+        previo = previos.get((r["tool"], r["engine"], r["scenario"]))
+        ref = f"{previo['median']:9.3f}" if previo else f"{'-':>9}"
+        pasos = ", ".join(f"{paso} {segundos:.3f}" for paso, segundos in r["steps"].items())
+        lineas.append(f"{r['tool']:<14} {r['engine']:<12} {r['scenario']:<13} {r['median']:9.3f} "
+                      f"{r['min']:9.3f} {r['max']:9.3f} {ref}  {pasos}")
+    return "\n".join(lineas)
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Benchmarks de extremo a extremo de las herramientas de backup.")
+    parser.add_argument("--profile", choices=sorted(synthetic.PROFILES), default="default",
+                        help="Tamaño del repositorio sintético (por defecto 'default').")
+    parser.add_argument("--repeat", type=int, default=5, metavar="N",
+                        help="Mediciones por escenario (por defecto 5).")
+    parser.add_argument("--tools", nargs="+", choices=TOOLS, default=list(TOOLS))
+    parser.add_argument("--engines", nargs="+", choices=SNAPSHOT_ENGINES, default=list(SNAPSHOT_ENGINES))
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--seed", type=int, default=0, help="Semilla del contenido sintético.")
+    parser.add_argument("--output", metavar="ARCHIVO", help="Guarda los resultados en JSON.")
+    parser.add_argument("--baseline", metavar="ARCHIVO",
+                        help="Resultados de otro commit con los que comparar.")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Empeoramiento relativo de la mediana que cuenta como "
+                             "regresión (por defecto 0.25 = 25%%).")
+    parser.add_argument("--workdir", metavar="DIR",
+                        help="Directorio donde crear los repositorios (por defecto uno temporal).")
+    parser.add_argument("--keep", action="store_true", help="No borrar los repositorios al terminar.")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    perfil = synthetic.PROFILES[args.profile]
+    referencia = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            referencia = json.load(f)
+        if referencia["environment"].get("profile") != args.profile:
+            print(f"Aviso: la referencia usa el perfil '{referencia['environment'].get('profile')}'.",
+                  file=sys.stderr)
+
+    base = args.workdir or tempfile.mkdtemp(prefix="backup-bench-")
+    resultados = []
+    try:
+        for tool in args.tools:
+            for engine in args.engines:
+                directorio = os.path.join(base, f"{tool}-{engine}")
+                shutil.rmtree(directorio, ignore_errors=True)
+                os.makedirs(directorio)
+                print(f"Midiendo {tool} con {engine}...", file=sys.stderr)
+                resultados += run_case(tool, engine, args.scenarios, perfil, args.repeat,
+                                       directorio, args.seed)
+    finally:
+        if not args.keep:
+            shutil.rmtree(base, ignore_errors=True)
+
+    informe = {"environment": environment_info(args.profile, perfil, args.repeat, args.seed),
+               "results": resultados}
+    print(_tabla(resultados, referencia))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(informe, f, indent=2, ensure_ascii=False)
+    if referencia:
+        regresiones = compare(resultados, referencia, args.threshold)
+        for regresion in regresiones:
+            print(f"REGRESIÓN: {regresion}", file=sys.stderr)
+        return 1 if regresiones else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,166 @@
+"""
+Repositorios sintéticos y reproducibles para los benchmarks.
+
+Todo el contenido se genera con un `random.Random` con semilla fija, de modo
+que dos ejecuciones (en commits distintos de la herramienta) respaldan
+exactamente los mismos bytes. El remoto es un repositorio bare local que hace
+las veces de GitHub: el push mide el trabajo de Git (empaquetado, escritura de
+objetos) sin el ruido de la red.
+"""
+
+import os  # Para crear los árboles de directorios
+import random  # Contenido determinista a partir de una semilla
+import subprocess  # Para inicializar los repositorios con Git
+from dataclasses import dataclass  # Para los perfiles de tamaño
+
+# Extensiones de los archivos pequeños (código y recursos de un proyecto Capacitor)
+_EXTENSIONES = (".ts", ".tsx", ".css", ".json", ".java", ".xml", ".gradle", ".md")
+# Segmentos con los que se construyen rutas profundas al estilo de android/
+_SEGMENTOS_ANDROID = ("app", "src", "main", "java", "com", "example", "backup", "ui",
+                      "res", "layout", "values", "drawable", "build", "intermediates")
+
+
+@dataclass
+class Profile:
+    """
+    Tamaño del repositorio sintético y de los cambios de cada escenario.
+
+    Attributes:
+        small_files (int): Archivos de texto pequeños en src/.
+        small_file_size (int): Tamaño medio (bytes) de los archivos pequeños.
+        android_files (int): Archivos repartidos en el árbol profundo android/.
+        android_depth (int): Profundidad máxima del árbol android/.
+        binaries (int): Binarios grandes (no comprimibles) en assets/.
+        binary_size (int): Tamaño (bytes) de cada binario.
+        small_change_files (int): Archivos modificados en el escenario "small-change".
+        large_change_files (int): Archivos nuevos en el escenario "large-change".
+        large_change_binary_size (int): Binario nuevo del escenario "large-change".
+    """
+    small_files: int = 2000
+    small_file_size: int = 2048
+    android_files: int = 600
+    android_depth: int = 10
+    binaries: int = 3
+    binary_size: int = 4 * 1024 * 1024
+    small_change_files: int = 10
+    large_change_files: int = 500
+    large_change_binary_size: int = 8 * 1024 * 1024
+
+
+PROFILES = {
+    "tiny": Profile(small_files=100, android_files=50, android_depth=6, binaries=1,
+                    binary_size=256 * 1024, small_change_files=3, large_change_files=50,
+                    large_change_binary_size=512 * 1024),
+    "default": Profile(),
+    "large": Profile(small_files=20000, android_files=5000, android_depth=14, binaries=5,
+                     binary_size=32 * 1024 * 1024, small_change_files=50, large_change_files=5000,
+                     large_change_binary_size=64 * 1024 * 1024),
+}
+
+
+def _git(args, cwd=None):
+    subprocess.run(["git"] + args, cwd=cwd, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def _texto(rng, tamano):
+    """Texto pseudoaleatorio comprimible, parecido a código fuente."""
+    palabras = ("const", "return", "import", "function", "backup", "value", "=", "{", "}",
+                "(", ")", ";", "if", "else", "string", "number", "await", "export")
+    lineas = []
+    total = 0
+    while total < tamano:
+        linea = " ".join(rng.choice(palabras) for _ in range(rng.randint(3, 12)))
+        lineas.append(linea)
+        total += len(linea) + 1
+    return "\n".join(lineas) + "\n"
+
+
+def _escribir(ruta, contenido):
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    modo = "wb" if isinstance(contenido, bytes) else "w"
+    with open(ruta, modo, **({} if modo == "wb" else {"encoding": "utf-8", "newline": "\n"})) as f:
+        f.write(contenido)
+
+
+def _ruta_android(rng, profundidad_maxima, indice):
+    profundidad = rng.randint(3, profundidad_maxima)
+    segmentos = [rng.choice(_SEGMENTOS_ANDROID) for _ in range(profundidad)]
+    return os.path.join("android", *segmentos, f"Archivo{indice}{rng.choice(_EXTENSIONES)}")
+
+
+def populate(raiz, perfil, semilla=0):
+    """Genera en `raiz` el árbol de trabajo inicial descrito por `perfil`."""
+    rng = random.Random(semilla)
+    for i in range(perfil.small_files):
+        tamano = rng.randint(perfil.small_file_size // 4, perfil.small_file_size * 2)
+        _escribir(os.path.join(raiz, "src", f"modulo{i % 50}", f"archivo{i}{rng.choice(_EXTENSIONES)}"),
+                  _texto(rng, tamano))
+    for i in range(perfil.android_files):
+        _escribir(os.path.join(raiz, _ruta_android(rng, perfil.android_depth, i)),
+                  _texto(rng, rng.randint(200, perfil.small_file_size)))
+    for i in range(perfil.binaries):
+        _escribir(os.path.join(raiz, "assets", f"binario{i}.bin"), rng.randbytes(perfil.binary_size))
+
+
+def create_repos(directorio, perfil, semilla=0):
+    """
+    Crea en `directorio` un remoto bare (`remote.git`) y un clon de trabajo
+    (`work`) con el árbol inicial ya commiteado y subido.
+
+    Returns:
+        str: Ruta del árbol de trabajo.
+    """
+    remoto = os.path.join(directorio, "remote.git")
+    trabajo = os.path.join(directorio, "work")
+    _git(["init", "--bare", "-q", "-b", "main", remoto])
+    _git(["init", "-q", "-b", "main", trabajo])
+    # Identidad fija y sin gc automático: nada externo altera los tiempos
+    for clave, valor in (("user.name", "Benchmark"), ("user.email", "benchmark@example.com"),
+                         ("gc.auto", "0"), ("core.autocrlf", "false"),
+                         ("push.default", "current")):
+        _git(["config", clave, valor], cwd=trabajo)
+    _git(["remote", "add", "origin", remoto], cwd=trabajo)
+    populate(trabajo, perfil, semilla)
+    _git(["add", "."], cwd=trabajo)
+    _git(["commit", "-q", "-m", "Árbol inicial"], cwd=trabajo)
+    _git(["push", "-q", "-u", "origin", "main"], cwd=trabajo)
+    return trabajo
+
+
+def settle(raiz):
+    """
+    Commitea y sube lo que haya quedado pendiente (p. ej. archivos que
+    escriba la herramienta tras cada backup), para que cada medición
+    parta de un árbol limpio y sincronizado con el remoto.
+    """
+    estado = subprocess.run(["git", "status", "--porcelain"], cwd=raiz, check=True,
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL).stdout
+    if estado.strip():
+        _git(["add", "."], cwd=raiz)
+        _git(["commit", "-q", "-m", "Preparación del benchmark"], cwd=raiz)
+    _git(["push", "-q", "origin", "HEAD"], cwd=raiz)
+
+
+def apply_small_change(raiz, perfil, iteracion):
+    """Modifica `perfil.small_change_files` archivos existentes de src/."""
+    rng = random.Random(f"small-{iteracion}")
+    for _ in range(perfil.small_change_files):
+        i = rng.randrange(perfil.small_files)
+        directorio = os.path.join(raiz, "src", f"modulo{i % 50}")
+        nombre = next(n for n in sorted(os.listdir(directorio)) if n.startswith(f"archivo{i}."))
+        with open(os.path.join(directorio, nombre), "a", encoding="utf-8", newline="\n") as f:
+            f.write(_texto(rng, 200))
+
+
+def apply_large_change(raiz, perfil, iteracion):
+    """Añade `perfil.large_change_files` archivos y un binario grande."""
+    rng = random.Random(f"large-{iteracion}")
+    base = os.path.join(raiz, "generado", f"lote{iteracion}")
+    for i in range(perfil.large_change_files):
+        if i % 2:
+            ruta = os.path.join(base, _ruta_android(rng, perfil.android_depth, i))
+        else:
+            ruta = os.path.join(base, f"modulo{i % 20}", f"nuevo{i}{rng.choice(_EXTENSIONES)}")
+        _escribir(ruta, _texto(rng, rng.randint(200, perfil.small_file_size)))
+    _escribir(os.path.join(base, "assets", "nuevo.bin"), rng.randbytes(perfil.large_change_binary_size))
@@ -1,162 +1,119 @@
-import tkinter as tk
-from tkinter import messagebox, scrolledtext
-import subprocess
-import socket
-import datetime
+import asyncio
+import dataclasses
 import os
 import logging
-import time
 import threading
-from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError # Renombrar para evitar colisión con socket.timeout
+import sys
+
+from backup_tools import engine, headless
+from backup_tools.engine import EngineLoop
+from backup_tools.options import BackupOptions
+from backup_tools.journal import PushJournal, BackgroundPusher
+from backup_tools.logview import TkLogView
+from backup_tools.restoreview import RestorePanel
+from backup_tools import logfile
+from backup_tools import instance
+from backup_tools import metrics
+from backup_tools import profiling
+from backup_tools import reachability
+from backup_tools import statedir
+
+# Tkinter se importa bajo demanda (ver load_tkinter) para que el modo headless
+# no dependa de un entorno gráfico.
+tk = None
+messagebox = None
+scrolledtext = None
 
 # --- Configuración ---
-LOG_FILE = "backup_git.log"
-BACKUP_INFO_FILE = ".backup_info.txt" # Archivo para guardar el número del último backup
+LOG_FILE = "backup_git.log" # Dentro del directorio de estado (.git/backup-tool/)
 MAX_RETRIES = 5 # Número máximo de reintentos
-ATTEMPT_TIMEOUT_SECONDS = 4 * 60  # 4 minutos para que se suba el backup
-RETRY_DELAY_SECONDS = 10 # Tiempo de espera entre reintentos
+ATTEMPT_TIMEOUT_SECONDS = 4 * 60  # 4 minutos por intento; un push grande lo amplía (ver backup_tools/throughput.py)
+RETRY_DELAY_SECONDS = 10 # Espera tras el primer fallo; se duplica en cada reintento
+MAX_RETRY_DELAY_SECONDS = 2 * 60 # Tope de la espera entre reintentos
+COMMIT_MESSAGE = "backup {number} - {date}" # {number}: número de backup del catálogo
 
 # --- Configuración del Logging ---
-def setup_logging():
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(LOG_FILE),
-            logging.StreamHandler()
-        ]
-    )
+def setup_logging(repo_dir="."):
+    # Un hilo escritor guarda el log en UTF-8, rotado y comprimido, fuera del hilo del backup
+    logfile.setup_logging(statedir.state_path(repo_dir, LOG_FILE), consola=True)
+
+def load_tkinter():
+    """Importa Tkinter solo cuando se va a mostrar la interfaz gráfica."""
+    global tk, messagebox, scrolledtext
+    if tk is None:
+        import tkinter
+        from tkinter import messagebox as tk_messagebox, scrolledtext as tk_scrolledtext
+        tk, messagebox, scrolledtext = tkinter, tk_messagebox, tk_scrolledtext
+
+def log_message(message, level="INFO"):
+    """Loguea un mensaje en el archivo (y la consola) con el nivel indicado."""
+    if level == "ERROR":
+        logging.error(message)
+    elif level == "WARNING":
+        logging.warning(message)
+    elif level == "CRITICAL":
+        logging.critical(message)
+    else:
+        logging.info(message)
 
 # --- Funciones Auxiliares de Backup ---
-def get_next_backup_number():
-    if not os.path.exists(BACKUP_INFO_FILE):
-        return 1
-    try:
-        with open(BACKUP_INFO_FILE, 'r') as f:
-            return int(f.read().strip()) + 1
-    except (ValueError, FileNotFoundError):
-        return 1
+def check_remote_connection(log_fn=None, repo_dir=".", timeout=5, remote=None):
+    """
+    Verifica que el remoto de push del repositorio es alcanzable (ver backup_tools/reachability.py).
+    El resultado se guarda unos segundos en caché, compartida entre reintentos y repositorios.
+    """
+    return reachability.check_remote(repo_dir, log_fn, timeout, remote)
 
-def save_backup_number(number):
-    try:
-        with open(BACKUP_INFO_FILE, 'w') as f:
-            f.write(str(number))
-    except IOError as e:
-        logging.error(f"Error al guardar el número de backup: {e}")
+# --- Lógica Principal del Backup (backup_tools/engine.py) ---
+def perform_backup_logic(log_fn_threaded, changed_paths=None, options=None, progress=None):
+    """
+    Realiza un único intento de backup con el motor asíncrono y retorna su estado
+    ("SUCCESS", "NO_CHANGES", "COMMITTED_OFFLINE" o un código de error como "GIT_PUSH_ERROR").
+    `progress` (AttemptProgress) se conserva entre intentos: si el commit ya se creó,
+    el intento solo repite el push. Con `options.bundle_dir`, el bundle incremental del
+    backup se escribe en ese directorio a la vez que el push. Tras profiling.arm(), el
+    intento se perfila y el informe se escribe junto al log (ver backup_tools/profiling.py).
+    """
+    return asyncio.run(engine.attempt(options, progress, log_fn_threaded, changed_paths=changed_paths,
+                                      message_template=COMMIT_MESSAGE))
 
+def flush_push_journal(log_fn, options, engine_loop):
+    """Sube en `engine_loop` los backups guardados sin conexión, con un único push por destino."""
+    return engine_loop.run(engine.flush_journal(options, log_fn))
 
-def check_github_connection(log_fn, timeout=5):
-    """Verifica la conexión a github.com."""
-    try:
-        socket.create_connection(("github.com", 443), timeout=timeout)
-        log_fn("Conexión a GitHub establecida correctamente.", "INFO")
-        return True
-    except (socket.timeout, socket.error) as e:
-        log_fn(f"No se pudo conectar a GitHub: {e}", "ERROR")
-        return False
-
-def run_git_command(log_fn, command_args, operation_name="Comando Git"):
-    """Ejecuta un comando Git y devuelve su salida y código de retorno."""
-    try:
-        log_fn(f"Ejecutando: {' '.join(command_args)}", "INFO")
-        process = subprocess.Popen(
-            command_args,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            cwd=os.getcwd()
-        )
-        stdout, stderr = process.communicate(timeout=120) # Timeout interno para comando git (2 min)
-        return_code = process.returncode
-
-        log_message = f"{operation_name} finalizado. Código de retorno: {return_code}\n"
-        if stdout:
-            log_message += f"Salida estándar:\n{stdout.strip()}\n"
-        if stderr:
-            log_message += f"Salida de error:\n{stderr.strip()}\n"
-        
-        if return_code == 0:
-            log_fn(log_message, "INFO")
-        else:
-            if operation_name == "Commit" and "nothing to commit" in stderr.lower():
-                log_fn(log_message + "No había cambios para commitear.", "WARNING")
-                return stdout, stderr, 0 # Tratar "nothing to commit" como éxito
-            log_fn(log_message, "ERROR")
-            
-        return stdout, stderr, return_code
-    except FileNotFoundError:
-        log_fn("Error: El comando 'git' no se encontró. ¿Está Git instalado y en el PATH?", "ERROR")
-        return "", "Git no encontrado", -1
-    except subprocess.TimeoutExpired:
-        log_fn(f"{operation_name} excedió el tiempo de espera interno (120s).", "ERROR")
-        # process.kill() # communicate() ya se encarga de esto
-        # stdout, stderr = process.communicate()
-        return "", "Comando Git excedió el tiempo de espera", -2
-    except Exception as e:
-        log_fn(f"Error inesperado ejecutando {operation_name}: {e}", "ERROR")
-        return "", str(e), -3
-
-# --- Lógica Principal del Backup (modificada para retornar estado) ---
-def perform_backup_logic(log_fn_threaded):
+def run_backup_with_retries(log_fn, engine_loop, stop_event=None, changed_paths=None, options=None,
+                            metrics_writer=None, on_progress=None):
     """
-    Realiza un intento de backup.
-    Retorna: "SUCCESS", "NO_CHANGES", o un código de error específico como "CONNECTION_ERROR", "GIT_ADD_ERROR", etc.
+    Ejecuta en `engine_loop` (EngineLoop) un backup completo con reintentos y timeout por intento.
+    Si un intento expira o se activa `stop_event`, se terminan sus procesos de Git.
+    Al terminar, el resultado se anota en el catálogo de backups y los tiempos de cada
+    paso se escriben en `metrics_writer` (MetricsWriter).
+    Retorna una tupla (estado final, número del último intento).
     """
-    start_time = time.time()
-    log_fn_threaded("Iniciando intento de backup...", "INFO")
-
-    # 1. Detectar conexión a GitHub
-    log_fn_threaded("Verificando conexión a GitHub...", "INFO")
-    if not check_github_connection(log_fn_threaded):
-        return "CONNECTION_ERROR"
-
-    backup_number = get_next_backup_number()
-    current_date = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    commit_message = f"backup {backup_number} - {current_date}"
-
-    # 2. Añadir cambios
-    log_fn_threaded("Añadiendo cambios al staging area (git add .)...", "INFO")
-    _, stderr_add, rc_add = run_git_command(log_fn_threaded, ["git", "add", "."], "Add")
-    if rc_add != 0:
-        return "GIT_ADD_ERROR"
-
-    # Verificar si hay cambios
-    stdout_status, _, rc_status = run_git_command(log_fn_threaded, ["git", "status", "--porcelain"], "Status Check")
-    if rc_status == 0 and not stdout_status.strip():
-        log_fn_threaded("No hay cambios para realizar commit. El árbol de trabajo está limpio.", "INFO")
-        return "NO_CHANGES"
-    elif rc_status != 0:
-        log_fn_threaded("Error al verificar el estado de git.", "ERROR")
-        # Continuar, el commit fallará si no hay nada y será manejado
-
-    # 3. Commit
-    log_fn_threaded(f"Realizando commit con mensaje: '{commit_message}'...", "INFO")
-    _, stderr_commit, rc_commit = run_git_command(
-        log_fn_threaded, ["git", "commit", "-m", commit_message], "Commit"
-    )
-    if rc_commit != 0:
-        if "nothing to commit" not in stderr_commit.lower(): # Ya manejado por run_git_command
-            return "GIT_COMMIT_ERROR"
-        else: # "nothing to commit" (run_git_command ya lo trata como rc=0)
-            log_fn_threaded("No había cambios para commitear (detectado en commit).", "WARNING")
-            return "NO_CHANGES"
-
-    # 4. Push
-    log_fn_threaded("Realizando push a GitHub (git push)...", "INFO")
-    _, stderr_push, rc_push = run_git_command(log_fn_threaded, ["git", "push"], "Push")
-    if rc_push != 0:
-        return "GIT_PUSH_ERROR"
-
-    save_backup_number(backup_number)
-    duration = time.time() - start_time
-    log_fn_threaded(f"Intento de Backup número {backup_number} completado y subido exitosamente en {duration:.2f} segundos.", "INFO")
-    return "SUCCESS"
+    return engine_loop.run(backup_coroutine(log_fn, stop_event, changed_paths, options, metrics_writer,
+                                            on_progress))
+
+def backup_coroutine(log_fn, stop_event=None, changed_paths=None, options=None, metrics_writer=None,
+                     on_progress=None):
+    """Corutina de engine.backup con la configuración de reintentos de esta herramienta."""
+    options = options or BackupOptions()
+    return engine.backup(
+        options.repo_dir, options, log_fn=log_fn, on_progress=on_progress, changed_paths=changed_paths,
+        cancel_event=stop_event, max_retries=MAX_RETRIES, retry_delay=RETRY_DELAY_SECONDS,
+        max_retry_delay=MAX_RETRY_DELAY_SECONDS, attempt_timeout=ATTEMPT_TIMEOUT_SECONDS,
+        metrics_writer=metrics_writer, message_template=COMMIT_MESSAGE)
 
 
 # --- Interfaz Gráfica ---
 class BackupApp:
-    def __init__(self, root_window):
+    def __init__(self, root_window, repo_instance, options=None, metrics_writer=None, profile=False):
+        load_tkinter()
         self.root = root_window
+        self.options = options or BackupOptions()
+        self.metrics_writer = metrics_writer # Registro de tiempos por paso de cada backup
+        self.profile = profile # Perfilar el primer intento de cada backup (--profile-attempt)
+        # Devuelta por instance.claim(): el cerrojo del repositorio ya está tomado al abrir la ventana
+        self.repo_instance = repo_instance
         root_window.title("Herramienta de Backup a GitHub con Reintentos")
         root_window.geometry("700x450")
 
@@ -173,6 +130,24 @@ class BackupApp:
         )
         self.backup_button.pack(pady=10, fill=tk.X)
 
+        self.cancel_button = tk.Button(
+            self.main_frame,
+            text="Cancelar Backup",
+            command=self.cancel_backup,
+            state=tk.DISABLED
+        )
+        self.cancel_button.pack(pady=(0, 5), fill=tk.X)
+
+        self.progress_label = tk.Label(self.main_frame, text="", anchor="w") # Paso en curso del backup
+        self.progress_label.pack(fill=tk.X)
+
+        self.restore_button = tk.Button(
+            self.main_frame,
+            text="Restaurar archivos de un backup...",
+            command=self.open_restore_panel
+        )
+        self.restore_button.pack(pady=(0, 5), fill=tk.X)
+
         self.status_label = tk.Label(self.main_frame, text="Log de Operaciones:", anchor="w")
         self.status_label.pack(pady=(10,0), fill=tk.X)
 
@@ -183,110 +158,162 @@ class BackupApp:
             state=tk.DISABLED
         )
         self.status_text.pack(pady=5, fill=tk.BOTH, expand=True)
-
-        self.executor = ThreadPoolExecutor(max_workers=1) # Para ejecutar perform_backup_logic con timeout
+        self.log_view = TkLogView(root_window, self.status_text) # Dibuja los logs por lotes en el hilo principal
+        self.log_view.start()
+
+        self.engine_loop = EngineLoop() # Bucle de eventos del motor de backup (backup_tools/engine.py)
+        self.cancel_event = threading.Event() # Activado por el botón Cancelar o al cerrar la ventana
+        # Sube en segundo plano los backups guardados sin conexión (serializado con los backups)
+        self.pusher = BackgroundPusher(
+            PushJournal(self.options.repo_dir),
+            lambda: flush_push_journal(self.log_to_gui_and_file, self.options, self.engine_loop),
+            lambda: check_remote_connection(repo_dir=self.options.repo_dir),
+            self.log_to_gui_and_file)
+        self.pusher.ensure_running()
+        # Otras ejecuciones en este repositorio (--headless, --trigger) piden aquí su backup
+        self.repo_instance.listen(self.run_backup, self.log_to_gui_and_file)
 
     def log_to_gui_and_file(self, message, level="INFO"):
         """Loguea al archivo y a la GUI de forma segura para hilos."""
-        timestamped_message_for_file = message # logging ya añade timestamp y nivel
-        timestamped_message_for_gui = f"[{level}] {message}\n"
-        
-        if level == "ERROR":
-            logging.error(timestamped_message_for_file)
-        elif level == "WARNING":
-            logging.warning(timestamped_message_for_file)
-        else:
-            logging.info(timestamped_message_for_file)
-        
-        # Actualizar GUI en el hilo principal
-        self.root.after(0, self._update_status_widget, timestamped_message_for_gui)
+        log_message(message, level) # logging ya añade timestamp y nivel
+
+        # Solo se encola: el hilo principal lo dibuja en el siguiente lote de log_view
+        self.log_view.sink.put(f"[{level}] {message}")
 
-    def _update_status_widget(self, message_line):
-        """Actualiza el widget de texto. Debe ser llamado desde el hilo principal."""
-        self.status_text.config(state=tk.NORMAL)
-        self.status_text.insert(tk.END, message_line)
-        self.status_text.see(tk.END) # Auto-scroll
-        self.status_text.config(state=tk.DISABLED)
-        # self.status_text.update_idletasks() # root.after se encarga del ciclo de eventos
+    def open_restore_panel(self):
+        """Abre el panel para restaurar archivos desde cualquier backup."""
+        RestorePanel(tk, messagebox, self.root, self.options.repo_dir, self.log_to_gui_and_file,
+                     self.options.chunk_target)
 
     def start_backup_process_threaded(self):
-        """Inicia el proceso de backup con reintentos en un hilo separado."""
+        """
+        Inicia el proceso de backup con reintentos en un hilo de trabajo, sin bloquear la GUI.
+        Si ya hay un backup en curso (pedido por otra ejecución), se suma al siguiente.
+        """
         self.backup_button.config(state=tk.DISABLED)
-        self.status_text.config(state=tk.NORMAL)
-        self.status_text.delete('1.0', tk.END)
-        self.status_text.config(state=tk.DISABLED)
+        self.log_view.clear()
+        threading.Thread(target=self.repo_instance.run, daemon=True, name="backup-gui").start()
+
+    def run_backup(self, changed_paths=None):
+        """
+        Ejecuta en el bucle del motor un backup con reintentos, pedido con el botón o por otra
+        ejecución, y devuelve su estado final. Se llama desde un hilo de trabajo.
+        """
+        self.root.after(0, lambda: self.backup_button.config(state=tk.DISABLED))
+        self.root.after(0, lambda: self.cancel_button.config(state=tk.NORMAL))
+        self.cancel_event.clear()
 
         self.log_to_gui_and_file("Iniciando proceso de backup con reintentos...", "INFO")
+        if self.profile:
+            profiling.arm(self.log_view) # Mide también el dibujo del log en el hilo de Tk
+
+        future = self.engine_loop.submit(backup_coroutine(
+            self.log_to_gui_and_file, self.cancel_event, changed_paths, options=self.options,
+            metrics_writer=self.metrics_writer, on_progress=self.show_progress))
+        return self._backup_finished(future)
+
+    def show_progress(self, step, detail):
+        """Muestra el paso en curso (y el progreso de Git) en la etiqueta de progreso."""
+        text = f"Paso: {step}" + (f" — {detail}" if detail else "")
+        self.root.after(0, lambda: self.progress_label.config(text=text))
+
+    def _backup_finished(self, future):
+        """Espera el resultado del backup, lo muestra y lo devuelve. Se ejecuta en el hilo de trabajo."""
+        try:
+            result_status, attempt = future.result()
+        except BaseException as e: # Bucle cerrado (ventana cerrada) o fallo inesperado
+            logging.warning(f"El backup terminó sin resultado: {e!r}")
+            return "CANCELLED"
+
+        if result_status == "SUCCESS":
+            self.root.after(0, lambda: messagebox.showinfo("Éxito", f"Backup realizado con éxito en el intento {attempt}."))
+        elif result_status in ("NO_CHANGES", "NO_CHANGES_AFTER_ADD"):
+            self.root.after(0, lambda: messagebox.showinfo("Sin Cambios", "No se detectaron cambios para el backup."))
+        elif result_status == "COMMITTED_OFFLINE":
+            self.root.after(0, lambda: messagebox.showinfo("Sin Conexión", "Backup guardado en local; se subirá automáticamente cuando vuelva la conexión."))
+        elif result_status == "CANCELLED":
+            self.root.after(0, lambda: messagebox.showwarning("Cancelado", "El backup fue cancelado por el usuario."))
+        else:
+            self.root.after(0, lambda: messagebox.showerror("Fallo Total", f"No se pudo completar el backup después de {attempt} intento(s)."))
 
-        # Crear y empezar el hilo trabajador
-        worker_thread = threading.Thread(target=self._backup_worker_loop, daemon=True)
-        worker_thread.start()
-
-    def _backup_worker_loop(self):
-        """Contiene el bucle de reintentos. Se ejecuta en un hilo separado."""
-        overall_start_time = time.time()
-        
-        for attempt in range(1, MAX_RETRIES + 1):
-            self.log_to_gui_and_file(f"--- Intento de Backup {attempt}/{MAX_RETRIES} ---", "INFO")
-            attempt_start_time = time.time()
-            
-            future = self.executor.submit(perform_backup_logic, self.log_to_gui_and_file)
-            
-            try:
-                # Esperar el resultado con timeout
-                result_status = future.result(timeout=ATTEMPT_TIMEOUT_SECONDS)
-            except FutureTimeoutError:
-                result_status = "TIMEOUT_ATTEMPT"
-                self.log_to_gui_and_file(f"Intento {attempt} excedió el tiempo límite de {ATTEMPT_TIMEOUT_SECONDS / 60:.0f} minutos.", "ERROR")
-                # Intentar cancelar la tarea (puede que no funcione si está bloqueada en C)
-                if future.running():
-                    future.cancel() # No garantiza la detención inmediata
-            except Exception as e: # Excepción inesperada dentro de perform_backup_logic si no es capturada allí
-                result_status = "EXCEPTION_IN_LOGIC"
-                self.log_to_gui_and_file(f"Excepción no controlada durante el intento {attempt}: {e}", "CRITICAL")
-                logging.exception(f"Excepción no controlada en _backup_worker_loop, intento {attempt}")
-
-
-            attempt_duration = time.time() - attempt_start_time
-            self.log_to_gui_and_file(f"Intento {attempt} finalizado en {attempt_duration:.2f}s con estado: {result_status}", "INFO")
-
-            if result_status == "SUCCESS":
-                overall_duration = time.time() - overall_start_time
-                self.log_to_gui_and_file(f"Backup completado exitosamente después de {attempt} intento(s).", "INFO")
-                self.log_to_gui_and_file(f"Duración total del proceso: {overall_duration:.2f} segundos.", "INFO")
-                self.root.after(0, lambda: messagebox.showinfo("Éxito", f"Backup realizado con éxito en el intento {attempt}."))
-                break # Salir del bucle de reintentos
-            
-            elif result_status == "NO_CHANGES":
-                overall_duration = time.time() - overall_start_time
-                self.log_to_gui_and_file("No hay cambios para el backup.", "INFO")
-                self.log_to_gui_and_file(f"Duración total del proceso (sin cambios): {overall_duration:.2f} segundos.", "INFO")
-                self.root.after(0, lambda: messagebox.showinfo("Sin Cambios", "No se detectaron cambios para el backup."))
-                break # Salir del bucle de reintentos
-            
-            else: # Cualquier tipo de error o timeout del intento
-                self.log_to_gui_and_file(f"Intento {attempt} falló. Estado: {result_status}", "ERROR")
-                if attempt < MAX_RETRIES:
-                    self.log_to_gui_and_file(f"Esperando {RETRY_DELAY_SECONDS} segundos antes del próximo intento...", "INFO")
-                    time.sleep(RETRY_DELAY_SECONDS)
-                else:
-                    overall_duration = time.time() - overall_start_time
-                    self.log_to_gui_and_file(f"Todos los {MAX_RETRIES} intentos de backup fallaron.", "ERROR")
-                    self.log_to_gui_and_file(f"Duración total del proceso (fallido): {overall_duration:.2f} segundos.", "ERROR")
-                    self.root.after(0, lambda: messagebox.showerror("Fallo Total", f"No se pudo completar el backup después de {MAX_RETRIES} intentos."))
-        
+        self.pusher.ensure_running()
         # Siempre rehabilitar el botón al final del proceso (éxito, sin cambios o fallo total)
         self.root.after(0, lambda: self.backup_button.config(state=tk.NORMAL))
+        self.root.after(0, lambda: self.cancel_button.config(state=tk.DISABLED))
+        self.root.after(0, lambda: self.progress_label.config(text=""))
+        return result_status
+
+    def cancel_backup(self):
+        """
+        Cancela el backup en curso. El motor lo detecta en menos de un segundo y
+        termina los procesos de Git del intento.
+        """
+        self.log_to_gui_and_file("Cancelación solicitada por el usuario.", "WARNING")
+        self.cancel_button.config(state=tk.DISABLED)
+        self.cancel_event.set()
 
     def on_closing(self):
         """Maneja el cierre de la ventana."""
         self.log_to_gui_and_file("Cerrando aplicación de backup...", "INFO")
-        self.executor.shutdown(wait=False, cancel_futures=True) # Intenta cancelar tareas pendientes
+        self.cancel_event.set()
+        self.pusher.stop() # Lo pendiente queda en el diario para la próxima ejecución
+        self.engine_loop.close() # Cancela el backup en curso sin dejar un git push huérfano
+        self.repo_instance.close(wait=False) # Libera el repositorio; esperar bloquearía el hilo de Tk
+        self.log_view.stop()
         self.root.destroy()
 
 
+def main_headless(args):
+    """Ejecuta el backup sin interfaz gráfica y devuelve el código de salida."""
+    setup_logging(args.repo)
+    stop_event = threading.Event()
+    engine_loop = EngineLoop()
+    options = BackupOptions.from_args(args)
+    metrics_writer = metrics.MetricsWriter.from_args(args)
+    if profiling.enabled(args):
+        profiling.arm() # Solo el primer intento: el informe queda junto al log
+    pusher = BackgroundPusher(
+        PushJournal(options.repo_dir),
+        lambda: flush_push_journal(log_message, options, engine_loop),
+        lambda: check_remote_connection(repo_dir=options.repo_dir),
+        log_message)
+
+    def run_backup(changed_paths=None):
+        status, _ = run_backup_with_retries(log_message, engine_loop, stop_event, changed_paths, options,
+                                            metrics_writer=metrics_writer)
+        pusher.ensure_running() # En modo programado o --watch, sube lo pendiente al volver la red
+        return status
+
+    try:
+        return headless.run_headless(
+            args,
+            run_backup,
+            log_message,
+            stop_event,
+            ignored_files=(LOG_FILE,) + metrics_writer.paths(),
+            run_attempt=lambda repo_dir, log_fn, progress: engine.attempt(
+                dataclasses.replace(options, repo_dir=repo_dir), progress, log_fn,
+                message_template=COMMIT_MESSAGE),
+            max_retries=MAX_RETRIES,
+            retry_delay=RETRY_DELAY_SECONDS,
+            attempt_timeout=ATTEMPT_TIMEOUT_SECONDS,
+            metrics_writer=metrics_writer
+        )
+    finally:
+        if not stop_event.is_set():
+            engine_loop.run(engine.run_pending_maintenance()) # Un backup único no espera a la inactividad
+        pusher.stop()
+        engine_loop.close()
+        logging.info("Backup headless finalizado.")
+
+
 if __name__ == "__main__":
-    if not os.path.exists(".git"):
+    args = headless.build_arg_parser("Herramienta de backup a GitHub con reintentos.").parse_args()
+    if headless.wants_headless(args):
+        sys.exit(main_headless(args))
+
+    load_tkinter()
+    if not os.path.exists(os.path.join(args.repo, ".git")):
         # Mostrar error en una ventana de Tkinter simple si la GUI principal no se va a iniciar
         root_check = tk.Tk()
         root_check.withdraw()
@@ -295,11 +322,23 @@ if __name__ == "__main__":
         print("ERROR: Este script debe ejecutarse desde la raíz de un repositorio Git.")
         exit(1)
         
-    setup_logging()
+    setup_logging(args.repo)
+    repo_instance = instance.claim(args.repo)
+    if repo_instance is None:
+        # Otra ventana o un backup programado ya trabaja en este repositorio
+        pid = instance.owner_pid(args.repo)
+        root_check = tk.Tk()
+        root_check.withdraw()
+        messagebox.showerror("Backup en Curso", f"Ya hay otra instancia de la herramienta{f' (pid {pid})' if pid else ''} "
+                             "en este repositorio. Use --trigger para pedirle un backup.")
+        root_check.destroy()
+        logging.error("Ya hay otra instancia de la herramienta en este repositorio.")
+        exit(1)
     logging.info("Aplicación de backup iniciada.")
     
     gui_root = tk.Tk()
-    app = BackupApp(gui_root)
+    app = BackupApp(gui_root, repo_instance, BackupOptions.from_args(args), metrics.MetricsWriter.from_args(args),
+                    profile=profiling.enabled(args))
     gui_root.protocol("WM_DELETE_WINDOW", app.on_closing) # Manejar cierre de ventana
     gui_root.mainloop()
     
@@ -0,0 +1,51 @@
+"""
+Utilidades comunes de las pruebas: un repositorio Git temporal con un remoto
+local (bare) y una identidad de commit fija.
+"""
+
+import os  # Para la raíz del proyecto y las variables de entorno de Git
+import subprocess  # Para preparar los repositorios de prueba
+import sys  # Para importar backup_tools sin instalarlo
+
+import pytest  # Fixtures
+
+RAIZ_PROYECTO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ_PROYECTO not in sys.path:
+    sys.path.insert(0, RAIZ_PROYECTO)
+
+
+def git(repo, *args):
+    """Ejecuta Git en `repo` y devuelve su salida sin espacios finales."""
+    return subprocess.run(["git", *args], cwd=repo, check=True, capture_output=True,
+                          text=True).stdout.strip()
+
+
+@pytest.fixture(autouse=True)
+def git_identity(monkeypatch):
+    """Identidad fija y sin configuración global del usuario."""
+    for variable in ("AUTHOR", "COMMITTER"):
+        monkeypatch.setenv(f"GIT_{variable}_NAME", "Backup Test")
+        monkeypatch.setenv(f"GIT_{variable}_EMAIL", "backup@test.invalid")
+    monkeypatch.setenv("GIT_CONFIG_GLOBAL", os.devnull)
+    monkeypatch.setenv("GIT_CONFIG_NOSYSTEM", "1")
+
+
+@pytest.fixture
+def remote(tmp_path):
+    """Repositorio bare que hace de remoto `origin`."""
+    ruta = tmp_path / "remote.git"
+    git(tmp_path, "init", "-q", "--bare", "-b", "main", str(ruta))
+    return ruta
+
+
+@pytest.fixture
+def repo(tmp_path, remote):
+    """Repositorio con un commit inicial en `main` ya subido a `remote`."""
+    ruta = tmp_path / "work"
+    git(tmp_path, "init", "-q", "-b", "main", str(ruta))
+    (ruta / "README").write_text("inicial\n")
+    git(ruta, "add", "README")
+    git(ruta, "commit", "-q", "-m", "inicial")
+    git(ruta, "remote", "add", "origin", str(remote))
+    git(ruta, "push", "-q", "-u", "origin", "main")
+    return ruta
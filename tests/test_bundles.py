@@ -0,0 +1,72 @@
+import asyncio
+
+from backup_tools import bundles, engine
+from backup_tools.options import BackupOptions
+
+from conftest import git
+
+
+def nuevo_commit(repo, texto):
+    (repo / "README").write_text(texto)
+    git(repo, "commit", "-q", "-am", texto)
+    return {"refs/heads/main": git(repo, "rev-parse", "HEAD")}
+
+
+def exportar(repo, destino, numero, refs, **opciones):
+    return asyncio.run(bundles.export_bundle(str(repo), str(destino), numero, refs, lambda m, n: None,
+                                             **opciones))
+
+
+def test_full_then_incremental_then_unchanged(repo, tmp_path):
+    destino = tmp_path / "usb"
+    primero = nuevo_commit(repo, "uno\n")
+    completo = exportar(repo, destino, 1, primero)
+    assert completo["full"] and completo["prerequisites"] == []
+    segundo = nuevo_commit(repo, "dos\n")
+    incremental = exportar(repo, destino, 2, segundo)
+    assert not incremental["full"]
+    assert incremental["prerequisites"] == [primero["refs/heads/main"]]
+    # Sin commits nuevos no se escribe otro bundle
+    assert exportar(repo, destino, 3, segundo) is None
+
+    directorio = bundles.repo_directory(str(destino), str(repo))
+    assert [e["number"] for e in bundles.load_index(directorio)] == [1, 2]
+    assert bundles.verify_bundles(str(destino), str(repo)) == []
+    # La cadena completa se puede clonar en orden
+    clon = tmp_path / "clon"
+    git(tmp_path, "clone", "-q", "-b", "main", f"{directorio}/backup-000001.bundle", str(clon))
+    git(clon, "pull", "-q", f"{directorio}/backup-000002.bundle", "main")
+    assert git(clon, "rev-parse", "HEAD") == segundo["refs/heads/main"]
+
+
+def test_verify_reports_damaged_and_missing_bundles(repo, tmp_path):
+    destino = tmp_path / "usb"
+    exportar(repo, destino, 1, nuevo_commit(repo, "uno\n"))
+    exportar(repo, destino, 2, nuevo_commit(repo, "dos\n"))
+    directorio = bundles.repo_directory(str(destino), str(repo))
+    with open(f"{directorio}/backup-000001.bundle", "ab") as f:
+        f.write(b"basura")
+    (tmp_path / "usb" / "work" / "backup-000002.bundle").unlink()
+    problemas = dict(bundles.verify_bundles(str(destino), str(repo)))
+    assert problemas["backup-000001.bundle"] == "la suma SHA-256 no coincide"
+    assert problemas["backup-000002.bundle"].startswith("no se puede leer")
+
+
+def test_old_chains_are_pruned(repo, tmp_path, monkeypatch):
+    monkeypatch.setattr(bundles, "BUNDLES_POR_CADENA", 1)
+    destino = tmp_path / "usb"
+    for numero in range(1, 6):
+        exportar(repo, destino, numero, nuevo_commit(repo, f"{numero}\n"), cadenas=1)
+    directorio = bundles.repo_directory(str(destino), str(repo))
+    # Cadenas de un completo y un incremental: 1-2, 3-4, 5
+    assert [(e["number"], e["full"]) for e in bundles.load_index(directorio)] == [(5, True)]
+    assert sorted(p.name for p in (tmp_path / "usb" / "work").glob("*.bundle")) == ["backup-000005.bundle"]
+
+
+def test_backup_writes_bundle_alongside_push(repo, tmp_path):
+    destino = tmp_path / "usb"
+    (repo / "README").write_text("cambiado\n")
+    opciones = BackupOptions(repo_dir=str(repo), bundle_dir=str(destino))
+    assert asyncio.run(engine.attempt(opciones, log_fn=lambda m, n: None)) == "SUCCESS"
+    [entrada] = bundles.load_index(bundles.repo_directory(str(destino), str(repo)))
+    assert entrada["full"] and git(repo, "rev-parse", "HEAD") in entrada["refs"].values()
@@ -0,0 +1,55 @@
+from backup_tools.catalog import STATUS_IN_PROGRESS, STATUS_LEGACY, BackupCatalog
+
+
+def test_allocate_continues_from_legacy_counter(repo):
+    (repo / "backup_info.txt").write_text("41\n")
+    catalogo = BackupCatalog(str(repo))
+    assert catalogo.allocate("add-commit") == 42
+    assert catalogo.get(41)["status"] == STATUS_LEGACY
+    registro = catalogo.get(42)
+    assert registro["status"] == STATUS_IN_PROGRESS
+    assert registro["engine"] == "add-commit"
+
+
+def test_allocate_uses_highest_legacy_counter_once(repo):
+    (repo / "backup_info.txt").write_text("7")
+    (repo / ".backup_info.txt").write_text("12")
+    catalogo = BackupCatalog(str(repo))
+    assert catalogo.allocate() == 13
+    # El contador antiguo solo se consulta con el catálogo vacío
+    (repo / "backup_info.txt").write_text("100")
+    assert catalogo.allocate() == 14
+
+
+def test_finish_releases_uncommitted_number(repo):
+    (repo / "backup_info.txt").write_text("5")
+    catalogo = BackupCatalog(str(repo))
+    numero = catalogo.allocate()
+    catalogo.finish(numero, "NO_CHANGES", attempts=1)
+    assert catalogo.get(numero) is None
+    assert catalogo.allocate() == numero
+
+
+def test_finish_records_committed_backup(repo):
+    (repo / "backup_info.txt").write_text("5")
+    catalogo = BackupCatalog(str(repo))
+    numero = catalogo.allocate()
+    catalogo.record_commit(numero, "a" * 40, "refs/heads/main", ["src/a.py", "src/a.py", "b.txt"])
+    catalogo.finish(numero, "SUCCESS", attempts=2)
+    registro = catalogo.get(numero)
+    assert registro["status"] == "SUCCESS"
+    assert registro["commit_sha"] == "a" * 40
+    assert registro["changed_files"] == 2
+    assert registro["attempts"] == 2
+    assert registro["pushed"] is not None
+    assert catalogo.last_backup_of("src")["number"] == numero
+    assert catalogo.allocate() == numero + 1
+
+
+def test_failed_uncommitted_backup_keeps_its_number(repo):
+    catalogo = BackupCatalog(str(repo))
+    numero = catalogo.allocate()
+    assert numero == 1
+    catalogo.finish(numero, "FAILED", attempts=3)
+    assert catalogo.get(numero)["status"] == "FAILED"
+    assert catalogo.allocate() == 2
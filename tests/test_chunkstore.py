@@ -0,0 +1,79 @@
+import asyncio
+import io
+import json
+import os
+import random
+
+import pytest
+
+from backup_tools import chunkstore, engine
+from backup_tools.options import BackupOptions
+
+from conftest import git
+
+
+def datos_aleatorios(tamano, semilla=0):
+    return random.Random(semilla).randbytes(tamano)
+
+
+def test_chunks_are_bounded_and_content_defined():
+    datos = datos_aleatorios(6 * chunkstore.MIB)
+    fragmentos = list(chunkstore.iter_chunks(io.BytesIO(datos)))
+    assert b"".join(fragmentos) == datos
+    assert all(chunkstore.TAMANO_MINIMO <= len(f) <= chunkstore.TAMANO_MAXIMO for f in fragmentos[:-1])
+    # Insertar bytes al principio solo cambia los primeros fragmentos
+    desplazados = list(chunkstore.iter_chunks(io.BytesIO(b"cabecera" + datos)))
+    assert len(set(fragmentos) & set(desplazados)) >= len(fragmentos) - 2
+
+
+def test_manifest_paths():
+    assert chunkstore.manifest_path("datos/grande.bin") == ".backup-chunks/datos/grande.bin.json"
+    assert chunkstore.original_path(".backup-chunks/datos/grande.bin.json") == "datos/grande.bin"
+    assert chunkstore.original_path("datos/grande.bin.json") is None
+    assert chunkstore.manifest_pathspecs(["datos/", "."]) == [
+        ".backup-chunks/datos.json", ".backup-chunks/datos", ".backup-chunks"]
+
+
+def test_sync_upload_and_reassemble(repo, tmp_path):
+    grande = repo / "grande.bin"
+    grande.write_bytes(datos_aleatorios(2 * chunkstore.MIB))
+    assert chunkstore.sync_manifests(str(repo), ["grande.bin"], 1024) == [".backup-chunks/grande.bin.json"]
+    # Sin cambios en tamaño ni mtime no se vuelve a fragmentar
+    assert chunkstore.sync_manifests(str(repo), ["grande.bin"], 1024) == []
+
+    manifiesto = json.loads((repo / ".backup-chunks/grande.bin.json").read_text())
+    assert manifiesto["path"] == "grande.bin" and manifiesto["size"] == 2 * chunkstore.MIB
+
+    destino = tmp_path / "fragmentos"
+    almacen = chunkstore.ChunkStore(str(repo))
+    subidos, _ = chunkstore.upload_pending(str(repo), str(destino))
+    assert subidos == len(manifiesto["chunks"]) and almacen.pending() == []
+
+    # Con el almacén local vacío los fragmentos se leen del destino
+    for fragmento in manifiesto["chunks"]:
+        os.remove(almacen._ruta_fragmento(fragmento.split()[0]))
+    salida = io.BytesIO()
+    assert chunkstore.reassemble(manifiesto, salida, str(repo), str(destino)) == 2 * chunkstore.MIB
+    assert salida.getvalue() == grande.read_bytes()
+    with pytest.raises(chunkstore.ChunkStoreError):
+        chunkstore.reassemble(manifiesto, io.BytesIO(), str(repo))
+
+
+def test_manifest_removed_when_file_shrinks(repo):
+    grande = repo / "grande.bin"
+    grande.write_bytes(datos_aleatorios(4096))
+    chunkstore.sync_manifests(str(repo), ["grande.bin"], 1024)
+    grande.write_bytes(b"corto")
+    assert chunkstore.sync_manifests(str(repo), [], 1024) == [".backup-chunks/grande.bin.json"]
+    assert not (repo / ".backup-chunks/grande.bin.json").exists()
+
+
+def test_backup_commits_manifest_instead_of_large_file(repo, tmp_path):
+    (repo / "grande.bin").write_bytes(datos_aleatorios(8192))
+    (repo / "README").write_text("cambiado\n")
+    destino = tmp_path / "fragmentos"
+    opciones = BackupOptions(repo_dir=str(repo), chunk_threshold=4096, chunk_target=str(destino))
+    assert asyncio.run(engine.attempt(opciones, log_fn=lambda m, n: None)) == "SUCCESS"
+    assert sorted(git(repo, "ls-files").splitlines()) == [".backup-chunks/grande.bin.json", "README"]
+    assert chunkstore.ChunkStore(str(repo)).pending() == []
+    assert any(destino.rglob("*"))
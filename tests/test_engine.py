@@ -0,0 +1,143 @@
+import asyncio
+
+import pytest
+
+from backup_tools import engine, snapshot
+from backup_tools.catalog import BackupCatalog
+from backup_tools.journal import PushJournal
+from backup_tools.options import BackupOptions, ENGINE_FAST_IMPORT
+
+from conftest import git
+
+
+@pytest.fixture(autouse=True)
+def cerrar_snapshotters():
+    yield
+    snapshot.close_all()
+
+
+def intento(repo, **opciones):
+    mensajes = []
+    estado = asyncio.run(engine.attempt(BackupOptions(repo_dir=str(repo), **opciones),
+                                        log_fn=lambda m, n: mensajes.append((n, m))))
+    return estado, mensajes
+
+
+def test_fast_import_pushes_to_the_branch_push_remote(repo, remote):
+    # Sin 'origin': el remoto de push de la rama es 'backup'
+    git(repo, "remote", "rename", "origin", "backup")
+    (repo / "README").write_text("cambiado\n")
+    estado, _ = intento(repo, snapshot_engine=ENGINE_FAST_IMPORT)
+    assert estado == "SUCCESS"
+    assert git(remote, "rev-parse", "refs/backups/main") == git(repo, "rev-parse", "refs/backups/main")
+
+
+def test_fast_import_honours_push_remote_over_branch_remote(repo, remote, tmp_path):
+    otro = tmp_path / "otro.git"
+    git(tmp_path, "init", "-q", "--bare", str(otro))
+    git(repo, "remote", "add", "espejo", str(otro))
+    git(repo, "config", "branch.main.pushRemote", "espejo")
+    (repo / "README").write_text("cambiado\n")
+    estado, _ = intento(repo, snapshot_engine=ENGINE_FAST_IMPORT)
+    assert estado == "SUCCESS"
+    assert git(otro, "rev-parse", "refs/backups/main") == git(repo, "rev-parse", "refs/backups/main")
+    assert git(remote, "for-each-ref", "refs/backups/") == ""
+
+
+def test_add_commit_untracks_stale_tool_files_once(repo):
+    (repo / "backup_info.txt").write_text("41\n")
+    (repo / "backup_git.log").write_text("log antiguo\n")
+    git(repo, "add", "backup_info.txt", "backup_git.log")
+    git(repo, "commit", "-q", "-m", "versión anterior de la herramienta")
+    git(repo, "push", "-q", "origin", "main")
+    (repo / "README").write_text("cambiado\n")
+    estado, _ = intento(repo)
+    assert estado == "SUCCESS"
+    assert git(repo, "log", "-1", "--format=%s").startswith("Backup #42 - ")
+    assert git(repo, "ls-files") == "README"
+    assert git(repo, "show", "--name-status", "--format=", "HEAD").splitlines() == [
+        "M\tREADME", "D\tbackup_git.log", "D\tbackup_info.txt"]
+    # Siguen en disco, sin rastrear y excluidas: no provocan más backups
+    assert (repo / "backup_info.txt").exists() and (repo / "backup_git.log").exists()
+    (repo / "backup_git.log").write_text("otra línea\n")
+    assert intento(repo)[0] == "NO_CHANGES"
+
+
+@pytest.fixture
+def sondeos(monkeypatch):
+    """Sustituye el sondeo del remoto: `conexion` indica si hay red y `llamadas` cuenta los sondeos."""
+    estado = {"conexion": True, "llamadas": 0}
+
+    def sondear(*args, **kwargs):
+        estado["llamadas"] += 1
+        return estado["conexion"]
+
+    monkeypatch.setattr(engine.reachability, "check_remote", sondear)
+    return estado
+
+
+def test_empty_watcher_batch_skips_git(repo, sondeos):
+    mensajes = []
+    estado = asyncio.run(engine.attempt(BackupOptions(repo_dir=str(repo)), changed_paths=set(),
+                                        log_fn=lambda m, n: mensajes.append(m)))
+    assert estado == "NO_CHANGES"
+    assert not any(m.startswith("Ejecutando:") for m in mensajes)
+    assert sondeos["llamadas"] == 0
+
+
+@pytest.mark.parametrize("motor", ["add-commit", ENGINE_FAST_IMPORT])
+def test_clean_tree_returns_no_changes_without_network(repo, sondeos, motor):
+    assert intento(repo, snapshot_engine=motor)[0] == "NO_CHANGES"
+    assert sondeos["llamadas"] == 0
+    assert BackupCatalog(str(repo)).recent() == []
+
+
+def test_only_excluded_changes_return_no_changes(repo, sondeos):
+    (repo / "node_modules").mkdir()
+    (repo / "node_modules/dep.js").write_text("x")
+    assert intento(repo)[0] == "NO_CHANGES"
+    assert sondeos["llamadas"] == 0
+    assert git(repo, "rev-list", "--count", "HEAD") == "1"
+
+
+def test_offline_backup_is_committed_locally_and_pushed_later(repo, remote, sondeos):
+    inicial = git(remote, "rev-parse", "main")
+    sondeos["conexion"] = False
+    (repo / "README").write_text("sin red\n")
+    assert intento(repo)[0] == "COMMITTED_OFFLINE"
+    local = git(repo, "rev-parse", "HEAD")
+    assert local != inicial and git(remote, "rev-parse", "main") == inicial
+    assert [e["backup_number"] for e in PushJournal(str(repo)).pending()] == [1]
+    assert BackupCatalog(str(repo)).get(1)["status"] == "COMMITTED"
+
+    # Sin cambios nuevos y sin red: no se sube nada y la entrada sigue pendiente
+    assert intento(repo)[0] == "NO_CHANGES"
+    assert PushJournal(str(repo)).pending()
+
+    # Vuelve la red: el siguiente intento, aun sin cambios, sube lo pendiente
+    sondeos["conexion"] = True
+    assert intento(repo)[0] == "NO_CHANGES"
+    assert git(remote, "rev-parse", "main") == local
+    assert PushJournal(str(repo)).pending() == []
+    assert BackupCatalog(str(repo)).get(1)["pushed"] is not None
+
+
+def test_offline_without_journal_fails_with_connection_error(repo, sondeos):
+    sondeos["conexion"] = False
+    (repo / "README").write_text("sin red\n")
+    assert intento(repo, offline_journal=False)[0] == "CONNECTION_ERROR"
+    assert git(repo, "rev-list", "--count", "HEAD") == "1"
+    assert PushJournal(str(repo)).pending() == []
+
+
+def test_next_backup_pushes_offline_backlog_in_the_same_push(repo, remote, sondeos):
+    sondeos["conexion"] = False
+    (repo / "README").write_text("uno\n")
+    assert intento(repo)[0] == "COMMITTED_OFFLINE"
+    sondeos["conexion"] = True
+    (repo / "README").write_text("dos\n")
+    estado, mensajes = intento(repo)
+    assert estado == "SUCCESS"
+    assert git(remote, "rev-parse", "main") == git(repo, "rev-parse", "HEAD")
+    assert PushJournal(str(repo)).pending() == []
+    assert any("1 backup(s) pendientes" in m for _, m in mensajes)
@@ -0,0 +1,51 @@
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from backup_tools import gitrunner
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="grupos de procesos POSIX")
+
+
+def vivo(pid):
+    """True si `pid` existe y no es un zombi."""
+    try:
+        with open(f"/proc/{pid}/stat", encoding="utf-8") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+    except OSError:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        return True
+
+
+def test_inactivity_timeout_kills_whole_process_group(tmp_path, monkeypatch):
+    monkeypatch.setattr(gitrunner, "GRACIA_TERMINACION_SEGUNDOS", 2)
+    archivo_pid = tmp_path / "hijo.pid"
+    # El hijo en segundo plano hereda el grupo; matar solo al shell lo dejaría huérfano
+    comando = ["sh", "-c", f'sleep 60 & echo $! > "{archivo_pid}"; wait']
+    mensajes = []
+    inicio = time.monotonic()
+    with pytest.raises(subprocess.TimeoutExpired):
+        asyncio.run(gitrunner.run_git(comando, lambda m, n: mensajes.append(m),
+                                      inactivity_timeout=1))
+    assert time.monotonic() - inicio < 20
+    pid_hijo = int(archivo_pid.read_text())
+    limite = time.monotonic() + 5
+    while vivo(pid_hijo) and time.monotonic() < limite:
+        time.sleep(0.05)
+    assert not vivo(pid_hijo)
+
+
+def test_output_is_returned_when_process_finishes(tmp_path):
+    stdout, stderr, codigo = asyncio.run(gitrunner.run_git(
+        ["sh", "-c", "echo salida; echo aviso >&2; exit 3"], lambda m, n: None,
+        capture_stdout=True, inactivity_timeout=5))
+    assert (stdout, stderr.strip(), codigo) == ("salida\n", "aviso", 3)
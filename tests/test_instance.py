@@ -0,0 +1,107 @@
+import threading
+import time
+
+import pytest
+
+from backup_tools import instance
+from backup_tools.instance import BackupTrigger
+
+
+class BackupLento:
+    """run_backup que se queda bloqueado hasta `soltar` y anota cada llamada."""
+
+    def __init__(self):
+        self.llamadas = []
+        self.empezado = threading.Semaphore(0)
+        self.soltar = threading.Event()
+
+    def __call__(self, rutas):
+        self.llamadas.append(None if rutas is None else set(rutas))
+        self.empezado.release()
+        assert self.soltar.wait(10)
+        return f"SUCCESS-{len(self.llamadas)}"
+
+
+def en_hilo(funcion, *args):
+    resultado = {}
+    hilo = threading.Thread(target=lambda: resultado.setdefault("estado", funcion(*args)))
+    hilo.start()
+    return hilo, resultado
+
+
+def esperar_turno(disparador, rutas):
+    """Espera a que el backup agrupado pendiente acumule `rutas`."""
+    limite = time.monotonic() + 5
+    while time.monotonic() < limite:
+        turno = disparador._siguiente
+        if turno is not None and turno.rutas == rutas:
+            return
+        time.sleep(0.01)
+    raise AssertionError(f"el turno siguiente no llegó a {rutas}")
+
+
+def test_requests_during_a_backup_coalesce_into_one_more():
+    backup = BackupLento()
+    disparador = BackupTrigger(backup)
+    primero, resultado_primero = en_hilo(disparador.run, {"a"})
+    assert backup.empezado.acquire(timeout=5)
+    assert disparador.busy
+    agrupados = [en_hilo(disparador.run, rutas) for rutas in ({"b"}, {"c"}, {"d", "e"})]
+    esperar_turno(disparador, {"b", "c", "d", "e"})
+    backup.soltar.set()
+    primero.join(5)
+    for hilo, _ in agrupados:
+        hilo.join(5)
+    assert resultado_primero["estado"] == "SUCCESS-1"
+    assert [r["estado"] for _, r in agrupados] == ["SUCCESS-2"] * 3
+    assert backup.llamadas == [{"a"}, {"b", "c", "d", "e"}]
+    assert not disparador.busy
+
+
+def test_full_check_request_wins_over_path_sets():
+    backup = BackupLento()
+    disparador = BackupTrigger(backup)
+    primero, _ = en_hilo(disparador.run, {"a"})
+    assert backup.empezado.acquire(timeout=5)
+    agrupados = [en_hilo(disparador.run, {"b"})]
+    esperar_turno(disparador, {"b"})
+    agrupados.append(en_hilo(disparador.run, None))
+    esperar_turno(disparador, None)
+    backup.soltar.set()
+    for hilo, _ in [(primero, None)] + agrupados:
+        hilo.join(5)
+    assert backup.llamadas == [{"a"}, None]
+
+
+def test_close_without_wait_abandons_pending_backup():
+    backup = BackupLento()
+    disparador = BackupTrigger(backup)
+    primero, resultado_primero = en_hilo(disparador.run, None)
+    assert backup.empezado.acquire(timeout=5)
+    pendiente, resultado_pendiente = en_hilo(disparador.run, {"x"})
+    esperar_turno(disparador, {"x"})
+    disparador.close(wait=False)
+    backup.soltar.set()
+    primero.join(5)
+    pendiente.join(5)
+    assert resultado_primero["estado"] == "SUCCESS-1"
+    assert resultado_pendiente["estado"] == instance.ESTADO_ABANDONADO
+    assert disparador.run(None) == instance.ESTADO_ABANDONADO
+    assert len(backup.llamadas) == 1
+
+
+@pytest.mark.skipif(not instance.supported(), reason="flock y sockets Unix")
+def test_second_claim_fails_and_requests_go_to_the_owner(repo):
+    duena = instance.claim(str(repo))
+    assert duena is not None
+    try:
+        assert instance.claim(str(repo)) is None
+        assert instance.request_backup(str(repo), lambda m, n: None, espera=0.5) is None  # Aún no escucha
+        duena.listen(lambda rutas: "SUCCESS", lambda m, n: None)
+        assert instance.request_backup(str(repo), lambda m, n: None) == "SUCCESS"
+        assert instance.owner_pid(str(repo)) is not None
+    finally:
+        duena.close()
+    otra = instance.claim(str(repo))
+    assert otra is not None
+    otra.close()
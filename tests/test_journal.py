@@ -0,0 +1,54 @@
+import asyncio
+import subprocess
+
+from backup_tools.journal import PushJournal
+
+from conftest import git
+
+
+def push_real(repo):
+    async def push(push_args):
+        return subprocess.run(["git", *push_args], cwd=repo, capture_output=True).returncode == 0
+    return push
+
+
+def commit(repo, nombre, contenido):
+    (repo / nombre).write_text(contenido)
+    git(repo, "add", nombre)
+    git(repo, "commit", "-q", "-m", nombre)
+    return git(repo, "rev-parse", "HEAD")
+
+
+def test_flush_pushes_every_pending_backup_in_one_push(repo, remote):
+    diario = PushJournal(str(repo))
+    push_args = ["push", "origin", "main"]
+    commit(repo, "uno.txt", "1")
+    diario.add(1, push_args)
+    ultimo = commit(repo, "dos.txt", "2")
+    diario.add(2, push_args)
+    diario.add(2, push_args)  # Anotar de nuevo no duplica la entrada
+    assert [e["backup_number"] for e in PushJournal(str(repo)).pending()] == [1, 2]
+
+    llamadas, subidas, mensajes = [], [], []
+    push = push_real(repo)
+
+    async def contar(args):
+        llamadas.append(args)
+        return await push(args)
+
+    assert asyncio.run(diario.flush(contar, lambda m, n: mensajes.append(m), subidas.extend))
+    assert llamadas == [push_args]
+    assert [e["backup_number"] for e in subidas] == [1, 2]
+    assert diario.pending() == []
+    assert git(remote, "rev-parse", "main") == ultimo
+
+
+def test_failed_flush_keeps_entries_for_next_run(repo, remote):
+    diario = PushJournal(str(repo))
+    inicial = git(remote, "rev-parse", "main")
+    commit(repo, "uno.txt", "1")
+    diario.add(1, ["push", "noexiste", "main"])
+
+    assert not asyncio.run(diario.flush(push_real(repo), lambda m, n: None))
+    assert [e["backup_number"] for e in diario.pending()] == [1]
+    assert git(remote, "rev-parse", "main") == inicial
@@ -0,0 +1,81 @@
+import asyncio
+import json
+
+from backup_tools import maintenance, statedir
+from backup_tools.maintenance import ObjectStats
+
+from conftest import git
+
+SALIDA_COUNT_OBJECTS = """count: 300
+size: 1200
+in-pack: 40
+packs: 3
+size-pack: 80
+prune-packable: 0
+garbage: 1
+size-garbage: 4
+"""
+
+
+def test_parse_count_objects():
+    assert maintenance.parse_count_objects(SALIDA_COUNT_OBJECTS) == ObjectStats(
+        loose_objects=300, loose_kib=1200, packs=3, pack_kib=80, packed_objects=40, garbage=1)
+
+
+def test_plan_tasks():
+    todo = [maintenance.TASK_REPACK, maintenance.TASK_MIDX, maintenance.TASK_COMMIT_GRAPH]
+    assert maintenance.plan_tasks(ObjectStats(loose_objects=maintenance.UMBRAL_OBJETOS_SUELTOS)) == todo
+    assert maintenance.plan_tasks(ObjectStats(packs=maintenance.UMBRAL_PAQUETES)) == todo
+    assert maintenance.plan_tasks(ObjectStats(), force=True) == todo
+    # Por debajo de los umbrales solo se crean los índices que faltan
+    assert maintenance.plan_tasks(ObjectStats(packs=2)) == [maintenance.TASK_MIDX, maintenance.TASK_COMMIT_GRAPH]
+    assert maintenance.plan_tasks(ObjectStats(packs=2, multi_pack_index=True, commit_graph=True)) == []
+
+
+def test_forced_maintenance_repacks_and_logs(repo):
+    registro = asyncio.run(maintenance.run_maintenance(str(repo), lambda m, n: None, force=True))
+    assert [t["task"] for t in registro["tasks"]] == [
+        maintenance.TASK_REPACK, maintenance.TASK_MIDX, maintenance.TASK_COMMIT_GRAPH]
+    assert all(t["returncode"] == 0 for t in registro["tasks"])
+    assert registro["before"]["loose_objects"] > 0
+    assert registro["after"]["loose_objects"] == 0
+    assert registro["after"]["multi_pack_index"] and registro["after"]["commit_graph"]
+    with open(statedir.state_path(str(repo), maintenance.ARCHIVO_REGISTRO), encoding="utf-8") as f:
+        assert [json.loads(linea)["tasks"] for linea in f] == [registro["tasks"]]
+    # Ya al día: no hace falta nada
+    assert asyncio.run(maintenance.run_maintenance(str(repo), lambda m, n: None)) is None
+    git(repo, "fsck", "--no-progress")
+
+
+def test_maintenance_stops_when_a_backup_arrives(repo):
+    mensajes = []
+    registro = asyncio.run(maintenance.run_maintenance(str(repo), lambda m, n: mensajes.append(m),
+                                                       force=True, busy_fn=lambda: True))
+    assert registro["tasks"] == []
+    assert "Mantenimiento aplazado: hay un backup en curso." in mensajes
+
+
+def test_idle_scheduler_waits_for_inactivity():
+    ejecuciones = []
+
+    async def mantener(repo_dir, log_fn, busy_fn):
+        ejecuciones.append((repo_dir, busy_fn()))
+
+    async def escenario():
+        programador = maintenance.IdleScheduler(mantener, delay=0.05)
+        programador.backup_started("/repo")
+        programador.backup_finished("/repo", print)
+        # Un backup que llega durante la espera la cancela
+        programador.backup_started("/repo")
+        await asyncio.sleep(0.1)
+        assert ejecuciones == [] and programador.busy("/repo")
+        programador.backup_finished("/repo", print)
+        await asyncio.sleep(0.1)
+        assert ejecuciones == [("/repo", False)]
+        # run_pending no espera a la inactividad
+        programador.backup_started("/repo")
+        programador.backup_finished("/repo", print)
+        await programador.run_pending()
+        assert len(ejecuciones) == 2
+
+    asyncio.run(escenario())
@@ -0,0 +1,57 @@
+import json
+
+from backup_tools import metrics
+
+SALIDA_PUSH = """Enumerating objects: 5, done.
+Counting objects: 100% (5/5), done.
+Writing objects:  50% (1/2)
+Writing objects: 100% (3/3), 1.50 KiB | 1.50 MiB/s, done.
+Total 3 (delta 0), reused 0 (delta 0), pack-reused 0
+"""
+
+
+def test_parse_push_output():
+    assert metrics.parse_push_output(SALIDA_PUSH) == (3, 1536)
+    assert metrics.parse_push_output("Total 4 (delta 1), reused 0 (delta 0)") == (4, 0)
+    assert metrics.parse_push_output("Everything up-to-date\n") == (0, 0)
+    assert metrics.parse_push_output(None) == (0, 0)
+
+
+def test_phases_accumulate_across_attempts():
+    medicion = metrics.BackupMetrics()
+    for _ in range(2):
+        with medicion.phase(metrics.STEP_PUSH):
+            pass
+        medicion.record_push(SALIDA_PUSH)
+    registro = medicion.to_record("repo", "SUCCESS", 2)
+    assert set(registro["phases"]) == {metrics.STEP_PUSH}
+    assert (registro["bytes_pushed"], registro["objects_pushed"]) == (3072, 6)
+
+
+def test_writer_appends_jsonl_and_exposes_totals(tmp_path):
+    escritor = metrics.MetricsWriter(str(tmp_path / "m.jsonl"), str(tmp_path / "m.prom"))
+    for estado in ("SUCCESS", "PUSH_ERROR"):
+        medicion = metrics.BackupMetrics(phases={metrics.STEP_COMMIT: 0.2})
+        medicion.record_push(SALIDA_PUSH)
+        escritor.write(medicion, 'repo "raro"', estado, 1)
+    registros = [json.loads(linea) for linea in (tmp_path / "m.jsonl").read_text().splitlines()]
+    assert [r["status"] for r in registros] == ["SUCCESS", "PUSH_ERROR"]
+
+    # Un escritor nuevo continúa los acumulados guardados
+    escritor = metrics.MetricsWriter(str(tmp_path / "m.jsonl"), str(tmp_path / "m.prom"))
+    escritor.write(metrics.BackupMetrics(phases={metrics.STEP_COMMIT: 0.2}), 'repo "raro"', "SUCCESS", 1)
+    prom = (tmp_path / "m.prom").read_text().splitlines()
+    etiqueta = 'repo="repo \\"raro\\""'
+    assert f'git_backup_runs_total{{{etiqueta},status="SUCCESS"}} 2' in prom
+    assert f"git_backup_pushed_bytes_total{{{etiqueta}}} 3072" in prom
+    assert f'git_backup_phase_duration_seconds_bucket{{{etiqueta},phase="commit",le="0.25"}} 3' in prom
+    assert f'git_backup_phase_duration_seconds_bucket{{{etiqueta},phase="commit",le="0.1"}} 0' in prom
+    assert any(linea.startswith("git_backup_last_success_timestamp_seconds{") for linea in prom)
+
+
+def test_write_errors_are_only_logged(tmp_path):
+    mensajes = []
+    escritor = metrics.MetricsWriter(str(tmp_path / "no-existe" / "m.jsonl"), None)
+    registro = escritor.write(metrics.BackupMetrics(), "repo", "SUCCESS", 1,
+                              log_fn=lambda m, n: mensajes.append(n))
+    assert registro["status"] == "SUCCESS" and mensajes == ["WARNING"]
@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+
+from backup_tools import engine, mirrors
+from backup_tools.journal import PushJournal
+from backup_tools.options import BackupOptions
+from backup_tools.retry import AttemptProgress
+
+from conftest import git
+
+
+def test_destinations_add_one_push_per_mirror():
+    explicito = ["git", "push", "--progress", "origin", "refs/backups/main:refs/backups/main"]
+    assert mirrors.destinations(explicito, ["nas", "origin", "nas"]) == [
+        ("origin", explicito),
+        ("nas", ["git", "push", "--progress", "nas", "refs/backups/main:refs/backups/main"]),
+    ]
+    # Sin remoto explícito: HEAD a la rama del mismo nombre en el espejo
+    assert mirrors.destinations(["git", "push"], ["nas"]) == [
+        (mirrors.DESTINO_PREDETERMINADO, ["git", "push"]),
+        ("nas", ["git", "push", "nas", "HEAD"]),
+    ]
+
+
+@pytest.mark.parametrize("quorum, total, esperado", [(None, 3, 3), (2, 3, 2), (5, 3, 3), (0, 3, 1)])
+def test_required_successes(quorum, total, esperado):
+    assert mirrors.required_successes(quorum, total) == esperado
+
+
+def progreso_en_push():
+    progreso = AttemptProgress()
+    progreso.reserve(7)
+    progreso.commit_done(7, ["git", "push", "--progress", "origin", "main"])
+    return progreso
+
+
+def test_quorum_reached_journals_lagging_mirror(repo):
+    intentos = {}
+
+    async def push(args):
+        intentos[args[3]] = intentos.get(args[3], 0) + 1
+        return ("", 0) if args[3] != "lento" else ("fatal: Could not resolve host: lento", 128)
+
+    progreso = progreso_en_push()
+    diario = PushJournal(str(repo))
+    ok, _ = asyncio.run(mirrors.push_with_quorum(progreso, ["nas", "lento"], 2, push, lambda m, n: None,
+                                                 diario))
+    assert ok
+    assert progreso.pushed_remotes == {"origin", "nas"}
+    assert intentos["lento"] == 1 + mirrors.REINTENTOS_PUSH
+    assert [e["push_args"] for e in diario.pending()] == [["git", "push", "--progress", "lento", "main"]]
+
+
+def test_fatal_failure_is_not_retried_and_misses_quorum():
+    intentos = []
+
+    async def push(args):
+        intentos.append(args[3])
+        if args[3] == "nas":
+            return "! [remote rejected] main -> main (pre-receive hook declined)", 1
+        return "", 0
+
+    progreso = progreso_en_push()
+    ok, stderr = asyncio.run(mirrors.push_with_quorum(progreso, ["nas"], None, push, lambda m, n: None))
+    assert not ok and "hook declined" in stderr
+    assert intentos.count("nas") == 1
+    # El siguiente intento solo repite los destinos que faltan
+    asyncio.run(mirrors.push_with_quorum(progreso, ["nas"], None, push, lambda m, n: None))
+    assert intentos.count("origin") == 1
+
+
+def test_backup_reaches_every_mirror(repo, remote, tmp_path):
+    espejo = tmp_path / "espejo.git"
+    git(tmp_path, "init", "-q", "--bare", str(espejo))
+    git(repo, "remote", "add", "espejo", str(espejo))
+    (repo / "README").write_text("cambiado\n")
+    estado = asyncio.run(engine.attempt(BackupOptions(repo_dir=str(repo), mirrors=("espejo",)),
+                                        log_fn=lambda m, n: None))
+    assert estado == "SUCCESS"
+    head = git(repo, "rev-parse", "HEAD")
+    assert git(remote, "rev-parse", "main") == head
+    assert git(espejo, "rev-parse", "main") == head
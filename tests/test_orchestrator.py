@@ -0,0 +1,106 @@
+import asyncio
+import json
+
+import pytest
+
+from backup_tools import instance
+from backup_tools.orchestrator import ConfigError, Orchestrator, RepoState, load_config, run_from_config
+
+from conftest import git
+
+
+@pytest.fixture
+def repos(tmp_path):
+    """Tres repositorios vacíos: a, b y c."""
+    rutas = []
+    for nombre in "abc":
+        git(tmp_path, "init", "-q", str(tmp_path / nombre))
+        rutas.append(str(tmp_path / nombre))
+    return rutas
+
+
+def escribir_config(tmp_path, config):
+    ruta = tmp_path / "backups.json"
+    ruta.write_text(json.dumps(config))
+    return str(ruta)
+
+
+def test_load_config_resolves_relative_paths_and_names(tmp_path, repos):
+    ruta = escribir_config(tmp_path, {"max_workers": 2, "unknown": 1,
+                                      "repos": ["a", {"path": repos[1], "name": "otro"}]})
+    estados, ajustes = load_config(ruta)
+    assert [(r.name, r.path) for r in estados] == [("a", repos[0]), ("otro", repos[1])]
+    assert ajustes == {"max_workers": 2}
+
+
+@pytest.mark.parametrize("config", [
+    {"repos": []},
+    {"repos": ["a", {"path": "b", "name": "a"}]},
+    {"repos": ["no-existe"]},
+])
+def test_load_config_rejects_invalid_configs(tmp_path, repos, config):
+    with pytest.raises(ConfigError):
+        load_config(escribir_config(tmp_path, config))
+
+
+def test_load_config_rejects_unreadable_file(tmp_path):
+    with pytest.raises(ConfigError):
+        load_config(str(tmp_path / "no-existe.json"))
+
+
+class IntentosFalsos:
+    """run_attempt que sigue un guion de estados por repositorio y mide la concurrencia."""
+
+    def __init__(self, guiones):
+        self.guiones = {ruta: list(estados) for ruta, estados in guiones.items()}
+        self.en_curso = 0
+        self.maximo = 0
+
+    async def __call__(self, ruta, log_fn, progreso):
+        self.en_curso += 1
+        self.maximo = max(self.maximo, self.en_curso)
+        try:
+            await asyncio.sleep(0.02)
+            estado, stderr = self.guiones[ruta].pop(0)
+            return estado if estado == "SUCCESS" else progreso.fail(estado, stderr)
+        finally:
+            self.en_curso -= 1
+
+
+def test_retries_are_per_repository_and_bounded_by_workers(repos):
+    intentos = IntentosFalsos({
+        repos[0]: [("SUCCESS", "")],
+        repos[1]: [("PUSH_ERROR", "fatal: Could not resolve host: github.com"), ("SUCCESS", "")],
+        repos[2]: [("PUSH_ERROR", "ERROR: Repository not found.")],
+    })
+    estados = [RepoState(name=ruta[-1], path=ruta) for ruta in repos]
+    Orchestrator(estados, intentos, lambda m, n: None, max_workers=2, retry_delay=0.01,
+                 maintenance=False).run()
+    assert [(r.status, r.history) for r in estados] == [
+        ("SUCCESS", ["SUCCESS"]),
+        ("SUCCESS", ["PUSH_ERROR", "SUCCESS"]),
+        # Error definitivo: no se reintenta
+        ("PUSH_ERROR", ["PUSH_ERROR"]),
+    ]
+    assert intentos.maximo == 2
+    # Los cerrojos de instancia se liberan al terminar
+    assert all(r.instance is None for r in estados)
+    reclamada = instance.claim(repos[0])
+    assert reclamada is not None
+    reclamada.close()
+
+
+def test_run_from_config_reports_partial_failure(tmp_path, repos):
+    ruta = escribir_config(tmp_path, {"repos": repos[:2], "max_retries": 2})
+    intentos = IntentosFalsos({
+        repos[0]: [("SUCCESS", "")],
+        repos[1]: [("PUSH_ERROR", "fatal: Could not resolve host: a"),
+                   ("PUSH_ERROR", "fatal: Could not resolve host: a")],
+    })
+    mensajes = []
+    resultado = run_from_config(ruta, intentos, lambda m, n: mensajes.append((n, m)), max_retries=5,
+                                retry_delay=0.01, maintenance=False)
+    assert resultado == "PARTIAL_FAILURE"
+    assert ("ERROR", "[b] Backup fallido tras 2 intento(s).") in mensajes
+    assert ("ERROR", "1/2 repositorios respaldados correctamente") in [
+        (n, m.split(" en ")[0]) for n, m in mensajes]
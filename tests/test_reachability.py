@@ -0,0 +1,84 @@
+import socket
+
+import pytest
+
+from backup_tools import reachability
+from backup_tools.reachability import Endpoint, ReachabilityProbe, parse_remote_url
+
+from conftest import git
+
+
+@pytest.mark.parametrize("url, esperado", [
+    ("https://github.com/u/r.git", Endpoint("http", "github.com", 443)),
+    ("http://forja.local:8080/r.git", Endpoint("http", "forja.local", 8080)),
+    ("ssh://git@host.example:2222/r.git", Endpoint("ssh", "host.example", 2222)),
+    ("git@github.com:u/r.git", Endpoint("ssh", "github.com", 22)),
+    ("[::1]:r.git", Endpoint("ssh", "::1", 22)),
+    ("git://host.example/r.git", Endpoint("git", "host.example", 9418)),
+    ("file:///srv/git/r.git", Endpoint("local", path="/srv/git/r.git")),
+    ("ext::ssh -p 22 host %S r.git", Endpoint("unknown")),
+    ("s3::bucket/r", Endpoint("unknown")),
+])
+def test_parse_remote_url(url, esperado):
+    assert parse_remote_url(url) == esperado
+
+
+def test_relative_local_paths_resolve_against_the_repository(tmp_path):
+    assert parse_remote_url("../r.git", str(tmp_path / "work")) == Endpoint("local", path=str(tmp_path / "r.git"))
+
+
+def test_resolve_push_remote_follows_git_precedence(repo, tmp_path):
+    git(repo, "remote", "add", "nas", str(tmp_path / "nas.git"))
+    git(repo, "remote", "add", "forja", "https://forja.example/r.git")
+    git(repo, "remote", "set-url", "--push", "forja", "ssh://git@forja.example/r.git")
+    assert reachability.resolve_push_remote(str(repo)) == ("origin", str(tmp_path / "remote.git"))
+    git(repo, "config", "remote.pushDefault", "nas")
+    assert reachability.resolve_push_remote(str(repo))[0] == "nas"
+    git(repo, "config", "branch.main.pushRemote", "forja")
+    assert reachability.resolve_push_remote(str(repo)) == ("forja", "ssh://git@forja.example/r.git")
+    assert reachability.resolve_push_remote(str(repo), "nope") == ("nope", None)
+
+
+def test_local_remote_is_checked_and_cached(repo, remote):
+    sonda = ReachabilityProbe()
+    assert sonda.check(str(repo))
+    git(repo, "remote", "set-url", "origin", str(remote) + "-desmontado")
+    # El remoto resuelto y el resultado siguen en caché hasta que caducan
+    assert sonda.check(str(repo))
+    assert not ReachabilityProbe().check(str(repo))
+
+
+def test_tcp_probe_uses_real_connections():
+    servidor = socket.socket()
+    servidor.bind(("127.0.0.1", 0))
+    servidor.listen()
+    puerto = servidor.getsockname()[1]
+    sonda = ReachabilityProbe()
+    try:
+        assert sonda.probe(Endpoint("http", "127.0.0.1", puerto), timeout=2)[:1] == (True,)
+        alcanzable, _, en_cache = sonda.probe(Endpoint("http", "127.0.0.1", puerto), timeout=2)
+        assert alcanzable and en_cache
+    finally:
+        servidor.close()
+    alcanzable, detalle, en_cache = ReachabilityProbe().probe(Endpoint("http", "127.0.0.1", puerto), timeout=2)
+    assert not alcanzable and not en_cache and str(puerto) in detalle
+
+
+def test_ssh_config_lookup_is_cached_per_url_host_and_port(monkeypatch):
+    llamadas = []
+
+    class Resultado:
+        returncode = 0
+        stdout = "hostname 127.0.0.1\nport 1\n"
+
+    def ejecutar(args, **kwargs):
+        llamadas.append(args)
+        return Resultado()
+
+    monkeypatch.setattr(reachability.subprocess, "run", ejecutar)
+    sonda = ReachabilityProbe()
+    assert sonda._destino_ssh("alias", 22) == ("127.0.0.1", 1)
+    assert sonda._destino_ssh("alias", 22) == ("127.0.0.1", 1)
+    # Un puerto explícito en la URL prevalece sobre el de ~/.ssh/config
+    assert sonda._destino_ssh("alias", 2222) == ("127.0.0.1", 2222)
+    assert len(llamadas) == 2
@@ -0,0 +1,86 @@
+import os
+
+import pytest
+
+from backup_tools import restore, snapshot
+
+from conftest import git
+
+
+@pytest.fixture(autouse=True)
+def cerrar_lectores():
+    yield
+    restore.close_all()
+
+
+def backup(repo, mensaje):
+    git(repo, "add", "-A")
+    git(repo, "commit", "-q", "-m", mensaje)
+    return git(repo, "rev-parse", "HEAD")
+
+
+@pytest.fixture
+def historial(repo):
+    """Dos backups en main y un snapshot en refs/backups/main."""
+    (repo / "src").mkdir()
+    (repo / "src/app.py").write_text("v1\n")
+    (repo / "run.sh").write_text("#!/bin/sh\n")
+    (repo / "run.sh").chmod(0o755)
+    primero = backup(repo, "Backup #1 - 2026-01-01 10:00:00")
+    (repo / "src/app.py").write_text("v2\n")
+    (repo / "src/util.py").write_text("util\n")
+    segundo = backup(repo, "backup 2 - 2026-01-02 10:00:00")
+    git(repo, "commit", "-q", "--allow-empty", "-m", "trabajo normal")
+    tercero = git(repo, "commit-tree", "-p", "HEAD", "-m", "Backup #3 - 2026-01-03 10:00:00",
+                  git(repo, "rev-parse", "HEAD^{tree}"))
+    git(repo, "update-ref", snapshot.REF_PREFIX + "main", tercero)
+    return {1: primero, 2: segundo, 3: tercero}
+
+
+def test_list_backups_finds_both_formats_and_snapshot_refs(repo, historial):
+    backups = restore.list_backups(str(repo))
+    assert [(b.number, b.sha) for b in backups] == [(n, historial[n]) for n in (3, 2, 1)]
+    assert backups[0].ref == snapshot.REF_PREFIX + "main"
+    assert [b.number for b in restore.list_backups(str(repo), limite=2)] == [3, 2]
+
+
+def test_resolve_backup_by_number_or_commit(repo, historial):
+    assert restore.resolve_backup(str(repo), 1) == historial[1]
+    assert restore.resolve_backup(str(repo), "#2") == historial[2]
+    assert restore.resolve_backup(str(repo), historial[3][:10]) == historial[3]
+    with pytest.raises(restore.RestoreError):
+        restore.resolve_backup(str(repo), "no-existe")
+
+
+def test_restore_overwrites_files_in_the_work_tree(repo, historial):
+    (repo / "src/app.py").write_text("roto\n")
+    (repo / "run.sh").unlink()
+    restaurados, total, errores = restore.restore(str(repo), 1, ["src/app.py", "run.sh"])
+    assert (restaurados, errores) == (2, [])
+    assert total == len("v1\n") + len("#!/bin/sh\n")
+    assert (repo / "src/app.py").read_text() == "v1\n"
+    assert os.access(repo / "run.sh", os.X_OK)
+    assert not [n for n in os.listdir(repo / "src") if n.startswith(".restore-")]
+
+
+def test_restore_directory_to_another_destination(repo, historial, tmp_path):
+    destino = tmp_path / "restaurado"
+    restaurados, _, errores = restore.restore(str(repo), 2, ["src/"], str(destino))
+    assert (restaurados, errores) == (2, [])
+    assert (destino / "src/app.py").read_text() == "v2\n"
+    assert (destino / "src/util.py").read_text() == "util\n"
+    assert (repo / "src/app.py").read_text() == "v2\n"
+
+
+def test_restore_of_missing_path_fails(repo, historial):
+    with pytest.raises(restore.RestoreError):
+        restore.restore(str(repo), 1, ["src/util.py"])
+
+
+@pytest.mark.skipif(os.name == "nt", reason="enlaces simbólicos")
+def test_restore_recreates_symlinks(repo, historial, tmp_path):
+    (repo / "enlace").symlink_to("run.sh")
+    backup(repo, "Backup #4 - 2026-01-04 10:00:00")
+    destino = tmp_path / "restaurado"
+    restore.restore(str(repo), 4, ["enlace"], str(destino))
+    assert os.readlink(destino / "enlace") == "run.sh"
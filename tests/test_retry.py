@@ -0,0 +1,33 @@
+import pytest
+
+from backup_tools.retry import FATAL, RETRYABLE, UNKNOWN, classify_error
+
+
+@pytest.mark.parametrize("stderr", [
+    "remote: Repository not found.\nfatal: repository 'https://example.invalid/x.git/' not found",
+    "! [remote rejected] main -> main (pre-receive hook declined)",
+    "fatal: No configured push destination.",
+    "*** Please tell me who you are.",
+])
+def test_permanent_failures_are_fatal(stderr):
+    assert classify_error(stderr) == FATAL
+
+
+@pytest.mark.parametrize("stderr", [
+    "fatal: unable to access 'https://github.com/x/y.git/': Could not resolve host: github.com",
+    "ssh: connect to host github.com port 22: Connection refused",
+    "fatal: the remote end hung up unexpectedly",
+    "The requested URL returned error: 503",
+    "fatal: Unable to create '/repo/.git/index.lock': File exists.",
+])
+def test_transient_failures_are_retryable(stderr):
+    assert classify_error(stderr) == RETRYABLE
+
+
+@pytest.mark.parametrize("stderr", ["", None, "error: something nobody has seen before"])
+def test_unrecognised_output_is_unknown(stderr):
+    assert classify_error(stderr) == UNKNOWN
+
+
+def test_fatal_wins_over_retryable_fragments():
+    assert classify_error("Connection reset\n! [remote rejected] (hook declined)") == FATAL
@@ -0,0 +1,51 @@
+import datetime
+
+import pytest
+
+from backup_tools.scheduler import CronExpression
+
+
+def siguientes(expresion, desde, cantidad):
+    cron, momento, resultado = CronExpression(expresion), desde, []
+    for _ in range(cantidad):
+        momento = cron.next_after(momento)
+        resultado.append(momento)
+    return resultado
+
+
+def test_next_after_is_strictly_later_and_drops_seconds():
+    cron = CronExpression("*/15 * * * *")
+    assert cron.next_after(datetime.datetime(2026, 1, 1, 10, 0, 0)) == datetime.datetime(2026, 1, 1, 10, 15)
+    assert cron.next_after(datetime.datetime(2026, 1, 1, 10, 14, 59)) == datetime.datetime(2026, 1, 1, 10, 15)
+
+
+def test_next_after_rolls_over_hours_days_and_months():
+    assert siguientes("30 23 31 * *", datetime.datetime(2026, 1, 31, 23, 30), 2) == [
+        datetime.datetime(2026, 3, 31, 23, 30),
+        datetime.datetime(2026, 5, 31, 23, 30),
+    ]
+
+
+def test_restricted_day_of_month_and_week_match_either():
+    # 1 de junio de 2026 es lunes; el resto de lunes y el día 15 también cuentan
+    dias = [m.day for m in siguientes("0 3 15 * 1", datetime.datetime(2026, 5, 31, 12), 4)]
+    assert dias == [1, 8, 15, 22]
+
+
+def test_star_prefixed_day_field_is_unrestricted_like_vixie_cron():
+    # '*/2' cuenta como no restringido: hace falta un día impar que además sea lunes
+    momentos = siguientes("0 3 */2 * 1", datetime.datetime(2026, 10, 1), 3)
+    assert all(m.weekday() == 0 and m.day % 2 == 1 for m in momentos)
+    assert [m.day for m in momentos] == [5, 19, 9]
+
+
+def test_sunday_can_be_written_as_0_or_7():
+    desde = datetime.datetime(2026, 10, 14)
+    assert siguientes("0 8 * * 0", desde, 2) == siguientes("0 8 * * 7", desde, 2)
+    assert siguientes("0 8 * * 7", desde, 1)[0].weekday() == 6
+
+
+@pytest.mark.parametrize("expresion", ["* * * *", "60 * * * *", "*/0 * * * *", "0 0 31 2 *"])
+def test_invalid_or_impossible_expressions_raise(expresion):
+    with pytest.raises(ValueError):
+        siguientes(expresion, datetime.datetime(2026, 1, 1), 1)
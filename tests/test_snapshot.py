@@ -0,0 +1,83 @@
+import os
+import subprocess
+
+import pytest
+
+from backup_tools.snapshot import REF_PREFIX, FastImportSnapshotter
+
+from conftest import git
+
+REF = REF_PREFIX + "main"
+
+
+def status(repo):
+    return subprocess.run(["git", "status", "--porcelain", "-z", "-uall"], cwd=repo,
+                          check=True, capture_output=True).stdout.decode("utf-8", "surrogateescape")
+
+
+def snapshot(repo, mensaje="backup"):
+    """Cada llamada usa un snapshotter nuevo, como una ejecución nueva de la herramienta."""
+    snapshotter = FastImportSnapshotter(str(repo))
+    try:
+        salida = status(repo)
+        sin_cambios = snapshotter.unchanged(salida)
+        sha = snapshotter.snapshot(salida, mensaje)
+        assert sin_cambios == (sha is None)
+        return sha
+    finally:
+        snapshotter.close()
+
+
+def test_repeated_runs_create_a_single_snapshot(repo):
+    (repo / "README").write_text("modificado\n")
+    (repo / "nuevo.txt").write_text("nuevo\n")
+    primero = snapshot(repo)
+    assert primero and git(repo, "rev-parse", REF) == primero
+    assert snapshot(repo) is None
+    assert snapshot(repo) is None
+    assert git(repo, "rev-list", "--count", REF) == "2"  # Backup + commit inicial
+    # El índice y la rama del usuario no se tocan
+    assert git(repo, "rev-list", "--count", "main") == "1"
+    assert git(repo, "diff", "--cached", "--name-only") == ""
+
+
+def test_touch_without_content_change_is_not_a_new_snapshot(repo):
+    archivo = repo / "README"
+    archivo.write_text("modificado\n")
+    assert snapshot(repo)
+    os.utime(archivo, (1, 1))
+    assert snapshot(repo) is None
+
+
+def test_new_content_after_dedup_creates_snapshot(repo):
+    (repo / "README").write_text("v1\n")
+    primero = snapshot(repo)
+    assert snapshot(repo) is None
+    (repo / "README").write_text("v2\n")
+    segundo = snapshot(repo)
+    assert segundo not in (None, primero)
+    assert git(repo, "show", f"{segundo}:README") == "v2"
+    assert git(repo, "rev-parse", f"{segundo}^2") == primero
+
+
+def test_deletions_are_snapshotted_and_deduplicated(repo):
+    (repo / "README").unlink()
+    sha = snapshot(repo)
+    assert sha
+    assert git(repo, "ls-tree", "--name-only", sha) == ""
+    assert snapshot(repo) is None
+
+
+@pytest.mark.skipif(os.name == "nt", reason="symlinks y bit de ejecución de POSIX")
+def test_symlinks_and_exec_bit_are_deduplicated(repo):
+    script = repo / "run.sh"
+    script.write_text("#!/bin/sh\n")
+    script.chmod(0o755)
+    (repo / "enlace").symlink_to("README")
+    sha = snapshot(repo)
+    modos = {linea.split()[-1]: linea.split()[0] for linea in git(repo, "ls-tree", sha).splitlines()}
+    assert modos["run.sh"] == "100755"
+    assert modos["enlace"] == "120000"
+    assert snapshot(repo) is None
+    script.chmod(0o644)
+    assert snapshot(repo)
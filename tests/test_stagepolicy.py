@@ -0,0 +1,131 @@
+import os
+import subprocess
+
+import pytest
+
+from backup_tools import stagepolicy
+from backup_tools.stagepolicy import StagePolicy, compile_patterns, scan
+
+from conftest import git
+
+
+def coincide(patrones, ruta):
+    return compile_patterns(patrones).search(ruta) is not None
+
+
+def status(repo):
+    return subprocess.run(["git", "status", "--porcelain", "-z"], cwd=repo, check=True,
+                          capture_output=True).stdout.decode()
+
+
+@pytest.mark.parametrize("patron, ruta, esperado", [
+    # Sin '/' intermedia: el patrón vale a cualquier profundidad
+    ("*.log", "debug.log", True),
+    ("*.log", "a/b/debug.log", True),
+    ("*.log", "debug.log.txt", False),
+    # Con '/' al principio o en medio: anclado a la raíz
+    ("/build", "build", True),
+    ("/build", "build/out.bin", True),
+    ("/build", "app/build", False),
+    ("docs/tmp", "docs/tmp/x", True),
+    ("docs/tmp", "src/docs/tmp/x", False),
+    ("**/cache", "a/b/cache/x", True),
+    ("a/**/z", "a/z", True),
+    ("a/**/z", "a/b/c/z", True),
+    # Excluir un directorio excluye todo su contenido
+    ("tmp", "tmp/a/b.txt", True),
+    ("tmp", "tmpfile", False),
+    ("?.bin", "a.bin", True),
+    ("?.bin", "ab.bin", False),
+])
+def test_compile_patterns_anchoring(patron, ruta, esperado):
+    assert coincide([patron], ruta) is esperado
+
+
+def test_directory_only_patterns_match_directories_and_their_contents():
+    # Las rutas de directorio terminan en '/', como las entrega git status
+    assert coincide(["node_modules/"], "node_modules/")
+    assert coincide(["node_modules/"], "web/node_modules/lodash/index.js")
+    assert not coincide(["node_modules/"], "node_modules")  # Un archivo con ese nombre
+    assert coincide(["android/app/build/"], "android/app/build/outputs/app.apk")
+    assert not coincide(["android/app/build/"], "lib/android/app/build/x")
+
+
+def test_comments_negations_and_blank_lines_are_ignored():
+    assert compile_patterns(["", "   ", "# comentario", "!importante.log"]) is None
+    assert not StagePolicy(patterns=()).excluded("cualquier/cosa")
+
+
+def test_for_repo_reads_backupignore_and_extra_patterns(repo):
+    (repo / ".backupignore").write_text("*.iso\n# comentario\n/local/\n")
+    politica = StagePolicy.for_repo(str(repo), extra_patterns=["*.bak"])
+    assert politica.excluded("discos/ubuntu.iso")
+    assert politica.excluded("local/x")
+    assert not politica.excluded("src/local/x")
+    assert politica.excluded("a.bak")
+    assert politica.excluded("node_modules/x")  # DEFAULT_EXCLUDES
+
+
+def test_scan_walks_untracked_directories_and_reports_exclusions_once(repo):
+    (repo / "src/node_modules/dep").mkdir(parents=True)
+    (repo / "src/node_modules/dep/index.js").write_text("x" * 10)
+    (repo / "src/main.js").write_text("x" * 7)
+    (repo / "notas.tmp").write_text("x")
+    plan = scan(str(repo), status(repo), StagePolicy.for_repo(str(repo), ["*.tmp"]))
+    assert plan.included == ["src/main.js"]
+    assert sorted(plan.excluded) == [("notas.tmp", "patrón de exclusión"),
+                                     ("src/node_modules/", "patrón de exclusión")]
+    assert plan.total_bytes == 7 and not plan.over_budget
+
+
+def test_scan_keeps_tracked_files_that_match_a_pattern(repo):
+    (repo / "build.log").write_text("v1")
+    git(repo, "add", "build.log")
+    git(repo, "commit", "-q", "-m", "log rastreado")
+    (repo / "build.log").write_text("v2")
+    plan = scan(str(repo), status(repo), StagePolicy.for_repo(str(repo), ["*.log"]))
+    assert plan.included == ["build.log"]
+
+
+def test_scan_applies_file_size_limit_and_budget(repo):
+    (repo / "grande.bin").write_bytes(b"x" * 2000)
+    (repo / "a.txt").write_bytes(b"x" * 600)
+    (repo / "b.txt").write_bytes(b"x" * 600)
+    politica = StagePolicy(patterns=(), max_file_bytes=1000, max_total_bytes=1000)
+    plan = scan(str(repo), status(repo), politica)
+    assert sorted(plan.included) == ["a.txt", "b.txt"]
+    assert [ruta for ruta, _ in plan.excluded] == ["grande.bin"]
+    assert plan.total_bytes == 1200 and plan.over_budget
+
+
+def test_filter_status_and_pathspecs_leave_out_excluded_paths(repo):
+    (repo / "node_modules").mkdir()
+    (repo / "node_modules/x.js").write_text("x")
+    (repo / "app.js").write_text("x")
+    salida = subprocess.run(["git", "status", "--porcelain", "-z", "-uall"], cwd=repo, check=True,
+                            capture_output=True).stdout.decode()
+    plan = scan(str(repo), salida, StagePolicy.for_repo(str(repo)))
+    assert stagepolicy.filter_status(salida, plan) == "?? app.js\0"
+    archivo = stagepolicy.write_pathspec_file(str(repo), plan)
+    try:
+        subprocess.run(stagepolicy.add_command(archivo), cwd=repo, check=True)
+    finally:
+        if archivo:
+            os.remove(archivo)
+    assert git(repo, "diff", "--cached", "--name-only") == "app.js"
+
+
+def test_own_files_are_excluded_only_at_the_root(repo):
+    politica = StagePolicy.for_repo(str(repo))
+    for ruta in ("backup_git.log", "backup_git.log.1.gz", "backup_info.txt", ".backup_info.txt",
+                 "backup_metrics.jsonl"):
+        assert politica.excluded(ruta), ruta
+    # '/nombre' está anclado: un archivo del usuario con el mismo nombre en otro sitio se respalda
+    assert not politica.excluded("docs/backup_info.txt")
+    assert not politica.excluded("logs/backup_git.log")
+    (repo / "backup_git.log").write_text("x")
+    (repo / "docs").mkdir()
+    (repo / "docs/backup_info.txt").write_text("x")
+    plan = scan(str(repo), status(repo), politica)
+    assert plan.included == ["docs/backup_info.txt"]
+    assert [ruta for ruta, _ in plan.excluded] == ["backup_git.log"]
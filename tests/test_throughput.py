@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+
+from backup_tools import throughput
+
+from conftest import git
+
+MIB = 1024 * 1024
+
+
+@pytest.mark.parametrize("push_args, esperado", [
+    (["git", "push", "--progress", "origin", "+refs/backups/main:refs/backups/main"], "refs/backups/main"),
+    (["git", "push", "--progress", "origin", "main"], "main"),
+    (["git", "push", "--progress", "origin", ":borrada"], "HEAD"),
+    (["git", "push", "--progress"], "HEAD"),
+])
+def test_push_source(push_args, esperado):
+    assert throughput.push_source(push_args) == esperado
+
+
+def test_initial_plan_uses_defaults_and_bounds(repo):
+    historial = throughput.ThroughputHistory(str(repo))
+    plan = historial.plan(0)
+    assert plan.samples == 0 and plan.expected == throughput.LATENCIA_INICIAL
+    assert plan.timeout == throughput.PLAZO_MINIMO_SEGUNDOS
+    assert plan.inactivity_timeout == throughput.INACTIVIDAD_MINIMA_SEGUNDOS
+    enorme = historial.plan(1024 ** 4)
+    assert enorme.timeout == throughput.PLAZO_MAXIMO_SEGUNDOS
+    assert enorme.inactivity_timeout == throughput.INACTIVIDAD_MAXIMA_SEGUNDOS
+
+
+def test_history_learns_latency_and_throughput(repo):
+    historial = throughput.ThroughputHistory(str(repo))
+    for _ in range(3):
+        historial.record(1024, 2.0)  # Pushes pequeños: solo latencia
+    for segundos in (12.0, 12.0, 22.0):
+        historial.record(10 * MIB, segundos, "refs/backups/main", "abc")
+    # Se persiste y se recarga
+    historial = throughput.ThroughputHistory(str(repo))
+    assert historial.latency() == 2.0
+    caudal, muestras = historial.throughput()
+    assert muestras == 3
+    # Percentil prudente: más cerca del push lento que de los rápidos
+    assert 0.5 * MIB <= caudal < MIB
+    assert historial.puntas == {"refs/backups/main": "abc"}
+    assert historial.plan(10 * MIB).expected > 12.0
+
+
+def test_corrupt_history_starts_over(repo):
+    historial = throughput.ThroughputHistory(str(repo))
+    historial.record(1024, 1.0)
+    with open(historial.ruta, "w", encoding="utf-8") as f:
+        f.write("{no es json")
+    assert throughput.ThroughputHistory(str(repo)).muestras == []
+
+
+def test_estimate_excludes_already_pushed_tips(repo):
+    historial = throughput.ThroughputHistory(str(repo))
+    (repo / "grande.bin").write_bytes(bytes(range(256)) * 4096)
+    git(repo, "add", "grande.bin")
+    git(repo, "commit", "-q", "-m", "grande")
+    args = ["git", "push", "--progress", "origin", "main"]
+    tamano, sha = asyncio.run(throughput.estimate_push(str(repo), args, historial, lambda m, n: None))
+    assert sha == git(repo, "rev-parse", "HEAD") and tamano > 0
+    # Con la punta ya subida registrada solo cuenta el commit nuevo
+    historial.record(tamano, 1.0, "main", sha)
+    (repo / "README").write_text("cambiado\n")
+    git(repo, "commit", "-q", "-am", "pequeño")
+    pequeno, _ = asyncio.run(throughput.estimate_push(str(repo), args, historial, lambda m, n: None))
+    assert 0 < pequeno < tamano // 10
@@ -0,0 +1,105 @@
+import sys
+import threading
+
+import pytest
+
+from backup_tools import watcher
+from backup_tools.stagepolicy import StagePolicy
+
+from conftest import git
+
+VIGILANTES = [pytest.param(lambda raiz, politica: watcher.PollingWatcher(raiz, intervalo_sondeo=0.1,
+                                                                         politica=politica), id="polling")]
+if sys.platform.startswith("linux"):
+    VIGILANTES.append(pytest.param(lambda raiz, politica: watcher.InotifyWatcher(raiz, politica=politica),
+                                   id="inotify"))
+
+
+@pytest.fixture
+def arbol(repo):
+    """Repositorio con dependencias, artefactos ignorados y un directorio excluido pero rastreado."""
+    (repo / ".gitignore").write_text("dist/\n*.tmp\n")
+    for directorio in ("src", "node_modules/pkg", "dist/js", "android/app/build", "vendor/node_modules"):
+        (repo / directorio).mkdir(parents=True)
+    (repo / "vendor/node_modules/lib.js").write_text("rastreado\n")
+    git(repo, "add", ".gitignore")
+    git(repo, "add", "-f", "vendor/node_modules/lib.js")
+    git(repo, "commit", "-q", "-m", "arbol")
+    return repo
+
+
+def esperar(vigilante, timeout=1.5):
+    return vigilante.wait_for_changes(0.2, threading.Event(), timeout=timeout)
+
+
+@pytest.mark.parametrize("crear", VIGILANTES)
+def test_excluded_and_gitignored_paths_do_not_trigger(arbol, crear):
+    vigilante = crear(str(arbol), StagePolicy.for_repo(str(arbol), extra_patterns=["*.bak"]))
+    try:
+        (arbol / "node_modules/pkg/index.js").write_text("x")
+        (arbol / "android/app/build/out.apk").write_text("x")
+        (arbol / "dist/js/app.js").write_text("x")
+        (arbol / "notas.tmp").write_text("x")
+        (arbol / "src/viejo.bak").write_text("x")
+        assert esperar(vigilante) == set()
+    finally:
+        vigilante.close()
+
+
+@pytest.mark.parametrize("crear", VIGILANTES)
+def test_changes_in_included_and_tracked_paths_trigger(arbol, crear):
+    vigilante = crear(str(arbol), StagePolicy.for_repo(str(arbol)))
+    try:
+        (arbol / "node_modules/pkg/index.js").write_text("x")
+        (arbol / "src/main.js").write_text("x")
+        # Excluido por patrón pero ya rastreado: se sigue respaldando, así que se vigila
+        (arbol / "vendor/node_modules/lib.js").write_text("cambiado\n")
+        assert esperar(vigilante, timeout=5) == {"src/main.js", "vendor/node_modules/lib.js"}
+    finally:
+        vigilante.close()
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify")
+def test_inotify_does_not_watch_pruned_directories(arbol):
+    vigilante = watcher.InotifyWatcher(str(arbol), politica=StagePolicy.for_repo(str(arbol)))
+    try:
+        vigilados = set(vigilante._directorios.values())
+    finally:
+        vigilante.close()
+    assert {".", "src", "android", "android/app", "vendor/node_modules"} <= vigilados
+    assert not vigilados & {"node_modules", "node_modules/pkg", "dist", "dist/js", "android/app/build"}
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify")
+def test_new_ignored_directory_is_not_watched(arbol):
+    vigilante = watcher.InotifyWatcher(str(arbol), politica=StagePolicy.for_repo(str(arbol)))
+    try:
+        (arbol / "src/node_modules/dep").mkdir(parents=True)
+        (arbol / "src/node_modules/dep/a.js").write_text("x")
+        (arbol / "src/nuevo").mkdir()
+        (arbol / "src/nuevo/b.js").write_text("x")
+        cambios = esperar(vigilante, timeout=5)
+        vigilados = set(vigilante._directorios.values())
+    finally:
+        vigilante.close()
+    assert "src/nuevo" in vigilados and "src/node_modules" not in vigilados
+    assert cambios and not any("node_modules" in ruta for ruta in cambios)
+
+
+class _VigilanteFalso:
+    def __init__(self, lotes):
+        self.lotes = list(lotes)
+
+    def wait_for_changes(self, debounce, stop_event, timeout=None):
+        if not self.lotes:
+            stop_event.set()
+            return None
+        return self.lotes.pop(0)
+
+
+def test_heartbeat_runs_full_check_instead_of_skipping_git():
+    llamadas = []
+    watcher.run_watch(lambda rutas: llamadas.append(rutas) or "NO_CHANGES",
+                      _VigilanteFalso([set(), {"src/a.js"}]), 0.1, threading.Event(), heartbeat=60)
+    # Arranque, latido sin cambios (revisión completa) y lote del vigilante
+    assert llamadas == [None, None, {"src/a.js"}]